@@ -0,0 +1,83 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, abort
+from flask_login import current_user, login_required
+from functools import wraps
+import io
+import os
+import pstats
+from ...db import db
+from ...models import PerfilExecucao
+
+admin_bp = Blueprint("admin", __name__, template_folder="templates", url_prefix="/admin")
+
+
+def admin_required(fn):
+    """Restringe a rota a usuários administradores."""
+    @wraps(fn)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if not getattr(current_user, "is_admin", False):
+            flash("Acesso restrito a administradores.", "danger")
+            return redirect(url_for("home"))
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route("/perfis")
+@admin_required
+def perfis():
+    limite = request.args.get("limite", 50, type=int)
+    execucoes = (
+        db.session.query(PerfilExecucao)
+        .order_by(PerfilExecucao.duracao_s.desc())
+        .limit(limite)
+        .all()
+    )
+    return render_template("admin_perfis.html", execucoes=execucoes)
+
+
+@admin_bp.route("/perfis/<int:perfil_id>")
+@admin_required
+def perfil_detalhe(perfil_id):
+    execucao = db.session.get(PerfilExecucao, perfil_id)
+    if not execucao:
+        flash("Perfil não encontrado.", "danger")
+        return redirect(url_for("admin.perfis"))
+
+    saida = io.StringIO()
+    try:
+        stats = pstats.Stats(execucao.caminho_perfil, stream=saida)
+        stats.sort_stats("cumulative").print_stats(30)
+    except (OSError, TypeError) as e:
+        saida.write(f"Perfil indisponível: {e}")
+
+    alocacoes = []
+    if execucao.caminho_alocacoes and os.path.exists(execucao.caminho_alocacoes):
+        import tracemalloc
+        snapshot = tracemalloc.Snapshot.load(execucao.caminho_alocacoes)
+        alocacoes = [str(s) for s in snapshot.statistics("lineno")[:20]]
+
+    return render_template(
+        "admin_perfis.html",
+        execucao=execucao,
+        relatorio=saida.getvalue(),
+        alocacoes=alocacoes,
+    )
+
+
+@admin_bp.route("/perfis/<int:perfil_id>/download/<tipo>")
+@admin_required
+def perfil_download(perfil_id, tipo):
+    execucao = db.session.get(PerfilExecucao, perfil_id)
+    if not execucao or tipo not in ("prof", "tracemalloc"):
+        abort(404)
+
+    caminho = execucao.caminho_perfil if tipo == "prof" else execucao.caminho_alocacoes
+    if not caminho or not os.path.exists(caminho):
+        abort(404)
+
+    return send_file(
+        os.path.abspath(caminho),
+        as_attachment=True,
+        download_name=f"{execucao.job_id}.{tipo}",
+        mimetype="application/octet-stream",
+    )
@@ -0,0 +1,574 @@
+from flask import Blueprint, current_app, g, jsonify, request
+from flask_login import current_user, login_required
+from functools import wraps
+from datetime import datetime
+import hashlib
+import os
+import secrets
+import uuid
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from ...db import db
+from ...models import ApiToken, CleanRun, ConexaoSQL, Documentos, Job, UploadChunk, UploadSession
+from ...jobs import agendador, enfileirar, posicao_na_fila, verificar_orfao
+from ...connectors.validacao import (
+    MODOS_EXPORTACAO, validar_consulta, validar_tabela, validar_url_do_usuario,
+)
+
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+EXTENSOES = (".csv", ".xls", ".xlsx", ".json", ".zip")
+BLOCO_LEITURA = 1024 * 1024
+
+
+def _erro(mensagem, status):
+    return jsonify({"error": mensagem}), status
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def gerar_token(user_id, nome):
+    """Cria um ApiToken e retorna (registro, token em texto); o texto não é recuperável depois."""
+    token = secrets.token_urlsafe(32)
+    registro = ApiToken(user_id=user_id, nome=nome, prefixo=token[:8], token_hash=_hash_token(token))
+    db.session.add(registro)
+    db.session.commit()
+    return registro, token
+
+
+def token_required(fn):
+    """Autentica por `Authorization: Bearer <token>` e expõe o usuário em g.api_user."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        cabecalho = request.headers.get("Authorization", "")
+        if not cabecalho.startswith("Bearer "):
+            return _erro("Token não informado.", 401)
+        registro = ApiToken.query.filter_by(token_hash=_hash_token(cabecalho[7:].strip())).first()
+        if not registro:
+            return _erro("Token inválido.", 401)
+        registro.last_used_at = datetime.utcnow()
+        db.session.commit()
+        g.api_user = registro.user
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _documento_do_usuario(doc_id):
+    return Documentos.query.filter_by(id=doc_id, user_id=g.api_user.id).first()
+
+
+def _sessao_do_usuario(sessao_id):
+    return UploadSession.query.filter_by(id=sessao_id, user_id=g.api_user.id).first()
+
+
+def _parametros_limpeza(dados):
+    from ...pipeline import ESTRATEGIAS
+    from ...cleaning import validar_regras
+    from ...utils.quase_duplicadas import validar_config
+    from ...utils.validacao import compilar_regras
+    estrategia = dados.get("estrategia", "knn")
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError("Estratégia de limpeza inválida.")
+    parametros = {"estrategia": estrategia, "paralelo": bool(dados.get("paralelo", False))}
+    if "normalizar" in dados:
+        if not isinstance(dados["normalizar"], bool):
+            raise ValueError("'normalizar' deve ser true ou false.")
+        parametros["normalizar"] = dados["normalizar"]
+
+    colunas = dados.get("colunas")
+    if colunas is not None:
+        if not isinstance(colunas, list) or not all(isinstance(c, str) for c in colunas):
+            raise ValueError("'colunas' deve ser uma lista de nomes de colunas.")
+        parametros["colunas"] = colunas
+    if dados.get("regras"):
+        parametros["regras"] = validar_regras(dados["regras"], estrategia)
+    if dados.get("validacao"):
+        parametros["validacao"] = compilar_regras(dados["validacao"])
+    if dados.get("quase_duplicadas"):
+        parametros["quase_duplicadas"] = validar_config(dados["quase_duplicadas"])
+    return parametros
+
+
+def _job_dict(job):
+    dados = job.to_dict()
+    if job.status == "pendente":
+        dados["posicao_fila"] = posicao_na_fila(job.id)
+    return dados
+
+
+def _documento_dict(doc):
+    return {
+        "id": doc.id,
+        "nome_documento": doc.nome_documento,
+        "tamanho_kb": doc.tamanho_kb,
+        "linhas": doc.linhas,
+        "uploaded_at": doc.uploaded_at.isoformat() if doc.uploaded_at else None,
+    }
+
+
+# ---------------- Tokens (sessão web) ----------------
+@api_bp.route("/tokens", methods=["GET"])
+@login_required
+def listar_tokens():
+    tokens = ApiToken.query.filter_by(user_id=current_user.id).order_by(ApiToken.id).all()
+    return jsonify([t.to_dict() for t in tokens])
+
+
+@api_bp.route("/tokens", methods=["POST"])
+@login_required
+def criar_token():
+    nome = (request.get_json(silent=True) or request.form).get("nome") or "api"
+    registro, token = gerar_token(current_user.id, nome[:100])
+    return jsonify({**registro.to_dict(), "token": token}), 201
+
+
+@api_bp.route("/tokens/<int:token_id>", methods=["DELETE"])
+@login_required
+def revogar_token(token_id):
+    registro = ApiToken.query.filter_by(id=token_id, user_id=current_user.id).first()
+    if not registro:
+        return _erro("Token não encontrado.", 404)
+    db.session.delete(registro)
+    db.session.commit()
+    return "", 204
+
+
+# ---------------- Upload em partes ----------------
+@api_bp.route("/uploads", methods=["POST"])
+@token_required
+def criar_upload():
+    dados = request.get_json(silent=True) or {}
+    nome = os.path.basename(str(dados.get("nome_arquivo", "")).strip())
+    tamanho = dados.get("tamanho_total")
+
+    if not nome or not nome.lower().endswith(EXTENSOES):
+        return _erro("Formato não suportado.", 400)
+    if not isinstance(tamanho, int) or tamanho <= 0:
+        return _erro("tamanho_total deve ser um inteiro positivo.", 400)
+    if tamanho > current_app.config["API_MAX_UPLOAD_BYTES"]:
+        return _erro("Arquivo maior que o limite permitido.", 413)
+
+    sessao_id = uuid.uuid4().hex
+    pasta = os.path.join(current_app.config["UPLOAD_FOLDER"], "parciais")
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{sessao_id}.part")
+    # Pré-aloca o arquivo para que os trechos possam chegar em qualquer ordem
+    with open(caminho, "wb") as f:
+        f.truncate(tamanho)
+
+    sessao = UploadSession(
+        id=sessao_id,
+        user_id=g.api_user.id,
+        nome_arquivo=nome,
+        tamanho_total=tamanho,
+        caminho_parcial=caminho,
+    )
+    db.session.add(sessao)
+    db.session.commit()
+    return jsonify(sessao.to_dict()), 201
+
+
+@api_bp.route("/uploads/<sessao_id>", methods=["PUT"])
+@token_required
+def enviar_trecho(sessao_id):
+    sessao = _sessao_do_usuario(sessao_id)
+    if not sessao:
+        return _erro("Upload não encontrado.", 404)
+    if sessao.status != "aberta":
+        return _erro("Upload já finalizado.", 409)
+
+    offset = request.args.get("offset", type=int)
+    tamanho = request.content_length
+    if offset is None or offset < 0:
+        return _erro("offset não informado.", 400)
+    if not tamanho:
+        return _erro("Content-Length não informado.", 411)
+    if offset + tamanho > sessao.tamanho_total:
+        return _erro("Trecho ultrapassa o tamanho declarado.", 416)
+
+    esperado = request.headers.get("X-Content-SHA256")
+    digest = hashlib.sha256()
+    recebido = 0
+    with open(sessao.caminho_parcial, "r+b") as f:
+        f.seek(offset)
+        while recebido < tamanho:
+            bloco = request.stream.read(min(BLOCO_LEITURA, tamanho - recebido))
+            if not bloco:
+                break
+            f.write(bloco)
+            digest.update(bloco)
+            recebido += len(bloco)
+
+    if recebido != tamanho:
+        return _erro("Trecho incompleto; reenvie o mesmo offset.", 400)
+    if esperado and esperado.lower() != digest.hexdigest():
+        return _erro("Checksum do trecho não confere; reenvie o mesmo offset.", 400)
+
+    # reenvio (ou dois PUTs simultâneos) do mesmo offset: a unique constraint decide e o trecho é atualizado
+    try:
+        with db.session.begin_nested():
+            db.session.add(UploadChunk(sessao_id=sessao.id, offset=offset, tamanho=tamanho))
+    except IntegrityError:
+        UploadChunk.query.filter_by(sessao_id=sessao.id, offset=offset).update({"tamanho": tamanho})
+    sessao.updated_at = datetime.utcnow()
+    db.session.commit()
+    db.session.refresh(sessao)
+    return jsonify(sessao.to_dict())
+
+
+@api_bp.route("/uploads/<sessao_id>", methods=["GET"])
+@token_required
+def status_upload(sessao_id):
+    sessao = _sessao_do_usuario(sessao_id)
+    if not sessao:
+        return _erro("Upload não encontrado.", 404)
+    return jsonify(sessao.to_dict())
+
+
+@api_bp.route("/uploads/<sessao_id>/finalize", methods=["POST"])
+@token_required
+def finalizar_upload(sessao_id):
+    sessao = _sessao_do_usuario(sessao_id)
+    if not sessao:
+        return _erro("Upload não encontrado.", 404)
+    if sessao.status != "aberta":
+        return _erro("Upload já finalizado.", 409)
+
+    faltam = sessao.faltantes()
+    if faltam:
+        return jsonify({"error": "Upload incompleto.", "faltantes": faltam}), 409
+    agendador().verificar_fila()  # antes de mover o arquivo e fechar a sessão: com 503, dá para tentar de novo
+
+    dados = request.get_json(silent=True) or {}
+    try:
+        parametros = _parametros_limpeza(dados)
+    except ValueError as e:
+        return _erro(str(e), 400)
+    parametros["limpar"] = bool(dados.get("limpar", False))
+
+    # fecha a sessão com um UPDATE condicional: a linha fica travada até o commit e um finalize
+    # simultâneo não encontra mais status "aberta" (409), em vez de mover o arquivo duas vezes
+    fechada = (
+        UploadSession.query.filter_by(id=sessao.id, status="aberta")
+        .update({"status": "finalizada"}, synchronize_session=False)
+    )
+    if not fechada:
+        db.session.rollback()
+        return _erro("Upload já finalizado.", 409)
+
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    save_dir = os.path.join(current_app.config["UPLOAD_FOLDER"], f"user_{g.api_user.id}")
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, f"{timestamp}_{sessao.nome_arquivo}")
+    os.replace(sessao.caminho_parcial, save_path)
+
+    doc = Documentos(
+        nome_documento=sessao.nome_arquivo,
+        user_id=g.api_user.id,
+        caminho=save_path,
+        tamanho_kb=sessao.tamanho_total / 1024,
+        uploaded_at=datetime.utcnow(),
+    )
+    db.session.add(doc)
+    db.session.flush()
+
+    sessao.status = "finalizada"
+    sessao.documento_id = doc.id
+    sessao.chunks.clear()
+    db.session.commit()
+
+    job = enfileirar("ingest", g.api_user.id, doc.id, parametros)
+    return jsonify({"documento_id": doc.id, "job": _job_dict(job)}), 202
+
+
+@api_bp.route("/uploads/<sessao_id>", methods=["DELETE"])
+@token_required
+def cancelar_upload(sessao_id):
+    sessao = _sessao_do_usuario(sessao_id)
+    if not sessao:
+        return _erro("Upload não encontrado.", 404)
+    if sessao.status == "aberta" and os.path.exists(sessao.caminho_parcial):
+        os.remove(sessao.caminho_parcial)
+    db.session.delete(sessao)
+    db.session.commit()
+    return "", 204
+
+
+# ---------------- Jobs ----------------
+@api_bp.route("/jobs/<job_id>", methods=["GET"])
+@token_required
+def status_job(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=g.api_user.id).first()
+    if not job:
+        return _erro("Job não encontrado.", 404)
+    return jsonify(_job_dict(verificar_orfao(job)))
+
+
+# ---------------- Documentos ----------------
+@api_bp.route("/documents", methods=["GET"])
+@token_required
+def listar_documentos():
+    docs = Documentos.query.filter_by(user_id=g.api_user.id).order_by(Documentos.id.desc()).all()
+    return jsonify([_documento_dict(d) for d in docs])
+
+
+@api_bp.route("/documents/<int:doc_id>", methods=["GET"])
+@token_required
+def detalhar_documento(doc_id):
+    doc = _documento_do_usuario(doc_id)
+    if not doc:
+        return _erro("Documento não encontrado.", 404)
+    return jsonify({
+        **_documento_dict(doc),
+        "estatisticas": doc.estatisticas,
+        "runs": [r.to_dict() for r in doc.clean_runs],
+    })
+
+
+@api_bp.route("/documents/<int:doc_id>/clean", methods=["POST"])
+@token_required
+def limpar_documento(doc_id):
+    doc = _documento_do_usuario(doc_id)
+    if not doc:
+        return _erro("Documento não encontrado.", 404)
+    from ...cleaning import selecao_colunas
+    from ...pipeline import verificar_colunas
+    try:
+        parametros = _parametros_limpeza(request.get_json(silent=True) or {})
+        verificar_colunas(
+            doc.id, selecao_colunas(parametros.get("colunas"), parametros.get("regras")),
+            parametros.get("validacao"), parametros.get("quase_duplicadas"),
+        )
+    except ValueError as e:
+        return _erro(str(e), 400)
+
+    job = enfileirar("clean", g.api_user.id, doc.id, parametros)
+    return jsonify({"documento_id": doc.id, "job": _job_dict(job)}), 202
+
+
+@api_bp.route("/documents/<int:doc_id>/runs/<int:run_id>/failures", methods=["GET"])
+@token_required
+def falhas_validacao_run(doc_id, run_id):
+    from ...pipeline import falhas_validacao
+
+    doc = _documento_do_usuario(doc_id)
+    run = CleanRun.query.filter_by(id=run_id, documento_id=doc_id).first() if doc else None
+    if not run:
+        return _erro("Execução não encontrada.", 404)
+    offset = request.args.get("offset", 0, type=int)
+    limite = request.args.get("limite", 100, type=int)
+    if offset < 0 or not 1 <= limite <= 1000:
+        return _erro("offset deve ser >= 0 e limite entre 1 e 1000.", 400)
+    try:
+        pagina = falhas_validacao(run, offset, limite, request.args.get("regra"))
+    except ValueError as e:
+        return _erro(str(e), 400)
+    if pagina is None:
+        return _erro("Execução sem índice de validação.", 404)
+    return jsonify(pagina)
+
+
+@api_bp.route("/documents/<int:doc_id>/aggregate", methods=["POST"])
+@token_required
+def agregar_documento_api(doc_id):
+    from ...pipeline import agregar_documento
+
+    doc = _documento_do_usuario(doc_id)
+    if not doc:
+        return _erro("Documento não encontrado.", 404)
+    run = None
+    run_id = request.args.get("run_id", type=int)
+    if run_id:
+        run = CleanRun.query.filter_by(id=run_id, documento_id=doc.id).first()
+        if not run:
+            return _erro("Execução não encontrada.", 404)
+    try:
+        return jsonify(agregar_documento(doc, request.get_json(silent=True) or {}, run))
+    except ValueError as e:
+        return _erro(str(e), 400)
+
+
+@api_bp.route("/documents/<int:doc_id>/near-duplicates", methods=["GET"])
+@token_required
+def quase_duplicadas_documento(doc_id):
+    from ...pipeline import grupos_quase_duplicadas
+
+    doc = _documento_do_usuario(doc_id)
+    if not doc:
+        return _erro("Documento não encontrado.", 404)
+    offset = request.args.get("offset", 0, type=int)
+    limite = request.args.get("limite", 50, type=int)
+    if offset < 0 or not 1 <= limite <= 500:
+        return _erro("offset deve ser >= 0 e limite entre 1 e 500.", 400)
+    pagina = grupos_quase_duplicadas(doc, offset, limite)
+    if pagina is None:
+        return _erro("Documento sem detecção de quase-duplicatas.", 404)
+    return jsonify(pagina)
+
+
+@api_bp.route("/documents/<int:doc_id>/drift", methods=["GET"])
+@token_required
+def deriva_documento_api(doc_id):
+    from ...pipeline import deriva_documento
+    from ...utils.deriva import parametros_consulta
+
+    doc = _documento_do_usuario(doc_id)
+    if not doc:
+        return _erro("Documento não encontrado.", 404)
+    try:
+        contra, limite = parametros_consulta(request.args.get("contra"), request.args.get("limite"))
+    except ValueError as e:
+        return _erro(str(e), 400)
+    resultado = deriva_documento(doc, contra, limite)
+    if resultado is None:
+        return _erro("Documento sem assinatura (enviado antes da detecção de deriva).", 404)
+    return jsonify(resultado)
+
+
+@api_bp.route("/documents/<int:doc_id>/export", methods=["POST"])
+@token_required
+def exportar_documento(doc_id):
+    doc = _documento_do_usuario(doc_id)
+    if not doc:
+        return _erro("Documento não encontrado.", 404)
+
+    dados = request.get_json(silent=True) or {}
+    modo = dados.get("modo", "append")
+    chave = dados.get("chave") or []
+    if isinstance(chave, str):
+        chave = [chave]
+    tamanho_lote = dados.get("tamanho_lote", current_app.config["EXPORT_BATCH_SIZE"])
+    run_id = dados.get("run_id")
+    conexao_id = dados.get("conexao_id")
+    try:
+        validar_tabela(str(dados.get("tabela", "")))
+        if modo not in MODOS_EXPORTACAO:
+            raise ValueError("Modo de exportação inválido.")
+        if not isinstance(chave, list) or not all(isinstance(c, str) and c for c in chave):
+            raise ValueError("chave deve ser uma lista de nomes de coluna.")
+        if modo == "upsert" and not chave:
+            raise ValueError("O modo upsert exige as colunas de chave.")
+        if not _inteiro(tamanho_lote) or tamanho_lote <= 0:
+            raise ValueError("tamanho_lote deve ser um inteiro positivo.")
+        if run_id is not None and not _inteiro(run_id):
+            raise ValueError("run_id deve ser um inteiro.")
+        if conexao_id is not None and not _inteiro(conexao_id):
+            raise ValueError("conexao_id deve ser um inteiro.")
+        if conexao_id is None and not dados.get("url"):
+            raise ValueError("Informe conexao_id (ou url).")
+        url = None if conexao_id is not None else _url_normalizada(dados["url"])
+    except ValueError as e:
+        return _erro(str(e), 400)
+
+    if run_id is not None and not CleanRun.query.filter_by(id=run_id, documento_id=doc.id).first():
+        return _erro("Execução não encontrada.", 404)
+    if conexao_id is not None:
+        conexao = ConexaoSQL.query.filter_by(id=conexao_id, user_id=g.api_user.id).first()
+        if not conexao:
+            return _erro("Conexão não encontrada.", 404)
+        try:
+            validar_url_do_usuario(conexao.url, g.api_user)
+        except ValueError as e:
+            return _erro(str(e), 400)
+    else:
+        conexao = _conexao_de_destino(url)
+
+    # só o id da conexão vai para o job: a URL (com senha) fica apenas em sql_connections
+    job = enfileirar("export", g.api_user.id, doc.id, {
+        "conexao_id": conexao.id,
+        "tabela": dados["tabela"],
+        "modo": modo,
+        "chave": chave,
+        "tamanho_lote": tamanho_lote,
+        "run_id": run_id,
+    })
+    return jsonify({"documento_id": doc.id, "job": _job_dict(job)}), 202
+
+
+# ---------------- Conexões SQL ----------------
+def _inteiro(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def _url_normalizada(url):
+    """URL validada e renderizada de volta (é essa forma que fica salva)."""
+    url = validar_url_do_usuario(str(url), g.api_user).render_as_string(hide_password=False)
+    if len(url) > 500:
+        raise ValueError("URL de conexão longa demais.")
+    return url
+
+
+def _conexao_de_destino(url):
+    """Conexão só de destino do usuário para `url`, reaproveitada entre exportações."""
+    conexao = ConexaoSQL.query.filter_by(user_id=g.api_user.id, url=url, documento_id=None).first()
+    if conexao is None:
+        parsed = make_url(url)
+        nome = f"destino {parsed.host or parsed.database or parsed.get_backend_name()}"[:100]
+        conexao = ConexaoSQL(user_id=g.api_user.id, nome=nome, url=url)
+        db.session.add(conexao)
+        db.session.commit()
+    return conexao
+
+
+@api_bp.route("/connections", methods=["GET"])
+@token_required
+def listar_conexoes():
+    conexoes = ConexaoSQL.query.filter_by(user_id=g.api_user.id).order_by(ConexaoSQL.id).all()
+    return jsonify([c.to_dict() for c in conexoes])
+
+
+@api_bp.route("/connections", methods=["POST"])
+@token_required
+def criar_conexao():
+    dados = request.get_json(silent=True) or {}
+    nome = str(dados.get("nome") or "").strip()[:100]
+    if not nome:
+        return _erro("nome não informado.", 400)
+    destino = bool(dados.get("destino"))
+    try:
+        url = _url_normalizada(dados.get("url", ""))
+        consulta = None if destino else validar_consulta(str(dados.get("consulta", "")))
+    except ValueError as e:
+        return _erro(str(e), 400)
+    if destino:
+        conexao = ConexaoSQL(user_id=g.api_user.id, nome=nome, url=url)
+        db.session.add(conexao)
+        db.session.commit()
+        return jsonify({"conexao": conexao.to_dict()}), 201
+    agendador().verificar_fila()
+
+    doc = Documentos(nome_documento=nome, user_id=g.api_user.id, linhas=0, uploaded_at=datetime.utcnow())
+    db.session.add(doc)
+    db.session.flush()
+    conexao = ConexaoSQL(
+        user_id=g.api_user.id,
+        documento_id=doc.id,
+        nome=nome,
+        url=url,
+        consulta=consulta,
+        coluna_watermark=dados.get("coluna_watermark") or None,
+    )
+    db.session.add(conexao)
+    db.session.commit()
+
+    job = enfileirar("sql", g.api_user.id, doc.id, {"substituir": True})
+    return jsonify({"conexao": conexao.to_dict(), "job": _job_dict(job)}), 202
+
+
+@api_bp.route("/connections/<int:conexao_id>/pull", methods=["POST"])
+@token_required
+def puxar_conexao(conexao_id):
+    conexao = ConexaoSQL.query.filter_by(id=conexao_id, user_id=g.api_user.id).first()
+    if not conexao:
+        return _erro("Conexão não encontrada.", 404)
+    if not conexao.consulta:
+        return _erro("Conexão só de destino: não há consulta para puxar.", 400)
+    try:
+        validar_url_do_usuario(conexao.url, g.api_user)
+    except ValueError as e:
+        return _erro(str(e), 400)
+    substituir = bool((request.get_json(silent=True) or {}).get("substituir", False))
+    job = enfileirar("sql", g.api_user.id, conexao.documento_id, {"substituir": substituir})
+    return jsonify({"conexao": conexao.to_dict(), "job": _job_dict(job)}), 202
@@ -4,7 +4,6 @@ from werkzeug.utils import secure_filename
 import os, uuid
 from ...db import db
 from ...models import Documentos
-from ...utils.file_loader import load_dataframe  #  agora usa a função centralizada
 
 predicao_bp = Blueprint(
     "predicao", __name__, template_folder="templates", url_prefix="/predicao"
@@ -29,6 +28,7 @@ def upload():
         file.save(save_path)
 
         try:
+            from ...utils.file_loader import load_dataframe  # pandas só no primeiro uso
             df = load_dataframe(save_path)  # reaproveita utilitário
             tamanho_kb = os.path.getsize(save_path) / 1024
             linhas = len(df)
@@ -62,8 +62,11 @@ def view_doc(id):
         return redirect(url_for("predicao.page"))
 
     try:
-        df = load_dataframe(doc.caminho)  # idem
-        sample = df.head(20).to_dict(orient="records")
+        from ...pipeline import amostra_documento, arquivo_em_cache
+        amostra = amostra_documento(doc.id)
+        # amostra guardada na ingestão (sem ler o arquivo); documentos antigos leem pelo cache colunar
+        df = amostra.previa(20) if amostra is not None else arquivo_em_cache(doc).head(20)
+        sample = df.to_dict(orient="records")
         columns = df.columns.tolist()
     except Exception as e:
         flash(f"Erro ao ler o arquivo: {str(e)}", "danger")
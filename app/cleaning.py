@@ -1,38 +1,35 @@
 import io
+import os
 import json
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pandas as pd
 import numpy as np
-from sklearn.impute import KNNImputer
-from sklearn.ensemble import IsolationForest
 
+from .utils.amostragem import amostra_espalhada
+from .utils.cache_colunar import abrir as abrir_colunar, materializar
+from .utils.metrics import etapa
+from .utils.sketches import KLL, HashesVistos, PerfilSketch, perfilar_chunks
+from .utils.validacao import validar_chunks
 
-def validate_dataframe(df: pd.DataFrame) -> dict:
-    """Valida se o DataFrame atende critérios básicos de qualidade."""
-    results = {}
 
+def validate_dataframe(df: pd.DataFrame, regras=None) -> dict:
+    """
+    Valida o DataFrame com as regras declarativas de `utils.validacao`
+    (sem `regras`: numéricas sem nulos e sem negativos). Mantém as chaves
+    históricas e acrescenta as falhas por regra e as mensagens.
+    """
     if df is None or df.empty:
         return {"valid": False, "reason": "DataFrame vazio ou nulo", "row_count": 0}
 
     try:
-        num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-
-        results["no_nulls_numeric"] = (
-            all(df[c].notna().all() for c in num_cols) if num_cols else True
-        )
-        results["numeric_positive"] = all(
-            (df[c] >= 0).all() for c in num_cols if c in df.columns
-        )
-        results["row_count"] = len(df)
-        results["valid"] = (
-            results["no_nulls_numeric"]
-            and results["numeric_positive"]
-            and results["row_count"] > 0
-        )
-
+        return validar_chunks([df], regras).resultado()
     except Exception as e:
-        results = {"valid": False, "error": str(e), "row_count": len(df)}
-
-    return results
+        return {"valid": False, "error": str(e), "row_count": len(df)}
 
 
 def analyze_dataframe(df: pd.DataFrame) -> dict:
@@ -56,27 +53,508 @@ def analyze_dataframe(df: pd.DataFrame) -> dict:
         return {"error": f"Erro ao analisar DataFrame: {str(e)}"}
 
 
-def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    """Remove duplicados, imputa valores ausentes e trata outliers."""
+def analyze_dataframe_sketch(chunks, perfil: PerfilSketch = None) -> dict:
+    """
+    Versão aproximada do `analyze_dataframe` para documentos grandes:
+    percorre os chunks uma única vez com sketches (KLL, HLL, Count-Min).
+    """
+    try:
+        resumo = perfilar_chunks(chunks, perfil).resumo()
+    except Exception as e:
+        return {"error": f"Erro ao analisar DataFrame: {str(e)}"}
+
+    return {
+        "shape": (resumo["linhas"], resumo["colunas"]),
+        "dtypes": {c: r["dtype"] for c, r in resumo["por_coluna"].items()},
+        "missing_by_col": {c: r["nulos"] for c, r in resumo["por_coluna"].items()},
+        "duplicates": resumo["duplicadas"],
+        "aproximado": True,
+        "resumo": resumo,
+    }
+
+
+# ---------------- Regras por coluna ----------------
+IMPUTACOES = ("mediana", "media", "valor", "knn", "nenhum")
+TRATAMENTOS_OUTLIERS = ("iqr", "isolation_forest", "nenhum")
+# Padrões de cada estratégia para as colunas sem regra própria
+REGRAS_PADRAO = {
+    "knn": {"imputar": "knn", "outliers": "isolation_forest", "fator_iqr": 1.5},
+    "regras": {"imputar": "mediana", "outliers": "iqr", "fator_iqr": 1.5},
+}
+
+
+def validar_regras(regras, estrategia: str) -> dict:
+    """
+    Valida as regras por coluna ({coluna: {"imputar", "valor", "outliers",
+    "fator_iqr"}}); levanta ValueError com a primeira inconsistência.
+    KNN e IsolationForest precisam do frame inteiro, então não valem na
+    estratégia "regras" (que roda em chunks e em paralelo).
+    """
+    if not regras:
+        return {}
+    if not isinstance(regras, dict):
+        raise ValueError("'regras' deve ser um objeto {coluna: regra}.")
+    for col, regra in regras.items():
+        if not isinstance(regra, dict):
+            raise ValueError(f"Regra da coluna '{col}' deve ser um objeto.")
+        desconhecidas = set(regra) - {"imputar", "valor", "outliers", "fator_iqr"}
+        if desconhecidas:
+            raise ValueError(f"Chaves desconhecidas na regra de '{col}': {', '.join(sorted(desconhecidas))}.")
+        imputar, outliers = regra.get("imputar"), regra.get("outliers")
+        if imputar is not None and imputar not in IMPUTACOES:
+            raise ValueError(f"'imputar' inválido em '{col}' (use {', '.join(IMPUTACOES)}).")
+        if outliers is not None and outliers not in TRATAMENTOS_OUTLIERS:
+            raise ValueError(f"'outliers' inválido em '{col}' (use {', '.join(TRATAMENTOS_OUTLIERS)}).")
+        if imputar == "valor" and "valor" not in regra:
+            raise ValueError(f"Informe 'valor' para imputar a coluna '{col}'.")
+        if estrategia == "regras" and (imputar == "knn" or outliers == "isolation_forest"):
+            raise ValueError(f"'knn'/'isolation_forest' em '{col}' exigem a estratégia knn.")
+        fator = regra.get("fator_iqr", 1.5)
+        if isinstance(fator, bool) or not isinstance(fator, (int, float)) or fator <= 0:
+            raise ValueError(f"'fator_iqr' de '{col}' deve ser um número positivo.")
+    return regras
+
+
+def selecao_colunas(colunas=None, regras=None):
+    """Colunas a limpar (seleção + colunas com regra), ou None para todas."""
+    if not colunas and not regras:
+        return None
+    selecao = list(colunas or [])
+    selecao += [c for c in (regras or {}) if c not in selecao]
+    return selecao
+
+
+def _regra(col, regras, estrategia: str) -> dict:
+    return {**REGRAS_PADRAO[estrategia], **((regras or {}).get(col) or {})}
+
+
+def _colunas_para_coercao(df: pd.DataFrame, amostra: int = 10_000, limiar: float = 0.95) -> list:
+    """Colunas texto cujos valores (em uma amostra espalhada pelo frame) são quase todos numéricos."""
+    colunas = []
+    for col in df.select_dtypes(exclude=[np.number, "bool", "datetime"]).columns:
+        valores = amostra_espalhada(df[col].dropna(), amostra)
+        if valores.empty:
+            continue
+        convertidos = pd.to_numeric(valores, errors="coerce")
+        if convertidos.notna().mean() >= limiar:
+            colunas.append(col)
+    return colunas
+
+
+def _coagir(df: pd.DataFrame, colunas: list) -> pd.DataFrame:
+    if not colunas:
+        return df
+    # Cópia rasa: com Copy-on-Write as colunas não convertidas não são copiadas
+    df = df.copy(deep=False)
+    for col in colunas:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def _projetar(df: pd.DataFrame, selecao) -> pd.DataFrame:
+    return df if selecao is None else df[[c for c in selecao if c in df.columns]]
+
+
+# ---------------- Normalização de datas, moeda e números em texto ----------------
+# Formatos de data tentados, na ordem (o brasileiro primeiro: "05/03/2024" é 5 de março)
+FORMATOS_DATA = (
+    "%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y",
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y/%m/%d",
+)
+# Separadores (milhar, decimal): "1.234,56" (brasileiro) ou "1,234.56"
+SEPARADORES = {"br": (".", ","), "us": (",", ".")}
+# Filtro barato antes de testar os formatos de data um a um: "dd/mm/aaaa", "aaaa-mm-dd"...
+_PARECE_DATA = r"\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}"
+_PADROES_NUMERO = {
+    "br": r"[-+]?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?",
+    "us": r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?",
+}
+
+
+def _distintos(serie: pd.Series):
+    """(códigos por linha, valores distintos como texto sem espaços nas pontas); NaN → -1."""
+    codigos, distintos = pd.factorize(serie, use_na_sentinel=True)
+    return codigos, pd.Series(distintos, dtype="str").str.strip()
+
+
+def _espalhar(codigos, convertidos: pd.Series, index) -> pd.Series:
+    """Leva o resultado dos valores distintos de volta às linhas (código -1 → ausente)."""
+    if not len(convertidos):
+        return pd.Series(np.nan, index=index, dtype=convertidos.dtype)
+    valores = convertidos.to_numpy()[np.maximum(codigos, 0)]
+    return pd.Series(valores, index=index).where(codigos >= 0)
+
+
+def _sem_moeda(textos: pd.Series, moeda: bool = True) -> pd.Series:
+    """
+    Tira o "R$" e os espaços ("-R$ 1,00" e "R$ -1,00" viram "-1,00").
+    Substituições literais: regex custaria ~10x mais em milhões de valores.
+    """
+    if moeda:
+        textos = textos.str.replace("R$", "", regex=False)
+    return textos.str.replace(" ", "", regex=False).str.strip()
+
+
+def _converter_numero(textos: pd.Series, formato: dict) -> pd.Series:
+    milhar, decimal = SEPARADORES[formato["separadores"]]
+    textos = _sem_moeda(textos, formato["moeda"]).str.replace(milhar, "", regex=False)
+    textos = textos.str.replace(decimal, ".", regex=False)
+    try:
+        return textos.astype("float64")
+    except ValueError:  # algum valor não converte: caminho mais lento, que vira NaN
+        return pd.to_numeric(textos, errors="coerce").astype("float64")
+
+
+def _converter_data(textos: pd.Series, formato: dict) -> pd.Series:
+    convertidos = pd.to_datetime(textos, format=formato["formatos"][0], errors="coerce")
+    for fmt in formato["formatos"][1:]:
+        faltando = convertidos.isna()
+        if not faltando.any():
+            break
+        convertidos = convertidos.mask(faltando, pd.to_datetime(textos[faltando], format=fmt, errors="coerce"))
+    return convertidos
+
+
+def _formato_data(textos: pd.Series, limiar: float):
+    """Formatos que cobrem a amostra, escolhidos gulosamente (o que mais converte primeiro)."""
+    if textos.str.match(_PARECE_DATA).mean() < limiar:
+        return None
+    restantes, escolhidos = textos, []
+    while len(restantes):
+        cobertura = {fmt: pd.to_datetime(restantes, format=fmt, errors="coerce").notna() for fmt in FORMATOS_DATA}
+        fmt = max(FORMATOS_DATA, key=lambda f: cobertura[f].sum())
+        if not cobertura[fmt].any():
+            break
+        escolhidos.append(fmt)
+        restantes = restantes[~cobertura[fmt]]
+    if escolhidos and 1 - len(restantes) / len(textos) >= limiar:
+        return {"tipo": "data", "formatos": escolhidos}
+    return None
+
+
+def _formato_numero(textos: pd.Series, limiar: float):
+    limpos = _sem_moeda(textos)
+    cobertura = {s: limpos.str.fullmatch(p).mean() for s, p in _PADROES_NUMERO.items()}
+    separadores = max(cobertura, key=lambda s: (cobertura[s], s == "br"))  # empate ("1234", "1.500") → brasileiro
+    if cobertura[separadores] < limiar:
+        return None
+    return {"tipo": "numero", "separadores": separadores, "moeda": bool(textos.str.contains("R$", regex=False).any())}
+
+
+def detectar_formatos(df: pd.DataFrame, colunas=None, amostra: int = 10_000, limiar: float = 0.95) -> dict:
+    """
+    Formato de cada coluna texto (só das `colunas`, se informadas),
+    detectado uma vez a partir dos valores distintos de uma amostra
+    espalhada pelo frame (não só as primeiras linhas):
+    {"tipo": "data", "formatos": [...]} ou {"tipo": "numero", "separadores":
+    "br"|"us", "moeda": bool}. Colunas em que menos de `limiar` da amostra
+    converte ficam de fora.
+    """
+    formatos = {}
+    df = _projetar(df, colunas)
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        textos = _distintos(amostra_espalhada(df[col].dropna(), amostra))[1]
+        textos = textos[textos != ""]
+        if textos.empty:
+            continue
+        formato = _formato_data(textos, limiar) or _formato_numero(textos, limiar)
+        if formato:
+            formatos[col] = formato
+    return formatos
+
+
+def normalizar_dataframe(df: pd.DataFrame, formatos: dict, contagens: dict = None):
+    """
+    Converte as colunas de `formatos` (ver `detectar_formatos`) de uma vez,
+    com operações vetorizadas de texto sobre os valores distintos. Retorna
+    (df, contagens), com {coluna: {"convertidos", "falhas"}} somados em
+    `contagens`; valores que não convertem viram ausentes.
+    """
+    contagens = {} if contagens is None else contagens
+    presentes = [c for c in formatos if c in df.columns]
+    if not presentes:
+        return df, contagens
+    df = df.copy(deep=False)
+    for col in presentes:
+        formato = formatos[col]
+        codigos, textos = _distintos(df[col])
+        converter = _converter_data if formato["tipo"] == "data" else _converter_numero
+        convertidos = _espalhar(codigos, converter(textos, formato), df.index)
+        # textos vazios viram ausentes sem contar como falha
+        preenchidos = int(np.count_nonzero(codigos >= 0)) - int((textos == "").to_numpy()[codigos[codigos >= 0]].sum())
+        ok = int(convertidos.notna().sum())
+        total = contagens.setdefault(col, {**formato, "convertidos": 0, "falhas": 0})
+        total["convertidos"] += ok
+        total["falhas"] += preenchidos - ok
+        df[col] = convertidos
+    return df, contagens
+
+
+def normalizar_chunks(chunks, formatos: dict, contagens: dict):
+    """Versão em streaming de `normalizar_dataframe` (as contagens acumulam em `contagens`)."""
+    for chunk in chunks:
+        yield normalizar_dataframe(chunk, formatos, contagens)[0]
+
+
+def _montar_estatisticas(coercao, quartis, medias, regras) -> dict:
+    """quartis = {coluna: (q1, mediana, q3)} → valores de imputação e cercas de IQR por coluna."""
+    estatisticas = {
+        "coercao": coercao,
+        "colunas": list(quartis),
+        "imputacao": {},
+        "limite_inferior": {},
+        "limite_superior": {},
+    }
+    for col, (q1, mediana, q3) in quartis.items():
+        regra = _regra(col, regras, "regras")
+        if regra["imputar"] == "mediana":
+            estatisticas["imputacao"][col] = mediana
+        elif regra["imputar"] == "media":
+            estatisticas["imputacao"][col] = medias[col]
+        elif regra["imputar"] == "valor":
+            estatisticas["imputacao"][col] = regra["valor"]
+        if regra["outliers"] == "iqr":
+            iqr = q3 - q1
+            estatisticas["limite_inferior"][col] = q1 - regra["fator_iqr"] * iqr
+            estatisticas["limite_superior"][col] = q3 + regra["fator_iqr"] * iqr
+    return estatisticas
+
+
+def calcular_estatisticas_regras(df: pd.DataFrame, colunas=None, regras=None) -> dict:
+    """
+    Estatísticas globais da limpeza por regras: colunas a converter,
+    valores de imputação (mediana por padrão) e cercas de IQR (1.5x) para
+    outliers, só das colunas selecionadas (todas, se `colunas`/`regras`
+    não forem informadas).
+    """
+    df = _projetar(df, selecao_colunas(colunas, regras))
+    coercao = _colunas_para_coercao(df)
+    num = _coagir(df, coercao).select_dtypes(include=[np.number])
+    q1, mediana, q3 = (num.quantile(q) for q in (0.25, 0.5, 0.75))
+    quartis = {c: (q1[c], mediana[c], q3[c]) for c in num.columns}
+    return _montar_estatisticas(coercao, quartis, num.mean().to_dict(), regras)
+
+
+def calcular_estatisticas_regras_chunks(chunks, colunas=None, regras=None, amostra=None) -> dict:
+    """
+    Versão em uma passada de `calcular_estatisticas_regras`, para dados
+    que não cabem em memória: quartis aproximados por KLL e colunas de
+    coerção decididas pela `amostra` do documento (utils.amostragem) ou,
+    sem ela, pelo primeiro chunk. Os chunks podem trazer só as colunas
+    selecionadas (projeção feita na leitura).
+    """
+    selecao = selecao_colunas(colunas, regras)
+    coercao = _colunas_para_coercao(_projetar(amostra, selecao)) if amostra is not None and not amostra.empty else None
+    sketches, somas = {}, {}
+    for chunk in chunks:
+        chunk = _projetar(chunk, selecao)
+        if coercao is None:
+            coercao = _colunas_para_coercao(chunk)
+        num = _coagir(chunk, coercao).select_dtypes(include=[np.number])
+        for col in num.columns:
+            valores = num[col].to_numpy(dtype="float64", na_value=np.nan)
+            sketches.setdefault(col, KLL(k=400)).update(valores)
+            soma, n = somas.get(col, (0.0, 0))
+            somas[col] = (soma + np.nansum(valores), n + int(np.count_nonzero(~np.isnan(valores))))
+
+    quartis, medias = {}, {}
+    for col, kll in sketches.items():
+        quartis[col] = tuple(np.nan if q is None else q for q in kll.quantis((0.25, 0.5, 0.75)))
+        soma, n = somas[col]
+        medias[col] = soma / n if n else np.nan
+    return _montar_estatisticas(coercao or [], quartis, medias, regras)
+
+
+def _limpar_chunk_regras(chunk: pd.DataFrame, estatisticas: dict) -> pd.DataFrame:
+    """Etapas seguras por chunk: conversão, imputação, outliers por regra e dedup local."""
+    chunk = _coagir(chunk, estatisticas["coercao"])
+    imputacao = {c: v for c, v in estatisticas["imputacao"].items() if pd.notna(v)}
+    if imputacao:
+        chunk = chunk.fillna(imputacao)
+    cols = list(estatisticas["limite_inferior"])
+    if cols:
+        valores = chunk[cols]
+        fora = (valores.lt(pd.Series(estatisticas["limite_inferior"]))
+                | valores.gt(pd.Series(estatisticas["limite_superior"]))).any(axis=1)
+        chunk = chunk[~fora]
+    return chunk.drop_duplicates()
+
+
+def limpar_chunks_regras(chunks, estatisticas: dict):
+    """
+    Limpeza por regras em streaming: cada chunk é limpo com as estatísticas
+    globais e a deduplicação global mantém a primeira ocorrência, usando
+    só os hashes das linhas já emitidas (8 bytes por linha). Os hashes
+    ficam em `HashesVistos`: cada chunk custa O(chunk · log n), não O(n).
+    """
+    vistos = HashesVistos()
+    for chunk in chunks:
+        limpo = _limpar_chunk_regras(chunk, estatisticas)
+        if limpo.empty:
+            continue
+        hashes = pd.util.hash_pandas_object(limpo, index=False).to_numpy()
+        novos = ~vistos.contem(hashes)
+        vistos.adicionar(hashes[novos])
+        yield limpo[novos].reset_index(drop=True)
+
+
+# Frame do processo worker, aberto uma vez por processo do pool (ver _abrir_compartilhado)
+_DF_WORKER = None
+
+
+def _abrir_compartilhado(pasta: str):
+    global _DF_WORKER
+    _DF_WORKER = abrir_colunar(pasta)
+
+
+def _limpar_intervalo_regras(inicio: int, fim: int, estatisticas: dict) -> pd.DataFrame:
+    return _limpar_chunk_regras(_DF_WORKER.iloc[inicio:fim], estatisticas)
+
+
+def _contexto_pool():
+    """
+    Processos novos (forkserver/spawn), nunca fork: o servidor tem threads
+    (requisições, jobs) e um fork copiaria locks no estado em que estiverem.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    # o servidor (um só por processo, sem threads) importa pandas e este módulo uma vez; os workers nascem prontos
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+
+def _limpar_chunks_em_pool(df: pd.DataFrame, estatisticas: dict, n_jobs: int, chunk_rows: int) -> list:
+    """
+    O frame é gravado uma vez em colunas mapeáveis (utils.cache_colunar) numa
+    pasta própria da chamada; cada worker a abre com memory-map no
+    initializer e lê só os seus intervalos. Nada é compartilhado por variável
+    de módulo no processo pai, então limpezas simultâneas não se misturam.
+    """
+    inicios = list(range(0, len(df), chunk_rows))
+    fins = [min(i + chunk_rows, len(df)) for i in inicios]
+    workers = min(n_jobs, len(inicios))
+
+    raiz = tempfile.mkdtemp(prefix="limpeza_")
+    try:
+        pasta = os.path.join(raiz, "df")
+        materializar(df.reset_index(drop=True), pasta)
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=_contexto_pool(),
+            initializer=_abrir_compartilhado, initargs=(pasta,),
+        ) as pool:
+            return list(pool.map(_limpar_intervalo_regras, inicios, fins, repeat(estatisticas)))
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+def clean_dataframe_regras(
+    df: pd.DataFrame, n_jobs: int = 1, chunk_rows: int = 100_000, colunas=None, regras=None
+) -> pd.DataFrame:
+    """
+    Limpeza por regras (mediana + IQR), com estatísticas globais pré-calculadas.
+    Com n_jobs > 1 os chunks são processados em um pool de processos; o
+    resultado é idêntico ao caminho serial. `colunas`/`regras` restringem e
+    ajustam a limpeza por coluna; as demais passam intactas.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    with etapa("clean.regras.estatisticas"):
+        estatisticas = calcular_estatisticas_regras(df, colunas, regras)
+
+    if n_jobs <= 1 or len(df) <= chunk_rows:
+        with etapa("clean.regras.chunks"):
+            partes = [_limpar_chunk_regras(df, estatisticas)]
+    else:
+        with etapa("clean.regras.chunks"):
+            partes = _limpar_chunks_em_pool(df, estatisticas, n_jobs, chunk_rows)
+
+    # Dedup global: manter a primeira ocorrência preserva a equivalência com o serial
+    with etapa("clean.regras.merge"):
+        return pd.concat(partes, ignore_index=True).drop_duplicates().reset_index(drop=True)
+
+
+def clean_dataframe(
+    df: pd.DataFrame, estrategia: str = "knn", n_jobs: int = 1, colunas=None, regras=None, treino: int = None,
+    bloco_knn_mb: int = None,
+) -> pd.DataFrame:
+    """
+    Remove duplicados, imputa valores ausentes e trata outliers.
+    estrategia="knn" usa KNNImputer + IsolationForest; "regras" usa
+    mediana + IQR e pode rodar em paralelo (`n_jobs`). `colunas` limita a
+    limpeza a essas colunas e `regras` ajusta imputação/outliers por coluna
+    (ver `validar_regras`); as demais colunas passam sem cópia. Com
+    `treino`, os modelos do knn são ajustados em uma amostra aleatória de
+    até `treino` linhas e só aplicados ao frame inteiro. `bloco_knn_mb`
+    limita os blocos de distâncias do KNNImputer (`working_memory` do
+    sklearn), o que limita o pico de memória do knn.
+    """
     if df is None or df.empty:
         return pd.DataFrame()
 
+    if estrategia == "regras":
+        return clean_dataframe_regras(df, n_jobs=n_jobs, colunas=colunas, regras=regras)
+
     try:
         # Remove duplicados
-        df = df.drop_duplicates()
+        with etapa("clean.dedup"):
+            df = df.drop_duplicates()
 
-        # Seleciona apenas colunas numéricas
-        num_cols = df.select_dtypes(include=[np.number]).columns
+        # Seleciona apenas colunas numéricas (da seleção, se houver)
+        selecao = selecao_colunas(colunas, regras)
+        num_cols = _projetar(df, selecao).select_dtypes(include=[np.number]).columns
+        plano = {c: _regra(c, regras, "knn") for c in num_cols}
+        por_imputacao = {m: [c for c in num_cols if plano[c]["imputar"] == m] for m in IMPUTACOES}
+        por_outliers = {m: [c for c in num_cols if plano[c]["outliers"] == m] for m in TRATAMENTOS_OUTLIERS}
 
         if len(num_cols) > 0:
+            # Imputações simples por coluna
+            simples = {c: df[c].median() for c in por_imputacao["mediana"]}
+            simples.update({c: df[c].mean() for c in por_imputacao["media"]})
+            simples.update({c: plano[c]["valor"] for c in por_imputacao["valor"]})
+            simples = {c: v for c, v in simples.items() if pd.notna(v)}
+            if simples:
+                df = df.fillna(simples)
+
+            # sklearn só é carregado pela estratégia knn
+            from sklearn import config_context
+            from sklearn.impute import KNNImputer
+            from sklearn.ensemble import IsolationForest
+
+            # Linhas de ajuste dos modelos: todas ou uma amostra aleatória (as mesmas nos dois modelos)
+            ajuste = None
+            if treino and len(df) > treino:
+                ajuste = np.sort(np.random.default_rng(42).choice(len(df), treino, replace=False))
+
             # Imputação de valores ausentes
-            imputer = KNNImputer(n_neighbors=3)
-            df[num_cols] = imputer.fit_transform(df[num_cols])
+            knn_cols = por_imputacao["knn"]
+            if knn_cols:
+                with etapa("clean.knn"), config_context(working_memory=bloco_knn_mb):
+                    imputer = KNNImputer(n_neighbors=3)
+                    if ajuste is None:
+                        df[knn_cols] = imputer.fit_transform(df[knn_cols])
+                    else:
+                        imputer.fit(df[knn_cols].iloc[ajuste])
+                        df[knn_cols] = imputer.transform(df[knn_cols])
 
             # Detecção e remoção de outliers
-            iso = IsolationForest(contamination=0.05, random_state=42)
-            mask = iso.fit_predict(df[num_cols])
-            df = df[mask == 1]
+            manter = np.ones(len(df), dtype=bool)
+            iso_cols = por_outliers["isolation_forest"]
+            if iso_cols:
+                with etapa("clean.isolation_forest"):
+                    iso = IsolationForest(contamination=0.05, random_state=42)
+                    if ajuste is None:
+                        manter &= iso.fit_predict(df[iso_cols]) == 1
+                    else:
+                        iso.fit(df[iso_cols].iloc[ajuste])
+                        manter &= iso.predict(df[iso_cols]) == 1
+            for c in por_outliers["iqr"]:
+                q1, q3 = df[c].quantile(0.25), df[c].quantile(0.75)
+                fator = plano[c]["fator_iqr"] * (q3 - q1)
+                manter &= ~(df[c].lt(q1 - fator) | df[c].gt(q3 + fator)).to_numpy()
+            if not manter.all():
+                df = df[manter]
 
         return df.reset_index(drop=True)
 
@@ -0,0 +1,195 @@
+# app/connectors/sql.py
+"""
+Conector de bancos SQL: executa uma consulta em qualquer URL SQLAlchemy
+e entrega o resultado em DataFrames de `chunksize` linhas, lidos com
+cursor do lado do servidor (`stream_results`), sem materializar tudo;
+e grava DataFrames de volta em uma tabela externa, em lotes.
+"""
+import io
+import datetime as dt
+from decimal import Decimal
+
+import pandas as pd
+import sqlalchemy as sa
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .validacao import MODOS_EXPORTACAO, validar_consulta, validar_tabela
+
+
+def montar_consulta(consulta, dialeto, coluna_watermark=None, watermark=None):
+    """Envolve a consulta do usuário para puxar só linhas após o watermark, em ordem."""
+    consulta = validar_consulta(consulta)
+    if not coluna_watermark:
+        return text(consulta), {}
+
+    coluna = dialeto.identifier_preparer.quote(coluna_watermark)
+    sql = f"SELECT * FROM ({consulta}) origem"
+    params = {}
+    if watermark is not None:
+        sql += f" WHERE {coluna} > :watermark"
+        params["watermark"] = watermark
+    sql += f" ORDER BY {coluna}"
+    return text(sql), params
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (dt.datetime, dt.date, dt.time)):
+        return valor.isoformat()
+    if isinstance(valor, (bytes, memoryview)):
+        return bytes(valor).hex()
+    return valor
+
+
+def _normalizar_chunk(linhas, colunas):
+    """Converte tipos do driver (Decimal, datas, bytes) para valores serializáveis em JSON."""
+    df = pd.DataFrame.from_records(linhas, columns=colunas)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(_valor_json)
+    return df
+
+
+def iter_consulta(url, consulta, chunksize=100_000, coluna_watermark=None, watermark=None):
+    """
+    Gera DataFrames com o resultado da consulta. Com `coluna_watermark`,
+    só traz linhas com valor maior que `watermark`, ordenadas por ela; o
+    watermark do último chunk fica em `df.attrs["watermark"]`.
+    """
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            sql, params = montar_consulta(consulta, engine.dialect, coluna_watermark, watermark)
+            resultado = conn.execution_options(stream_results=True, yield_per=chunksize).execute(sql, params)
+            colunas = list(resultado.keys())
+            if coluna_watermark and coluna_watermark not in colunas:
+                raise ValueError(f"Coluna de watermark '{coluna_watermark}' não está no resultado.")
+            for parte in resultado.partitions(chunksize):
+                df = _normalizar_chunk(parte, colunas)
+                if coluna_watermark and not df.empty:
+                    df.attrs["watermark"] = _valor_json(parte[-1][colunas.index(coluna_watermark)])
+                yield df
+    finally:
+        engine.dispose()
+
+
+# ---------------- Exportação ----------------
+def _tipo_coluna(serie):
+    if pd.api.types.is_bool_dtype(serie):
+        return sa.Boolean()
+    if pd.api.types.is_integer_dtype(serie):
+        return sa.BigInteger()
+    if pd.api.types.is_float_dtype(serie):
+        return sa.Float()
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return sa.DateTime()
+    return sa.Text()
+
+
+def _criar_tabela(conn, schema, nome, df, chave):
+    colunas = [
+        sa.Column(str(col), _tipo_coluna(df[col]), primary_key=str(col) in chave, nullable=str(col) not in chave)
+        for col in df.columns
+    ]
+    tabela = sa.Table(nome, sa.MetaData(), *colunas, schema=schema)
+    tabela.create(conn)
+    return tabela
+
+
+def _registros(df):
+    """Linhas como dicts, com NaN/NaT convertidos em NULL."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _inserir_copy(conn, tabela, df):
+    """Caminho rápido do PostgreSQL (psycopg2): COPY FROM STDIN em CSV."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep="\\N")
+    buffer.seek(0)
+    preparer = conn.dialect.identifier_preparer
+    colunas = ", ".join(preparer.quote(str(c)) for c in df.columns)
+    alvo = preparer.format_table(tabela)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {alvo} ({colunas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+
+
+def _upsert(conn, tabela, linhas, chave):
+    dialeto = conn.dialect.name
+    if dialeto in ("postgresql", "sqlite"):
+        insert = postgresql_insert if dialeto == "postgresql" else sqlite_insert
+        stmt = insert(tabela)
+        atualizar = {c.name: stmt.excluded[c.name] for c in tabela.columns if c.name not in chave}
+        stmt = stmt.on_conflict_do_update(index_elements=chave, set_=atualizar) if atualizar \
+            else stmt.on_conflict_do_nothing(index_elements=chave)
+        conn.execute(stmt, linhas)
+    elif dialeto in ("mysql", "mariadb"):
+        stmt = mysql_insert(tabela)
+        atualizar = {c.name: stmt.inserted[c.name] for c in tabela.columns if c.name not in chave}
+        conn.execute(stmt.on_duplicate_key_update(**(atualizar or {chave[0]: stmt.inserted[chave[0]]})), linhas)
+    else:
+        # Genérico: apaga as chaves do lote e reinsere, na mesma transação
+        condicao = sa.and_(*(tabela.c[k] == sa.bindparam(f"_k_{k}") for k in chave))
+        conn.execute(tabela.delete().where(condicao), [{f"_k_{k}": linha[k] for k in chave} for linha in linhas])
+        conn.execute(tabela.insert(), linhas)
+
+
+def exportar_chunks(chunks, url, tabela, modo="append", chave=None, tamanho_lote=5_000, progresso=None):
+    """
+    Grava os DataFrames em `tabela` no banco `url`, em lotes de
+    `tamanho_lote` linhas, cada lote na sua transação.
+
+    - create: cria a tabela (erro se já existir);
+    - append: cria se não existir e insere;
+    - upsert: atualiza pelas colunas `chave` (exige PK/índice único nelas).
+
+    `progresso(linhas_escritas)` é chamado após cada lote. Retorna o total escrito.
+    """
+    if modo not in MODOS_EXPORTACAO:
+        raise ValueError("Modo de exportação inválido.")
+    chave = list(chave or [])
+    if modo == "upsert" and not chave:
+        raise ValueError("O modo upsert exige as colunas de chave.")
+    schema, nome = validar_tabela(tabela)
+
+    engine = create_engine(url)
+    escritas = 0
+    try:
+        destino = None
+        for chunk in chunks:
+            if destino is None:
+                faltando = [k for k in chave if k not in chunk.columns]
+                if faltando:
+                    raise ValueError(f"Colunas de chave ausentes: {', '.join(faltando)}")
+                with engine.begin() as conn:
+                    existe = sa.inspect(conn).has_table(nome, schema=schema)
+                    if modo == "create" and existe:
+                        raise ValueError(f"A tabela {tabela} já existe.")
+                    if existe:
+                        destino = sa.Table(nome, sa.MetaData(), schema=schema, autoload_with=conn)
+                    else:
+                        destino = _criar_tabela(conn, schema, nome, chunk, chave)
+                usar_copy = modo != "upsert" and engine.dialect.name == "postgresql" \
+                    and engine.dialect.driver == "psycopg2"
+
+            for inicio in range(0, len(chunk), tamanho_lote):
+                lote = chunk.iloc[inicio:inicio + tamanho_lote]
+                with engine.begin() as conn:
+                    if usar_copy:
+                        _inserir_copy(conn, destino, lote)
+                    elif modo == "upsert":
+                        _upsert(conn, destino, _registros(lote), chave)
+                    else:
+                        conn.execute(destino.insert(), _registros(lote))
+                escritas += len(lote)
+                if progresso:
+                    progresso(escritas)
+    finally:
+        engine.dispose()
+    return escritas
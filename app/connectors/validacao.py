@@ -0,0 +1,122 @@
+# app/connectors/validacao.py
+"""
+Validações dos conectores SQL que não dependem de pandas: podem ser
+importadas pelos modelos e blueprints sem carregar a pilha de dados.
+"""
+import os
+import re
+
+from sqlalchemy.engine import make_url
+
+MODOS_EXPORTACAO = ("create", "append", "upsert")
+BACKENDS_PADRAO = ("postgresql", "mysql", "mariadb", "mssql", "oracle")
+# bancos que são arquivos do servidor: só administradores, e só se liberados em SQL_CONNECTOR_BACKENDS
+BACKENDS_ARQUIVO = ("sqlite",)
+_LOCAIS = {"", "localhost", "127.0.0.1", "::1", "0.0.0.0"}
+_PORTAS = {"postgresql": 5432, "mysql": 3306, "mariadb": 3306, "mssql": 1433, "oracle": 1521}
+# Parâmetros de query aceitos por backend (nomes em minúsculas). Qualquer outro
+# é recusado: vários drivers leem arquivos, carregam bibliotecas ou trocam o
+# destino da conexão a partir da query string.
+PARAMETROS_PERMITIDOS = {
+    "postgresql": {"sslmode", "connect_timeout", "application_name", "client_encoding", "target_session_attrs"},
+    "mysql": {"charset", "connect_timeout", "read_timeout", "write_timeout"},
+    "mariadb": {"charset", "connect_timeout", "read_timeout", "write_timeout"},
+    "mssql": {"driver", "encrypt", "trustservercertificate", "charset", "login_timeout", "timeout"},
+    "oracle": {"service_name", "encoding", "nencoding"},
+    "sqlite": {"mode", "uri", "timeout"},
+}
+# Recusados sempre, com mensagem própria: leitura de arquivos locais, driver
+# ODBC arbitrário, socket local e troca do host validado
+PARAMETROS_PROIBIDOS = {"odbc_connect", "local_infile", "unix_socket", "host", "hostaddr", "port"}
+_VALOR_DRIVER = re.compile(r"^[A-Za-z0-9 ._+{}-]+$")
+
+
+def _destino(parsed):
+    """
+    Banco que a URL abre de fato, para comparar URLs escritas de formas
+    diferentes: caminho real do arquivo (sqlite) ou backend, host, porta e
+    base; None para sqlite em memória.
+    """
+    backend = parsed.get_backend_name()
+    if backend in BACKENDS_ARQUIVO:
+        caminho = parsed.database or ""
+        if caminho.startswith("file:"):  # sqlite:///file:caminho?mode=ro&uri=true
+            caminho = caminho[5:].split("?", 1)[0]
+        if caminho in ("", ":memory:"):
+            return None
+        return backend, os.path.realpath(caminho)
+    host = (parsed.host or "").lower()
+    return backend, "localhost" if host in _LOCAIS else host, parsed.port or _PORTAS.get(backend), parsed.database
+
+
+def _validar_parametros(backend, query):
+    permitidos = PARAMETROS_PERMITIDOS.get(backend, set())
+    for nome, valor in query.items():
+        chave = nome.lower()
+        if chave in PARAMETROS_PROIBIDOS:
+            raise ValueError(f"Parâmetro de conexão proibido: {nome}")
+        if chave not in permitidos:
+            raise ValueError(f"Parâmetro de conexão não permitido para {backend}: {nome}")
+        if not isinstance(valor, str):
+            raise ValueError(f"Parâmetro de conexão repetido: {nome}")
+        # nome do driver ODBC registrado, nunca o caminho de uma biblioteca
+        if chave == "driver" and not _VALOR_DRIVER.match(valor):
+            raise ValueError("Driver ODBC inválido: use o nome registrado, não um caminho.")
+
+
+def validar_url(url, backends=BACKENDS_PADRAO, proibidas=(), arquivos=False):
+    """
+    Normaliza a URL e rejeita backends não permitidos, parâmetros de query
+    fora de `PARAMETROS_PERMITIDOS`, bancos em arquivo (salvo
+    `arquivos=True`) e os bancos de `proibidas` (o da aplicação),
+    comparados pelo destino real e não pelo texto da URL.
+    """
+    try:
+        parsed = make_url(url)
+    except Exception:
+        raise ValueError("URL de conexão inválida.")
+    backend = parsed.get_backend_name()
+    if backend not in backends:
+        raise ValueError(f"Backend não permitido: {backend}")
+    if backend in BACKENDS_ARQUIVO and not arquivos:
+        raise ValueError(f"Backend restrito a administradores: {backend}")
+    _validar_parametros(backend, parsed.query)
+    destino = _destino(parsed)
+    for proibida in proibidas:
+        if proibida and destino is not None and destino == _destino(make_url(proibida)):
+            raise ValueError("Não é permitido usar o banco da própria aplicação.")
+    return parsed
+
+
+def validar_url_do_usuario(url, usuario):
+    """`validar_url` com os backends do app, o banco da aplicação proibido e arquivos só para administradores."""
+    from flask import current_app
+
+    from ..db import db
+
+    return validar_url(
+        url,
+        backends=current_app.config["SQL_CONNECTOR_BACKENDS"],
+        proibidas=[db.engine.url, current_app.config["SQLALCHEMY_DATABASE_URI"]],
+        arquivos=bool(getattr(usuario, "is_admin", False)),
+    )
+
+
+def validar_consulta(consulta):
+    inicio = consulta.lstrip().split(None, 1)[0].lower() if consulta.strip() else ""
+    if inicio not in ("select", "with"):
+        raise ValueError("A consulta deve começar com SELECT ou WITH.")
+    return consulta.strip().rstrip(";")
+
+
+def url_sem_senha(url):
+    return make_url(url).render_as_string(hide_password=True)
+
+_NOME_TABELA = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+
+def validar_tabela(nome):
+    if not nome or not _NOME_TABELA.match(nome):
+        raise ValueError("Nome de tabela inválido.")
+    schema, _, tabela = nome.rpartition(".")
+    return schema or None, tabela
@@ -0,0 +1,275 @@
+# app/jobs.py
+"""
+Execução assíncrona de tarefas (ingestão, limpeza) em um pool de threads
+do próprio processo. O estado fica na tabela `jobs`, então o status pode
+ser consultado de qualquer worker.
+
+Jobs e operações pesadas síncronas passam pelo mesmo agendador
+(app/utils/agendador.py): cota por usuário, vagas de CPU/memória do
+processo e prioridade das operações interativas sobre as de lote.
+
+A fila é da memória do processo: cada job guarda a instância (host, pid e
+início do processo) que o enfileirou, e jobs pendentes/em execução de uma
+instância que não existe mais são marcados como erro na subida e na
+consulta de status, em vez de ficarem pendentes para sempre.
+"""
+import os
+import uuid
+import socket
+import threading
+import importlib
+import traceback
+from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from .db import db
+from .models import Job
+from .utils.agendador import Agendador, FilaCheia
+from .utils.metrics import coletar_metricas, registro
+
+_TAREFAS = {}
+_RECURSOS = {}
+_local = threading.local()
+ATIVOS = ("pendente", "executando")
+MENSAGEM_ORFAO = "Interrompido: o processo que executava o job foi encerrado (reinício do servidor). Envie de novo."
+
+
+def tarefa(tipo, recursos=None):
+    """
+    Registra `fn(job) -> dict` como executor das tarefas do tipo `tipo`;
+    `recursos(job) -> (peso, memoria_bytes)` estima o que reservar no
+    agendador (padrão: uma vaga e o orçamento de memória dos jobs).
+    """
+    def decorator(fn):
+        _TAREFAS[tipo] = fn
+        if recursos is not None:
+            _RECURSOS[tipo] = recursos
+        return fn
+    return decorator
+
+
+def _carregar_tarefas():
+    """As tarefas ficam em app.pipeline (pandas, sklearn...), importado só no primeiro uso."""
+    importlib.import_module(".pipeline", __package__)
+
+
+def init_jobs(app):
+    app.config.setdefault("JOB_WORKERS", 2)
+    # JOBS_SINCRONOS executa a tarefa na própria requisição (testes/benchmarks)
+    app.config.setdefault("JOBS_SINCRONOS", False)
+    app.extensions["neodata_jobs"] = ThreadPoolExecutor(
+        max_workers=app.config["JOB_WORKERS"], thread_name_prefix="neodata-job"
+    )
+    app.config.setdefault("SCHEDULER_SLOTS", os.cpu_count() or 1)
+    app.config.setdefault("SCHEDULER_SLOTS_PER_USER", 2)
+    app.config.setdefault("SCHEDULER_MEMORY_MB", 0)
+    app.config.setdefault("SCHEDULER_QUEUE_MAX", 0)
+    app.config.setdefault("SCHEDULER_WAIT_S", 30)
+    app.extensions["neodata_agendador"] = Agendador(
+        vagas=app.config["SCHEDULER_SLOTS"],
+        por_usuario=app.config["SCHEDULER_SLOTS_PER_USER"],
+        memoria_bytes=app.config["SCHEDULER_MEMORY_MB"] * 1024 * 1024,
+        fila_maxima=app.config["SCHEDULER_QUEUE_MAX"],
+    )
+
+
+def agendador():
+    return current_app.extensions["neodata_agendador"]
+
+
+def _registrar_espera(pedido, tipo):
+    registro.observar(
+        "neodata_scheduler_wait_seconds", pedido.admitido - pedido.chegada, prioridade=pedido.prioridade, tipo=tipo
+    )
+
+
+@contextmanager
+def operacao_pesada(tipo, user_id, prioridade="interativa", peso=1, memoria=0):
+    """
+    Reserva uma vaga do agendador para uma operação pesada feita na própria
+    requisição; espera no máximo SCHEDULER_WAIT_S e, depois disso (ou com a
+    fila cheia), levanta FilaCheia com a posição na fila.
+    """
+    try:
+        with agendador().vaga(
+            user_id, prioridade, peso=peso, memoria=memoria, espera_s=current_app.config["SCHEDULER_WAIT_S"]
+        ) as pedido:
+            _registrar_espera(pedido, tipo)
+            yield pedido
+    except FilaCheia:
+        registro.observar("neodata_scheduler_rejected_total", 1, tipo=tipo)
+        raise
+
+
+def posicao_na_fila(job_id):
+    """Posição do job na fila deste processo (None se já começou ou está em outro worker)."""
+    return agendador().posicao(job_id)
+
+
+def enfileirar(tipo, user_id, documento_id=None, parametros=None):
+    """
+    Cria o Job e agenda a execução; retorna o Job já persistido. Levanta
+    FilaCheia (e descarta o Job) se a fila do agendador estiver no limite.
+    """
+    _carregar_tarefas()
+    if tipo not in _TAREFAS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+
+    job = Job(
+        id=uuid.uuid4().hex,
+        tipo=tipo,
+        user_id=user_id,
+        documento_id=documento_id,
+        parametros=parametros or {},
+        status="pendente",
+        instancia=instancia_atual(),
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    peso, memoria = _recursos(job)
+    if app.config["JOBS_SINCRONOS"]:
+        if getattr(_local, "com_vaga", False):  # job encadeado por outro job síncrono: já está com a vaga dele
+            _executar(app, job.id)
+        else:
+            with agendador().vaga(user_id, "lote", peso=peso, memoria=memoria) as pedido:
+                _registrar_espera(pedido, tipo)
+                _local.com_vaga = True
+                try:
+                    _executar(app, job.id)
+                finally:
+                    _local.com_vaga = False
+        db.session.refresh(job)
+    else:
+        # o job espera a vez na fila do agendador; só então ocupa uma thread do pool.
+        # `iniciar` pode rodar em outra thread (a que liberou a vaga): usa só o id, não o objeto ORM.
+        job_id = job.id
+
+        def iniciar(pedido):
+            _registrar_espera(pedido, tipo)
+            app.extensions["neodata_jobs"].submit(_executar_agendado, app, job_id)
+
+        try:
+            agendador().agendar(user_id, iniciar, "lote", peso=peso, memoria=memoria, id=job_id)
+        except FilaCheia:
+            registro.observar("neodata_scheduler_rejected_total", 1, tipo=tipo)
+            db.session.delete(job)
+            db.session.commit()
+            raise
+    return job
+
+
+def _recursos(job):
+    # o job se planeja para caber no orçamento: na falta de estimativa, reserva o orçamento inteiro
+    padrao = (1, current_app.config["JOB_MEMORY_BUDGET_MB"] * 1024 * 1024)
+    if job.tipo not in _RECURSOS:
+        return padrao
+    try:
+        return _RECURSOS[job.tipo](job)
+    except Exception:  # a estimativa só decide a reserva; erros de verdade aparecem na execução
+        current_app.logger.warning(f"[jobs] estimativa de recursos de {job.tipo} {job.id} falhou")
+        return padrao
+
+
+def _executar_agendado(app, job_id):
+    try:
+        _executar(app, job_id)
+    finally:
+        app.extensions["neodata_agendador"].liberar(job_id)
+
+
+def _executar(app, job_id):
+    _carregar_tarefas()
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return
+        job.status = "executando"
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        with coletar_metricas() as metricas:
+            try:
+                resultado = _TAREFAS[job.tipo](job)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"[jobs] {job.tipo} {job_id} falhou:\n{traceback.format_exc()}")
+                job = db.session.get(Job, job_id)
+                job.status = "erro"
+                job.erro = str(e)
+            else:
+                job.status = "concluido"
+                job.resultado = resultado
+
+        job.tempos = dict(metricas["etapas"])
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        db.session.remove()
+
+
+# ---------------- Órfãos ----------------
+def _inicio_processo(pid):
+    """Instante de início do processo (campo 22 de /proc/<pid>/stat), para não confundir pids reusados."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+
+
+def instancia_atual():
+    """Identifica o processo que enfileira: "host:pid:início" (o pid é lido na hora, depois do fork do gunicorn)."""
+    pid = os.getpid()
+    return f"{socket.gethostname()}:{pid}:{_inicio_processo(pid)}"
+
+
+def _instancia_viva(instancia):
+    if not instancia:
+        return False  # jobs de antes do registro da instância
+    host, pid, inicio = instancia.rsplit(":", 2)
+    if host != socket.gethostname():
+        return True  # processo de outro servidor: daqui não dá para saber
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return not inicio or _inicio_processo(pid) == inicio
+
+
+def _marcar_orfao(job):
+    job.status = "erro"
+    job.erro = MENSAGEM_ORFAO
+    job.finished_at = datetime.utcnow()
+
+
+def verificar_orfao(job):
+    """Marca o job como erro se ele ainda consta ativo mas o processo dono não existe mais."""
+    if job.status in ATIVOS and not _instancia_viva(job.instancia):
+        _marcar_orfao(job)
+        db.session.commit()
+    return job
+
+
+def recuperar_orfaos(app):
+    """Na subida: jobs ativos de processos que não existem mais viram erro. Retorna quantos."""
+    with app.app_context():
+        try:
+            orfaos = [j for j in Job.query.filter(Job.status.in_(ATIVOS)).all() if not _instancia_viva(j.instancia)]
+            for job in orfaos:
+                _marcar_orfao(job)
+            db.session.commit()
+        except Exception as e:  # banco ainda sem a tabela/coluna (antes do `flask db upgrade`)
+            db.session.rollback()
+            app.logger.debug(f"[jobs] recuperação de órfãos ignorada: {e}")
+            return 0
+        finally:
+            db.session.remove()
+    if orfaos:
+        app.logger.warning(f"[jobs] {len(orfaos)} job(s) órfão(s) marcados como erro")
+    return len(orfaos)
@@ -1,12 +1,15 @@
 # main.py
 import os
 import io
+import shutil
 from datetime import datetime
 
-import pandas as pd
+import fcntl
+
+import click
 from flask import (
-    Flask, render_template, request, jsonify, send_file,
-    session, redirect, url_for, flash
+    Flask, Response, render_template, request, jsonify, send_file,
+    session, redirect, url_for, flash, stream_with_context
 )
 from flask_login import LoginManager, current_user, login_required
 from flask_migrate import upgrade
@@ -14,22 +17,76 @@ from dotenv import load_dotenv
 
 # imports locais
 from .db import db, migrate
-from .models import User, Documentos, RawRecord, CleanRecord
+from .models import User, Documentos, RawRecord, CleanRecord, CleanRun, ConexaoSQL
 from .blueprints.auth.auth_blueprint import auth_bp
 from .blueprints.user.user_blueprint import user_bp
 from .blueprints.predicao.predicao_blueprint import predicao_bp
-from .cleaning import analyze_dataframe, clean_dataframe, validate_dataframe
-from .utils.file_loader import load_dataframe
-from .utils.report_generator import gerar_relatorio_pdf
+from .blueprints.admin.admin_blueprint import admin_bp
+from .blueprints.api.api_blueprint import api_bp, gerar_token
+from .jobs import init_jobs, operacao_pesada, recuperar_orfaos
+from .utils.agendador import FilaCheia
+from .utils.metrics import etapa, init_metrics
+from .utils.profiling import perfilavel
+
+# pandas, sklearn, matplotlib e reportlab (via pipeline, cleaning, memoria,
+# sketches, run_store) são importados dentro das rotas, no primeiro uso,
+# para o processo subir rápido (ver benchmarks/import_time.py).
 
 load_dotenv()
 
 
+def _migrar_uma_vez(app):
+    """
+    Aplica as migrações quando AUTO_MIGRATE=1. Um lock de arquivo garante que
+    só um worker por vez rode `upgrade()`; os demais esperam e encontram o
+    banco já atualizado. Em produção prefira `flask db upgrade` antes de subir.
+    """
+    if app.extensions.get("neodata_migrado"):
+        return
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, ".migrate.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with app.app_context():
+                upgrade()
+        except Exception:
+            app.logger.exception("[migrate] falha ao aplicar migrações")
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    app.extensions["neodata_migrado"] = True
+
+
 def create_app():
     app = Flask(__name__, template_folder="templates")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///neodata.db")
     app.config["UPLOAD_FOLDER"] = os.environ.get("UPLOAD_FOLDER", "uploads")
     app.config["OUTPUT_FOLDER"] = os.environ.get("OUTPUT_FOLDER", "outputs")
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    app.config["CHUNK_ROWS"] = int(os.environ.get("CHUNK_ROWS", "100000"))
+    app.config["SKETCH_MIN_ROWS"] = int(os.environ.get("SKETCH_MIN_ROWS", "200000"))
+    app.config["CLEAN_WORKERS"] = int(os.environ.get("CLEAN_WORKERS", os.cpu_count() or 1))
+    app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", "2"))
+    app.config["SQL_CONNECTOR_BACKENDS"] = os.environ.get(
+        "SQL_CONNECTOR_BACKENDS", "postgresql,mysql,mariadb,mssql,oracle"
+    ).split(",")
+    app.config["MEMORY_BUDGET_MB"] = int(os.environ.get("MEMORY_BUDGET_MB", "2048"))
+    app.config["JOB_MEMORY_BUDGET_MB"] = int(os.environ.get("JOB_MEMORY_BUDGET_MB", app.config["MEMORY_BUDGET_MB"]))
+    # o agendador é por processo: com N workers do gunicorn (WEB_CONCURRENCY),
+    # os padrões de máquina são divididos entre eles
+    workers_web = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+    app.config["SCHEDULER_SLOTS"] = int(os.environ.get("SCHEDULER_SLOTS", max(1, (os.cpu_count() or 1) // workers_web)))
+    app.config["SCHEDULER_SLOTS_PER_USER"] = int(os.environ.get("SCHEDULER_SLOTS_PER_USER", "2"))
+    app.config["SCHEDULER_MEMORY_MB"] = int(
+        os.environ.get("SCHEDULER_MEMORY_MB", app.config["MEMORY_BUDGET_MB"] * 2 // workers_web)
+    )
+    app.config["SCHEDULER_QUEUE_MAX"] = int(os.environ.get("SCHEDULER_QUEUE_MAX", "200"))
+    app.config["SCHEDULER_WAIT_S"] = float(os.environ.get("SCHEDULER_WAIT_S", "30"))
+    app.config["DATASET_CACHE_MB"] = int(os.environ.get("DATASET_CACHE_MB", "1024"))
+    app.config["SAMPLE_ROWS"] = int(os.environ.get("SAMPLE_ROWS", "2000"))
+    app.config["MODEL_SAMPLE_ROWS"] = int(os.environ.get("MODEL_SAMPLE_ROWS", "20000"))
+    app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", "5000"))
+    app.config["API_MAX_UPLOAD_BYTES"] = int(os.environ.get("API_MAX_UPLOAD_BYTES", str(20 * 1024 ** 3)))
+    app.config["AUTO_MIGRATE"] = os.environ.get("AUTO_MIGRATE", "0") == "1"
 
     # Secret key
     secret_key = os.getenv("SECRET_KEY") or os.urandom(24).hex()
@@ -52,18 +109,92 @@ def create_app():
     def load_user(user_id):
         return User.query.get(int(user_id))
 
+    # Métricas (/metrics + Server-Timing)
+    init_metrics(app)
+
+    # Jobs assíncronos (API) + agendador das operações pesadas
+    init_jobs(app)
+
+    @app.errorhandler(FilaCheia)
+    def fila_cheia(e):
+        resposta = jsonify({"error": str(e), "posicao": e.posicao, "retry_after": e.retry_after})
+        resposta.status_code = 503
+        resposta.headers["Retry-After"] = str(e.retry_after or 1)
+        return resposta
+
     # Blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(user_bp)
     app.register_blueprint(predicao_bp)
-
-    with app.app_context():
-        try:
-            upgrade()
-        except Exception:
-            pass
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
+
+    @app.cli.command("promover-admin")
+    @click.argument("email")
+    def promover_admin(email):
+        """Concede acesso de administrador ao usuário com o e-mail informado."""
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            raise click.ClickException(f"Usuário {email} não encontrado.")
+        user.is_admin = True
+        db.session.commit()
+        click.echo(f"{email} agora é administrador.")
+
+    @app.cli.command("criar-token")
+    @click.argument("email")
+    @click.option("--nome", default="cli", help="Identificação do token.")
+    def criar_token(email, nome):
+        """Gera um token da API JSON para o usuário (exibido uma única vez)."""
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            raise click.ClickException(f"Usuário {email} não encontrado.")
+        _, token = gerar_token(user.id, nome)
+        click.echo(token)
+
+    @app.cli.command("puxar-sql")
+    @click.argument("conexao_id", type=int)
+    @click.option("--substituir", is_flag=True, help="Recarrega tudo em vez de usar o watermark.")
+    def puxar_sql(conexao_id, substituir):
+        """Executa a carga (incremental) de uma conexão SQL; útil em agendadores."""
+        from .pipeline import ingerir_sql
+
+        conexao = db.session.get(ConexaoSQL, conexao_id)
+        if not conexao:
+            raise click.ClickException(f"Conexão {conexao_id} não encontrada.")
+        if not conexao.consulta:
+            raise click.ClickException(f"Conexão {conexao_id} é só de destino.")
+        novas = ingerir_sql(conexao, substituir=substituir)
+        click.echo(f"{novas} linhas ingeridas (watermark: {conexao.watermark}).")
+
+    @app.cli.command("limpar-blocos")
+    @click.option("--carencia-horas", type=float, default=6.0, show_default=True,
+                  help="Só apaga blocos sem manifesto mais antigos que isso (limpezas em andamento).")
+    def limpar_blocos(carencia_horas):
+        """Apaga blocos do run_store que nenhuma execução referencia mais."""
+        from .pipeline import pasta_runs
+        from .utils.run_store import carregar_manifesto, coletar_blocos_orfaos
+
+        manifestos = [
+            carregar_manifesto(r.artefatos["manifesto"])
+            for r in CleanRun.query.all()
+            if r.artefatos and os.path.exists(r.artefatos.get("manifesto", ""))
+        ]
+        removidos = coletar_blocos_orfaos(pasta_runs("blocos"), manifestos, carencia_horas * 3600)
+        click.echo(f"{removidos} blocos removidos.")
+
+    # Migrações: `flask db upgrade` como passo separado (Dockerfile/compose);
+    # AUTO_MIGRATE=1 mantém a migração na subida, uma vez por processo.
+    if app.config["AUTO_MIGRATE"]:
+        _migrar_uma_vez(app)
+    # jobs que ficaram na fila de um processo que não existe mais
+    recuperar_orfaos(app)
 
     # ---------------- Upload ----------------
+    def _fila_cheia_html(template, e):
+        posicao = f" Sua operação estava na posição {e.posicao} da fila." if e.posicao else ""
+        erro = f"{e}{posicao} Tente novamente em alguns segundos."
+        return render_template(template, error=erro), 503, {"Retry-After": str(e.retry_after or 1)}
+
     @app.route("/upload", methods=["GET"])
     @login_required
     def show_upload_form():
@@ -71,10 +202,14 @@ def create_app():
 
     @app.route("/api/upload", methods=["GET", "POST"])
     @login_required
+    @perfilavel
     def api_upload():
         if request.method == "GET":
             return redirect(url_for("show_upload_form"))
 
+        from .pipeline import ingerir_arquivo
+        from .utils.memoria import OrcamentoExcedido, estimar_arquivo, reserva_bytes
+
         file = request.files.get("file")
         if not file or file.filename.strip() == "":
             return render_template("upload_result.html", error="Nenhum arquivo enviado.")
@@ -89,47 +224,56 @@ def create_app():
         os.makedirs(save_dir, exist_ok=True)
         save_path = os.path.join(save_dir, safe_name)
 
-        try:
-            file_bytes = file.read()
-            size_kb = len(file_bytes) / 1024
-            file.seek(0)
-            df = load_dataframe(file)
-        except Exception as e:
-            return render_template("upload_result.html", error=f"Erro ao processar arquivo: {str(e)}")
-
-        file.seek(0)
         file.save(save_path)
+        size_kb = os.path.getsize(save_path) / 1024
 
         doc = Documentos(
             nome_documento=file.filename,
             user_id=current_user.id,
             caminho=save_path,
             tamanho_kb=float(size_kb),
-            linhas=int(df.shape[0]),
             uploaded_at=datetime.utcnow()
         )
         db.session.add(doc)
         db.session.commit()
 
-        db.session.query(RawRecord).filter_by(documento_id=doc.id).delete()
-        for rec in df.to_dict(orient="records"):
-            db.session.add(RawRecord(documento_id=doc.id, data=rec))
-        db.session.commit()
+        try:
+            memoria = reserva_bytes(estimar_arquivo(save_path), "ingest")
+            with operacao_pesada("ingest", current_user.id, "interativa", memoria=memoria):
+                ingestao = ingerir_arquivo(doc, save_path)
+        except Exception as e:
+            db.session.rollback()
+            db.session.query(RawRecord).filter_by(documento_id=doc.id).delete()
+            db.session.delete(doc)
+            db.session.commit()
+            os.remove(save_path)
+            if isinstance(e, FilaCheia):
+                return _fila_cheia_html("upload_result.html", e)
+            if isinstance(e, OrcamentoExcedido):
+                return render_template("upload_result.html", error=str(e))
+            return render_template("upload_result.html", error=f"Erro ao processar arquivo: {str(e)}")
 
         session["last_doc_id"] = doc.id
 
+        modo = " em modo streaming" if ingestao["modo"] == "streaming" else ""
         return render_template(
             "upload_result.html",
-            message=f"Arquivo '{file.filename}' salvo com sucesso ({size_kb:.2f} KB, {df.shape[0]} linhas).",
-            columns=df.columns.tolist()[:15],
-            sample=df.head(10).to_dict(orient="records"),
+            message=f"Arquivo '{file.filename}' salvo com sucesso{modo} ({size_kb:.2f} KB, {ingestao['linhas']} linhas).",
+            columns=ingestao["colunas"][:15],
+            todas_colunas=ingestao["colunas"],
+            sample=ingestao["amostra"].to_dict(orient="records"),
             doc_id=doc.id,
         )
 
     # ---------------- Limpeza ----------------
     @app.route("/api/clean/run", methods=["POST"])
     @login_required
+    @perfilavel
     def api_clean_run():
+        import json
+        from .pipeline import ESTRATEGIAS, executar_limpeza
+        from .utils.memoria import estimar_documento, reserva_bytes
+
         doc_id = request.args.get("doc_id", type=int) or session.get("last_doc_id")
         if not doc_id:
             return render_template("clean_result.html", error="Documento não informado.")
@@ -138,44 +282,38 @@ def create_app():
         if not doc:
             return render_template("clean_result.html", error="Acesso negado ao documento.")
 
-        raw_q = RawRecord.query.filter_by(documento_id=doc.id).all()
-        if not raw_q:
-            return render_template("clean_result.html", error="Nenhum dado encontrado.")
-
-        df_raw = pd.DataFrame([r.data for r in raw_q])
-
-        before = analyze_dataframe(df_raw)
-        df_cleaned = clean_dataframe(df_raw)
-        after = analyze_dataframe(df_cleaned)
-        val = validate_dataframe(df_cleaned)
-
-        summary = {
-            "linhas_antes": int(df_raw.shape[0]) if not df_raw.empty else 0,
-            "linhas_depois": int(df_cleaned.shape[0]),
-            "colunas": int(df_cleaned.shape[1]),
-            "ausentes_antes": int(df_raw.isna().sum().sum()) if not df_raw.empty else 0,
-            "ausentes_depois": int(df_cleaned.isna().sum().sum()),
-            "duplicadas_antes": int(df_raw.duplicated().sum()) if not df_raw.empty else 0,
-            "duplicadas_depois": int(df_cleaned.duplicated().sum()),
-        }
+        estrategia = request.values.get("estrategia", "knn")
+        if estrategia not in ESTRATEGIAS:
+            return render_template("clean_result.html", error="Estratégia de limpeza inválida.")
+        n_jobs = app.config["CLEAN_WORKERS"] if request.values.get("paralelo") == "1" else 1
+        colunas = request.values.getlist("colunas") or None
 
-        db.session.query(CleanRecord).filter_by(documento_id=doc.id).delete()
-        for rec in df_cleaned.to_dict(orient="records"):
-            db.session.add(CleanRecord(documento_id=doc.id, data=rec))
-        db.session.commit()
-
-        pdf_buffer = gerar_relatorio_pdf(doc.id, df_raw, df_cleaned, before, after, val)
-        pdf_path = os.path.join(app.config["OUTPUT_FOLDER"], f"relatorio_{doc.id}.pdf")
-        with open(pdf_path, "wb") as f:
-            f.write(pdf_buffer.getvalue())
+        try:
+            regras = json.loads(request.values["regras"]) if request.values.get("regras") else None
+            validacao = json.loads(request.values["validacao"]) if request.values.get("validacao") else None
+            politica = request.values.get("quase_duplicadas")
+            quase_duplicadas = {"politica": politica} if politica else None
+            memoria = reserva_bytes(estimar_documento(doc, RawRecord), estrategia)
+            with operacao_pesada("clean", current_user.id, "lote", peso=n_jobs, memoria=memoria):
+                resultado = executar_limpeza(doc, estrategia, n_jobs, colunas, regras, validacao, quase_duplicadas)
+        except FilaCheia as e:
+            return _fila_cheia_html("clean_result.html", e)
+        except ValueError as e:
+            return render_template("clean_result.html", error=str(e))
+        amostra, run = resultado["amostra"], resultado["run"]
+        modo = ", em modo streaming" if resultado["modo"] == "streaming" else ""
 
         return render_template(
             "clean_result.html",
-            message=f"Limpeza concluída ({len(df_cleaned)} linhas). Relatório salvo em outputs.",
-            summary=summary,
-            validation=val,
-            columns=df_cleaned.columns.tolist(),
-            sample=df_cleaned.head(5).to_dict(orient="records"),
+            message=(
+                f"Limpeza concluída ({resultado['summary']['linhas_depois']} linhas, versão {run.versao}{modo}). "
+                "Relatório salvo em outputs."
+            ),
+            summary=resultado["summary"],
+            validation=resultado["validation"],
+            run_id=run.id,
+            columns=amostra.columns.tolist(),
+            sample=amostra.to_dict(orient="records"),
             doc_id=doc.id,
         )
 
@@ -188,14 +326,27 @@ def create_app():
             flash("Documento não encontrado ou você não tem permissão.", "danger")
             return redirect(url_for("home"))
 
+        from .pipeline import (
+            caminho_agregacoes, caminho_amostra, caminho_quase_duplicadas, caminho_sketch, caminhos_xlsx,
+            invalidar_cache_documento,
+        )
+
         db.session.query(RawRecord).filter_by(documento_id=doc.id).delete()
         db.session.query(CleanRecord).filter_by(documento_id=doc.id).delete()
 
-        if os.path.exists(doc.caminho):
-            try:
-                os.remove(doc.caminho)
-            except Exception:
-                pass
+        caminhos = [doc.caminho, caminho_sketch(doc.id), caminho_amostra(doc.id), caminho_quase_duplicadas(doc.id)]
+        caminhos += caminhos_xlsx(doc)
+        for run in doc.clean_runs:
+            caminhos += list((run.artefatos or {}).get(k) for k in ("manifesto", "relatorio", "validacao"))
+            shutil.rmtree(caminho_agregacoes(run), ignore_errors=True)
+        invalidar_cache_documento(doc.id)
+
+        for caminho in caminhos:
+            if caminho and os.path.exists(caminho):
+                try:
+                    os.remove(caminho)
+                except Exception:
+                    pass
 
         db.session.delete(doc)
         db.session.commit()
@@ -204,6 +355,74 @@ def create_app():
         return redirect(url_for("home"))
 
     # ---------------- Downloads ----------------
+    def _run_do_usuario(run_id, doc_id=None):
+        query = CleanRun.query.join(Documentos).filter(
+            CleanRun.id == run_id, Documentos.user_id == current_user.id
+        )
+        if doc_id:
+            query = query.filter(CleanRun.documento_id == doc_id)
+        return query.first()
+
+    def _carregar_limpos(doc_id, run_id=None):
+        """Dados limpos atuais (CleanRecord) ou de uma versão específica do run_store (via cache colunar)."""
+        from .pipeline import registros_em_cache, versao_em_cache
+
+        if run_id:
+            run = _run_do_usuario(run_id, doc_id)
+            if not run or not run.artefatos:
+                return None
+            return versao_em_cache(run)
+
+        df = registros_em_cache(CleanRecord, doc_id)
+        return None if df.empty else df
+
+    def _excede_orcamento(doc_id):
+        """Se montar a exportação inteira em memória passaria do orçamento."""
+        from .utils.memoria import OrcamentoExcedido, estimar_documento, planejar
+
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        if not doc:
+            return False
+        try:
+            return planejar(estimar_documento(doc, CleanRecord), "ingest", app.config["CHUNK_ROWS"])[0] != "memoria"
+        except OrcamentoExcedido:
+            return True
+
+    def _chunks_limpos(doc_id, run_id=None):
+        """Dados limpos em chunks (run_store ou CleanRecord), sem montar o frame inteiro."""
+        from .pipeline import iter_limpos
+
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        run = _run_do_usuario(run_id, doc_id) if run_id else None
+        if not doc or (run_id and not run):
+            return None
+        total, chunks = iter_limpos(doc, run)
+        return chunks if total else None
+
+    def _download_streaming(doc_id, extensao, mimetype, serializar):
+        chunks = _chunks_limpos(doc_id, request.args.get("run_id", type=int))
+        if chunks is None:
+            return jsonify({"error": "Nenhum dado limpo"}), 404
+        return Response(
+            stream_with_context(serializar(chunks)),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=dados_limpos_{doc_id}.{extensao}"},
+        )
+
+    def _csv_em_chunks(chunks):
+        for i, df in enumerate(chunks):
+            yield df.to_csv(index=False, header=(i == 0))
+
+    def _json_em_chunks(chunks):
+        yield "["
+        primeiro = True
+        for df in chunks:
+            if df.empty:
+                continue
+            corpo = df.to_json(orient="records", force_ascii=False)[1:-1]
+            yield corpo if primeiro else "," + corpo
+            primeiro = False
+        yield "]"
 
     @app.route("/api/download/clean.csv")
     @login_required
@@ -211,12 +430,13 @@ def create_app():
         doc_id = request.args.get("doc_id", type=int)
         if not doc_id:
             return jsonify({"error": "Documento não informado"}), 400
+        if _excede_orcamento(doc_id):
+            return _download_streaming(doc_id, "csv", "text/csv", _csv_em_chunks)
 
-        records = CleanRecord.query.filter_by(documento_id=doc_id).all()
-        if not records:
+        df = _carregar_limpos(doc_id, request.args.get("run_id", type=int))
+        if df is None:
             return jsonify({"error": "Nenhum dado limpo"}), 404
 
-        df = pd.DataFrame([r.data for r in records])
         out = io.StringIO()
         df.to_csv(out, index=False)
         return send_file(
@@ -229,22 +449,24 @@ def create_app():
     @app.route("/api/download/clean.xlsx")
     @login_required
     def download_xlsx():
+        from .pipeline import xlsx_limpos
+
         doc_id = request.args.get("doc_id", type=int)
         if not doc_id:
             return jsonify({"error": "Documento não informado"}), 400
 
-        records = CleanRecord.query.filter_by(documento_id=doc_id).all()
-        if not records:
+        # Workbook write_only gerado chunk a chunk e guardado por versão:
+        # memória limitada e, a partir do segundo download, só leitura do disco.
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        run_id = request.args.get("run_id", type=int)
+        run = _run_do_usuario(run_id, doc_id) if run_id else None
+        with operacao_pesada("export", current_user.id, "interativa"):
+            caminho = xlsx_limpos(doc, run) if doc and (run or not run_id) else None
+        if caminho is None:
             return jsonify({"error": "Nenhum dado limpo"}), 404
 
-        df = pd.DataFrame([r.data for r in records])
-        out = io.BytesIO()
-        with pd.ExcelWriter(out, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Limpos")
-        out.seek(0)
-
         return send_file(
-            out,
+            os.path.abspath(caminho),
             as_attachment=True,
             download_name=f"dados_limpos_{doc_id}.xlsx",
             mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
@@ -256,12 +478,13 @@ def create_app():
         doc_id = request.args.get("doc_id", type=int)
         if not doc_id:
             return jsonify({"error": "Documento não informado"}), 400
+        if _excede_orcamento(doc_id):
+            return _download_streaming(doc_id, "json", "application/json", _json_em_chunks)
 
-        records = CleanRecord.query.filter_by(documento_id=doc_id).all()
-        if not records:
+        df = _carregar_limpos(doc_id, request.args.get("run_id", type=int))
+        if df is None:
             return jsonify({"error": "Nenhum dado limpo"}), 404
 
-        df = pd.DataFrame([r.data for r in records])
         out = io.StringIO()
         df.to_json(out, orient="records", force_ascii=False, indent=2)  # Exporta como JSON formatado
         out.seek(0)
@@ -281,17 +504,131 @@ def create_app():
         if not doc_id:
             return jsonify({"error": "Documento não informado"}), 400
 
-        pdf_path = os.path.join(app.config["OUTPUT_FOLDER"], f"relatorio_{doc_id}.pdf")
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        if not doc:
+            return jsonify({"error": "Documento não encontrado"}), 404
+
+        run_id = request.args.get("run_id", type=int)
+        if run_id:
+            run = _run_do_usuario(run_id, doc.id)
+            if not run:
+                return jsonify({"error": "Execução não encontrada"}), 404
+        else:
+            run = CleanRun.query.filter_by(documento_id=doc.id).order_by(CleanRun.versao.desc()).first()
+
+        if run and run.artefatos:
+            pdf_path = run.artefatos["relatorio"]
+        else:
+            # relatórios gerados antes do versionamento (o documento já é do usuário)
+            pdf_path = os.path.join(app.config["OUTPUT_FOLDER"], f"relatorio_{doc.id}.pdf")
         if not os.path.exists(pdf_path):
             return jsonify({"error": "Relatório ainda não foi gerado."}), 404
 
         return send_file(
-            pdf_path,
+            os.path.abspath(pdf_path),
             as_attachment=True,
             download_name=f"relatorio_{doc_id}.pdf",
             mimetype="application/pdf",
         )
 
+    # ---------------- Versões de Limpeza ----------------
+    @app.route("/api/clean/runs")
+    @login_required
+    def list_clean_runs():
+        doc_id = request.args.get("doc_id", type=int)
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        if not doc:
+            return jsonify({"error": "Documento não encontrado"}), 404
+        return jsonify([r.to_dict() for r in doc.clean_runs])
+
+    @app.route("/api/clean/runs/diff")
+    @login_required
+    def diff_clean_runs():
+        run_a = _run_do_usuario(request.args.get("a", type=int))
+        run_b = _run_do_usuario(request.args.get("b", type=int))
+        if not run_a or not run_b or not run_a.artefatos or not run_b.artefatos:
+            return jsonify({"error": "Execução não encontrada"}), 404
+
+        from .utils.run_store import carregar_manifesto, diff_manifestos
+
+        diff = diff_manifestos(
+            carregar_manifesto(run_a.artefatos["manifesto"]),
+            carregar_manifesto(run_b.artefatos["manifesto"]),
+        )
+        diff["config"] = [run_a.config, run_b.config]
+        diff["estatisticas"] = [run_a.estatisticas, run_b.estatisticas]
+        return jsonify(diff)
+
+    @app.route("/api/clean/runs/<int:run_id>/falhas")
+    @login_required
+    def clean_run_failures(run_id):
+        from .pipeline import falhas_validacao
+
+        run = _run_do_usuario(run_id)
+        if not run:
+            return jsonify({"error": "Execução não encontrada"}), 404
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limite = min(max(request.args.get("limite", 100, type=int), 1), 1000)
+        try:
+            pagina = falhas_validacao(run, offset, limite, request.args.get("regra"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if pagina is None:
+            return jsonify({"error": "Execução sem índice de validação"}), 404
+        return jsonify(pagina)
+
+    @app.route("/api/documents/<int:doc_id>/aggregate", methods=["POST"])
+    @login_required
+    def aggregate_doc(doc_id):
+        from .pipeline import agregar_documento
+
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        if not doc:
+            return jsonify({"error": "Documento não encontrado"}), 404
+        run = None
+        if request.args.get("run_id", type=int):
+            run = _run_do_usuario(request.args.get("run_id", type=int), doc.id)
+            if not run:
+                return jsonify({"error": "Execução não encontrada"}), 404
+        try:
+            return jsonify(agregar_documento(doc, request.get_json(silent=True) or {}, run))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    @app.route("/api/documents/<int:doc_id>/drift")
+    @login_required
+    def drift_doc(doc_id):
+        from .pipeline import deriva_documento
+        from .utils.deriva import parametros_consulta
+
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        if not doc:
+            return jsonify({"error": "Documento não encontrado"}), 404
+        try:
+            contra, limite = parametros_consulta(request.args.get("contra"), request.args.get("limite"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        resultado = deriva_documento(doc, contra, limite)
+        if resultado is None:
+            return jsonify({"error": "Documento sem assinatura (enviado antes da detecção de deriva)"}), 404
+        return jsonify(resultado)
+
+    @app.route("/api/clean/quase-duplicadas")
+    @login_required
+    def clean_near_duplicates():
+        from .pipeline import grupos_quase_duplicadas
+
+        doc_id = request.args.get("doc_id", type=int) or session.get("last_doc_id")
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first() if doc_id else None
+        if not doc:
+            return jsonify({"error": "Documento não encontrado"}), 404
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limite = min(max(request.args.get("limite", 50, type=int), 1), 500)
+        pagina = grupos_quase_duplicadas(doc, offset, limite)
+        if pagina is None:
+            return jsonify({"error": "Documento sem detecção de quase-duplicatas"}), 404
+        return jsonify(pagina)
+
     # ---------------- Home & Dashboard ----------------
     @app.route("/")
     @login_required
@@ -308,6 +645,27 @@ def create_app():
             return redirect(url_for("home"))
         return redirect(url_for("dashboard", doc_id=doc.id))
 
+    @app.route("/dashboard/<int:doc_id>/deriva")
+    @login_required
+    def dashboard_deriva(doc_id):
+        from .pipeline import deriva_documento
+        from .utils.deriva import parametros_consulta
+
+        doc = Documentos.query.filter_by(id=doc_id, user_id=current_user.id).first()
+        if not doc:
+            flash("Acesso negado ao documento.", "danger")
+            return redirect(url_for("home"))
+        try:
+            contra, limite = parametros_consulta(request.args.get("contra"), request.args.get("limite"))
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("dashboard_deriva", doc_id=doc.id))
+        resultado = deriva_documento(doc, contra, limite)
+        if resultado is None:
+            flash("Documento enviado antes da detecção de deriva: envie-o de novo para gerar a assinatura.", "warning")
+            return redirect(url_for("home"))
+        return render_template("deriva.html", doc=doc, resultado=resultado, limite=limite)
+
     @app.route("/dashboard/<int:doc_id>")
     @login_required
     def dashboard(doc_id):
@@ -316,47 +674,105 @@ def create_app():
             flash("Acesso negado ao documento.", "danger")
             return redirect(url_for("home"))
 
-        records_raw = RawRecord.query.filter_by(documento_id=doc.id).all()
-        records_clean = CleanRecord.query.filter_by(documento_id=doc.id).all()
+        if (doc.linhas or 0) > app.config["SKETCH_MIN_ROWS"] or _excede_orcamento(doc.id):
+            return dashboard_aproximado(doc)
+
+        from .pipeline import registros_em_cache
+
+        with etapa("dashboard.load"):
+            df_clean = registros_em_cache(CleanRecord, doc.id)
+            if df_clean.empty:
+                flash("Nenhum dado limpo encontrado. Execute a limpeza primeiro.", "warning")
+                return redirect(url_for("home"))
+
+            df_raw = registros_em_cache(RawRecord, doc.id)
+
+        with etapa("dashboard.stats"):
+            stats = df_clean.describe(include="all").transpose().reset_index().fillna("").to_dict(orient="records")
+
+            summary = {
+                "linhas_antes": int(df_raw.shape[0]) if not df_raw.empty else 0,
+                "linhas_depois": int(df_clean.shape[0]),
+                "colunas": int(df_clean.shape[1]),
+                "ausentes_antes": int(df_raw.isna().sum().sum()) if not df_raw.empty else 0,
+                "ausentes_depois": int(df_clean.isna().sum().sum()),
+                "duplicadas_antes": int(df_raw.duplicated().sum()) if not df_raw.empty else 0,
+                "duplicadas_depois": int(df_clean.duplicated().sum()),
+            }
+
+        with etapa("dashboard.charts"):
+            numeric_cols = sorted(df_clean.select_dtypes(include="number").columns.tolist())
+            charts = {}
+            for col in numeric_cols:
+                before_series = df_raw[col].fillna(0).tolist() if (not df_raw.empty and col in df_raw.columns) else []
+                after_series = df_clean[col].fillna(0).tolist()
+                labels = list(range(len(after_series)))
+                charts[col] = {
+                    "labels": labels,
+                    "before": before_series if before_series else [0] * len(after_series),
+                    "after": after_series
+                }
+
+        return render_template(
+            "dashboard.html",
+            doc_id=doc.id,
+            clean_exists=True,
+            stats=stats,
+            summary=summary,
+            charts=charts
+        )
 
-        if not records_clean:
+    def dashboard_aproximado(doc):
+        """Dashboard em memória constante: estatísticas via sketches, lidas em chunks."""
+        from .cleaning import analyze_dataframe_sketch
+        from .pipeline import iter_registros
+        from .utils.sketches import estatisticas_tabela, margem_duplicadas
+
+        if not db.session.query(CleanRecord.id).filter_by(documento_id=doc.id).first():
             flash("Nenhum dado limpo encontrado. Execute a limpeza primeiro.", "warning")
             return redirect(url_for("home"))
 
-        df_raw = pd.DataFrame([r.data for r in records_raw]) if records_raw else pd.DataFrame()
-        df_clean = pd.DataFrame([r.data for r in records_clean])
-
-        stats = df_clean.describe(include="all").transpose().reset_index().fillna("").to_dict(orient="records")
-
-        summary = {
-            "linhas_antes": int(df_raw.shape[0]) if not df_raw.empty else 0,
-            "linhas_depois": int(df_clean.shape[0]),
-            "colunas": int(df_clean.shape[1]),
-            "ausentes_antes": int(df_raw.isna().sum().sum()) if not df_raw.empty else 0,
-            "ausentes_depois": int(df_clean.isna().sum().sum()),
-            "duplicadas_antes": int(df_raw.duplicated().sum()) if not df_raw.empty else 0,
-            "duplicadas_depois": int(df_clean.duplicated().sum()),
-        }
-
-        numeric_cols = sorted(df_clean.select_dtypes(include="number").columns.tolist())
-        charts = {}
-        for col in numeric_cols:
-            before_series = df_raw[col].fillna(0).tolist() if (not df_raw.empty and col in df_raw.columns) else []
-            after_series = df_clean[col].fillna(0).tolist()
-            labels = list(range(len(after_series)))
-            charts[col] = {
-                "labels": labels,
-                "before": before_series if before_series else [0] * len(after_series),
-                "after": after_series
+        chunk = app.config["CHUNK_ROWS"]
+        with etapa("dashboard.stats"):
+            raw = doc.estatisticas
+            if not raw:
+                raw = analyze_dataframe_sketch(iter_registros(RawRecord, doc.id, chunk)).get("resumo", {})
+            clean = analyze_dataframe_sketch(iter_registros(CleanRecord, doc.id, chunk)).get("resumo", {})
+
+            stats = estatisticas_tabela(clean)
+            summary = {
+                "linhas_antes": raw.get("linhas", 0),
+                "linhas_depois": clean.get("linhas", 0),
+                "colunas": clean.get("colunas", 0),
+                "ausentes_antes": raw.get("ausentes", 0),
+                "ausentes_depois": clean.get("ausentes", 0),
+                "duplicadas_antes": raw.get("duplicadas", 0),
+                "duplicadas_antes_margem": margem_duplicadas(raw),
+                "duplicadas_depois": clean.get("duplicadas", 0),
+                "duplicadas_depois_margem": margem_duplicadas(clean),
             }
 
+        with etapa("dashboard.charts"):
+            charts = {}
+            for col, r in sorted(clean.get("por_coluna", {}).items()):
+                quantis = r.get("quantis")
+                if not quantis:
+                    continue
+                antes = (raw.get("por_coluna", {}).get(col) or {}).get("quantis") or {}
+                charts[col] = {
+                    "labels": list(quantis.keys()),
+                    "before": [antes.get(q) or 0 for q in quantis],
+                    "after": [v or 0 for v in quantis.values()],
+                }
+
         return render_template(
             "dashboard.html",
             doc_id=doc.id,
             clean_exists=True,
             stats=stats,
             summary=summary,
-            charts=charts
+            charts=charts,
+            aproximado=True,
         )
 
     return app
@@ -1,5 +1,6 @@
 from flask_login import UserMixin
 from .db import db
+from .connectors.validacao import url_sem_senha
 from datetime import datetime
 
 
@@ -11,6 +12,7 @@ class User(UserMixin, db.Model):
     nome = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     senha = db.Column(db.String(256), nullable=False)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     documentos = db.relationship(
@@ -30,6 +32,9 @@ class Documentos(db.Model):
     caminho = db.Column(db.String(500), nullable=True)  # caminho físico do arquivo
     tamanho_kb = db.Column(db.Float, nullable=True)     # tamanho em KB
     linhas = db.Column(db.Integer, nullable=True)       # quantidade de linhas
+    estatisticas = db.Column(db.JSON, nullable=True)    # resumo aproximado (sketches) da ingestão
+    feed = db.Column(db.String(200), nullable=True, index=True)  # nome sem datas/números: cargas do mesmo arquivo
+    assinatura = db.Column(db.JSON, nullable=True)      # esquema e distribuições da ingestão (utils.deriva)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -47,15 +52,43 @@ class Documentos(db.Model):
         lazy=True,
         cascade="all, delete-orphan"
     )
+    esquemas = db.relationship(
+        "EsquemaRegistros",
+        back_populates="documento",
+        lazy=True,
+        cascade="all, delete-orphan"
+    )
+    clean_runs = db.relationship(
+        "CleanRun",
+        back_populates="documento",
+        lazy=True,
+        cascade="all, delete-orphan",
+        order_by="CleanRun.versao"
+    )
+
+
+class EsquemaRegistros(db.Model):
+    """Ordem e dtypes das colunas dos registros (raw/clean) de um documento."""
+    __tablename__ = "record_schemas"
+    __table_args__ = (db.UniqueConstraint("documento_id", "tipo", name="uq_record_schemas_documento_tipo"),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id"), nullable=False, index=True)
+    tipo = db.Column(db.String(10), nullable=False)  # "raw" | "clean"
+    colunas = db.Column(db.JSON, nullable=False)     # ordem das posições em `data`
+    dtypes = db.Column(db.JSON, nullable=False)      # {coluna: dtype pandas}
+
+    documento = db.relationship("Documentos", back_populates="esquemas")
 
 
 class RawRecord(db.Model):
     """Tabela para armazenar dados brutos (pré-limpeza)."""
     __tablename__ = "raw_records"
+    tipo_esquema = "raw"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id"), nullable=False, index=True)
-    data = db.Column(db.JSON, nullable=False)
+    data = db.Column(db.JSON, nullable=False)  # array posicional (ver EsquemaRegistros)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     documento = db.relationship("Documentos", back_populates="raw_records")
@@ -64,10 +97,215 @@ class RawRecord(db.Model):
 class CleanRecord(db.Model):
     """Tabela para armazenar dados limpos (pós-limpeza)."""
     __tablename__ = "clean_records"
+    tipo_esquema = "clean"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id"), nullable=False, index=True)
-    data = db.Column(db.JSON, nullable=False)
+    data = db.Column(db.JSON, nullable=False)  # array posicional (ver EsquemaRegistros)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     documento = db.relationship("Documentos", back_populates="clean_records")
+
+
+class CleanRun(db.Model):
+    """Execução de limpeza versionada; os dados ficam no run_store (imutável)."""
+    __tablename__ = "clean_runs"
+    __table_args__ = (db.UniqueConstraint("documento_id", "versao", name="uq_clean_runs_documento_versao"),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id"), nullable=False, index=True)
+    versao = db.Column(db.Integer, nullable=False)
+    config = db.Column(db.JSON, nullable=False)       # estratégia e parâmetros
+    tempos = db.Column(db.JSON, nullable=True)        # duração de cada etapa (s)
+    estatisticas = db.Column(db.JSON, nullable=True)  # resumo antes/depois
+    artefatos = db.Column(db.JSON, nullable=True)     # manifesto, relatório etc.
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    documento = db.relationship("Documentos", back_populates="clean_runs")
+
+    @property
+    def cache_key(self):
+        """Chave para caches derivados (exportações, relatórios, estatísticas)."""
+        return f"doc{self.documento_id}-run{self.id}"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "documento_id": self.documento_id,
+            "versao": self.versao,
+            "config": self.config,
+            "tempos": self.tempos,
+            "estatisticas": self.estatisticas,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class PerfilExecucao(db.Model):
+    """Perfis (cProfile + tracemalloc) capturados de execuções lentas."""
+    __tablename__ = "profile_runs"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String(36), nullable=False, unique=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id", ondelete="SET NULL"), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True, index=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    duracao_s = db.Column(db.Float, nullable=False, index=True)
+    pico_memoria_kb = db.Column(db.Float, nullable=True)
+    caminho_perfil = db.Column(db.String(500), nullable=False)
+    caminho_alocacoes = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ApiToken(db.Model):
+    """Tokens de acesso à API JSON (só o hash SHA-256 é armazenado)."""
+    __tablename__ = "api_tokens"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    nome = db.Column(db.String(100), nullable=False)
+    prefixo = db.Column(db.String(8), nullable=False)  # para identificar o token na listagem
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship("User")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "nome": self.nome,
+            "prefixo": self.prefixo,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "last_used_at": self.last_used_at.isoformat() if self.last_used_at else None,
+        }
+
+
+class UploadSession(db.Model):
+    """Upload em partes: o arquivo é pré-alocado e recebe trechos por offset."""
+    __tablename__ = "upload_sessions"
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    nome_arquivo = db.Column(db.String(200), nullable=False)
+    tamanho_total = db.Column(db.BigInteger, nullable=False)
+    caminho_parcial = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="aberta")  # aberta | finalizada
+    documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id", ondelete="SET NULL"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    chunks = db.relationship(
+        "UploadChunk",
+        back_populates="sessao",
+        lazy=True,
+        cascade="all, delete-orphan",
+        order_by="UploadChunk.offset"
+    )
+
+    def faltantes(self):
+        """Intervalos [inicio, fim) ainda não recebidos."""
+        faltam, cursor = [], 0
+        for chunk in self.chunks:
+            if chunk.offset > cursor:
+                faltam.append([cursor, chunk.offset])
+            cursor = max(cursor, chunk.offset + chunk.tamanho)
+        if cursor < self.tamanho_total:
+            faltam.append([cursor, self.tamanho_total])
+        return faltam
+
+    def to_dict(self):
+        faltam = self.faltantes()
+        return {
+            "id": self.id,
+            "nome_arquivo": self.nome_arquivo,
+            "tamanho_total": self.tamanho_total,
+            "recebido": self.tamanho_total - sum(fim - inicio for inicio, fim in faltam),
+            "faltantes": faltam,
+            "status": self.status,
+            "documento_id": self.documento_id,
+        }
+
+
+class UploadChunk(db.Model):
+    """Trecho recebido de um UploadSession; reenviar o mesmo offset sobrescreve."""
+    __tablename__ = "upload_chunks"
+    __table_args__ = (db.UniqueConstraint("sessao_id", "offset", name="uq_upload_chunks_sessao_offset"),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    sessao_id = db.Column(db.String(32), db.ForeignKey("upload_sessions.id"), nullable=False, index=True)
+    offset = db.Column(db.BigInteger, nullable=False)
+    tamanho = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    sessao = db.relationship("UploadSession", back_populates="chunks")
+
+
+class Job(db.Model):
+    """Tarefa assíncrona (ingestão, limpeza) e seu resultado."""
+    __tablename__ = "jobs"
+
+    id = db.Column(db.String(32), primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id", ondelete="SET NULL"), nullable=True, index=True)
+    status = db.Column(db.String(20), nullable=False, default="pendente")  # pendente | executando | concluido | erro
+    parametros = db.Column(db.JSON, nullable=True)
+    resultado = db.Column(db.JSON, nullable=True)
+    erro = db.Column(db.Text, nullable=True)
+    tempos = db.Column(db.JSON, nullable=True)
+    progresso = db.Column(db.JSON, nullable=True)  # ex.: {"linhas_escritas": n, "total": m}
+    instancia = db.Column(db.String(120), nullable=True)  # "host:pid:início" do processo com a fila (jobs.instancia_atual)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "status": self.status,
+            "documento_id": self.documento_id,
+            "parametros": {k: url_sem_senha(v) if k == "url" else v for k, v in (self.parametros or {}).items()},
+            "resultado": self.resultado,
+            "erro": self.erro,
+            "tempos": self.tempos,
+            "progresso": self.progresso,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ConexaoSQL(db.Model):
+    """
+    Banco externo do usuário. Origem de um documento (URL, consulta e
+    watermark da carga incremental) ou só destino de exportações, sem
+    documento nem consulta. Jobs guardam apenas o id da conexão.
+    """
+    __tablename__ = "sql_connections"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey("documentos.id", ondelete="CASCADE"), nullable=True, unique=True)
+    nome = db.Column(db.String(100), nullable=False)
+    url = db.Column(db.String(500), nullable=False)  # normalizada por validar_url
+    consulta = db.Column(db.Text, nullable=True)  # None: conexão só de destino
+    coluna_watermark = db.Column(db.String(100), nullable=True)
+    watermark = db.Column(db.JSON, nullable=True)  # último valor ingerido da coluna de watermark
+    ultima_execucao = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    documento = db.relationship("Documentos", backref=db.backref("conexao_sql", uselist=False, cascade="all, delete-orphan"))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "documento_id": self.documento_id,
+            "nome": self.nome,
+            "tipo": "origem" if self.consulta else "destino",
+            "url": url_sem_senha(self.url),
+            "consulta": self.consulta,
+            "coluna_watermark": self.coluna_watermark,
+            "watermark": self.watermark,
+            "ultima_execucao": self.ultima_execucao.isoformat() if self.ultima_execucao else None,
+        }
@@ -0,0 +1,869 @@
+# app/pipeline.py
+"""
+Etapas de ingestão e limpeza compartilhadas pelas rotas HTML, pela API
+JSON e pelos jobs assíncronos. Nada aqui depende de request/sessão:
+só do app context (config e db).
+"""
+import os
+import json
+import zipfile
+from itertools import chain
+from datetime import datetime
+
+import pandas as pd
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from .db import db
+from .models import ConexaoSQL, Documentos, RawRecord, CleanRecord, CleanRun, User
+from .cleaning import (
+    analyze_dataframe, calcular_estatisticas_regras_chunks, clean_dataframe, detectar_formatos, limpar_chunks_regras,
+    normalizar_chunks, normalizar_dataframe, selecao_colunas, validar_regras,
+)
+from .utils.agendador import FilaCheia
+from .utils.amostragem import AmostraReservatorio, carregar_amostra, salvar_amostra
+from .utils.cache_colunar import invalidar as invalidar_cache_colunar, obter as obter_cache_colunar
+from .utils.deriva import assinatura as assinatura_perfil, chave_feed, comparar as comparar_assinaturas
+from .utils.agregacao import agregar_chunks, chave_consulta, colunas_da_consulta, compilar_consulta
+from .utils.file_loader import fatiar_dataframe, iter_dataframe_chunks, load_dataframe
+from .utils.metrics import etapa, tempos_da_requisicao
+from .utils.report_generator import gerar_relatorio_pdf
+from .utils.memoria import (
+    OrcamentoExcedido, bloco_knn_mb, estimar_arquivo, estimar_documento, orcamento_bytes, planejar, reserva_bytes,
+)
+from .utils.registros import (
+    apagar_registros, carregar_esquema, carregar_posicoes, carregar_registros, codificar_linhas, decodificar_linhas,
+    gravar_registros, iter_registros,
+)
+from .utils.run_store import (
+    GravadorVersao, carregar_manifesto, carregar_versao, iter_versao, ler_linhas, salvar_manifesto, salvar_versao,
+)
+from .utils.quase_duplicadas import (
+    aplicar_plano, carregar_resultado, detectar_chunks, mesclar_grupos, pagina_grupos, resumo as resumo_quase_duplicadas,
+    salvar_resultado, validar_config as validar_quase_duplicadas,
+)
+from .utils.quase_duplicadas import planejar as planejar_quase_duplicadas
+from .utils.validacao import (
+    Validador, carregar_indice, colunas_das_regras, compilar_regras, contar_falhas, pagina_falhas, salvar_indice,
+)
+from .utils.xlsx_stream import escrever_xlsx
+from .utils.sketches import PerfilSketch, carregar_perfil, margem_duplicadas, perfilar_chunks, salvar_perfil
+from .connectors.sql import exportar_chunks, iter_consulta
+from .connectors.validacao import validar_url_do_usuario
+from .jobs import tarefa, enfileirar
+
+ESTRATEGIAS = ("knn", "regras")
+
+
+def caminho_sketch(doc_id):
+    return os.path.join(current_app.config["OUTPUT_FOLDER"], "sketches", f"doc_{doc_id}.sketch")
+
+
+def caminho_quase_duplicadas(doc_id):
+    return os.path.join(current_app.config["OUTPUT_FOLDER"], "quase_duplicadas", f"doc_{doc_id}.npz")
+
+
+def pasta_runs(*partes):
+    return os.path.join(current_app.config["OUTPUT_FOLDER"], "runs", *partes)
+
+
+def caminho_amostra(doc_id):
+    return os.path.join(current_app.config["OUTPUT_FOLDER"], "amostras", f"doc_{doc_id}.pkl")
+
+
+def amostra_documento(doc_id):
+    """Amostra (utils.amostragem) guardada na ingestão do documento; None para documentos anteriores a ela."""
+    try:
+        return carregar_amostra(caminho_amostra(doc_id))
+    except Exception:  # arquivo corrompido: quem chama cai no caminho antigo
+        return None
+
+
+def _amostra_registros(doc_id, estratificada=True):
+    """Linhas da amostra do documento no formato lido dos RawRecord (mesma codificação e dtypes)."""
+    amostra = amostra_documento(doc_id)
+    if amostra is None:
+        return None
+    df = amostra.amostra(estratificada=estratificada)
+    colunas = list(df.columns)
+    return decodificar_linhas(codificar_linhas(df, colunas), colunas, {c: str(df[c].dtype) for c in colunas})
+
+
+def _nova_amostra():
+    return AmostraReservatorio(tamanho=current_app.config["SAMPLE_ROWS"])
+
+
+def _previa(df, n=5):
+    """Prévia de `n` linhas sorteadas no frame inteiro (não as primeiras), na ordem original."""
+    amostra = AmostraReservatorio(tamanho=max(n, 100))
+    for chunk in fatiar_dataframe(df, current_app.config["CHUNK_ROWS"]):
+        amostra.update(chunk)
+    return amostra.previa(n)
+
+
+# ---------------- Cache colunar compartilhado ----------------
+def pasta_cache_colunar():
+    return os.path.join(current_app.config["OUTPUT_FOLDER"], "cache_colunar")
+
+
+def dados_em_cache(doc_id, tipo, versao, carregar):
+    """
+    DataFrame `tipo` do documento pelo cache colunar em disco (memory-map,
+    compartilhado entre os workers); `carregar()` só roda quando a versão
+    ainda não está no cache. DATASET_CACHE_MB=0 desliga o cache.
+    """
+    limite = current_app.config["DATASET_CACHE_MB"]
+    if limite <= 0:
+        return carregar()
+    return obter_cache_colunar(pasta_cache_colunar(), f"doc_{doc_id}_{tipo}", versao, carregar, limite * 1024 ** 2)
+
+
+def _versao_registros(modelo, doc_id):
+    """Muda a cada regravação dos registros (ids novos e/ou outra contagem)."""
+    maximo, total = (
+        db.session.query(db.func.max(modelo.id), db.func.count(modelo.id)).filter(modelo.documento_id == doc_id).one()
+    )
+    return f"{maximo}_{total}"
+
+
+def registros_em_cache(modelo, doc_id):
+    """Todos os registros (RawRecord/CleanRecord) do documento, via cache colunar."""
+    versao = _versao_registros(modelo, doc_id)
+    if modelo is CleanRecord:  # cada limpeza registra uma run nova: amarra a versão a ela
+        ultima = db.session.query(db.func.max(CleanRun.id)).filter(CleanRun.documento_id == doc_id).scalar()
+        versao = f"run{ultima}_{versao}"
+    return dados_em_cache(doc_id, modelo.tipo_esquema, versao, lambda: carregar_registros(modelo, doc_id))
+
+
+def versao_em_cache(run):
+    """Dados de uma run do run_store (imutável), via cache colunar."""
+    def carregar():
+        return carregar_versao(carregar_manifesto(run.artefatos["manifesto"]), pasta_runs("blocos"))
+    return dados_em_cache(run.documento_id, "run", run.id, carregar)
+
+
+def arquivo_em_cache(doc):
+    """Arquivo original do documento, via cache colunar (versão = mtime e tamanho)."""
+    info = os.stat(doc.caminho)
+    return dados_em_cache(doc.id, "arquivo", f"{info.st_mtime_ns}_{info.st_size}", lambda: load_dataframe(doc.caminho))
+
+
+def invalidar_cache_documento(doc_id):
+    for tipo in ("raw", "clean", "run", "arquivo"):
+        invalidar_cache_colunar(pasta_cache_colunar(), f"doc_{doc_id}_{tipo}")
+
+
+def resumo_limpeza(df_raw, df_cleaned):
+    return {
+        "linhas_antes": int(df_raw.shape[0]) if not df_raw.empty else 0,
+        "linhas_depois": int(df_cleaned.shape[0]),
+        "colunas": int(df_cleaned.shape[1]),
+        "ausentes_antes": int(df_raw.isna().sum().sum()) if not df_raw.empty else 0,
+        "ausentes_depois": int(df_cleaned.isna().sum().sum()),
+        "duplicadas_antes": int(df_raw.duplicated().sum()) if not df_raw.empty else 0,
+        "duplicadas_depois": int(df_cleaned.duplicated().sum()),
+    }
+
+
+# ---------------- Ingestão ----------------
+def _registrar_assinatura(doc, perfil):
+    """Feed e assinatura de esquema/distribuição do documento (para a detecção de deriva)."""
+    doc.feed = chave_feed(doc.nome_documento)
+    doc.assinatura = assinatura_perfil(perfil)
+
+
+def ingerir_dataframe(doc, df):
+    """Grava os registros brutos do documento, o perfil por sketches e a amostra; retorna a amostra."""
+    with etapa("upload.persist"):
+        doc.linhas = int(df.shape[0])
+        apagar_registros(RawRecord, doc.id)
+        gravar_registros(RawRecord, doc.id, df)
+        db.session.commit()
+
+    with etapa("upload.sketch"):
+        perfil = perfilar_chunks(fatiar_dataframe(df, current_app.config["CHUNK_ROWS"]))
+        salvar_perfil(perfil, caminho_sketch(doc.id))
+        doc.estatisticas = perfil.resumo()
+        _registrar_assinatura(doc, perfil)
+        db.session.commit()
+
+    with etapa("upload.amostra"):
+        amostra = _nova_amostra()
+        for chunk in fatiar_dataframe(df, current_app.config["CHUNK_ROWS"]):
+            amostra.update(chunk)
+        salvar_amostra(amostra, caminho_amostra(doc.id))
+    return amostra
+
+
+def ingerir_chunks(doc, chunks, perfil=None, substituir=True, ao_gravar=None, amostra=None):
+    """
+    Grava os registros brutos chunk a chunk, acumulando o perfil por sketches
+    e a amostra do documento (em `perfil`/`amostra`, se informados, para
+    cargas incrementais). `ao_gravar(df)` roda antes do commit de cada
+    chunk. Retorna (linhas_novas, prévia de 10 linhas da amostra).
+    """
+    if substituir:
+        apagar_registros(RawRecord, doc.id)
+        doc.linhas = 0
+        db.session.commit()
+    perfil = perfil or PerfilSketch()
+    amostra = amostra or _nova_amostra()
+
+    novas, planilhas = 0, {}
+    chunks = iter(chunks)
+    while True:
+        with etapa("upload.parse"):
+            df = next(chunks, None)
+        if df is None:
+            break
+        with etapa("upload.persist"):
+            gravar_registros(RawRecord, doc.id, df)
+            doc.linhas = (doc.linhas or 0) + len(df)
+            if ao_gravar:
+                ao_gravar(df)
+            db.session.commit()
+        with etapa("upload.sketch"):
+            perfil.update(df)
+        with etapa("upload.amostra"):
+            amostra.update(df)
+        novas += len(df)
+        if "planilha" in df.attrs:
+            planilhas[df.attrs["planilha"]] = planilhas.get(df.attrs["planilha"], 0) + len(df)
+
+    with etapa("upload.sketch"):
+        salvar_perfil(perfil, caminho_sketch(doc.id))
+        doc.estatisticas = perfil.resumo()
+        if planilhas:
+            # linhas por planilha (Excel), na ordem de leitura
+            doc.estatisticas = {**doc.estatisticas, "planilhas": planilhas}
+        _registrar_assinatura(doc, perfil)
+        db.session.commit()
+    with etapa("upload.amostra"):
+        salvar_amostra(amostra, caminho_amostra(doc.id))
+    return novas, amostra.previa(10)
+
+
+def ingerir_arquivo(doc, caminho):
+    """
+    Ingere o arquivo do documento em memória ou, se o pico estimado passar
+    do orçamento, em chunks. Planilhas .xlsx (soltas ou em ZIP) sempre vão
+    pelo caminho em chunks: o leitor read_only já é streaming e registra as
+    linhas por planilha. Retorna {"modo", "linhas", "colunas", "amostra"}.
+    """
+    modo, chunk_rows = planejar(estimar_arquivo(caminho), "ingest", current_app.config["CHUNK_ROWS"])
+    if modo == "memoria" and _tem_planilha(caminho):
+        modo, chunk_rows = "streaming", current_app.config["CHUNK_ROWS"]
+    if modo == "memoria":
+        with etapa("upload.parse"):
+            df = load_dataframe(caminho)
+        amostra = ingerir_dataframe(doc, df).previa(10)
+    else:
+        _, amostra = ingerir_chunks(doc, iter_dataframe_chunks(caminho, chunk_rows))
+    return {"modo": modo, "linhas": doc.linhas, "colunas": amostra.columns.tolist(), "amostra": amostra}
+
+
+def ingerir_sql(conexao, substituir=False):
+    """
+    Puxa a consulta da conexão em chunks para os RawRecord do documento.
+    Com watermark definido, só traz linhas novas e acumula no perfil por
+    sketches existente; cada chunk é gravado junto com o watermark, então
+    uma carga interrompida recomeça de onde parou.
+    """
+    doc = conexao.documento
+    incremental = not substituir and conexao.coluna_watermark and conexao.watermark is not None
+    caminho = caminho_sketch(doc.id)
+
+    perfil = carregar_perfil(caminho) if incremental and os.path.exists(caminho) else None
+    amostra = amostra_documento(doc.id) if incremental else None
+    if not incremental:
+        conexao.watermark = None
+
+    def avancar_watermark(df):
+        conexao.watermark = df.attrs.get("watermark", conexao.watermark)
+
+    chunks = iter_consulta(
+        conexao.url, conexao.consulta, current_app.config["CHUNK_ROWS"],
+        conexao.coluna_watermark, conexao.watermark,
+    )
+    novas, _ = ingerir_chunks(
+        doc, chunks, perfil=perfil, substituir=not incremental, ao_gravar=avancar_watermark, amostra=amostra
+    )
+    conexao.ultima_execucao = datetime.utcnow()
+    db.session.commit()
+    return novas
+
+
+def _tem_planilha(caminho):
+    if caminho.lower().endswith(".zip"):
+        with zipfile.ZipFile(caminho) as z:
+            return any(n.lower().endswith(".xlsx") for n in z.namelist())
+    return caminho.lower().endswith(".xlsx")
+
+# ---------------- Limpeza ----------------
+def verificar_colunas(doc_id, selecao=None, validacao=None, quase_duplicadas=None):
+    """Levanta ValueError se a seleção ou as regras citarem colunas que o documento não tem."""
+    citadas = list(selecao or []) + [c for c in colunas_das_regras(validacao) if c not in (selecao or [])]
+    if quase_duplicadas:
+        citadas += [c for c in (quase_duplicadas["colunas"] or []) + quase_duplicadas["bloqueio"] if c not in citadas]
+    if citadas:
+        esquema = carregar_esquema(RawRecord, doc_id)
+        faltando = [c for c in citadas if c not in (esquema.colunas if esquema else [])]
+        if faltando:
+            raise ValueError(f"Colunas inexistentes no documento: {', '.join(map(str, faltando))}.")
+
+
+def executar_limpeza(
+    doc, estrategia="knn", n_jobs=1, colunas=None, regras=None, validacao=None, quase_duplicadas=None,
+    normalizar=True,
+):
+    """
+    Limpa os dados brutos do documento, reescreve os CleanRecord, grava a
+    nova versão (CleanRun) e o relatório PDF. Se o pico estimado passar do
+    orçamento de memória, a estratégia "regras" roda em chunks; "knn" é
+    recusada com OrcamentoExcedido. `colunas`/`regras` restringem a limpeza
+    (as demais colunas passam intactas); `validacao` são as regras de
+    validação do resultado (utils.validacao) e `quase_duplicadas` liga a
+    etapa de quase-duplicatas antes da limpeza (utils.quase_duplicadas).
+    Com `normalizar`, colunas texto com datas, moeda ou números formatados
+    ("R$ 1.234,56", "05/03/2024") são convertidas antes da limpeza.
+    Levanta ValueError se não houver dados ou se a seleção for inválida.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError("Estratégia de limpeza inválida.")
+    validar_regras(regras, estrategia)
+    validacao = compilar_regras(validacao)
+    quase_duplicadas = validar_quase_duplicadas(quase_duplicadas)
+    selecao = selecao_colunas(colunas, regras)
+    verificar_colunas(doc.id, selecao, validacao, quase_duplicadas)
+    config = {"estrategia": estrategia, "n_jobs": n_jobs, "normalizar": bool(normalizar)}
+    if selecao:
+        config.update(colunas=selecao, regras=regras or {})
+    if validacao:
+        config["validacao"] = validacao
+    if quase_duplicadas:
+        config["quase_duplicadas"] = quase_duplicadas
+
+    try:
+        modo, chunk_rows = planejar(
+            estimar_documento(doc, RawRecord), estrategia, current_app.config["CHUNK_ROWS"],
+            streaming=(estrategia == "regras"),
+        )
+    except OrcamentoExcedido as e:
+        if estrategia == "knn":
+            raise OrcamentoExcedido(f"{e} Use a estratégia 'regras', que roda em chunks.") from None
+        raise
+    if modo == "streaming":
+        try:
+            return _executar_limpeza_streaming(doc, chunk_rows, config)
+        except Exception:
+            db.session.rollback()  # desfaz a troca pela metade: os CleanRecord anteriores continuam
+            raise
+
+    with etapa("clean.load"):
+        df_raw = carregar_registros(RawRecord, doc.id)
+        if df_raw.empty:
+            raise ValueError("Nenhum dado encontrado.")
+
+    with etapa("clean.analyze"):
+        before = analyze_dataframe(df_raw)
+    df_entrada, quase = df_raw, None
+    if quase_duplicadas:
+        with etapa("clean.quase_duplicadas"):
+            plano, mescladas, quase = _quase_duplicadas(doc, quase_duplicadas, lambda: [df_raw])
+            df_entrada = next(aplicar_plano([df_raw], plano, mescladas)).reset_index(drop=True)
+    normalizacao = {}
+    if normalizar:
+        with etapa("clean.normalizacao"):
+            df_entrada, normalizacao = normalizar_dataframe(df_entrada, detectar_formatos(df_entrada, selecao))
+    df_cleaned = clean_dataframe(
+        df_entrada, estrategia=estrategia, n_jobs=n_jobs, colunas=colunas, regras=regras,
+        treino=current_app.config["MODEL_SAMPLE_ROWS"], bloco_knn_mb=bloco_knn_mb(orcamento_bytes()),
+    )
+    with etapa("clean.analyze"):
+        after = analyze_dataframe(df_cleaned)
+    with etapa("clean.validacao"):
+        validador = Validador(validacao)
+        validador.adicionar(df_cleaned)
+        val = validador.resultado()
+
+    summary = resumo_limpeza(df_raw, df_cleaned)
+    if quase:
+        summary["quase_duplicadas"] = quase
+    if normalizacao:
+        summary["normalizacao"] = normalizacao
+
+    with etapa("clean.db_rewrite"):
+        apagar_registros(CleanRecord, doc.id)
+        gravar_registros(CleanRecord, doc.id, df_cleaned)
+        db.session.commit()
+
+    with etapa("clean.versionamento"):
+        manifesto, bytes_novos = salvar_versao(df_cleaned, pasta_runs("blocos"))
+        run = _registrar_run(doc, {**config, "modo": "memoria"}, summary, manifesto)
+    with etapa("clean.validacao"):
+        indice_path = _salvar_indice_validacao(run, validador)
+
+    with etapa("clean.pdf"):
+        aproximado = doc.estatisticas if (doc.linhas or 0) > current_app.config["SKETCH_MIN_ROWS"] else None
+        pdf_buffer = gerar_relatorio_pdf(
+            doc.id, df_raw, df_cleaned, before, after, val, aproximado=aproximado, summary=summary
+        )
+        pdf_path = _salvar_relatorio(doc, run, pdf_buffer)
+
+    run.artefatos = {**run.artefatos, "relatorio": pdf_path, "validacao": indice_path, "bytes_novos": bytes_novos}
+    run.tempos = tempos_da_requisicao()
+    db.session.commit()
+
+    return {"summary": summary, "validation": val, "amostra": _previa(df_cleaned), "run": run, "modo": "memoria"}
+
+
+def _registrar_run(doc, config, summary, manifesto):
+    ultima = db.session.query(db.func.max(CleanRun.versao)).filter_by(documento_id=doc.id).scalar()
+    run = CleanRun(documento_id=doc.id, versao=(ultima or 0) + 1, config=config, estatisticas=summary)
+    db.session.add(run)
+    db.session.flush()
+
+    manifesto_path = pasta_runs("manifestos", f"run_{run.id}.json")
+    salvar_manifesto(manifesto, manifesto_path)
+    run.artefatos = {"manifesto": manifesto_path}
+    return run
+
+
+def _salvar_relatorio(doc, run, pdf_buffer):
+    pdf_path = os.path.join(current_app.config["OUTPUT_FOLDER"], f"relatorio_{doc.id}_run{run.id}.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(pdf_buffer.getvalue())
+    return pdf_path
+
+
+def _quase_duplicadas(doc, config, chunks):
+    """
+    Detecta as quase-duplicatas nos dados brutos (`chunks()` devolve um
+    iterável novo a cada chamada), grava pares e grupos do documento e
+    retorna (plano, linhas mescladas ou None, resumo).
+    """
+    resultado = detectar_chunks(chunks(), config)
+    salvar_resultado(resultado, config, caminho_quase_duplicadas(doc.id))
+    plano = planejar_quase_duplicadas(resultado, config["politica"])
+    mescladas = mesclar_grupos(chunks(), resultado, plano) if config["politica"] == "mesclar" else None
+    return plano, mescladas, resumo_quase_duplicadas(resultado, plano)
+
+
+def _salvar_indice_validacao(run, validador):
+    caminho = pasta_runs("validacao", f"run_{run.id}.npz")
+    salvar_indice(validador, caminho)
+    return caminho
+
+
+def _executar_limpeza_streaming(doc, chunk_rows, config):
+    """
+    Limpeza por regras sem materializar o documento: uma passada para as
+    estatísticas (quartis por KLL, lendo só as colunas selecionadas) e outra
+    limpando, gravando CleanRecord e os blocos da versão chunk a chunk. O
+    PDF usa amostras e o resumo por sketches do documento. A troca dos
+    CleanRecord é uma transação só (commit junto com a CleanRun): quem lê
+    durante a limpeza, ou depois de uma falha no meio, vê a versão anterior.
+    """
+    colunas, regras, validacao = config.get("colunas"), config.get("regras"), config.get("validacao")
+
+    def brutos(colunas=None):
+        return iter_registros(RawRecord, doc.id, chunk_rows, colunas=colunas)
+
+    quase = None
+    if config.get("quase_duplicadas"):
+        with etapa("clean.quase_duplicadas"):
+            plano, mescladas, quase = _quase_duplicadas(doc, config["quase_duplicadas"], brutos)
+
+        def brutos(colunas=None, _ler=brutos):
+            return aplicar_plano(_ler(colunas), plano, mescladas)
+
+    # formatos e colunas a converter decididos pela amostra do documento (o arquivo todo), não pelo primeiro chunk
+    amostra_doc = _amostra_registros(doc.id)
+    normalizacao = {}
+    if config.get("normalizar"):
+        # formato decidido uma vez e reaplicado nas duas passadas
+        with etapa("clean.normalizacao"):
+            referencia = amostra_doc if amostra_doc is not None else next(iter(brutos(colunas)), pd.DataFrame())
+            formatos = detectar_formatos(referencia, colunas)
+            if amostra_doc is not None:
+                amostra_doc = normalizar_dataframe(amostra_doc, formatos)[0]
+
+        def brutos(colunas=None, _ler=brutos):
+            return normalizar_chunks(_ler(colunas), formatos, normalizacao)
+
+    with etapa("clean.regras.estatisticas"):
+        estatisticas = calcular_estatisticas_regras_chunks(brutos(colunas), colunas, regras, amostra=amostra_doc)
+    if not estatisticas["colunas"] and not doc.linhas:
+        raise ValueError("Nenhum dado encontrado.")
+    normalizacao.clear()  # conta só a passada de limpeza
+
+    limpos = limpar_chunks_regras(brutos(), estatisticas)
+    with etapa("clean.regras.chunks"):
+        primeiro = next(limpos, None)
+    if primeiro is not None:
+        # regra que não se aplica (coluna, expressão) falha aqui, antes de gravar qualquer chunk
+        Validador(validacao).adicionar(primeiro.head(1000))
+        limpos = chain([primeiro], limpos)
+
+    # sem commit até o fim: a leitura dos brutos pagina por id e enxerga a mesma transação
+    apagar_registros(CleanRecord, doc.id)
+
+    gravador = GravadorVersao(pasta_runs("blocos"))
+    validador, ausentes, amostra_limpa = Validador(validacao), 0, AmostraReservatorio(tamanho=10_000)
+    while True:
+        with etapa("clean.regras.chunks"):
+            df = next(limpos, None)
+        if df is None:
+            break
+        with etapa("clean.amostra"):
+            amostra_limpa.update(df)
+        with etapa("clean.db_rewrite"):
+            gravar_registros(CleanRecord, doc.id, df)
+        with etapa("clean.versionamento"):
+            gravador.adicionar(df)
+        with etapa("clean.validacao"):
+            validador.adicionar(df)
+        with etapa("clean.analyze"):
+            ausentes += int(df.isna().sum().sum())
+
+    amostra = amostra_limpa.amostra(estratificada=False)
+    original = doc.estatisticas or {}
+    summary = {
+        "linhas_antes": int(doc.linhas or 0),
+        "linhas_depois": gravador.linhas,
+        "colunas": int(amostra.shape[1]),
+        "ausentes_antes": int(original.get("ausentes", 0)),
+        "ausentes_depois": ausentes,
+        "duplicadas_antes": int(original.get("duplicadas", 0)),
+        "duplicadas_antes_margem": margem_duplicadas(original),
+        "duplicadas_depois": 0,
+    }
+    if quase:
+        summary["quase_duplicadas"] = quase
+    if normalizacao:
+        summary["normalizacao"] = normalizacao
+
+    with etapa("clean.versionamento"):
+        manifesto, bytes_novos = gravador.finalizar()
+        config = {**config, "n_jobs": 1, "modo": "streaming", "chunk_rows": chunk_rows}
+        run = _registrar_run(doc, config, summary, manifesto)
+    with etapa("clean.validacao"):
+        val = validador.resultado()
+        indice_path = _salvar_indice_validacao(run, validador)
+
+    with etapa("clean.pdf"):
+        amostra_raw = _amostra_registros(doc.id, estratificada=False)
+        if amostra_raw is None:
+            amostra_raw = next(iter_registros(RawRecord, doc.id, 10_000), pd.DataFrame())
+        before = {"shape": (summary["linhas_antes"], int(original.get("colunas", amostra_raw.shape[1])))}
+        after = {"shape": (summary["linhas_depois"], summary["colunas"])}
+        pdf_buffer = gerar_relatorio_pdf(
+            doc.id, amostra_raw, amostra, before, after, val, aproximado=original or None, summary=summary
+        )
+        pdf_path = _salvar_relatorio(doc, run, pdf_buffer)
+
+    run.artefatos = {**run.artefatos, "relatorio": pdf_path, "validacao": indice_path, "bytes_novos": bytes_novos}
+    run.tempos = tempos_da_requisicao()
+    db.session.commit()
+
+    return {"summary": summary, "validation": val, "amostra": amostra_limpa.previa(5), "run": run, "modo": "streaming"}
+
+
+def iter_limpos(doc, run=None, colunas=None):
+    """
+    Retorna (linhas, chunks) da versão limpa: do run_store (a execução
+    informada ou a mais recente) ou, para documentos anteriores ao
+    versionamento, dos CleanRecord. `colunas` lê só essas colunas
+    (ValueError se alguma não existir).
+    """
+    run = run or _ultima_run(doc)
+    if run and run.artefatos:
+        manifesto = carregar_manifesto(run.artefatos["manifesto"])
+        existentes = {c["nome"] for c in manifesto["colunas"]}
+        faltando = [c for c in colunas or [] if c not in existentes]
+        if faltando:
+            raise ValueError(f"Colunas inexistentes no documento: {', '.join(map(str, faltando))}.")
+        return manifesto["linhas"], iter_versao(manifesto, pasta_runs("blocos"), colunas)
+
+    total = CleanRecord.query.filter_by(documento_id=doc.id).count()
+    return total, iter_registros(CleanRecord, doc.id, current_app.config["CHUNK_ROWS"], colunas=colunas)
+
+
+def caminho_agregacoes(run):
+    return pasta_runs("agregacoes", f"run_{run.id}")
+
+
+def agregar_documento(doc, consulta, run=None):
+    """
+    Agregação ad-hoc (utils.agregacao) sobre a versão limpa, lendo só as
+    colunas citadas. Versões são imutáveis, então o resultado fica em
+    cache por execução e consulta, sem invalidação. Levanta ValueError se a
+    consulta for inválida.
+    """
+    consulta = compilar_consulta(consulta)
+    run = run or _ultima_run(doc)
+    versionada = run is not None and bool(run.artefatos)
+    caminho = os.path.join(caminho_agregacoes(run), f"{chave_consulta(consulta)}.json") if versionada else None
+    if caminho and os.path.exists(caminho):
+        with open(caminho) as f:
+            return {**json.load(f), "cache": True}
+
+    with etapa("aggregate"):
+        _, chunks = iter_limpos(doc, run, colunas_da_consulta(consulta))
+        tabela, total, linhas = agregar_chunks(chunks, consulta)
+    resultado = {
+        "documento_id": doc.id,
+        "run_id": run.id if versionada else None,
+        "versao": run.versao if versionada else None,
+        "consulta": consulta,
+        "linhas_filtradas": linhas,
+        "total_grupos": total,
+        "truncado": total > len(tabela),
+        "colunas": [str(c) for c in tabela.columns],
+        "linhas": json.loads(tabela.to_json(orient="records", date_format="iso", force_ascii=False)),
+    }
+    if caminho:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        tmp = f"{caminho}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(resultado, f, ensure_ascii=False)
+        os.replace(tmp, caminho)
+    return {**resultado, "cache": False}
+
+
+def falhas_validacao(run, offset=0, limite=100, regra=None):
+    """
+    Página das linhas da versão que falharam na validação: posição, regras
+    violadas e os dados da linha (lidos só dos blocos necessários). Retorna
+    None se a execução não tiver índice de validação.
+    """
+    caminho = (run.artefatos or {}).get("validacao")
+    if not caminho or not os.path.exists(caminho):
+        return None
+    indice = carregar_indice(caminho)
+    total, pagina = pagina_falhas(indice, offset, limite, regra)
+
+    posicoes = [p for p, _ in pagina]
+    dados = ler_linhas(carregar_manifesto(run.artefatos["manifesto"]), pasta_runs("blocos"), posicoes)
+    registros = json.loads(dados.to_json(orient="records", date_format="iso", force_ascii=False))
+    return {
+        "run_id": run.id,
+        "total": total,
+        "offset": offset,
+        "limite": limite,
+        "regras": contar_falhas(indice),
+        "linhas": [
+            {"linha": p, "regras": nomes, "dados": registro}
+            for (p, nomes), registro in zip(pagina, registros)
+        ],
+    }
+
+
+def grupos_quase_duplicadas(doc, offset=0, limite=50):
+    """
+    Página dos grupos de quase-duplicatas do documento (última detecção):
+    posições, pares com a similaridade e os registros brutos de cada grupo.
+    Retorna None se a etapa nunca rodou.
+    """
+    caminho = caminho_quase_duplicadas(doc.id)
+    if not os.path.exists(caminho):
+        return None
+    resultado, config = carregar_resultado(caminho)
+    total, grupos = pagina_grupos(resultado, offset, limite)
+
+    dados = carregar_posicoes(RawRecord, doc.id, [p for _, posicoes, _ in grupos for p in posicoes])
+    registros = dict(zip(dados.index, json.loads(dados.to_json(orient="records", date_format="iso", force_ascii=False))))
+    return {
+        "documento_id": doc.id,
+        "config": config,
+        "resumo": resumo_quase_duplicadas(resultado, planejar_quase_duplicadas(resultado, config["politica"])),
+        "total": total,
+        "offset": offset,
+        "limite": limite,
+        "grupos": [
+            {
+                "grupo": g,
+                "linhas": [{"linha": p, "dados": registros.get(p)} for p in posicoes],
+                "pares": [{"a": i, "b": j, "similaridade": s} for i, j, s in pares],
+            }
+            for g, posicoes, pares in grupos
+        ],
+    }
+
+
+# ---------------- Deriva ----------------
+def deriva_documento(doc, contra=None, limite=30):
+    """
+    Compara a assinatura do documento com as dos anteriores do mesmo feed
+    (os `limite` mais recentes enviados antes dele) ou, com `contra`, com
+    esses documentos (ids) do mesmo usuário. Só as assinaturas são lidas,
+    nunca os registros. Retorna None se o documento não tiver assinatura
+    (enviado antes da detecção de deriva).
+    """
+    if not doc.assinatura:
+        return None
+    consulta = db.session.query(
+        Documentos.id, Documentos.nome_documento, Documentos.uploaded_at, Documentos.assinatura
+    ).filter(Documentos.user_id == doc.user_id, Documentos.id != doc.id, Documentos.assinatura.isnot(None))
+    if contra:
+        consulta = consulta.filter(Documentos.id.in_(contra))
+    else:
+        consulta = consulta.filter(Documentos.feed == doc.feed, or_(
+            Documentos.uploaded_at < doc.uploaded_at,
+            and_(Documentos.uploaded_at == doc.uploaded_at, Documentos.id < doc.id),
+        ))
+    with etapa("deriva.load"):
+        linhas = consulta.order_by(Documentos.uploaded_at.desc(), Documentos.id.desc()).limit(limite).all()
+    anteriores = [
+        ({"documento_id": id_, "nome_documento": nome, "uploaded_at": data.isoformat() if data else None}, assinatura)
+        for id_, nome, data, assinatura in linhas if assinatura
+    ]
+    with etapa("deriva.comparar"):
+        resultado = comparar_assinaturas(doc.assinatura, anteriores)
+    return {"documento_id": doc.id, "feed": doc.feed, "linhas": doc.assinatura["linhas"], **resultado}
+
+
+def _ultima_run(doc):
+    return CleanRun.query.filter_by(documento_id=doc.id).order_by(CleanRun.versao.desc()).first()
+
+
+def caminhos_xlsx(doc):
+    """XLSX em cache do documento: um por execução e o dos CleanRecord anteriores ao versionamento."""
+    return [pasta_runs("xlsx", f"run_{run.id}.xlsx") for run in doc.clean_runs] + [
+        pasta_runs("xlsx", f"doc_{doc.id}.xlsx")
+    ]
+
+
+def xlsx_limpos(doc, run=None):
+    """
+    Caminho do XLSX da versão limpa, gerado em streaming (memória limitada)
+    na primeira vez e reaproveitado depois: as versões do run_store são
+    imutáveis. Retorna None se não houver dados limpos.
+    """
+    run = run or _ultima_run(doc)
+    nome = f"run_{run.id}.xlsx" if run and run.artefatos else f"doc_{doc.id}.xlsx"
+    caminho = pasta_runs("xlsx", nome)
+    if os.path.exists(caminho):
+        return caminho
+
+    total, chunks = iter_limpos(doc, run)
+    if not total:
+        return None
+    with etapa("download.xlsx"):
+        escrever_xlsx(chunks, caminho)
+    return caminho
+
+
+# ---------------- Tarefas assíncronas ----------------
+def _recursos_ingest(job):
+    doc = db.session.get(Documentos, job.documento_id)
+    return 1, reserva_bytes(estimar_arquivo(doc.caminho), "ingest", job=True)
+
+
+def _recursos_clean(job):
+    parametros = job.parametros or {}
+    doc = db.session.get(Documentos, job.documento_id)
+    peso = current_app.config["CLEAN_WORKERS"] if parametros.get("paralelo") else 1
+    return peso, reserva_bytes(estimar_documento(doc, RawRecord), parametros.get("estrategia", "knn"), job=True)
+
+
+def _recursos_export(job):
+    doc = db.session.get(Documentos, job.documento_id)
+    return 1, reserva_bytes(estimar_documento(doc, CleanRecord), "ingest", job=True)
+
+
+def _descartar_ingestao(job, doc):
+    """Ingestão que falhou: remove o documento, o que já foi gravado dele e o arquivo (como no upload pela página)."""
+    db.session.rollback()
+    apagar_registros(RawRecord, doc.id)
+    caminhos = [doc.caminho, caminho_sketch(doc.id), caminho_amostra(doc.id)]
+    job.documento_id = None
+    db.session.delete(doc)
+    db.session.commit()
+    for caminho in caminhos:
+        if caminho and os.path.exists(caminho):
+            os.remove(caminho)
+
+
+@tarefa("ingest", recursos=_recursos_ingest)
+def _tarefa_ingest(job):
+    doc = db.session.get(Documentos, job.documento_id)
+    try:
+        ingestao = ingerir_arquivo(doc, doc.caminho)
+    except Exception:
+        _descartar_ingestao(job, doc)
+        raise
+
+    resultado = {"documento_id": doc.id, "linhas": doc.linhas, "colunas": ingestao["colunas"], "modo": ingestao["modo"]}
+    parametros = job.parametros or {}
+    if parametros.get("limpar"):
+        try:
+            clean_job = enfileirar("clean", job.user_id, doc.id, {
+                k: v for k, v in parametros.items()
+                if k in ("estrategia", "paralelo", "colunas", "regras", "validacao", "quase_duplicadas", "normalizar")
+            })
+        except FilaCheia as e:  # a ingestão vale; a limpeza pode ser pedida depois
+            resultado["clean_job_erro"] = str(e)
+        else:
+            resultado["clean_job_id"] = clean_job.id
+    return resultado
+
+
+@tarefa("sql")
+def _tarefa_sql(job):
+    conexao = ConexaoSQL.query.filter_by(documento_id=job.documento_id).first()
+    # conexões criadas antes da restrição (ou de o usuário perder o perfil de admin) são recusadas aqui
+    validar_url_do_usuario(conexao.url, db.session.get(User, job.user_id))
+    novas = ingerir_sql(conexao, substituir=(job.parametros or {}).get("substituir", False))
+    return {
+        "documento_id": conexao.documento_id,
+        "linhas_novas": novas,
+        "linhas": conexao.documento.linhas,
+        "watermark": conexao.watermark,
+    }
+
+
+@tarefa("export", recursos=_recursos_export)
+def _tarefa_export(job):
+    doc = db.session.get(Documentos, job.documento_id)
+    parametros = job.parametros
+    run = db.session.get(CleanRun, parametros["run_id"]) if parametros.get("run_id") else None
+    total, chunks = iter_limpos(doc, run)
+    if not total:
+        raise ValueError("Nenhum dado limpo. Execute a limpeza primeiro.")
+
+    def progresso(escritas):
+        job.progresso = {"linhas_escritas": escritas, "total": total}
+        db.session.commit()
+
+    conexao = ConexaoSQL.query.filter_by(id=parametros.get("conexao_id"), user_id=job.user_id).first()
+    if conexao is None:
+        raise ValueError("Conexão de destino não encontrada.")
+    # revalida na execução: a configuração ou o perfil do usuário podem ter mudado desde o pedido
+    validar_url_do_usuario(conexao.url, db.session.get(User, job.user_id))
+    progresso(0)
+    with etapa("export.db"):
+        escritas = exportar_chunks(
+            chunks, conexao.url, parametros["tabela"], parametros["modo"],
+            chave=parametros.get("chave"), tamanho_lote=parametros["tamanho_lote"], progresso=progresso,
+        )
+    return {"documento_id": doc.id, "tabela": parametros["tabela"], "modo": parametros["modo"], "linhas_escritas": escritas}
+
+
+@tarefa("clean", recursos=_recursos_clean)
+def _tarefa_clean(job):
+    doc = db.session.get(Documentos, job.documento_id)
+    parametros = job.parametros or {}
+    n_jobs = current_app.config["CLEAN_WORKERS"] if parametros.get("paralelo") else 1
+    resultado = executar_limpeza(
+        doc, parametros.get("estrategia", "knn"), n_jobs, parametros.get("colunas"), parametros.get("regras"),
+        parametros.get("validacao"), parametros.get("quase_duplicadas"), parametros.get("normalizar", True),
+    )
+    return {
+        "documento_id": doc.id,
+        "run_id": resultado["run"].id,
+        "versao": resultado["run"].versao,
+        "modo": resultado["modo"],
+        "resumo": resultado["summary"],
+        "validacao": resultado["validation"],
+    }
@@ -0,0 +1,212 @@
+# app/utils/agendador.py
+"""
+Agendador das operações pesadas (ingestão, limpeza, exportação): limita
+quantas rodam ao mesmo tempo no processo — vagas de CPU e memória
+reservada — com cota por usuário e classes de prioridade: "interativa"
+(upload e pré-visualização, alguém esperando a página) passa à frente de
+"lote" (limpezas e jobs da API).
+
+Dentro da mesma classe, a vez é de quem tem menos operações em andamento
+(no empate, de quem chegou antes): um usuário com dez limpezas na fila
+não atrasa o primeiro pedido de outro. Se o pedido da vez não couber
+(vagas ou memória), ele segura os seguintes, para não ser ultrapassado
+para sempre por pedidos menores. Pedidos acima da cota do usuário não
+seguram ninguém.
+
+Dois modos de uso:
+- `vaga(...)`: context manager que bloqueia até a admissão (requisições
+  síncronas), com espera máxima;
+- `agendar(...)`: não bloqueia; `iniciar(pedido)` é chamado na admissão e
+  quem executa chama `liberar(id)` ao terminar (jobs em thread).
+"""
+import itertools
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PRIORIDADES = {"interativa": 0, "lote": 1}
+
+
+class FilaCheia(Exception):
+    """Pedido recusado: fila no limite ou espera maior que a permitida."""
+
+    def __init__(self, mensagem, posicao=None, retry_after=None):
+        super().__init__(mensagem)
+        self.posicao = posicao
+        self.retry_after = retry_after
+
+
+class _Pedido:
+    __slots__ = ("id", "usuario", "prioridade", "peso", "memoria", "seq", "chegada", "admitido", "evento", "iniciar")
+
+    def __init__(self, id, usuario, prioridade, peso, memoria, seq, iniciar=None):
+        self.id, self.usuario, self.prioridade = id, usuario, prioridade
+        self.peso, self.memoria, self.seq = peso, memoria, seq
+        self.chegada = time.monotonic()
+        self.admitido = None  # instante da admissão
+        self.evento = threading.Event()
+        self.iniciar = iniciar
+
+
+class Agendador:
+    def __init__(self, vagas, por_usuario, memoria_bytes=0, fila_maxima=0):
+        """
+        vagas: unidades de CPU simultâneas no processo; por_usuario: operações
+        simultâneas por usuário; memoria_bytes: memória total reservável
+        (0 = sem limite); fila_maxima: pedidos esperando (0 = sem limite).
+        """
+        self.vagas = max(1, int(vagas))
+        self.por_usuario = max(1, int(por_usuario))
+        self.memoria_bytes = max(0, int(memoria_bytes))
+        self.fila_maxima = max(0, int(fila_maxima))
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._fila = []
+        self._executando = {}
+        self._por_usuario = Counter()
+        self._em_uso = 0
+        self._memoria_em_uso = 0
+
+    # ---------------- Admissão ----------------
+    def _ordem(self, pedido):
+        return PRIORIDADES[pedido.prioridade], self._por_usuario[pedido.usuario], pedido.seq
+
+    def _cabe(self, pedido):
+        if self._em_uso + pedido.peso > self.vagas:
+            return False
+        if not self.memoria_bytes or not self._executando:
+            return True  # pedido maior que a memória toda ainda roda, sozinho
+        return self._memoria_em_uso + pedido.memoria <= self.memoria_bytes
+
+    def _despachar(self):
+        """Admite, na ordem, os pedidos que cabem; chamar com o lock. Retorna os admitidos."""
+        admitidos = []
+        while self._fila:
+            elegiveis = [p for p in self._fila if self._por_usuario[p.usuario] < self.por_usuario]
+            if not elegiveis:
+                break
+            pedido = min(elegiveis, key=self._ordem)
+            if not self._cabe(pedido):
+                break
+            self._fila.remove(pedido)
+            self._executando[pedido.id] = pedido
+            self._por_usuario[pedido.usuario] += 1
+            self._em_uso += pedido.peso
+            self._memoria_em_uso += pedido.memoria
+            pedido.admitido = time.monotonic()
+            admitidos.append(pedido)
+        return admitidos
+
+    def _iniciar(self, admitidos):
+        """Fora do lock: acorda quem espera em `vaga` e inicia os pedidos de `agendar`."""
+        for pedido in admitidos:
+            if pedido.iniciar is None:
+                pedido.evento.set()
+                continue
+            try:
+                pedido.iniciar(pedido)
+            except Exception:  # quem agendou trata o erro; aqui só devolve as vagas
+                self.liberar(pedido.id)
+
+    def _entrar(self, usuario, prioridade, peso, memoria, id=None, iniciar=None):
+        if prioridade not in PRIORIDADES:
+            raise ValueError(f"Prioridade inválida: {prioridade}")
+        with self._lock:
+            self._verificar_fila()
+            pedido = _Pedido(
+                id or uuid.uuid4().hex, usuario, prioridade, min(max(1, int(peso)), self.vagas),
+                max(0, int(memoria)), next(self._seq), iniciar,
+            )
+            self._fila.append(pedido)
+            admitidos = self._despachar()
+        self._iniciar(admitidos)
+        return pedido
+
+    def _verificar_fila(self):
+        if self.fila_maxima and len(self._fila) >= self.fila_maxima:
+            raise FilaCheia("Servidor ocupado: fila de operações cheia.", retry_after=self._retry_after())
+
+    def verificar_fila(self):
+        """Levanta FilaCheia se um pedido novo seria recusado agora (antes de criar estado que dependa dele)."""
+        with self._lock:
+            self._verificar_fila()
+
+    def liberar(self, id):
+        """Devolve as vagas do pedido `id` e admite os próximos."""
+        with self._lock:
+            pedido = self._executando.pop(id, None)
+            if pedido is not None:
+                self._por_usuario[pedido.usuario] -= 1
+                if not self._por_usuario[pedido.usuario]:
+                    del self._por_usuario[pedido.usuario]
+                self._em_uso -= pedido.peso
+                self._memoria_em_uso -= pedido.memoria
+            admitidos = self._despachar()
+        self._iniciar(admitidos)
+
+    def cancelar(self, id):
+        """Tira da fila um pedido ainda não admitido; True se estava na fila."""
+        with self._lock:
+            for pedido in self._fila:
+                if pedido.id == id:
+                    self._fila.remove(pedido)
+                    admitidos = self._despachar()
+                    break
+            else:
+                return False
+        self._iniciar(admitidos)
+        return True
+
+    # ---------------- Uso ----------------
+    @contextmanager
+    def vaga(self, usuario, prioridade="lote", peso=1, memoria=0, espera_s=None):
+        """
+        Bloqueia até haver vaga para o pedido e a mantém durante o bloco.
+        Levanta FilaCheia se a fila estiver no limite ou a espera passar de
+        `espera_s` (com a posição que o pedido tinha na fila).
+        """
+        pedido = self._entrar(usuario, prioridade, peso, memoria)
+        if not pedido.evento.wait(espera_s):
+            with self._lock:
+                posicao = self._posicao(pedido.id)
+            if self.cancelar(pedido.id):
+                raise FilaCheia(
+                    "Servidor ocupado: a operação esperou demais por uma vaga.",
+                    posicao=posicao, retry_after=self._retry_after(),
+                )
+        try:
+            yield pedido
+        finally:
+            self.liberar(pedido.id)
+
+    def agendar(self, usuario, iniciar, prioridade="lote", peso=1, memoria=0, id=None):
+        """Enfileira sem bloquear; `iniciar(pedido)` roda na admissão e quem executa chama `liberar(id)`."""
+        return self._entrar(usuario, prioridade, peso, memoria, id=id, iniciar=iniciar)
+
+    # ---------------- Estado ----------------
+    def _posicao(self, id):
+        ordem = sorted(self._fila, key=self._ordem)
+        return next((i + 1 for i, p in enumerate(ordem) if p.id == id), None)
+
+    def _retry_after(self):
+        # estimativa grosseira: uma "rodada" por vaga ocupada, no mínimo 1 s
+        return max(1, len(self._fila) // self.vagas + 1)
+
+    def posicao(self, id):
+        """Posição (1 = próximo) do pedido na fila, ou None se não estiver esperando."""
+        with self._lock:
+            return self._posicao(id)
+
+    def estado(self):
+        with self._lock:
+            return {
+                "vagas": self.vagas,
+                "vagas_em_uso": self._em_uso,
+                "memoria_bytes": self.memoria_bytes,
+                "memoria_em_uso": self._memoria_em_uso,
+                "executando": len(self._executando),
+                "fila": len(self._fila),
+                "fila_por_prioridade": dict(Counter(p.prioridade for p in self._fila)),
+            }
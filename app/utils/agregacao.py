@@ -0,0 +1,232 @@
+# app/utils/agregacao.py
+"""
+Agregações ad-hoc (group-by) sobre os dados limpos, sem exportar o
+arquivo inteiro. Cada chunk é filtrado e reduzido a parciais mescláveis
+por grupo (soma, contagem, mínimo, máximo); os parciais são fundidos a
+cada chunk, então a memória fica proporcional ao número de grupos, não de
+linhas. Só as colunas citadas na consulta são lidas.
+
+Consulta:
+    {
+        "grupos": ["uf", "ano"],
+        "medidas": [{"funcao": "soma", "coluna": "valor", "nome": "total"}, {"funcao": "contagem"}],
+        "filtros": [{"coluna": "uf", "op": "in", "valor": ["SP", "RJ"]}, {"coluna": "valor", "op": ">", "valor": 0}],
+        "ordem": "-total",
+        "limite": 100
+    }
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+FUNCOES = ("contagem", "soma", "media", "minimo", "maximo")
+OPERADORES = ("=", "!=", "<", "<=", ">", ">=", "in", "nulo", "nao_nulo")
+LIMITE_PADRAO = 1000
+LIMITE_MAXIMO = 10_000
+# Parciais mescláveis de cada função: (parcial, como fundir)
+_PARCIAIS = {"soma": ("sum", "sum"), "contagem": ("count", "sum"), "minimo": ("min", "min"), "maximo": ("max", "max")}
+_NUMERICAS = ("soma", "media")
+
+
+# ---------------- Compilação ----------------
+def _lista_de_nomes(valor, chave):
+    if valor is None:
+        return []
+    if not isinstance(valor, list) or not all(isinstance(c, str) and c for c in valor):
+        raise ValueError(f"'{chave}' deve ser uma lista de nomes de colunas.")
+    return list(dict.fromkeys(valor))
+
+
+def compilar_consulta(consulta) -> dict:
+    """
+    Valida a consulta e devolve uma cópia normalizada (medidas com "nome",
+    limite preenchido); levanta ValueError com a primeira inconsistência.
+    """
+    if not isinstance(consulta, dict):
+        raise ValueError("A consulta deve ser um objeto JSON.")
+    desconhecidas = set(consulta) - {"grupos", "medidas", "filtros", "ordem", "limite"}
+    if desconhecidas:
+        raise ValueError(f"Chaves desconhecidas na consulta: {', '.join(sorted(desconhecidas))}.")
+    grupos = _lista_de_nomes(consulta.get("grupos"), "grupos")
+
+    medidas = consulta.get("medidas") or [{"funcao": "contagem"}]
+    if not isinstance(medidas, list):
+        raise ValueError("'medidas' deve ser uma lista.")
+    compiladas = []
+    for i, medida in enumerate(medidas):
+        if not isinstance(medida, dict):
+            raise ValueError(f"Medida {i + 1} deve ser um objeto.")
+        funcao, coluna = medida.get("funcao"), medida.get("coluna")
+        if funcao not in FUNCOES:
+            raise ValueError(f"Função inválida na medida {i + 1} (use {', '.join(FUNCOES)}).")
+        if coluna is not None and not (isinstance(coluna, str) and coluna):
+            raise ValueError(f"'coluna' da medida {i + 1} deve ser um nome de coluna.")
+        if coluna is None and funcao != "contagem":
+            raise ValueError(f"A medida {i + 1} ({funcao}) exige 'coluna'.")
+        nome = medida.get("nome") or (f"{funcao}_{coluna}" if coluna else funcao)
+        if not isinstance(nome, str):
+            raise ValueError(f"'nome' da medida {i + 1} deve ser texto.")
+        compiladas.append({"funcao": funcao, "coluna": coluna, "nome": nome})
+    nomes = [m["nome"] for m in compiladas]
+    repetidos = sorted({n for n in nomes if nomes.count(n) > 1} | (set(nomes) & set(grupos)))
+    if repetidos:
+        raise ValueError(f"Nomes de medida repetidos ou iguais a um grupo: {', '.join(repetidos)}.")
+
+    filtros = consulta.get("filtros") or []
+    if not isinstance(filtros, list):
+        raise ValueError("'filtros' deve ser uma lista.")
+    for i, filtro in enumerate(filtros):
+        if not isinstance(filtro, dict) or not isinstance(filtro.get("coluna"), str):
+            raise ValueError(f"Filtro {i + 1} deve ser um objeto com 'coluna'.")
+        if filtro.get("op") not in OPERADORES:
+            raise ValueError(f"Operador inválido no filtro {i + 1} (use {', '.join(OPERADORES)}).")
+        if filtro["op"] == "in" and not isinstance(filtro.get("valor"), list):
+            raise ValueError(f"O filtro {i + 1} ('in') exige uma lista em 'valor'.")
+        if filtro["op"] not in ("nulo", "nao_nulo") and "valor" not in filtro:
+            raise ValueError(f"O filtro {i + 1} exige 'valor'.")
+    filtros = [{"coluna": f["coluna"], "op": f["op"], "valor": f.get("valor")} for f in filtros]
+
+    ordem = consulta.get("ordem")
+    if ordem is not None and (not isinstance(ordem, str) or ordem.lstrip("-") not in grupos + nomes):
+        raise ValueError("'ordem' deve ser um grupo ou medida (prefixo '-' para decrescente).")
+    limite = consulta.get("limite", LIMITE_PADRAO)
+    if isinstance(limite, bool) or not isinstance(limite, int) or not 1 <= limite <= LIMITE_MAXIMO:
+        raise ValueError(f"'limite' deve ser um inteiro entre 1 e {LIMITE_MAXIMO}.")
+    return {"grupos": grupos, "medidas": compiladas, "filtros": filtros, "ordem": ordem, "limite": limite}
+
+
+def colunas_da_consulta(consulta) -> list:
+    """Colunas que precisam ser lidas (projeção)."""
+    citadas = consulta["grupos"] + [m["coluna"] for m in consulta["medidas"] if m["coluna"]]
+    return list(dict.fromkeys(citadas + [f["coluna"] for f in consulta["filtros"]]))
+
+
+def chave_consulta(consulta) -> str:
+    """Hash estável da consulta compilada (chave do cache por versão)."""
+    return hashlib.sha1(json.dumps(consulta, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+# ---------------- Execução ----------------
+def _valor_filtro(serie, valor):
+    """Converte o valor do filtro para o tipo da coluna (data, número ou texto)."""
+    try:
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            return pd.Timestamp(valor)
+        if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            return float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Valor {valor!r} não combina com a coluna '{serie.name}'.") from None
+    return valor
+
+
+def _mascara(df, filtros):
+    manter = np.ones(len(df), dtype=bool)
+    for f in filtros:
+        serie, op = df[f["coluna"]], f["op"]
+        if op in ("nulo", "nao_nulo"):
+            nulos = serie.isna().to_numpy()
+            manter &= nulos if op == "nulo" else ~nulos
+            continue
+        if op == "in":
+            valores = [_valor_filtro(serie, v) for v in f["valor"]]
+            manter &= serie.isin(valores).to_numpy()
+            continue
+        valor = _valor_filtro(serie, f["valor"])
+        comparar = {"=": serie.eq, "!=": serie.ne, "<": serie.lt, "<=": serie.le, ">": serie.gt, ">=": serie.ge}[op]
+        try:
+            manter &= comparar(valor).to_numpy(dtype=bool, na_value=False)
+        except TypeError:
+            raise ValueError(f"Não é possível comparar a coluna '{f['coluna']}' com {f['valor']!r}.") from None
+    return manter
+
+
+def _plano_parciais(medidas):
+    """{coluna_parcial: (coluna, parcial, fusão)} sem repetir parciais entre medidas."""
+    plano = {"__linhas": (None, "size", "sum")}
+    for m in medidas:
+        if m["coluna"] is None:
+            continue
+        funcoes = {"media": ("soma", "contagem"), "soma": ("soma", "contagem")}.get(m["funcao"], (m["funcao"],))
+        for funcao in funcoes:
+            parcial, fusao = _PARCIAIS[funcao]
+            plano[f"{funcao}__{m['coluna']}"] = (m["coluna"], parcial, fusao)
+    return plano
+
+
+def _parciais(df, grupos, plano):
+    chaves = [df[g] for g in grupos] if grupos else [np.zeros(len(df), dtype=np.int8)]
+    agrupado = df.groupby(chaves, dropna=False, sort=False)
+    colunas = {}
+    for nome, (coluna, parcial, _) in plano.items():
+        colunas[nome] = agrupado.size() if coluna is None else agrupado[coluna].agg(parcial)
+    return pd.DataFrame(colunas)
+
+
+def _fundir(parciais, plano):
+    if len(parciais) == 1:
+        return parciais[0]
+    juntos = pd.concat(parciais)
+    return juntos.groupby(level=list(range(juntos.index.nlevels)), dropna=False, sort=False).agg(
+        {nome: fusao for nome, (_, _, fusao) in plano.items()}
+    )
+
+
+def agregar_chunks(chunks, consulta):
+    """
+    Executa a consulta compilada sobre os chunks. Retorna (DataFrame com
+    grupos + medidas, já ordenado e limitado, total de grupos, linhas que
+    passaram nos filtros).
+    """
+    grupos, medidas = consulta["grupos"], consulta["medidas"]
+    plano = _plano_parciais(medidas)
+    acumulado, verificadas = None, False
+    for chunk in chunks:
+        if not verificadas:
+            faltando = [c for c in colunas_da_consulta(consulta) if c not in chunk.columns]
+            if faltando:
+                raise ValueError(f"Colunas inexistentes no documento: {', '.join(faltando)}.")
+            for m in medidas:
+                serie = chunk[m["coluna"]] if m["coluna"] else None
+                if m["funcao"] in _NUMERICAS and not pd.api.types.is_numeric_dtype(serie):
+                    raise ValueError(f"'{m['funcao']}' exige uma coluna numérica ('{m['coluna']}').")
+            verificadas = True
+        filtrado = chunk[_mascara(chunk, consulta["filtros"])] if consulta["filtros"] else chunk
+        if filtrado.empty:
+            continue
+        parcial = _parciais(filtrado, grupos, plano)
+        acumulado = parcial if acumulado is None else _fundir([acumulado, parcial], plano)
+
+    if acumulado is None:
+        vazio = pd.DataFrame(columns=grupos + [m["nome"] for m in medidas])
+        if not grupos:  # sem grupos, a agregação de nada ainda é uma linha (contagem 0)
+            vazio = pd.DataFrame([{m["nome"]: 0 if m["funcao"] == "contagem" else None for m in medidas}])
+        return vazio, len(vazio), 0
+
+    resultado = pd.DataFrame(index=acumulado.index)
+    for m in medidas:
+        coluna = m["coluna"]
+        if coluna is None:
+            resultado[m["nome"]] = acumulado["__linhas"]
+        elif m["funcao"] == "media":
+            resultado[m["nome"]] = acumulado[f"soma__{coluna}"] / acumulado[f"contagem__{coluna}"].replace(0, np.nan)
+        elif m["funcao"] == "soma":  # como no SQL: soma só de nulos é nula
+            resultado[m["nome"]] = acumulado[f"soma__{coluna}"].where(acumulado[f"contagem__{coluna}"] > 0)
+        else:
+            resultado[m["nome"]] = acumulado[f"{m['funcao']}__{coluna}"]
+    linhas = int(acumulado["__linhas"].sum())
+
+    if grupos:
+        resultado.index.names = grupos
+        resultado = resultado.reset_index()
+    else:
+        resultado = resultado.reset_index(drop=True)
+
+    ordem = consulta["ordem"]
+    if ordem:
+        resultado = resultado.sort_values(ordem.lstrip("-"), ascending=not ordem.startswith("-"), kind="stable")
+    elif grupos:
+        resultado = resultado.sort_values(grupos, kind="stable")
+    total = len(resultado)
+    return resultado.head(consulta["limite"]).reset_index(drop=True), total, linhas
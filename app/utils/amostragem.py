@@ -0,0 +1,192 @@
+# app/utils/amostragem.py
+"""
+Amostra de tamanho fixo do documento, montada durante a ingestão em
+chunks, no lugar de `head()`: as primeiras linhas de um arquivo costumam
+ser de um só período, filial ou planilha e enganam a pré-visualização, a
+detecção de formatos e o ajuste dos modelos.
+
+Reservatório por prioridade (bottom-k): cada linha recebe uma chave
+aleatória e ficam as `tamanho` de menor chave, o que é uma amostra
+uniforme sem reposição do que já passou, em uma passada e memória
+constante. Opcionalmente estratificado pelas colunas texto de baixa
+cardinalidade: cada valor guarda também as `por_estrato` linhas de menor
+chave, então categorias raras aparecem na amostra mesmo que a seleção
+uniforme não as pegue. As contagens por valor são exatas.
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# colunas internas guardadas junto das linhas amostradas
+_CHAVE, _POSICAO = "__chave", "__posicao"
+_INTERNAS = (_CHAVE, _POSICAO)
+VAZIO = "(vazio)"
+
+
+def posicoes_espalhadas(n, k):
+    """Até `k` posições igualmente espaçadas em range(n), do início ao fim (amostra determinística)."""
+    if n <= k:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, k).round().astype(np.int64))
+
+
+def amostra_espalhada(obj, k):
+    """Linhas de `obj` (Series/DataFrame) em posições espalhadas: substitui `head(k)` em amostras para inferência."""
+    return obj if len(obj) <= k else obj.iloc[posicoes_espalhadas(len(obj), k)]
+
+
+class AmostraReservatorio:
+    def __init__(self, tamanho=2000, por_estrato=50, estratificar=True, max_estratos=50, max_candidatas=3, seed=None):
+        """
+        tamanho: linhas da amostra uniforme; por_estrato: linhas garantidas
+        por valor de cada coluna de estratificação; max_estratos: valores
+        distintos acima dos quais a coluna deixa de estratificar;
+        max_candidatas: colunas de estratificação acompanhadas.
+        """
+        self.tamanho = int(tamanho)
+        self.por_estrato = int(por_estrato)
+        self.estratificar = estratificar
+        self.max_estratos = int(max_estratos)
+        self.max_candidatas = int(max_candidatas)
+        self.candidatas = None  # decididas no primeiro chunk
+        self.n = 0
+        self.contagens = {}  # {coluna: {valor: linhas}}
+        self._linhas = None
+        self._rng = np.random.default_rng(seed)
+
+    # ---------------- Estratos ----------------
+    def _escolher_candidatas(self, df):
+        """
+        Colunas texto/categóricas de baixa cardinalidade no primeiro chunk.
+        Uma coluna com um só valor ali ainda conta: arquivos ordenados por
+        filial ou período só mostram os outros valores mais adiante.
+        """
+        candidatas = []
+        for col in df.select_dtypes(exclude=[np.number, "datetime"]).columns:
+            if col not in _INTERNAS and df[col].nunique(dropna=True) <= self.max_estratos:
+                candidatas.append(col)
+            if len(candidatas) == self.max_candidatas:
+                break
+        return candidatas
+
+    @staticmethod
+    def _rotulos(serie):
+        return serie.astype(str).astype(object).mask(serie.isna(), VAZIO)
+
+    @property
+    def coluna(self):
+        """Coluna de estratificação: a candidata com mais valores distintos (pelo menos 2), ou None."""
+        melhor = max(self.contagens.items(), key=lambda kv: len(kv[1]), default=(None, {}))
+        return melhor[0] if len(melhor[1]) >= 2 else None
+
+    # ---------------- Atualização ----------------
+    @staticmethod
+    def _limiar(chaves, k):
+        """Chave da k-ésima menor (só entra quem for menor) ou infinito se ainda não há k."""
+        return np.partition(chaves, k - 1)[k - 1] if len(chaves) >= k else np.inf
+
+    def update(self, df):
+        if df is None or df.empty:
+            return self
+        if self.candidatas is None:
+            self.candidatas = self._escolher_candidatas(df) if self.estratificar else []
+        chaves = self._rng.random(len(df))
+        guardadas = self._linhas
+
+        # pré-filtro: só entra quem está entre as k menores chaves do próprio chunk e abaixo da k-ésima guardada
+        limiar = self._limiar(chaves, self.tamanho)
+        if guardadas is not None:
+            limiar = min(limiar, self._limiar(guardadas[_CHAVE].to_numpy(), self.tamanho))
+        candidata = chaves <= limiar
+        ordem = None
+        for col in list(self.candidatas):
+            if col not in df.columns:
+                continue
+            rotulos = self._rotulos(df[col])
+            contagens = self.contagens.setdefault(col, {})
+            for valor, quantidade in rotulos.value_counts(sort=False).items():
+                contagens[valor] = contagens.get(valor, 0) + int(quantidade)
+            if len(contagens) > self.max_estratos:  # cardinalidade alta: deixa de estratificar
+                self.candidatas.remove(col)
+                del self.contagens[col]
+                continue
+            limiares = {}
+            if guardadas is not None and col in guardadas.columns:
+                for valor, grupo in guardadas[_CHAVE].groupby(self._rotulos(guardadas[col]).to_numpy(), sort=False):
+                    limiares[valor] = self._limiar(grupo.to_numpy(), self.por_estrato)
+            if ordem is None:
+                ordem = np.argsort(chaves, kind="stable")
+            # posição da linha entre as do mesmo valor, pela chave
+            rank = np.empty(len(df), dtype=np.int64)
+            rank[ordem] = pd.Series(rotulos.to_numpy()[ordem]).groupby(rotulos.to_numpy()[ordem], sort=False).cumcount()
+            candidata |= (rank < self.por_estrato) & (chaves < rotulos.map(limiares).fillna(np.inf).to_numpy(dtype=float))
+
+        # só as linhas que podem entrar são copiadas
+        indices = np.flatnonzero(candidata)
+        novas = df.iloc[indices].reset_index(drop=True)
+        novas[_CHAVE] = chaves[indices]
+        novas[_POSICAO] = self.n + indices
+        todas = novas if guardadas is None else pd.concat([guardadas, novas], ignore_index=True)
+        self._linhas = self._podar(todas)
+        self.n += len(df)
+        return self
+
+    def _podar(self, todas):
+        todas = todas.sort_values(_CHAVE, kind="stable", ignore_index=True)
+        manter = np.arange(len(todas)) < self.tamanho
+        for col in self.candidatas:
+            if col in todas.columns:
+                manter |= (todas.groupby(self._rotulos(todas[col]).to_numpy(), sort=False).cumcount() < self.por_estrato).to_numpy()
+        return todas[manter].reset_index(drop=True)
+
+    # ---------------- Leitura ----------------
+    def amostra(self, n=None, estratificada=True):
+        """
+        Linhas amostradas, na ordem original do documento. Com `n`, cada
+        valor da coluna de estratificação entra com pelo menos uma linha
+        (se couber) e o restante é completado pela seleção uniforme.
+        `estratificada=False` devolve só a parte uniforme (para estimativas
+        e ajuste de modelos).
+        """
+        linhas = self._linhas
+        if linhas is None:
+            return pd.DataFrame()
+        if not estratificada:
+            linhas = linhas.head(self.tamanho)  # _linhas fica ordenado pela chave
+        elif n is not None and self.coluna is not None:
+            primeira = (linhas.groupby(self._rotulos(linhas[self.coluna]).to_numpy(), sort=False).cumcount() == 0).to_numpy()
+            linhas = linhas.iloc[np.argsort(~primeira, kind="stable")]  # uma por valor, depois pela chave
+        if n is not None:
+            linhas = linhas.head(n)
+        return linhas.sort_values(_POSICAO).drop(columns=[_CHAVE, _POSICAO]).reset_index(drop=True)
+
+    def previa(self, n=10):
+        return self.amostra(n)
+
+    def resumo(self):
+        coluna = self.coluna
+        return {
+            "linhas": self.n,
+            "amostra": 0 if self._linhas is None else len(self._linhas),
+            "estrato": coluna,
+            "estratos": dict(sorted(self.contagens.get(coluna, {}).items(), key=lambda kv: -kv[1])),
+        }
+
+
+# ---------------- Persistência ----------------
+def salvar_amostra(amostra, caminho):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    tmp = f"{caminho}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(amostra, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, caminho)
+
+
+def carregar_amostra(caminho):
+    """Carrega uma amostra salva por `salvar_amostra`; None se não existir."""
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "rb") as f:
+        return pickle.load(f)
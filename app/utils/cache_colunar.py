@@ -0,0 +1,147 @@
+# app/utils/cache_colunar.py
+"""
+Cache de DataFrames compartilhado entre os workers (gunicorn): cada
+documento "quente" é gravado uma vez como colunas .npy em disco e aberto
+com memory-map, então todos os processos leem as mesmas páginas do page
+cache do SO em vez de cada um recarregar e decodificar o documento.
+
+- Colunas numéricas, datas e booleanas são mapeadas sem cópia.
+- Colunas texto/objeto ficam codificadas em dicionário: os códigos (int32)
+  são mapeados e só os valores distintos são carregados por processo.
+
+Cada entrada fica em `<raiz>/<chave>/<versao>/`; pedir uma versão nova
+da mesma chave descarta as antigas (invalidação por versão) e o total em
+disco é limitado por LRU (a data de modificação da entrada marca o último
+uso, visível para todos os processos).
+"""
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# dtypes numpy que o np.save grava como bloco contíguo (mapeáveis)
+_MAPEAVEIS = "biufmM"
+# código dos None em colunas objeto (-1 é o NaN do Categorical)
+_NONE = -2
+
+
+# ---------------- Gravação/leitura ----------------
+def _mapeavel(serie):
+    return isinstance(serie.dtype, np.dtype) and serie.dtype.kind in _MAPEAVEIS
+
+
+def materializar(df, pasta):
+    """Grava `df` em `pasta` (colunas .npy + meta.json), de forma atômica."""
+    tmp = f"{pasta}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp)
+    colunas = []
+    for i, col in enumerate(df.columns):
+        serie = df[col]
+        if _mapeavel(serie):
+            np.save(os.path.join(tmp, f"{i}.npy"), serie.to_numpy())
+            colunas.append({"nome": col, "tipo": "valores", "dtype": str(serie.dtype)})
+            continue
+        codigos, distintos = pd.factorize(serie, use_na_sentinel=True)
+        codigos = codigos.astype(np.int32)
+        if serie.dtype == object:  # None e NaN viram o mesmo -1: None é marcado à parte
+            codigos[(codigos == -1) & (serie.to_numpy() == None)] = _NONE  # noqa: E711 (comparação elemento a elemento)
+        np.save(os.path.join(tmp, f"{i}.npy"), codigos)
+        np.save(os.path.join(tmp, f"{i}.distintos.npy"), np.asarray(distintos, dtype=object), allow_pickle=True)
+        colunas.append({"nome": col, "tipo": "dicionario", "dtype": str(serie.dtype)})
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"linhas": len(df), "colunas": colunas}, f, ensure_ascii=False)
+    try:
+        os.rename(tmp, pasta)
+    except OSError:  # outro processo gravou a mesma entrada antes
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def abrir(pasta):
+    """DataFrame da entrada, com as colunas mapeadas em memória (somente leitura)."""
+    with open(os.path.join(pasta, "meta.json")) as f:
+        meta = json.load(f)
+    dados = {}
+    for i, info in enumerate(meta["colunas"]):
+        # view como ndarray comum: continua apontando para o mapa, sem propagar a subclasse memmap
+        valores = np.load(os.path.join(pasta, f"{i}.npy"), mmap_mode="r").view(np.ndarray)
+        if info["tipo"] == "valores":
+            dados[info["nome"]] = pd.Series(valores, copy=False)
+            continue
+        distintos = np.load(os.path.join(pasta, f"{i}.distintos.npy"), allow_pickle=True)
+        nones = valores == _NONE
+        if nones.any():
+            valores = np.where(nones, -1, valores)
+        serie = pd.Series(pd.Categorical.from_codes(valores, distintos, validate=False))
+        try:
+            serie = serie.astype(info["dtype"])
+        except (TypeError, ValueError):
+            serie = serie.astype(object)
+        if nones.any():
+            serie[nones] = None
+        dados[info["nome"]] = serie
+    return pd.DataFrame(dados, index=pd.RangeIndex(meta["linhas"]), copy=False)
+
+
+# ---------------- Cache ----------------
+def _tamanho(pasta):
+    return sum(e.stat().st_size for e in os.scandir(pasta) if e.is_file())
+
+
+def despejar(raiz, limite_bytes, manter=None):
+    """Remove as entradas usadas há mais tempo até o total caber em `limite_bytes`."""
+    entradas = []
+    for chave in os.scandir(raiz) if os.path.isdir(raiz) else []:
+        for versao in os.scandir(chave.path) if chave.is_dir() else []:
+            if versao.is_dir() and not versao.name.endswith(".tmp"):
+                entradas.append((versao.stat().st_mtime, versao.path, _tamanho(versao.path)))
+    total = sum(t for _, _, t in entradas)
+    removidas = 0
+    for _, caminho, tamanho in sorted(entradas):
+        if total <= limite_bytes:
+            break
+        if caminho == manter:
+            continue
+        # processos com a entrada aberta seguem lendo: o arquivo só some quando o último mapa fecha
+        shutil.rmtree(caminho, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(caminho))  # chave sem nenhuma versão
+        except OSError:
+            pass
+        total -= tamanho
+        removidas += 1
+    return removidas
+
+
+def invalidar(raiz, chave):
+    shutil.rmtree(os.path.join(raiz, chave), ignore_errors=True)
+
+
+def obter(raiz, chave, versao, carregar, limite_bytes):
+    """
+    DataFrame de `chave` na `versao`: do cache (memory-map) ou, se não
+    houver, de `carregar()`, que é então gravado para os próximos pedidos.
+    Versões antigas da chave são apagadas; frames vazios não são guardados.
+    """
+    versao = str(versao)
+    pasta = os.path.join(raiz, chave, versao)
+    if os.path.exists(os.path.join(pasta, "meta.json")):
+        try:
+            os.utime(pasta)  # último uso, para o LRU
+            return abrir(pasta)
+        except FileNotFoundError:  # despejada por outro processo entre o exists e a leitura
+            pass
+
+    df = carregar()
+    if df is None or df.empty:
+        return df
+    for antiga in os.listdir(os.path.join(raiz, chave)) if os.path.isdir(os.path.join(raiz, chave)) else []:
+        if antiga != versao and not antiga.endswith(".tmp"):
+            shutil.rmtree(os.path.join(raiz, chave, antiga), ignore_errors=True)
+    os.makedirs(os.path.dirname(pasta), exist_ok=True)
+    materializar(df, pasta)
+    os.utime(pasta)
+    despejar(raiz, limite_bytes, manter=pasta)
+    return df
@@ -0,0 +1,268 @@
+# app/utils/deriva.py
+"""
+Deriva de esquema e de distribuição entre cargas sucessivas do mesmo
+feed (o arquivo que chega todo dia). Na ingestão, o perfil por sketches
+do documento vira uma assinatura compacta (JSON, alguns KB): hash do
+esquema e, por coluna, tipo, taxa de nulos, distintos e a distribuição —
+21 quantis (numéricas) ou as frações dos valores mais frequentes (texto).
+
+A comparação usa só as assinaturas, nunca os registros: PSI (population
+stability index) de cada coluna contra cada documento anterior, calculado
+de uma vez para todo o histórico, e contra uma referência (mediana dos
+quantis / média das frações do histórico), que pega derivas lentas que
+nenhuma comparação dia a dia acusa.
+"""
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+VERSAO = 1
+QUANTIS = tuple(i / 20 for i in range(21))
+# bordas das faixas do PSI: decis da carga atual
+_DECIS = slice(2, 19, 2)
+PSI_MODERADO = 0.1
+PSI_ALTO = 0.25
+LIMIAR_NULOS = 0.05
+LIMIAR_LINHAS = 2.0  # carga com mais que o dobro ou menos que a metade das linhas da anterior
+_EPS = 1e-4
+HISTORICO_PADRAO = 30
+HISTORICO_MAXIMO = 1000
+
+
+# ---------------- Assinatura ----------------
+def chave_feed(nome) -> str:
+    """Nome do documento sem extensão, datas e números: "vendas_2024-05-01.csv" → "vendas_#-#-#"."""
+    base = os.path.splitext(os.path.basename(nome or ""))[0].lower().strip()
+    return re.sub(r"\d+", "#", base)[:200]
+
+
+def hash_esquema(colunas) -> str:
+    """Hash de [(coluna, dtype), ...] na ordem do documento."""
+    return hashlib.sha1(json.dumps([[str(c), str(t)] for c, t in colunas]).encode()).hexdigest()[:16]
+
+
+def assinatura(perfil) -> dict:
+    """Assinatura serializável em JSON a partir de um `PerfilSketch` (utils.sketches)."""
+    colunas = {}
+    for nome, sk in perfil.colunas.items():
+        preenchidos = sk.total - sk.nulos
+        c = {"dtype": sk.dtype, "nulos": sk.nulos / sk.total if sk.total else 0.0, "distintos": sk.hll.estimativa()}
+        if sk.momentos.n:
+            quantis = np.asarray(sk.kll.quantis(QUANTIS), dtype=float)
+            quantis[0], quantis[-1] = sk.momentos.minimo, sk.momentos.maximo
+            c.update(
+                tipo="numero", quantis=np.maximum.accumulate(quantis).tolist(),
+                media=sk.momentos.media, desvio=sk.momentos.desvio,
+            )
+        elif preenchidos and sk.cms.candidatos:
+            c.update(tipo="texto", frequentes={str(v): n / preenchidos for v, n in sk.cms.frequentes()})
+        else:
+            c["tipo"] = "vazia"
+        colunas[str(nome)] = c
+    return {
+        "versao": VERSAO,
+        "linhas": perfil.linhas,
+        "esquema": hash_esquema((n, sk.dtype) for n, sk in perfil.colunas.items()),
+        "colunas": colunas,
+    }
+
+
+def parametros_consulta(contra=None, limite=None):
+    """Valida `contra` ("3,5,8": ids a comparar) e `limite` (documentos do histórico); retorna (ids, limite)."""
+    ids = None
+    if contra:
+        try:
+            ids = [int(i) for i in str(contra).split(",") if i.strip()]
+        except ValueError:
+            raise ValueError("'contra' deve ser uma lista de ids separados por vírgula.") from None
+    try:
+        limite = HISTORICO_PADRAO if limite in (None, "") else int(limite)
+    except (TypeError, ValueError):
+        limite = 0
+    if not 1 <= limite <= HISTORICO_MAXIMO:
+        raise ValueError(f"'limite' deve ser um inteiro entre 1 e {HISTORICO_MAXIMO}.")
+    return ids, limite
+
+
+# ---------------- PSI ----------------
+def _psi(esperado, observado):
+    """PSI linha a linha entre matrizes de massas (faixas nas colunas)."""
+    a = np.clip(esperado, _EPS, None)
+    b = np.clip(observado, _EPS, None)
+    return ((b - a) * np.log(b / a)).sum(axis=-1)
+
+
+def _cdf(quantis, x):
+    """
+    CDF aproximada de cada linha de `quantis` (H × 21, nos níveis QUANTIS)
+    nos pontos `x`, interpolando entre quantis distintos; H × len(x).
+    """
+    p = np.asarray(QUANTIS)
+    k = len(p)
+    contagem = (quantis[:, :, None] <= x[None, None, :]).sum(axis=1)
+    baixo, alto = np.clip(contagem - 1, 0, k - 1), np.clip(contagem, 0, k - 1)
+    q_baixo = np.take_along_axis(quantis, baixo, axis=1)
+    q_alto = np.take_along_axis(quantis, alto, axis=1)
+    largura = q_alto - q_baixo
+    fracao = np.divide(x[None, :] - q_baixo, largura, out=np.zeros_like(largura), where=largura > 0)
+    cdf = p[baixo] + (p[alto] - p[baixo]) * fracao
+    return np.where(contagem == 0, 0.0, np.where(contagem >= k, 1.0, cdf))
+
+
+def _massas_numericas(quantis, bordas):
+    cdf = _cdf(quantis, bordas)
+    zeros, uns = np.zeros((len(quantis), 1)), np.ones((len(quantis), 1))
+    return np.diff(np.hstack([zeros, cdf, uns]), axis=1)
+
+
+def psi_numerico(atual, historico):
+    """
+    PSI da coluna numérica atual (21 quantis) contra cada linha de
+    `historico` (H × 21) e contra a referência (mediana dos quantis).
+    Retorna (psi por linha, psi da referência).
+    """
+    atual = np.asarray(atual, dtype=float)[None, :]
+    bordas = np.unique(atual[0, _DECIS])
+    massas = _massas_numericas(np.vstack([historico, np.median(historico, axis=0)]), bordas)
+    psi = _psi(massas, _massas_numericas(atual, bordas))
+    return psi[:-1], float(psi[-1])
+
+
+def _massas_texto(frequentes, categorias):
+    massas = np.zeros((len(frequentes), len(categorias) + 1))
+    indice = {c: i for i, c in enumerate(categorias)}
+    for linha, freq in enumerate(frequentes):
+        for valor, fracao in freq.items():
+            if valor in indice:
+                massas[linha, indice[valor]] = fracao
+    massas[:, -1] = np.clip(1 - massas[:, :-1].sum(axis=1), 0, None)  # demais valores
+    return massas
+
+
+def psi_texto(atual, historico):
+    """
+    PSI da coluna texto pelas frações dos valores frequentes (e "demais")
+    contra cada dict de `historico` e contra a referência (frações médias).
+    Retorna (psi por linha, psi da referência).
+    """
+    categorias = list(dict.fromkeys([*atual, *(v for freq in historico for v in freq)]))
+    massas = _massas_texto(historico, categorias)
+    psi = _psi(np.vstack([massas, massas.mean(axis=0)]), _massas_texto([atual], categorias))
+    return psi[:-1], float(psi[-1])
+
+
+def _severidade(psi):
+    if psi is None or not np.isfinite(psi):
+        return None
+    return "alta" if psi >= PSI_ALTO else "moderada" if psi >= PSI_MODERADO else None
+
+
+# ---------------- Comparação ----------------
+def _familia(coluna):
+    return "numero" if coluna["tipo"] == "numero" else "texto" if coluna["tipo"] == "texto" else None
+
+
+def comparar(atual, anteriores) -> dict:
+    """
+    Compara a assinatura `atual` com as `anteriores`: lista de (meta,
+    assinatura), da mais recente para a mais antiga; `meta` (id, nome,
+    data...) volta como está no histórico. Esquema e nulos são comparados
+    com a anterior imediata; distribuições com cada anterior e com a
+    referência do histórico.
+    """
+    alertas, colunas = [], {}
+    historico = [{**meta, "linhas": a["linhas"], "esquema_igual": a["esquema"] == atual["esquema"]} for meta, a in anteriores]
+    if not anteriores:
+        return {"comparados": 0, "deriva": False, "esquema": None, "colunas": {}, "historico": [], "alertas": []}
+
+    anterior = anteriores[0][1]
+    novas = [c for c in atual["colunas"] if c not in anterior["colunas"]]
+    removidas = [c for c in anterior["colunas"] if c not in atual["colunas"]]
+    tipos = [
+        {"coluna": c, "antes": anterior["colunas"][c]["dtype"], "depois": atual["colunas"][c]["dtype"]}
+        for c in atual["colunas"] if c in anterior["colunas"] and anterior["colunas"][c]["dtype"] != atual["colunas"][c]["dtype"]
+    ]
+    comuns = [c for c in atual["colunas"] if c in anterior["colunas"]]
+    esquema = {
+        "igual": atual["esquema"] == anterior["esquema"],
+        "novas": novas,
+        "removidas": removidas,
+        "tipos": tipos,
+        "ordem_alterada": comuns != [c for c in anterior["colunas"] if c in atual["colunas"]],
+    }
+    for c in removidas:
+        alertas.append({"tipo": "coluna_removida", "coluna": c, "severidade": "alta", "mensagem": f"Coluna '{c}' sumiu."})
+    for c in novas:
+        alertas.append({"tipo": "coluna_nova", "coluna": c, "severidade": "moderada", "mensagem": f"Coluna nova: '{c}'."})
+    for t in tipos:
+        mudou_familia = _familia(anterior["colunas"][t["coluna"]]) != _familia(atual["colunas"][t["coluna"]])
+        alertas.append({
+            "tipo": "tipo_alterado", "coluna": t["coluna"], "severidade": "alta" if mudou_familia else "moderada",
+            "mensagem": f"Coluna '{t['coluna']}' mudou de {t['antes']} para {t['depois']}.",
+        })
+
+    linhas_anterior = anterior["linhas"] or 0
+    if linhas_anterior and not 1 / LIMIAR_LINHAS <= atual["linhas"] / linhas_anterior <= LIMIAR_LINHAS:
+        alertas.append({
+            "tipo": "linhas", "coluna": None, "severidade": "moderada",
+            "mensagem": f"{atual['linhas']} linhas contra {linhas_anterior} na carga anterior.",
+        })
+
+    # PSI de cada coluna contra todo o histórico de uma vez (NaN onde a coluna não existia ou mudou de tipo)
+    psi_historico = np.full((len(anteriores), len(atual["colunas"])), np.nan)
+    for j, (nome, coluna) in enumerate(atual["colunas"].items()):
+        familia = _familia(coluna)
+        linhas = [i for i, (_, a) in enumerate(anteriores) if nome in a["colunas"] and _familia(a["colunas"][nome]) == familia]
+        info = {"tipo": coluna["tipo"], "nulos": coluna["nulos"], "psi_anterior": None, "psi_referencia": None}
+        if familia and linhas:
+            if familia == "numero":
+                matriz = np.array([anteriores[i][1]["colunas"][nome]["quantis"] for i in linhas], dtype=float)
+                psi, info["psi_referencia"] = psi_numerico(coluna["quantis"], matriz)
+            else:
+                freqs = [anteriores[i][1]["colunas"][nome]["frequentes"] for i in linhas]
+                psi, info["psi_referencia"] = psi_texto(coluna["frequentes"], freqs)
+            psi_historico[linhas, j] = psi
+            if linhas[0] == 0:
+                info["psi_anterior"] = float(psi[0])
+        if nome in anterior["colunas"]:
+            info["nulos_anterior"] = anterior["colunas"][nome]["nulos"]
+            if abs(coluna["nulos"] - info["nulos_anterior"]) >= LIMIAR_NULOS:
+                alertas.append({
+                    "tipo": "nulos", "coluna": nome, "severidade": "moderada",
+                    "mensagem": f"Nulos em '{nome}': {info['nulos_anterior']:.1%} → {coluna['nulos']:.1%}.",
+                })
+
+        for chave, contra in (("psi_anterior", "à carga anterior"), ("psi_referencia", "ao histórico")):
+            severidade = _severidade(info[chave])
+            if severidade:
+                alertas.append({
+                    "tipo": "distribuicao", "coluna": nome, "severidade": severidade,
+                    "mensagem": f"Distribuição de '{nome}' mudou em relação {contra} (PSI {info[chave]:.2f}).",
+                })
+        info["severidade"] = max(
+            (_severidade(info[k]) or "" for k in ("psi_anterior", "psi_referencia")), key=("", "moderada", "alta").index
+        ) or None
+        colunas[nome] = info
+
+    nomes = list(atual["colunas"])
+    finitos = np.isfinite(psi_historico)
+    maior = np.where(finitos, psi_historico, -np.inf).argmax(axis=1) if nomes else np.zeros(len(historico), dtype=int)
+    com_deriva = (np.where(finitos, psi_historico, 0) >= PSI_MODERADO).sum(axis=1)
+    for i, item in enumerate(historico):
+        if finitos[i].any():
+            j = int(maior[i])
+            item.update(psi_max=float(psi_historico[i, j]), coluna_psi_max=nomes[j], colunas_com_deriva=int(com_deriva[i]))
+        else:
+            item.update(psi_max=None, coluna_psi_max=None, colunas_com_deriva=0)
+
+    return {
+        "comparados": len(anteriores),
+        "deriva": bool(alertas),
+        "esquema": esquema,
+        "colunas": colunas,
+        "historico": historico,
+        "alertas": sorted(alertas, key=lambda a: a["severidade"] != "alta"),
+    }
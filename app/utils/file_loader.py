@@ -1,5 +1,6 @@
 # app/utils/file_loader.py
 import os
+import json
 import zipfile
 import tempfile
 import pandas as pd
@@ -35,9 +36,11 @@ def load_dataframe(file_input):
                     if lower_name.endswith(".csv") or lower_name.endswith("sociocsv"):
                         frames.append(pd.read_csv(z.open(name), sep=";", encoding="latin1", low_memory=False))
                     elif lower_name.endswith((".xls", ".xlsx")):
-                        frames.append(pd.read_excel(z.open(name)))
+                        with z.open(name) as membro:
+                            frames.append(_concatenar(iter_excel_chunks(membro, nome=lower_name)))
                     elif lower_name.endswith(".json"):
-                        frames.append(pd.read_json(z.open(name)))
+                        with z.open(name) as membro:
+                            frames.append(_ler_json(membro))
 
         if not frames:
             raise ValueError(f"Nenhum arquivo legível encontrado no ZIP. Conteúdo: {namelist}")
@@ -48,12 +51,202 @@ def load_dataframe(file_input):
     if fname.endswith(".csv") or fname.endswith("sociocsv"):
         return pd.read_csv(file_input, sep=";", encoding="latin1", low_memory=False)
 
-    # Excel
+    # Excel (todas as planilhas)
     if fname.endswith((".xls", ".xlsx")):
-        return pd.read_excel(file_input)
+        return _concatenar(iter_excel_chunks(file_input, nome=fname))
 
-    # JSON
+    # JSON (array/objeto ou JSON Lines)
     if fname.endswith(".json"):
-        return pd.read_json(file_input)
+        return _ler_json(file_input)
 
     raise ValueError("Formato de arquivo não suportado.")
+
+
+def _concatenar(chunks):
+    frames = list(chunks)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# ---------------- JSON ----------------
+def _espiar(fonte, n=1 << 16):
+    """Primeiros `n` bytes de um caminho ou arquivo aberto, sem consumir o arquivo."""
+    if isinstance(fonte, (str, os.PathLike)):
+        with open(fonte, "rb") as f:
+            return f.read(n)
+    posicao = fonte.tell()
+    dados = fonte.read(n)
+    fonte.seek(posicao)
+    return dados
+
+
+def json_em_linhas(fonte):
+    """True se o arquivo é JSON Lines (um objeto por linha), o único JSON que o pandas lê em chunks."""
+    inicio = _espiar(fonte).lstrip()
+    if not inicio.startswith(b"{"):
+        return False
+    primeira = inicio.split(b"\n", 1)[0]
+    try:
+        return isinstance(json.loads(primeira), dict)
+    except ValueError:
+        return False
+
+
+def _ler_json(fonte):
+    return pd.read_json(fonte, lines=json_em_linhas(fonte))
+
+
+def iter_json_chunks(fonte, chunksize):
+    """
+    JSON Lines em chunks de até `chunksize` linhas. Array/objeto JSON não
+    tem leitura incremental no pandas: é lido inteiro e fatiado (o
+    orçamento de memória recusa antes os que não cabem, ver utils.memoria).
+    """
+    if not json_em_linhas(fonte):
+        yield from fatiar_dataframe(pd.read_json(fonte), chunksize)
+        return
+    with pd.read_json(fonte, lines=True, chunksize=chunksize) as leitor:
+        yield from leitor
+
+
+# ---------------- Excel ----------------
+def _nomes_colunas(cabecalho):
+    """Cabeçalho como o pd.read_excel: vazios viram 'Unnamed: i' e repetidos ganham sufixo '.n'."""
+    cabecalho = list(cabecalho)
+    while cabecalho and cabecalho[-1] is None:
+        cabecalho.pop()
+    nomes, vistos = [], {}
+    for i, valor in enumerate(cabecalho):
+        nome = f"Unnamed: {i}" if valor is None else valor
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        vistos.setdefault(nome, 0)
+        nomes.append(nome)
+    return nomes
+
+
+def _frame_planilha(linhas, colunas, planilha):
+    largura = len(colunas)
+    df = pd.DataFrame([linha[:largura] for linha in linhas], columns=colunas)
+    # Como o leitor do pandas: números inteiros gravados como float (1.0) voltam como int
+    for c in df.columns[df.dtypes == "float64"]:
+        col = df[c]
+        if col.notna().all() and (col == col.round()).all() and len(col):
+            df[c] = col.astype("int64")
+    df.attrs["planilha"] = planilha
+    return df
+
+
+def iter_excel_chunks(fonte, chunksize=100_000, nome=None):
+    """
+    Lê todas as planilhas de um Excel em DataFrames de até `chunksize` linhas,
+    cada um com df.attrs["planilha"]. .xlsx usa o openpyxl em modo read_only
+    (linhas lidas em streaming, sem montar o workbook); .xls (formato antigo)
+    cai no pd.read_excel.
+    """
+    nome = (nome or str(fonte)).lower()
+    if nome.endswith(".xls"):
+        for planilha, df in pd.read_excel(fonte, sheet_name=None).items():
+            for chunk in fatiar_dataframe(df, chunksize):
+                chunk.attrs["planilha"] = planilha
+                yield chunk
+        return
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fonte, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            linhas = ws.iter_rows(values_only=True)
+            cabecalho = next(linhas, None)
+            if cabecalho is None:
+                continue
+            colunas = _nomes_colunas(cabecalho)
+            lote, emitidos = [], 0
+            for linha in linhas:
+                if all(v is None for v in linha):
+                    continue
+                lote.append(linha)
+                if len(lote) >= chunksize:
+                    yield _frame_planilha(lote, colunas, ws.title)
+                    emitidos += 1
+                    lote = []
+            if lote or not emitidos:
+                yield _frame_planilha(lote, colunas, ws.title)
+    finally:
+        wb.close()
+
+
+def contar_linhas_excel(fonte):
+    """Linhas de dados de um .xlsx pela dimensão declarada das planilhas (None se ausente)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(fonte, read_only=True)
+    try:
+        total = 0
+        for ws in wb.worksheets:
+            if ws.max_row is None:
+                return None
+            total += max(ws.max_row - 1, 0)
+        return total
+    finally:
+        wb.close()
+
+
+def fatiar_dataframe(df, chunksize=100_000):
+    """Gera fatias de até `chunksize` linhas de um DataFrame já carregado."""
+    for inicio in range(0, len(df), chunksize):
+        yield df.iloc[inicio:inicio + chunksize]
+
+
+def _iter_conteudo(nome, fonte, chunksize):
+    lower_name = nome.lower()
+    if lower_name.endswith(".csv") or lower_name.endswith("sociocsv"):
+        yield from pd.read_csv(fonte, sep=";", encoding="latin1", low_memory=False, chunksize=chunksize)
+    elif lower_name.endswith((".xls", ".xlsx")):
+        yield from iter_excel_chunks(fonte, chunksize, nome=lower_name)
+    elif lower_name.endswith(".json"):
+        yield from iter_json_chunks(fonte, chunksize)
+    else:
+        raise ValueError("Formato de arquivo não suportado.")
+
+
+def iter_dataframe_chunks(file_input, chunksize=100_000):
+    """
+    Versão em chunks do `load_dataframe`: gera DataFrames de até `chunksize` linhas.
+    CSV/sociocsv e .xlsx são lidos em streaming; ZIPs são percorridos membro
+    a membro. Chunks de Excel trazem df.attrs["planilha"] (prefixada pelo
+    membro, em ZIPs).
+    """
+    if hasattr(file_input, "filename"):
+        fname = file_input.filename.lower()
+    else:
+        fname = str(file_input).lower()
+
+    if not fname.endswith(".zip"):
+        yield from _iter_conteudo(fname, file_input, chunksize)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if hasattr(file_input, "save"):
+            path = os.path.join(tmpdir, os.path.basename(file_input.filename))
+            file_input.save(path)
+        else:
+            path = file_input
+
+        lidos = 0
+        with zipfile.ZipFile(path, "r") as z:
+            namelist = z.namelist()
+            for name in namelist:
+                lower_name = name.lower()
+                if not lower_name.endswith((".csv", "sociocsv", ".xls", ".xlsx", ".json")):
+                    continue
+                with z.open(name) as membro:
+                    for chunk in _iter_conteudo(lower_name, membro, chunksize):
+                        if "planilha" in chunk.attrs:
+                            chunk.attrs["planilha"] = f"{name}/{chunk.attrs['planilha']}"
+                        lidos += 1
+                        yield chunk
+
+        if not lidos:
+            raise ValueError(f"Nenhum arquivo legível encontrado no ZIP. Conteúdo: {namelist}")
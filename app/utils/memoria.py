@@ -0,0 +1,198 @@
+# app/utils/memoria.py
+"""
+Orçamento de memória: estima o tamanho em memória de um arquivo ou
+documento antes de carregá-lo e decide entre o caminho em memória e o
+caminho em chunks (streaming). Quando nem o streaming cabe, levanta
+OrcamentoExcedido com uma mensagem clara em vez de deixar o worker morrer.
+"""
+import io
+import os
+import zipfile
+
+import pandas as pd
+from flask import current_app, has_request_context
+
+AMOSTRA_BYTES = 1 << 20
+AMOSTRA_REGISTROS = 1_000
+CHUNK_MINIMO = 1_000
+
+# Pico de memória / tamanho do DataFrame, medidos com benchmarks.datasets
+# (tracemalloc, 5k e 20k linhas): a ingestão mantém registros dict e objetos
+# ORM; a limpeza faz cópias de coerção, imputação e o relatório.
+FATORES = {"ingest": 18, "regras": 28, "knn": 28}
+# KNNImputer: distâncias entre as linhas e as de ajuste, ~4 bytes por par
+# (medido de 5k a 30k linhas), calculadas em blocos de até `working_memory`
+# do sklearn; o pico das distâncias fica em ~2,1x esse bloco (medido com
+# working_memory de 128 e 1024 MB, 10k a 50k linhas).
+BYTES_POR_PAR_KNN = 4
+FATOR_BLOCO_KNN = 2.2
+# fração do orçamento para os blocos de distâncias do knn, entre os limites
+FRACAO_BLOCO_KNN = 0.25
+BLOCO_KNN_MB = (32, 1024)
+
+# Razão memória/arquivo para formatos sem amostragem barata
+RAZAO_EXCEL = 2.5
+RAZAO_JSON = 1.3
+
+
+class OrcamentoExcedido(ValueError):
+    """A operação não cabe no orçamento de memória nem em modo streaming."""
+
+
+def orcamento_bytes():
+    """Orçamento da requisição (MEMORY_BUDGET_MB) ou do job (JOB_MEMORY_BUDGET_MB)."""
+    chave = "MEMORY_BUDGET_MB" if has_request_context() else "JOB_MEMORY_BUDGET_MB"
+    return current_app.config[chave] * 1024 * 1024
+
+
+def _mb(n):
+    return f"{n / (1024 * 1024):.0f} MB"
+
+
+# ---------------- Estimativas ----------------
+def _amostrar_csv(fonte):
+    """Bytes por linha no disco e em memória, a partir do primeiro 1 MB."""
+    amostra = fonte.read(AMOSTRA_BYTES)
+    if len(amostra) == AMOSTRA_BYTES:
+        amostra = amostra[:amostra.rfind(b"\n") + 1] or amostra
+    df = pd.read_csv(io.BytesIO(amostra), sep=";", encoding="latin1", low_memory=False)
+    if df.empty:
+        return len(amostra) or 1, 0
+    return len(amostra) / len(df), df.memory_usage(deep=True).sum() / len(df)
+
+
+def _amostrar_json_linhas(fonte):
+    """Como `_amostrar_csv`, para JSON Lines."""
+    amostra = fonte.read(AMOSTRA_BYTES)
+    if len(amostra) == AMOSTRA_BYTES:
+        amostra = amostra[:amostra.rfind(b"\n") + 1] or amostra
+    df = pd.read_json(io.BytesIO(amostra), lines=True)
+    if df.empty:
+        return len(amostra) or 1, 0
+    return len(amostra) / len(df), df.memory_usage(deep=True).sum() / len(df)
+
+
+def _estimar_conteudo(nome, abrir, tamanho):
+    """(linhas, bytes em memória, motivo se o conteúdo só puder ser lido inteiro)."""
+    nome = nome.lower()
+    if nome.endswith(".csv") or nome.endswith("sociocsv"):
+        with abrir() as fonte:
+            disco, memoria = _amostrar_csv(fonte)
+        linhas = tamanho / disco
+        return linhas, linhas * memoria, None
+    if nome.endswith(".xlsx"):
+        # A dimensão declarada das planilhas dá as linhas sem ler as células
+        from .file_loader import contar_linhas_excel
+
+        with abrir() as fonte:
+            return contar_linhas_excel(fonte), tamanho * RAZAO_EXCEL, None
+    if nome.endswith(".xls"):
+        return None, tamanho * RAZAO_EXCEL, None
+    if nome.endswith(".json"):
+        from .file_loader import json_em_linhas
+
+        with abrir() as fonte:
+            if json_em_linhas(fonte):
+                disco, memoria = _amostrar_json_linhas(fonte)
+                linhas = tamanho / disco
+                return linhas, linhas * memoria, None
+        return None, tamanho * RAZAO_JSON, f"'{os.path.basename(nome)}' (JSON em array/objeto)"
+    return 0, 0, None
+
+
+def estimar_arquivo(caminho):
+    """
+    Estima {"linhas", "bytes", "bytes_por_linha", "inteiro"} do DataFrame
+    que o arquivo geraria. CSV e JSON Lines são amostrados; Excel e JSON em
+    array usam razões fixas (linhas do .xlsx pela dimensão das planilhas);
+    ZIPs somam os membros pelo tamanho descompactado. "inteiro" aponta o
+    conteúdo sem leitura em chunks (JSON em array), se houver.
+    """
+    inteiro = None
+    if caminho.lower().endswith(".zip"):
+        linhas, total = 0, 0
+        with zipfile.ZipFile(caminho) as z:
+            for info in z.infolist():
+                n, b, motivo = _estimar_conteudo(info.filename, lambda: z.open(info), info.file_size)
+                linhas = None if n is None or linhas is None else linhas + n
+                total += b
+                inteiro = inteiro or motivo
+    else:
+        linhas, total, inteiro = _estimar_conteudo(caminho, lambda: open(caminho, "rb"), os.path.getsize(caminho))
+
+    bytes_por_linha = total / linhas if linhas else None
+    return {
+        "linhas": int(linhas) if linhas is not None else None, "bytes": int(total),
+        "bytes_por_linha": bytes_por_linha, "inteiro": inteiro,
+    }
+
+
+def estimar_documento(doc, modelo):
+    """Estima o DataFrame dos registros (`modelo`) do documento a partir de uma amostra."""
+    from .registros import carregar_registros
+
+    df = carregar_registros(modelo, doc.id, limite=AMOSTRA_REGISTROS)
+    linhas = doc.linhas or 0
+    if df.empty or not linhas:
+        return {"linhas": linhas, "bytes": 0, "bytes_por_linha": None}
+    bytes_por_linha = df.memory_usage(deep=True).sum() / len(df)
+    return {"linhas": linhas, "bytes": int(bytes_por_linha * linhas), "bytes_por_linha": bytes_por_linha}
+
+
+def bloco_knn_mb(orcamento):
+    """`working_memory` do sklearn para o knn: uma fração do orçamento, dentro de BLOCO_KNN_MB."""
+    minimo, maximo = BLOCO_KNN_MB
+    return int(min(max(orcamento * FRACAO_BLOCO_KNN / (1024 * 1024), minimo), maximo))
+
+
+def pico_estimado(estimativa, operacao, orcamento=None):
+    pico = estimativa["bytes"] * FATORES[operacao]
+    if operacao == "knn" and estimativa.get("linhas"):
+        linhas = estimativa["linhas"]
+        ajuste = min(linhas, current_app.config.get("MODEL_SAMPLE_ROWS") or linhas)  # modelos ajustados na amostra
+        bloco = FATOR_BLOCO_KNN * bloco_knn_mb(orcamento or orcamento_bytes()) * 1024 * 1024
+        pico += min(BYTES_POR_PAR_KNN * linhas * ajuste, bloco)
+    return pico
+
+
+def reserva_bytes(estimativa, operacao, job=False):
+    """Memória a reservar no agendador: o pico estimado, limitado ao orçamento (acima dele a operação vai em chunks)."""
+    orcamento = current_app.config["JOB_MEMORY_BUDGET_MB" if job else "MEMORY_BUDGET_MB"] * 1024 * 1024
+    return int(min(pico_estimado(estimativa, operacao, orcamento), orcamento))
+
+
+# ---------------- Decisão ----------------
+def planejar(estimativa, operacao, chunk_rows, streaming=True):
+    """
+    Retorna ("memoria", None) se o pico estimado cabe no orçamento, ou
+    ("streaming", linhas_por_chunk) reduzindo o chunk até caber. Levanta
+    OrcamentoExcedido se não houver caminho possível.
+    """
+    orcamento = orcamento_bytes()
+    pico = pico_estimado(estimativa, operacao, orcamento)
+    if pico <= orcamento:
+        return "memoria", None
+
+    if not streaming:
+        raise OrcamentoExcedido(
+            f"Operação '{operacao}' precisaria de ~{_mb(pico)} de memória, acima do orçamento de "
+            f"{_mb(orcamento)}, e não tem modo em chunks."
+        )
+    if estimativa.get("inteiro"):
+        raise OrcamentoExcedido(
+            f"O arquivo precisaria de ~{_mb(pico)} de memória, acima do orçamento de {_mb(orcamento)}, e "
+            f"{estimativa['inteiro']} só pode ser lido inteiro. Envie como JSON Lines (um objeto por linha) ou CSV."
+        )
+
+    bytes_por_linha = estimativa.get("bytes_por_linha")
+    if not bytes_por_linha:
+        # Sem amostra por linha (Excel/JSON): usa o tamanho total em memória por chunk padrão
+        return "streaming", chunk_rows
+
+    cabe = int(orcamento / (bytes_por_linha * FATORES[operacao]))
+    if cabe < CHUNK_MINIMO:
+        raise OrcamentoExcedido(
+            f"Nem em modo streaming a operação '{operacao}' cabe no orçamento de {_mb(orcamento)} "
+            f"(~{bytes_por_linha:.0f} bytes por linha). Aumente MEMORY_BUDGET_MB/JOB_MEMORY_BUDGET_MB."
+        )
+    return "streaming", min(chunk_rows, cabe)
@@ -0,0 +1,269 @@
+# app/utils/metrics.py
+import hmac
+import os
+import sys
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_app_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class _Registro:
+    """Acumula métricas do processo (somas, contagens e máximos) com trava."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.somas = defaultdict(float)
+        self.contagens = defaultdict(int)
+        self.maximos = {}
+
+    def observar(self, nome, valor, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self.somas[chave] += valor
+            self.contagens[chave] += 1
+
+    def maximo(self, nome, valor, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            if valor > self.maximos.get(chave, float("-inf")):
+                self.maximos[chave] = valor
+
+    def definir(self, nome, valor, **labels):
+        """Gauge com o último valor observado (os máximos também são exportados como gauge)."""
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self.maximos[chave] = valor
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.somas), dict(self.contagens), dict(self.maximos)
+
+
+registro = _Registro()
+
+_DESCRICOES = {
+    "neodata_request_duration_seconds": ("summary", "Duração das requisições por endpoint."),
+    "neodata_stage_duration_seconds": ("summary", "Duração das etapas instrumentadas."),
+    "neodata_db_query_duration_seconds": ("summary", "Tempo gasto em queries SQL por endpoint."),
+    "neodata_db_queries_total": ("counter", "Quantidade de queries SQL por endpoint."),
+    "neodata_process_rss_bytes": ("gauge", "RSS atual do processo (amostrado no scrape)."),
+    "neodata_process_peak_rss_bytes": ("gauge", "Pico de RSS do processo desde o início."),
+    "neodata_scheduler_wait_seconds": ("summary", "Espera na fila do agendador de operações pesadas."),
+    "neodata_scheduler_rejected_total": ("counter", "Operações pesadas recusadas (fila cheia ou espera longa)."),
+}
+
+
+# ---------------- Etapas ----------------
+@contextmanager
+def etapa(nome):
+    """Cronometra um trecho de código e registra como etapa `nome`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        registro.observar("neodata_stage_duration_seconds", duracao, stage=nome)
+        metricas = _metricas_da_requisicao()
+        if metricas is not None:
+            metricas["etapas"][nome] = metricas["etapas"].get(nome, 0.0) + duracao
+
+
+def tempos_da_requisicao():
+    """Cópia das durações de etapa acumuladas na requisição atual (s)."""
+    metricas = _metricas_da_requisicao()
+    return dict(metricas["etapas"]) if metricas else {}
+
+
+def _metricas_da_requisicao():
+    if has_app_context():
+        return g.get("_metricas")
+    return None
+
+
+def _novas_metricas():
+    return {
+        "inicio": time.perf_counter(),
+        "etapas": {},
+        "queries": 0,
+        "tempo_queries": 0.0,
+    }
+
+
+@contextmanager
+def coletar_metricas():
+    """Acumula etapas e queries fora de uma requisição (ex.: jobs em background)."""
+    anteriores = g.get("_metricas")
+    g._metricas = metricas = _novas_metricas()
+    try:
+        yield metricas
+    finally:
+        g._metricas = anteriores
+
+
+# ---------------- Memória ----------------
+# RSS é do processo inteiro: com workers em threads não há pico por requisição,
+# então só exportamos os valores do processo (rotulados pelo pid).
+def _status_kb(campo):
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith(campo):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes():
+    """RSS atual do processo (Linux); None onde /proc não existe."""
+    return _status_kb("VmRSS:")
+
+
+def pico_rss_bytes():
+    """Pico de RSS do processo: VmHWM no Linux, getrusage nos demais."""
+    pico = _status_kb("VmHWM:")
+    if pico is not None:
+        return pico
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+# ---------------- SQLAlchemy ----------------
+_hooks_registrados = False
+
+
+def _registrar_hooks_sql():
+    global _hooks_registrados
+    if _hooks_registrados:
+        return
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_neodata_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("_neodata_inicio")
+        if not inicios:
+            return
+        duracao = time.perf_counter() - inicios.pop()
+        metricas = _metricas_da_requisicao()
+        if metricas is not None:
+            metricas["queries"] += 1
+            metricas["tempo_queries"] += duracao
+
+    _hooks_registrados = True
+
+
+# ---------------- Exportação ----------------
+def _formatar_labels(labels):
+    if not labels:
+        return ""
+    pares = []
+    for k, v in labels:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{k}="{v}"')
+    return "{" + ",".join(pares) + "}"
+
+
+def _amostrar_processo():
+    pid = os.getpid()
+    for nome, valor in (
+        ("neodata_process_rss_bytes", rss_bytes()),
+        ("neodata_process_peak_rss_bytes", pico_rss_bytes()),
+    ):
+        if valor is not None:
+            registro.definir(nome, valor, pid=pid)
+
+
+def exportar_prometheus():
+    """Serializa o registro no formato texto do Prometheus."""
+    _amostrar_processo()
+    somas, contagens, maximos = registro.snapshot()
+    linhas = []
+    for nome, (tipo, descricao) in _DESCRICOES.items():
+        linhas.append(f"# HELP {nome} {descricao}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        if tipo == "summary":
+            for (n, labels), soma in sorted(somas.items()):
+                if n == nome:
+                    lbl = _formatar_labels(labels)
+                    linhas.append(f"{nome}_sum{lbl} {soma:.6f}")
+                    linhas.append(f"{nome}_count{lbl} {contagens[(n, labels)]}")
+        elif tipo == "counter":
+            for (n, labels), soma in sorted(somas.items()):
+                if n == nome:
+                    linhas.append(f"{nome}{_formatar_labels(labels)} {int(soma)}")
+        else:
+            for (n, labels), valor in sorted(maximos.items()):
+                if n == nome:
+                    linhas.append(f"{nome}{_formatar_labels(labels)} {valor:.0f}")
+    return "\n".join(linhas) + "\n"
+
+
+def _server_timing(metricas, total):
+    partes = []
+    for nome, duracao in metricas["etapas"].items():
+        partes.append(f"{nome};dur={duracao * 1000:.1f}")
+    partes.append(f'db;dur={metricas["tempo_queries"] * 1000:.1f};desc="{metricas["queries"]} queries"')
+    partes.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(partes)
+
+
+# ---------------- Integração com o app ----------------
+def init_metrics(app):
+    """Registra hooks de requisição, eventos SQL e o endpoint /metrics."""
+    app.config.setdefault("SERVER_TIMING", os.environ.get("SERVER_TIMING", "0") == "1")
+    app.config.setdefault("METRICS_TOKEN", os.environ.get("METRICS_TOKEN"))
+    app.config.setdefault("METRICS_PUBLIC", os.environ.get("METRICS_PUBLIC", "0") == "1")
+    _registrar_hooks_sql()
+
+    @app.before_request
+    def _iniciar_metricas():
+        g._metricas = _novas_metricas()
+
+    @app.after_request
+    def _finalizar_metricas(response):
+        metricas = g.pop("_metricas", None)
+        if metricas is None:
+            return response
+
+        total = time.perf_counter() - metricas["inicio"]
+        endpoint = request.endpoint or "desconhecido"
+        registro.observar("neodata_request_duration_seconds", total, endpoint=endpoint)
+        registro.observar("neodata_db_queries_total", metricas["queries"], endpoint=endpoint)
+        registro.observar("neodata_db_query_duration_seconds", metricas["tempo_queries"], endpoint=endpoint)
+
+        if current_app.config["SERVER_TIMING"] or request.headers.get("X-Server-Timing") == "1":
+            response.headers["Server-Timing"] = _server_timing(metricas, total)
+        return response
+
+    def _autorizado():
+        """Bearer `METRICS_TOKEN` ou sessão de admin; público só com METRICS_PUBLIC=1."""
+        if current_app.config.get("METRICS_PUBLIC"):
+            return True
+        token = current_app.config.get("METRICS_TOKEN")
+        if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return True
+        return current_user.is_authenticated and getattr(current_user, "is_admin", False)
+
+    def metrics():
+        if not _autorizado():
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(exportar_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics)
@@ -0,0 +1,133 @@
+# app/utils/profiling.py
+import os
+import time
+import uuid
+import random
+import cProfile
+import functools
+import threading
+import tracemalloc
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+from ..db import db
+from ..models import PerfilExecucao
+
+# tracemalloc e cProfile são por processo: uma requisição perfilada por vez
+_PERFILANDO = threading.Lock()
+
+
+def _deve_perfilar():
+    """Admin pede via ?profile=1 / X-NeoData-Profile: 1; demais casos seguem a taxa de amostragem."""
+    pedido = request.args.get("profile") == "1" or request.headers.get("X-NeoData-Profile") == "1"
+    if pedido and current_user.is_authenticated and getattr(current_user, "is_admin", False):
+        return True
+    taxa = current_app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    return taxa > 0 and random.random() < taxa
+
+
+def _documento_da_requisicao():
+    return request.args.get("doc_id", type=int) or session.get("last_doc_id")
+
+
+def _iniciar():
+    """Liga o cProfile e o tracemalloc; retorna (profiler, ja_rastreando)."""
+    ja_rastreando = tracemalloc.is_tracing()
+    if not ja_rastreando:
+        tracemalloc.start(current_app.config.get("PROFILE_TRACEMALLOC_FRAMES", 10))
+    else:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except Exception:
+        if not ja_rastreando:
+            tracemalloc.stop()
+        raise
+    return profiler, ja_rastreando
+
+
+def _parar(profiler, ja_rastreando):
+    """Desliga os dois e devolve (snapshot, pico) ou None se a coleta falhar: nunca levanta."""
+    profiler.disable()
+    try:
+        return tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+    except Exception as e:
+        current_app.logger.warning(f"[perfilavel] Falha ao coletar alocações: {e}")
+        return None
+    finally:
+        if not ja_rastreando and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _salvar(job_id, fn, profiler, snapshot, pico, duracao):
+    pasta = os.path.join(current_app.config["OUTPUT_FOLDER"], "perfis")
+    os.makedirs(pasta, exist_ok=True)
+    caminho_perfil = os.path.join(pasta, f"{job_id}.prof")
+    caminho_alocacoes = os.path.join(pasta, f"{job_id}.tracemalloc")
+    profiler.dump_stats(caminho_perfil)
+    snapshot.dump(caminho_alocacoes)
+
+    try:
+        db.session.add(PerfilExecucao(
+            job_id=job_id,
+            documento_id=_documento_da_requisicao(),
+            user_id=current_user.id if current_user.is_authenticated else None,
+            endpoint=request.endpoint or fn.__name__,
+            duracao_s=duracao,
+            pico_memoria_kb=pico / 1024,
+            caminho_perfil=caminho_perfil,
+            caminho_alocacoes=caminho_alocacoes,
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def perfilavel(fn):
+    """
+    Executa o handler sob cProfile + tracemalloc quando solicitado,
+    salvando o perfil e o snapshot de alocações em OUTPUT_FOLDER/perfis.
+    O tracemalloc é global no processo: só uma requisição é perfilada por
+    vez (as que chegam durante um perfil rodam sem) e falhas do perfilador
+    só geram aviso no log, nunca mudam a resposta do handler.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _deve_perfilar() or not _PERFILANDO.acquire(blocking=False):
+            return fn(*args, **kwargs)
+
+        job_id = uuid.uuid4().hex
+        try:
+            profiler, ja_rastreando = _iniciar()
+        except Exception as e:
+            _PERFILANDO.release()
+            current_app.logger.warning(f"[perfilavel] Perfilador indisponível: {e}")
+            return fn(*args, **kwargs)
+
+        inicio = time.perf_counter()
+        coleta = None
+        try:
+            resposta = fn(*args, **kwargs)
+        finally:
+            duracao = time.perf_counter() - inicio
+            try:
+                coleta = _parar(profiler, ja_rastreando)
+            finally:
+                _PERFILANDO.release()
+
+        if coleta is None:
+            return resposta
+        try:
+            _salvar(job_id, fn, profiler, *coleta, duracao)
+        except Exception as e:
+            current_app.logger.warning(f"[perfilavel] Falha ao registrar perfil {job_id}: {e}")
+            return resposta
+
+        resposta = current_app.make_response(resposta)
+        resposta.headers["X-NeoData-Profile-Id"] = job_id
+        return resposta
+
+    return wrapper
@@ -0,0 +1,372 @@
+# app/utils/quase_duplicadas.py
+"""
+Detecção de quase-duplicatas (linhas que diferem por caixa, acentos,
+espaços ou pequenos erros de digitação) sem comparar todos os pares:
+
+1. normalização vetorizada do texto das colunas escolhidas, feita só nos
+   valores distintos (minúsculas, sem acentos, espaços colapsados);
+2. assinatura MinHash dos trigramas de caracteres de cada linha (numpy,
+   uma passada por permutação);
+3. LSH em bandas, opcionalmente combinado com chaves de bloqueio (ex.:
+   UF, cidade): só linhas que caem no mesmo balde viram candidatas, e os
+   vizinhos de cada balde ordenado bastam para ligar o grupo;
+4. os candidatos são confirmados pela similaridade estimada das
+   assinaturas e agrupados por componentes conexos.
+
+O custo é ~O(n log n) e a memória, `4 * permutacoes` bytes por linha
+(as assinaturas), então o mesmo detector roda chunk a chunk.
+"""
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .sketches import hash_linhas, hash_serie
+
+POLITICAS = ("primeira", "mais_completa", "mesclar", "marcar")
+CONFIG_PADRAO = {
+    "colunas": None,     # None: colunas de texto
+    "bloqueio": [],      # só compara linhas com o mesmo valor nessas colunas
+    "limiar": 0.8,       # similaridade de Jaccard (trigramas) mínima
+    "politica": "primeira",
+    "permutacoes": 64,
+    "bandas": 16,
+}
+LOTE_PARES = 100_000
+_SEMENTE = 20240917
+_MASCARA_32 = np.uint64(0xFFFFFFFF)
+_VAZIO = np.uint32(0xFFFFFFFF)
+
+
+def validar_config(config) -> dict:
+    """Completa `config` com os padrões; levanta ValueError se algo for inválido."""
+    if config is None:
+        return None
+    if not isinstance(config, dict):
+        raise ValueError("'quase_duplicadas' deve ser um objeto.")
+    desconhecidas = set(config) - set(CONFIG_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Chaves desconhecidas em 'quase_duplicadas': {', '.join(sorted(desconhecidas))}.")
+    config = {**CONFIG_PADRAO, **config}
+
+    for chave in ("colunas", "bloqueio"):
+        valor = config[chave]
+        if valor is not None and (not isinstance(valor, list) or not all(isinstance(c, str) for c in valor)):
+            raise ValueError(f"'{chave}' deve ser uma lista de nomes de colunas.")
+    if config["colunas"] == []:
+        config["colunas"] = None
+    if config["politica"] not in POLITICAS:
+        raise ValueError(f"'politica' inválida (use {', '.join(POLITICAS)}).")
+    limiar = config["limiar"]
+    if isinstance(limiar, bool) or not isinstance(limiar, (int, float)) or not 0 < limiar <= 1:
+        raise ValueError("'limiar' deve ser um número em (0, 1].")
+    permutacoes, bandas = config["permutacoes"], config["bandas"]
+    if not all(isinstance(v, int) and not isinstance(v, bool) and v > 0 for v in (permutacoes, bandas)):
+        raise ValueError("'permutacoes' e 'bandas' devem ser inteiros positivos.")
+    if permutacoes % bandas or permutacoes > 256:
+        raise ValueError("'permutacoes' deve ser múltiplo de 'bandas' (máximo 256).")
+    return config
+
+
+# ---------------- Normalização ----------------
+def normalizar_texto(serie: pd.Series) -> pd.Series:
+    """
+    Minúsculas, sem acentos (NFKD → ASCII) e com espaços colapsados. Roda
+    só nos valores distintos: cadastros repetem muito nomes e cidades.
+    """
+    codigos, distintos = pd.factorize(serie, use_na_sentinel=True)
+    texto = pd.Series(distintos, dtype=object).astype(str)
+    normalizados = (
+        texto.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.lower().str.replace(r"[^\w@.]+", " ", regex=True).str.strip()
+    ).to_numpy(dtype=object)
+    if not len(normalizados):
+        return pd.Series([""] * len(serie), index=serie.index, dtype=object)
+    return pd.Series(np.where(codigos >= 0, normalizados[codigos], ""), index=serie.index, dtype=object)
+
+
+def texto_linhas(df: pd.DataFrame, colunas) -> np.ndarray:
+    """Texto normalizado de cada linha: colunas normalizadas unidas por espaço."""
+    partes = [normalizar_texto(df[c]) for c in colunas]
+    if not partes:
+        return np.full(len(df), "", dtype=object)
+    texto = partes[0]
+    for parte in partes[1:]:
+        texto = texto + " " + parte
+    return texto.str.strip().to_numpy(dtype=object)
+
+
+# ---------------- MinHash ----------------
+def _permutacoes(k):
+    rng = np.random.default_rng(_SEMENTE)
+    a = rng.integers(0, 2 ** 32, size=k, dtype=np.uint32) | np.uint32(1)
+    b = rng.integers(0, 2 ** 32, size=k, dtype=np.uint32)
+    return a, b
+
+
+def _fmix32(x):
+    """Finalizador do MurmurHash3: espalha os bits dos trigramas antes das permutações."""
+    x = x ^ (x >> np.uint32(16))
+    x = x * np.uint32(0x85EBCA6B)
+    x = x ^ (x >> np.uint32(13))
+    x = x * np.uint32(0xC2B2AE35)
+    return x ^ (x >> np.uint32(16))
+
+
+def _assinaturas_distintas(textos, k):
+    n = len(textos)
+    sig = np.full((n, k), _VAZIO, dtype=np.uint32)
+    # espaço nas pontas: palavras curtas ainda geram trigramas
+    textos = [f" {t} " if t else "" for t in textos]
+    tamanhos = np.fromiter(map(len, textos), dtype=np.int64, count=n)
+    # "replace" troca cada caractere não ASCII por um só "?": os tamanhos batem
+    buffer = np.frombuffer("\0".join(textos).encode("ascii", "replace"), dtype=np.uint8)
+    if len(buffer) < 3:
+        return sig
+
+    inicios = np.concatenate(([0], np.cumsum(tamanhos + 1)[:-1]))
+    linha = np.repeat(np.arange(n), tamanhos + 1)[:len(buffer) - 2]
+    validos = np.arange(len(buffer) - 2) - inicios[linha] <= tamanhos[linha] - 3
+    bytes_ = buffer.astype(np.uint32)
+    gramas = _fmix32(((bytes_[:-2] << np.uint32(16)) | (bytes_[1:-1] << np.uint32(8)) | bytes_[2:])[validos])
+    linha = linha[validos]
+    if not len(gramas):
+        return sig
+
+    # `linha` já vem ordenada: o primeiro trigrama de cada texto é uma fronteira
+    fronteira = np.flatnonzero(np.concatenate(([True], linha[1:] != linha[:-1])))
+    com_gramas = linha[fronteira]
+    a, b = _permutacoes(k)
+    for j in range(k):
+        # a ímpar: x → a·x + b (mod 2³²) é uma permutação dos 32 bits
+        sig[com_gramas, j] = np.minimum.reduceat(gramas * a[j] + b[j], fronteira)
+    return sig
+
+
+def assinaturas(textos, k=64) -> np.ndarray:
+    """
+    Assinaturas MinHash (n × k, uint32) dos trigramas de cada texto
+    (ASCII), calculadas uma vez por texto distinto. Textos vazios ficam
+    com a assinatura "vazia" (todos os valores no máximo).
+    """
+    codigos, distintos = pd.factorize(np.asarray(textos, dtype=object))
+    if not len(distintos):
+        return np.full((len(codigos), k), _VAZIO, dtype=np.uint32)
+    return _assinaturas_distintas(list(distintos), k)[codigos]
+
+
+# ---------------- Detecção ----------------
+class DetectorQuaseDuplicadas:
+    """
+    Acumula, chunk a chunk, as assinaturas, o hash de bloqueio e a
+    quantidade de nulos de cada linha; `finalizar` gera candidatos por LSH,
+    confirma e agrupa. Posições contam a partir do primeiro chunk.
+    """
+
+    def __init__(self, config=None):
+        self.config = validar_config(config or {})
+        self.colunas = self.config["colunas"]
+        self.linhas = 0
+        self._assinaturas, self._blocos, self._nulos = [], [], []
+
+    def adicionar(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        if self.colunas is None:
+            texto = df.select_dtypes(include=["object", "string"]).columns.tolist()
+            self.colunas = [str(c) for c in (texto or df.columns)]
+        faltando = [c for c in self.colunas + self.config["bloqueio"] if c not in df.columns]
+        if faltando:
+            raise ValueError(f"Colunas inexistentes em 'quase_duplicadas': {', '.join(faltando)}.")
+
+        self._assinaturas.append(assinaturas(texto_linhas(df, self.colunas), self.config["permutacoes"]))
+        blocos = [hash_serie(normalizar_texto(df[c])) for c in self.config["bloqueio"]]
+        self._blocos.append(hash_linhas(blocos, len(df)))
+        self._nulos.append(df.isna().sum(axis=1).to_numpy(dtype=np.int32))
+        self.linhas += len(df)
+
+    def _candidatos(self, sig, blocos):
+        """
+        Pares (i < j) vizinhos em algum balde de banda (mesmo bloco). Dentro
+        do balde as linhas ficam ordenadas pela assinatura inteira, então
+        assinaturas idênticas são sempre vizinhas (uma linha diferente que
+        caiu no mesmo balde não quebra a cadeia entre elas).
+        """
+        bandas = self.config["bandas"]
+        largura = sig.shape[1] // bandas
+        preenchidas = np.flatnonzero((sig != _VAZIO).any(axis=1))
+        inteira = hash_linhas([sig[preenchidas, i].astype(np.uint64) for i in range(sig.shape[1])], len(preenchidas))
+        pares = []
+        for t in range(bandas):
+            colunas = [sig[preenchidas, t * largura + i].astype(np.uint64) for i in range(largura)]
+            chave = hash_linhas(colunas + [blocos[preenchidas], np.full(len(preenchidas), t, dtype=np.uint64)],
+                                len(preenchidas))
+            ordem = np.lexsort((inteira, chave))
+            iguais = chave[ordem[1:]] == chave[ordem[:-1]]
+            pares.append(np.stack((preenchidas[ordem[:-1][iguais]], preenchidas[ordem[1:][iguais]]), axis=1))
+        pares = np.concatenate(pares) if pares else np.empty((0, 2), dtype=np.int64)
+        pares.sort(axis=1)
+        # um inteiro por par, ordenado e sem repetições (sort é bem mais rápido que np.unique aqui)
+        codigo = np.sort((pares[:, 0].astype(np.uint64) << np.uint64(32)) | pares[:, 1].astype(np.uint64))
+        codigo = codigo[np.concatenate(([True], codigo[1:] != codigo[:-1]))] if len(codigo) else codigo
+        return np.stack(((codigo >> np.uint64(32)).astype(np.int64), (codigo & _MASCARA_32).astype(np.int64)), axis=1)
+
+    def finalizar(self) -> dict:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        n = self.linhas
+        vazio = {"linhas": n, "pares": np.empty((0, 2), dtype=np.uint32), "similaridade": np.empty(0, dtype=np.float32),
+                 "posicoes": np.empty(0, dtype=np.uint32), "rotulos": np.empty(0, dtype=np.uint32),
+                 "nulos": np.empty(0, dtype=np.int32)}
+        if n < 2:
+            return vazio
+        sig = np.concatenate(self._assinaturas)
+        blocos = np.concatenate(self._blocos)
+        nulos = np.concatenate(self._nulos)
+
+        pares = self._candidatos(sig, blocos)
+        # em lotes: comparar as assinaturas de milhões de pares de uma vez custaria GBs
+        similaridade = np.concatenate([
+            (sig[lote[:, 0]] == sig[lote[:, 1]]).mean(axis=1, dtype=np.float32)
+            for lote in np.array_split(pares, max(1, len(pares) // LOTE_PARES))
+        ]) if len(pares) else np.empty(0, dtype=np.float32)
+        confirmados = similaridade >= self.config["limiar"]
+        pares, similaridade = pares[confirmados], similaridade[confirmados]
+        if not len(pares):
+            return vazio
+
+        grafo = coo_matrix((np.ones(len(pares), dtype=np.int8), (pares[:, 0], pares[:, 1])), shape=(n, n))
+        _, rotulo = connected_components(grafo, directed=False)
+        tamanhos = np.bincount(rotulo)
+        posicoes = np.flatnonzero(tamanhos[rotulo] > 1)
+        # rótulos contíguos na ordem da primeira linha de cada grupo (posições já vêm ordenadas)
+        rotulos, _ = pd.factorize(rotulo[posicoes])
+        return {
+            "linhas": n,
+            "pares": pares.astype(np.uint32),
+            "similaridade": similaridade,
+            "posicoes": posicoes.astype(np.uint32),
+            "rotulos": rotulos.astype(np.uint32),
+            "nulos": nulos[posicoes],
+        }
+
+
+def detectar_chunks(chunks, config=None) -> dict:
+    detector = DetectorQuaseDuplicadas(config)
+    for df in chunks:
+        detector.adicionar(df)
+    return detector.finalizar()
+
+
+def resumo(resultado, plano=None) -> dict:
+    return {
+        "pares": int(len(resultado["pares"])),
+        "grupos": int(resultado["rotulos"].max() + 1) if len(resultado["rotulos"]) else 0,
+        "linhas_em_grupos": int(len(resultado["posicoes"])),
+        "linhas_removidas": int(len(plano["remover"])) if plano else 0,
+        "politica": plano["politica"] if plano else "marcar",
+    }
+
+
+# ---------------- Políticas ----------------
+def planejar(resultado, politica) -> dict:
+    """
+    Qual linha de cada grupo fica e quais saem: `primeira` (menor posição),
+    `mais_completa` (menos nulos; empate → primeira), `mesclar` (fica a
+    primeira, com os nulos preenchidos pelas outras) ou `marcar` (nenhuma
+    sai). Retorna {"politica", "manter" (por grupo), "remover" (ordenado)}.
+    """
+    posicoes, rotulos = resultado["posicoes"].astype(np.int64), resultado["rotulos"]
+    if politica == "marcar" or not len(posicoes):
+        return {"politica": politica, "manter": np.empty(0, dtype=np.int64), "remover": np.empty(0, dtype=np.int64)}
+
+    criterio = resultado["nulos"] if politica == "mais_completa" else np.zeros(len(posicoes))
+    ordem = np.lexsort((posicoes, criterio, rotulos))
+    primeiro_do_grupo = np.concatenate(([True], rotulos[ordem[1:]] != rotulos[ordem[:-1]]))
+    manter = posicoes[ordem[primeiro_do_grupo]]
+    remover = np.sort(posicoes[ordem[~primeiro_do_grupo]])
+    return {"politica": politica, "manter": manter, "remover": remover}
+
+
+def mesclar_grupos(chunks, resultado, plano) -> pd.DataFrame:
+    """
+    Linha mesclada de cada grupo (primeiro valor não nulo de cada coluna,
+    na ordem das linhas), indexada pela posição que fica. Lê os chunks uma
+    vez e guarda só as linhas dos grupos.
+    """
+    posicoes = resultado["posicoes"].astype(np.int64)
+    membros, inicio = [], 0
+    for df in chunks:
+        fim = inicio + len(df)
+        locais = posicoes[(posicoes >= inicio) & (posicoes < fim)] - inicio
+        if len(locais):
+            membros.append(df.iloc[locais].set_axis(locais + inicio))
+        inicio = fim
+    if not membros:
+        return pd.DataFrame()
+    membros = pd.concat(membros)
+    rotulos = pd.Series(resultado["rotulos"], index=posicoes)
+    mescladas = membros.groupby(rotulos.loc[membros.index].to_numpy(), sort=True).first()
+    return mescladas.set_axis(plano["manter"][mescladas.index.to_numpy()])
+
+
+def aplicar_plano(chunks, plano, mescladas=None):
+    """Remove (e, no `mesclar`, preenche) as linhas dos grupos, chunk a chunk."""
+    remover = plano["remover"]
+    inicio = 0
+    for df in chunks:
+        fim = inicio + len(df)
+        posicoes = np.arange(inicio, fim)
+        if mescladas is not None and len(mescladas):
+            alvo = mescladas.index[(mescladas.index >= inicio) & (mescladas.index < fim)]
+            if len(alvo):
+                df = df.copy()
+                linhas = df.index[alvo - inicio]
+                for c in df.columns.intersection(mescladas.columns):
+                    df.loc[linhas, c] = df.loc[linhas, c].fillna(
+                        pd.Series(mescladas.loc[alvo, c].to_numpy(), index=linhas)
+                    )
+        fica = ~np.isin(posicoes, remover[(remover >= inicio) & (remover < fim)])
+        yield df if fica.all() else df[fica]
+        inicio = fim
+
+
+# ---------------- Armazenamento ----------------
+def salvar_resultado(resultado, config, caminho):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = f"{caminho}.{uuid.uuid4().hex}.npz"
+    np.savez_compressed(
+        temporario, **{k: v for k, v in resultado.items() if k != "linhas"},
+        linhas=np.int64(resultado["linhas"]), config=np.array(json.dumps(config)),
+    )
+    os.replace(temporario, caminho)
+
+
+def carregar_resultado(caminho):
+    """(resultado, config) gravados por `salvar_resultado`."""
+    with np.load(caminho) as dados:
+        resultado = {k: dados[k] for k in dados.files if k not in ("linhas", "config")}
+        resultado["linhas"] = int(dados["linhas"])
+        return resultado, json.loads(str(dados["config"]))
+
+
+def pagina_grupos(resultado, offset=0, limite=50):
+    """(total de grupos, [(grupo, posições, [(i, j, similaridade)])]) da fatia pedida."""
+    posicoes, rotulos = resultado["posicoes"], resultado["rotulos"]
+    total = int(rotulos.max() + 1) if len(rotulos) else 0
+    na_fatia = (rotulos >= offset) & (rotulos < offset + limite)
+    # posições estão ordenadas: o grupo de cada par sai por busca binária
+    pares = resultado["pares"]
+    grupo_par = rotulos[np.searchsorted(posicoes, pares[:, 0])] if len(pares) else np.empty(0, dtype=np.uint32)
+    pares_fatia = (grupo_par >= offset) & (grupo_par < offset + limite)
+
+    grupos = []
+    for g in range(offset, min(offset + limite, total)):
+        sel = pares_fatia & (grupo_par == g)
+        grupos.append((g, posicoes[na_fatia & (rotulos == g)].tolist(), [
+            (int(i), int(j), round(float(s), 3)) for (i, j), s in zip(pares[sel], resultado["similaridade"][sel])
+        ]))
+    return total, grupos
@@ -0,0 +1,196 @@
+# app/utils/registros.py
+"""
+Codificação compacta dos RawRecord/CleanRecord: a ordem das colunas e os
+dtypes ficam uma vez por documento em `record_schemas` e cada linha é
+gravada como um array JSON posicional, sem repetir os nomes das colunas.
+O esquema só cresce (colunas novas vão para o fim), então linhas antigas,
+mais curtas, continuam decodificando — as colunas que faltam viram NaN.
+Ausentes são gravados como null (JSON padrão), o que permite ler só
+algumas posições direto no banco (projeção). Na leitura, cada coluna
+volta ao dtype guardado no esquema (datas gravadas como texto ISO voltam
+a ser datetime).
+"""
+import pandas as pd
+from pandas.api.types import pandas_dtype
+from sqlalchemy import insert
+
+from ..db import db
+from ..models import EsquemaRegistros
+
+
+# ---------------- Codificação ----------------
+def _valores(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        # JSON não tem tipo data: grava ISO 8601 (NaT → null)
+        return serie.dt.strftime("%Y-%m-%dT%H:%M:%S").astype(object).where(serie.notna(), None).tolist()
+    if serie.hasnans:
+        return serie.astype(object).where(serie.notna(), None).tolist()
+    return serie.tolist()
+
+
+def codificar_linhas(df, colunas):
+    """DataFrame → lista de arrays na ordem de `colunas` (valores Python nativos; NaN → null)."""
+    if df.empty:
+        return []
+    return [list(linha) for linha in zip(*(_valores(df[c]) for c in colunas))]
+
+
+def _restaurar(serie, dtype):
+    """Converte a coluna decodificada de volta ao `dtype` gravado no esquema."""
+    try:
+        tipo = pandas_dtype(dtype)
+    except TypeError:
+        return serie
+    if pd.api.types.is_datetime64_any_dtype(tipo):
+        valores = pd.to_datetime(serie, errors="coerce")
+        tz = getattr(tipo, "tz", None)
+        # strftime gravou a hora local do fuso, sem o offset
+        return valores.dt.tz_localize(tz) if tz is not None else valores
+    if tipo == object or serie.dtype == tipo:
+        return serie
+    if pd.api.types.is_bool_dtype(tipo) and serie.isna().any():
+        return serie  # astype(bool) transformaria os nulos em False
+    try:
+        return serie.astype(tipo)
+    except (TypeError, ValueError):
+        # nulos (ex.: linhas curtas) em coluna int: float, como o pandas faz ao ler
+        return serie.astype("float64") if pd.api.types.is_integer_dtype(tipo) else serie
+
+
+def decodificar_linhas(linhas, colunas, dtypes=None):
+    """
+    Lista de arrays posicionais → DataFrame com todas as `colunas` do esquema
+    (posições que faltam em linhas curtas viram NaN), nos `dtypes` gravados.
+    """
+    colunas = list(colunas)
+    largura = len(colunas)
+    linhas = [linha if len(linha) == largura else list(linha) + [None] * (largura - len(linha)) for linha in linhas]
+    df = pd.DataFrame(linhas, columns=colunas) if linhas else pd.DataFrame(columns=colunas)
+    for c, dtype in (dtypes or {}).items():
+        if c in df.columns:
+            df[c] = _restaurar(df[c], dtype)
+    return df
+
+
+# ---------------- Esquema ----------------
+def carregar_esquema(modelo, doc_id):
+    return EsquemaRegistros.query.filter_by(documento_id=doc_id, tipo=modelo.tipo_esquema).first()
+
+
+def _atualizar_esquema(modelo, doc_id, df):
+    """Acrescenta ao esquema as colunas novas de `df` e retorna a ordem completa."""
+    esquema = carregar_esquema(modelo, doc_id)
+    if esquema is None:
+        esquema = EsquemaRegistros(documento_id=doc_id, tipo=modelo.tipo_esquema, colunas=[], dtypes={})
+        db.session.add(esquema)
+
+    colunas, dtypes = list(esquema.colunas), dict(esquema.dtypes)
+    for c in df.columns:
+        dtype = str(df[c].dtype)
+        if c not in dtypes:
+            colunas.append(c)
+            dtypes[c] = dtype
+        elif dtypes[c] != dtype:
+            dtypes[c] = "object"
+    if colunas != esquema.colunas or dtypes != esquema.dtypes:
+        esquema.colunas, esquema.dtypes = colunas, dtypes
+    return colunas
+
+
+# ---------------- Leitura/escrita ----------------
+def gravar_registros(modelo, doc_id, df):
+    """Insere as linhas de `df` (em lote, sem objetos ORM) no formato posicional."""
+    colunas = _atualizar_esquema(modelo, doc_id, df)
+    presentes = [c for c in colunas if c in df.columns]
+    if len(presentes) < len(colunas):
+        # chunk sem alguma coluna já conhecida: completa com None na posição
+        df = df.reindex(columns=colunas)
+        presentes = colunas
+    linhas = codificar_linhas(df, presentes)
+    if linhas:
+        db.session.execute(insert(modelo), [{"documento_id": doc_id, "data": linha} for linha in linhas])
+
+
+def apagar_registros(modelo, doc_id):
+    """Remove os registros e o esquema (a próxima carga começa um esquema novo)."""
+    db.session.query(modelo).filter_by(documento_id=doc_id).delete()
+    db.session.query(EsquemaRegistros).filter_by(documento_id=doc_id, tipo=modelo.tipo_esquema).delete()
+
+
+def _leitura(modelo, esquema, colunas):
+    """
+    (expressões SELECT, decodificar) para ler todas as colunas ou só
+    `colunas`: a projeção extrai as posições no próprio banco (data[i]), sem
+    trazer nem decodificar o array inteiro.
+    """
+    dtypes = dict(esquema.dtypes or {})
+    if colunas is None:
+        nomes = list(esquema.colunas)
+        return [modelo.data], lambda linhas: decodificar_linhas([d for (d,) in linhas], nomes, dtypes)
+    faltando = [c for c in colunas if c not in esquema.colunas]
+    if faltando:
+        raise ValueError(f"Colunas inexistentes no documento: {', '.join(map(str, faltando))}.")
+    expressoes = [modelo.data[esquema.colunas.index(c)] for c in colunas]
+    return expressoes, lambda linhas: decodificar_linhas(
+        [tuple(linha) for linha in linhas], colunas, {c: dtypes[c] for c in colunas if c in dtypes}
+    )
+
+
+def iter_registros(modelo, doc_id, chunksize, colunas=None):
+    """
+    Lê os registros do documento como DataFrames de até `chunksize` linhas
+    (só as `colunas` pedidas, se informadas). Pagina por id (sem cursor
+    aberto), então é seguro gravar e fazer commit entre um chunk e outro.
+    """
+    esquema = carregar_esquema(modelo, doc_id)
+    if esquema is None:
+        return
+    expressoes, decodificar = _leitura(modelo, esquema, colunas)
+    ultimo = 0
+    while True:
+        lote = (
+            db.session.query(modelo.id, *expressoes)
+            .filter(modelo.documento_id == doc_id, modelo.id > ultimo)
+            .order_by(modelo.id)
+            .limit(chunksize)
+            .all()
+        )
+        if not lote:
+            return
+        ultimo = lote[-1][0]
+        yield decodificar([linha[1:] for linha in lote])
+
+
+def carregar_posicoes(modelo, doc_id, posicoes):
+    """
+    Registros nas `posicoes` (0 = primeiro, na ordem de gravação) em uma
+    consulta só, numerando as linhas no banco (ROW_NUMBER). Índice = posição.
+    """
+    esquema = carregar_esquema(modelo, doc_id)
+    if esquema is None or not len(posicoes):
+        return pd.DataFrame()
+    numeradas = (
+        db.session.query(modelo.data.label("data"), (db.func.row_number().over(order_by=modelo.id) - 1).label("posicao"))
+        .filter(modelo.documento_id == doc_id)
+        .subquery()
+    )
+    linhas = (
+        db.session.query(numeradas.c.posicao, numeradas.c.data)
+        .filter(numeradas.c.posicao.in_([int(p) for p in posicoes]))
+        .order_by(numeradas.c.posicao)
+        .all()
+    )
+    df = decodificar_linhas([d for _, d in linhas], list(esquema.colunas), esquema.dtypes)
+    return df.set_axis([p for p, _ in linhas])
+
+
+def carregar_registros(modelo, doc_id, limite=None, colunas=None):
+    """Todos os registros do documento (ou os `limite` primeiros) em um DataFrame."""
+    esquema = carregar_esquema(modelo, doc_id)
+    if esquema is None:
+        return pd.DataFrame()
+    expressoes, decodificar = _leitura(modelo, esquema, colunas)
+    query = db.session.query(*expressoes).filter(modelo.documento_id == doc_id).order_by(modelo.id)
+    if limite:
+        query = query.limit(limite)
+    return decodificar(query.all())
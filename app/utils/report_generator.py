@@ -1,23 +1,30 @@
 # app/utils/report_generator.py
 import io
 import pandas as pd
-import matplotlib.pyplot as plt
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
 
+from .sketches import margem_duplicadas
 
-def gerar_relatorio_pdf(doc_id, raw_df, clean_df, before, after, val):
+
+def gerar_relatorio_pdf(doc_id, raw_df, clean_df, before, after, val, aproximado=None, summary=None):
     """
     Gera relatório PDF profissional com resumo, comparações e gráficos.
+    `aproximado` (opcional) é o resumo de sketches do documento original.
+    `summary` (opcional) substitui o resumo calculado dos frames, quando
+    eles são apenas amostras (limpeza em streaming).
     """
+    # matplotlib e reportlab custam ~1 s de import: só quando há relatório
+    import matplotlib.pyplot as plt
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = io.BytesIO()
     doc_pdf = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
     content = [Paragraph("Relatório de Limpeza de Dados - NeoData", styles["Title"]), Spacer(1, 12)]
 
     # ----------------- RESUMO -----------------
-    summary = {
+    summary = summary or {
         "linhas_antes": int(raw_df.shape[0]) if not raw_df.empty else 0,
         "linhas_depois": int(clean_df.shape[0]),
         "colunas": int(clean_df.shape[1]),
@@ -36,7 +43,22 @@ def gerar_relatorio_pdf(doc_id, raw_df, clean_df, before, after, val):
         if summary["ausentes_antes"] > 0:
             content.append(Paragraph(f"Havia {summary['ausentes_antes']} valores ausentes.", styles["Normal"]))
         if summary["duplicadas_antes"] > 0:
-            content.append(Paragraph(f"Foram encontrados {summary['duplicadas_antes']} registros duplicados.", styles["Normal"]))
+            margem = summary.get("duplicadas_antes_margem", 0)
+            qtd = f"cerca de {summary['duplicadas_antes']} (± {margem})" if margem else summary["duplicadas_antes"]
+            content.append(Paragraph(f"Foram encontrados {qtd} registros duplicados.", styles["Normal"]))
+        for col, n in (summary.get("normalizacao") or {}).items():
+            content.append(Paragraph(
+                f"Coluna {col} normalizada ({'data' if n['tipo'] == 'data' else 'número'}): "
+                f"{n['convertidos']} valores convertidos, {n['falhas']} não reconhecidos.",
+                styles["Normal"]
+            ))
+        quase = summary.get("quase_duplicadas")
+        if quase and quase["grupos"]:
+            content.append(Paragraph(
+                f"{quase['linhas_em_grupos']} linhas formavam {quase['grupos']} grupos de quase-duplicatas "
+                f"(política \"{quase['politica']}\", {quase['linhas_removidas']} linhas removidas).",
+                styles["Normal"]
+            ))
 
     if summary["linhas_depois"] > 0:
         content.append(Spacer(1, 12))
@@ -59,11 +81,43 @@ def gerar_relatorio_pdf(doc_id, raw_df, clean_df, before, after, val):
         if val.get("valid", False):
             content.append(Paragraph("Os dados finais passaram em todas as validações principais.", styles["Normal"]))
         else:
-            messages = val.get("messages", None)
+            messages = val.get("messages") or val.get("error") or val.get("reason")
             if messages:
                 content.append(Paragraph("Foram encontradas inconsistências:", styles["Normal"]))
                 for m in messages if isinstance(messages, (list, tuple)) else [messages]:
                     content.append(Paragraph(f"- {m}", styles["Normal"]))
+            if val.get("linhas_com_falha"):
+                content.append(Paragraph(
+                    f"{val['linhas_com_falha']} de {val.get('row_count', 0)} linhas falharam em ao menos uma regra.",
+                    styles["Normal"]
+                ))
+
+    # ----------------- ESTATÍSTICAS APROXIMADAS -----------------
+    if aproximado:
+        margem = margem_duplicadas(aproximado)
+        duplicadas = (
+            f"cerca de {aproximado.get('duplicadas', 0)} (± {margem}) duplicadas" if margem
+            else f"{aproximado.get('duplicadas', 0)} duplicadas"
+        )
+        content.append(Spacer(1, 12))
+        content.append(Paragraph("Estatísticas Aproximadas (documento original)", styles["Heading2"]))
+        content.append(Paragraph(
+            f"{aproximado.get('linhas', 0)} linhas, {duplicadas} "
+            f"e {aproximado.get('ausentes', 0)} valores ausentes.",
+            styles["Normal"]
+        ))
+        for col, r in aproximado.get("por_coluna", {}).items():
+            texto = f"<b>{col}</b>: ~{r.get('distintos', 0)} distintos, {r.get('nulos', 0)} nulos"
+            quantis = r.get("quantis")
+            if quantis and quantis.get("p50") is not None:
+                texto += (
+                    f"; média {r['media']:.4g}, mediana ~{quantis['p50']:.4g}, "
+                    f"p01–p99 ~[{quantis['p01']:.4g}, {quantis['p99']:.4g}]"
+                )
+            frequentes = r.get("frequentes")
+            if frequentes:
+                texto += "; mais frequentes: " + ", ".join(f"{v} (~{c})" for v, c in frequentes[:3])
+            content.append(Paragraph(texto, styles["Normal"]))
 
     # ----------------- COMPARAÇÕES VISUAIS -----------------
     numeric_cols = list(
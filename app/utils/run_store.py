@@ -0,0 +1,198 @@
+# app/utils/run_store.py
+"""
+Armazenamento imutável das versões de limpeza (copy-on-write).
+
+Cada coluna é dividida em blocos de `CHUNK_LINHAS` linhas; cada bloco é
+gravado uma única vez, endereçado pelo hash do seu conteúdo. Uma versão é
+apenas um manifesto (lista de hashes por coluna), então blocos que não
+mudaram entre execuções são compartilhados e o diff entre duas versões
+compara manifestos sem ler os dados.
+"""
+import os
+import json
+import time
+import hashlib
+
+import pandas as pd
+
+CHUNK_LINHAS = 65_536
+# idade mínima de um bloco sem manifesto para ser coletado (maior que a limpeza mais longa)
+CARENCIA_ORFAOS_S = 6 * 3600
+
+
+def _hash_bloco(bloco):
+    h = hashlib.sha1(str(bloco.dtype).encode())
+    h.update(pd.util.hash_pandas_object(bloco, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _caminho_bloco(pasta, chave):
+    return os.path.join(pasta, chave[:2], f"{chave}.pkl")
+
+
+class GravadorVersao:
+    """
+    Grava uma versão a partir de DataFrames recebidos aos poucos: acumula
+    linhas até completar blocos de `chunk_linhas`, então o resultado (e os
+    hashes) é o mesmo de `salvar_versao` sobre o frame inteiro.
+    """
+
+    def __init__(self, pasta, chunk_linhas=CHUNK_LINHAS):
+        self.pasta = pasta
+        self.chunk_linhas = chunk_linhas
+        self.linhas = 0
+        self.bytes_novos = 0
+        self.colunas = {}
+        self._pendente = []
+
+    def _gravar_bloco(self, bloco):
+        chave = _hash_bloco(bloco)
+        caminho = _caminho_bloco(self.pasta, chave)
+        try:
+            # bloco já existente: renova a data de modificação, que protege da coleta de órfãos até o manifesto sair
+            os.utime(caminho)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            tmp = f"{caminho}.{os.getpid()}.tmp"
+            bloco.to_pickle(tmp)
+            os.replace(tmp, caminho)
+            self.bytes_novos += os.path.getsize(caminho)
+        return chave
+
+    def _gravar_frame(self, df):
+        for col in df.columns:
+            serie = df[col].reset_index(drop=True)
+            info = self.colunas.setdefault(str(col), {"nome": str(col), "dtype": str(serie.dtype), "chunks": []})
+            info["chunks"].append(self._gravar_bloco(serie))
+
+    def adicionar(self, df):
+        self.linhas += len(df)
+        self._pendente.append(df)
+        pendentes = sum(len(p) for p in self._pendente)
+        if pendentes < self.chunk_linhas:
+            return
+        buffer = pd.concat(self._pendente, ignore_index=True) if len(self._pendente) > 1 else self._pendente[0]
+        completos = (len(buffer) // self.chunk_linhas) * self.chunk_linhas
+        for inicio in range(0, completos, self.chunk_linhas):
+            self._gravar_frame(buffer.iloc[inicio:inicio + self.chunk_linhas])
+        self._pendente = [buffer.iloc[completos:]] if completos < len(buffer) else []
+
+    def finalizar(self):
+        """Grava o bloco parcial restante e retorna (manifesto, bytes_novos)."""
+        if self._pendente:
+            resto = pd.concat(self._pendente, ignore_index=True)
+            if len(resto) or not self.colunas:
+                self._gravar_frame(resto)
+            self._pendente = []
+        manifesto = {"linhas": self.linhas, "chunk_linhas": self.chunk_linhas, "colunas": list(self.colunas.values())}
+        return manifesto, self.bytes_novos
+
+
+def salvar_versao(df, pasta, chunk_linhas=CHUNK_LINHAS):
+    """Grava os blocos ainda inexistentes e retorna (manifesto, bytes_novos)."""
+    gravador = GravadorVersao(pasta, chunk_linhas)
+    gravador.adicionar(df)
+    return gravador.finalizar()
+
+
+def carregar_versao(manifesto, pasta, colunas=None):
+    """Reconstrói o DataFrame de uma versão (opcionalmente só algumas colunas)."""
+    dados = {}
+    for info in manifesto["colunas"]:
+        if colunas is not None and info["nome"] not in colunas:
+            continue
+        blocos = [pd.read_pickle(_caminho_bloco(pasta, c)) for c in info["chunks"]]
+        dados[info["nome"]] = pd.concat(blocos, ignore_index=True) if blocos else pd.Series(dtype=info["dtype"])
+    return pd.DataFrame(dados)
+
+
+def iter_versao(manifesto, pasta, colunas=None):
+    """Lê a versão bloco a bloco (`chunk_linhas` linhas por DataFrame), sem montar tudo."""
+    infos = [c for c in manifesto["colunas"] if colunas is None or c["nome"] in colunas]
+    n_blocos = max((len(c["chunks"]) for c in infos), default=0)
+    for i in range(n_blocos):
+        yield pd.DataFrame({c["nome"]: pd.read_pickle(_caminho_bloco(pasta, c["chunks"][i])) for c in infos})
+
+
+def ler_linhas(manifesto, pasta, posicoes, colunas=None):
+    """Linhas nas `posicoes` da versão, lendo só os blocos que as contêm."""
+    tamanho = manifesto.get("chunk_linhas", CHUNK_LINHAS)
+    infos = [c for c in manifesto["colunas"] if colunas is None or c["nome"] in colunas]
+    posicoes = pd.Series(posicoes, dtype="int64")
+    partes = []
+    for bloco, grupo in posicoes.groupby(posicoes // tamanho, sort=True):
+        locais = (grupo - bloco * tamanho).to_numpy()
+        partes.append(pd.DataFrame({
+            c["nome"]: pd.read_pickle(_caminho_bloco(pasta, c["chunks"][bloco])).iloc[locais].to_numpy()
+            for c in infos
+        }, index=grupo.to_numpy()))
+    if not partes:
+        return pd.DataFrame(columns=[c["nome"] for c in infos])
+    return pd.concat(partes).loc[posicoes.to_numpy()]
+
+
+def diff_manifestos(a, b):
+    """Compara duas versões coluna a coluna usando só os hashes dos blocos."""
+    cols_a = {c["nome"]: c for c in a["colunas"]}
+    cols_b = {c["nome"]: c for c in b["colunas"]}
+
+    alteradas, iguais = {}, []
+    for nome in cols_a.keys() & cols_b.keys():
+        ca, cb = cols_a[nome], cols_b[nome]
+        if ca["chunks"] == cb["chunks"] and ca["dtype"] == cb["dtype"]:
+            iguais.append(nome)
+            continue
+        n = max(len(ca["chunks"]), len(cb["chunks"]))
+        blocos = [
+            i for i in range(n)
+            if i >= len(ca["chunks"]) or i >= len(cb["chunks"]) or ca["chunks"][i] != cb["chunks"][i]
+        ]
+        alteradas[nome] = {
+            "dtype": [ca["dtype"], cb["dtype"]],
+            "blocos_alterados": blocos,
+            "linhas_afetadas_max": min(len(blocos) * a.get("chunk_linhas", CHUNK_LINHAS), max(a["linhas"], b["linhas"])),
+        }
+
+    return {
+        "linhas": [a["linhas"], b["linhas"]],
+        "colunas_adicionadas": sorted(cols_b.keys() - cols_a.keys()),
+        "colunas_removidas": sorted(cols_a.keys() - cols_b.keys()),
+        "colunas_iguais": sorted(iguais),
+        "colunas_alteradas": alteradas,
+    }
+
+
+def salvar_manifesto(manifesto, caminho):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "w") as f:
+        json.dump(manifesto, f)
+
+
+def carregar_manifesto(caminho):
+    with open(caminho) as f:
+        return json.load(f)
+
+
+def coletar_blocos_orfaos(pasta, manifestos, carencia_s=CARENCIA_ORFAOS_S):
+    """
+    Remove blocos não referenciados por nenhum manifesto e gravados (ou
+    reaproveitados) há mais de `carencia_s`; retorna quantos apagou. A
+    carência protege as versões em andamento: os blocos são gravados antes
+    do manifesto, e um bloco reaproveitado tem a data renovada.
+    """
+    referenciados = {c for m in manifestos for col in m["colunas"] for c in col["chunks"]}
+    limite = time.time() - carencia_s
+    removidos = 0
+    for raiz, _, arquivos in os.walk(pasta):
+        for nome in arquivos:
+            caminho = os.path.join(raiz, nome)
+            orfao = nome.endswith(".pkl") and nome[:-4] not in referenciados
+            if not (orfao or nome.endswith(".tmp")):  # .tmp: gravação interrompida
+                continue
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+                    removidos += 1
+            except FileNotFoundError:
+                pass
+    return removidos
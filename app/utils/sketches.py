@@ -0,0 +1,477 @@
+# app/utils/sketches.py
+"""
+Sketches mescláveis para estatísticas aproximadas em memória constante.
+
+Todos os sketches aceitam atualização em lote (um chunk por vez) e
+`merge` com outro sketch do mesmo tipo, de modo que chunks e membros
+de um ZIP possam ser processados separadamente e combinados depois.
+"""
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+QUANTIS_PADRAO = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+_MASCARA_32 = np.uint64(0xFFFFFFFF)
+_HASH_NULO = np.uint64(0x9E3779B97F4A7C15)
+_PRIMO = np.uint64(0x100000001B3)
+# Até quantos hashes de linha distintos a contagem de duplicadas é exata (~16 MB)
+LIMITE_DUPLICADAS_EXATAS = 2_000_000
+
+
+# ---------------- Hash ----------------
+def _bit_length(w):
+    """Bit length exato de um array uint64 (via duas metades de 32 bits)."""
+    alto = (w >> np.uint64(32)).astype(np.float64)
+    baixo = (w & _MASCARA_32).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        bl_alto = np.where(alto > 0, np.floor(np.log2(alto)) + 33, 0)
+        bl_baixo = np.where(baixo > 0, np.floor(np.log2(baixo)) + 1, 0)
+    return np.where(alto > 0, bl_alto, bl_baixo).astype(np.int64)
+
+
+def normalizar_serie(serie):
+    """Converte para uma representação estável entre chunks (float64 ou str)."""
+    if pd.api.types.is_bool_dtype(serie):
+        return serie.astype("float64")
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype("float64")
+    return serie.astype(str).astype(object).mask(serie.isna())
+
+
+def hash_serie(serie):
+    """Hash 64 bits por valor; nulos recebem uma constante fixa."""
+    h = pd.util.hash_pandas_object(serie, index=False).to_numpy(dtype=np.uint64)
+    return np.where(serie.isna().to_numpy(), _HASH_NULO, h)
+
+
+def hash_linhas(hashes_colunas, n):
+    """Combina os hashes das colunas em um hash por linha."""
+    h = np.zeros(n, dtype=np.uint64)
+    for hc in hashes_colunas:
+        h = (h * _PRIMO) ^ hc
+    return h
+
+
+class HashesVistos:
+    """
+    Hashes já vistos em níveis ordenados de tamanhos decrescentes (como uma
+    LSM-tree): consultar é uma busca binária por nível e inserir só funde
+    níveis de tamanho parecido, então o custo total fica O(n log n) em vez
+    de reordenar tudo a cada chunk.
+    """
+
+    def __init__(self):
+        self.niveis = []
+
+    def contem(self, hashes):
+        # buscar as chaves já ordenadas mantém a busca binária no cache
+        ordem = np.argsort(hashes, kind="stable")
+        ordenados = hashes[ordem]
+        achou = np.zeros(len(hashes), dtype=bool)
+        for nivel in self.niveis:
+            i = np.minimum(np.searchsorted(nivel, ordenados), len(nivel) - 1)
+            achou[ordem] |= nivel[i] == ordenados
+        return achou
+
+    @staticmethod
+    def _unicos_ordenados(hashes):
+        ordenados = np.sort(hashes)
+        return ordenados[np.concatenate(([True], ordenados[1:] != ordenados[:-1]))] if len(ordenados) else ordenados
+
+    def adicionar(self, hashes):
+        novo = self._unicos_ordenados(hashes)
+        if not len(novo):
+            return
+        while self.niveis and len(self.niveis[-1]) <= 2 * len(novo):
+            novo = self._unicos_ordenados(np.concatenate((self.niveis.pop(), novo)))
+        self.niveis.append(novo)
+
+
+# ---------------- Quantis (KLL) ----------------
+class KLL:
+    """Sketch KLL de quantis: erro de rank ~ O(1/k), memória O(k)."""
+
+    def __init__(self, k=200, c=2 / 3, seed=None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.niveis = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacidade(self, nivel):
+        altura = len(self.niveis)
+        return max(2, int(math.ceil(self.k * self.c ** (altura - nivel - 1))))
+
+    def _compactar(self):
+        nivel = 0
+        while nivel < len(self.niveis):
+            if len(self.niveis[nivel]) > self._capacidade(nivel):
+                if nivel + 1 == len(self.niveis):
+                    self.niveis.append(np.empty(0))
+                itens = np.sort(self.niveis[nivel])
+                sobra = itens[-1:] if len(itens) % 2 else itens[:0]
+                itens = itens[: len(itens) - len(sobra)]
+                offset = int(self._rng.integers(2))
+                self.niveis[nivel + 1] = np.concatenate([self.niveis[nivel + 1], itens[offset::2]])
+                self.niveis[nivel] = sobra
+            nivel += 1
+
+    def update(self, valores):
+        v = np.asarray(valores, dtype=np.float64)
+        v = v[~np.isnan(v)]
+        if v.size == 0:
+            return
+        self.n += int(v.size)
+        self.niveis[0] = np.concatenate([self.niveis[0], v])
+        self._compactar()
+
+    def merge(self, outro):
+        while len(self.niveis) < len(outro.niveis):
+            self.niveis.append(np.empty(0))
+        for i, itens in enumerate(outro.niveis):
+            self.niveis[i] = np.concatenate([self.niveis[i], itens])
+        self.n += outro.n
+        self._compactar()
+        return self
+
+    def quantis(self, qs=QUANTIS_PADRAO):
+        if self.n == 0:
+            return [None] * len(qs)
+        itens = np.concatenate(self.niveis)
+        pesos = np.concatenate([np.full(len(x), 2.0 ** i) for i, x in enumerate(self.niveis)])
+        ordem = np.argsort(itens, kind="mergesort")
+        itens, acumulado = itens[ordem], np.cumsum(pesos[ordem])
+        alvos = np.asarray(qs) * acumulado[-1]
+        pos = np.minimum(np.searchsorted(acumulado, alvos, side="left"), len(itens) - 1)
+        return [float(x) for x in itens[pos]]
+
+
+# ---------------- Distintos (HyperLogLog) ----------------
+class HyperLogLog:
+    """Contagem aproximada de distintos; erro relativo ~ 1.04 / sqrt(2^p)."""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registros = np.zeros(self.m, dtype=np.uint8)
+
+    def update_hashes(self, h):
+        h = np.asarray(h, dtype=np.uint64)
+        if h.size == 0:
+            return
+        p = np.uint64(self.p)
+        idx = (h >> (np.uint64(64) - p)).astype(np.int64)
+        # bit de guarda limita o rank a 64 - p + 1
+        w = (h << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = (65 - _bit_length(w)).astype(np.uint8)
+        np.maximum.at(self.registros, idx, rank)
+
+    def merge(self, outro):
+        np.maximum(self.registros, outro.registros, out=self.registros)
+        return self
+
+    def estimativa(self):
+        m = float(self.m)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        e = alpha * m * m / np.sum(np.power(2.0, -self.registros.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registros == 0))
+        if e <= 2.5 * m and zeros > 0:
+            e = m * math.log(m / zeros)
+        return int(round(e))
+
+    @property
+    def erro_relativo(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+# ---------------- Frequentes (Count-Min) ----------------
+class CountMin:
+    """Count-Min sketch com lista de candidatos a valores mais frequentes."""
+
+    def __init__(self, largura=2048, profundidade=4, top_k=10):
+        self.largura = largura
+        self.profundidade = profundidade
+        self.top_k = top_k
+        self.tabela = np.zeros((profundidade, largura), dtype=np.int64)
+        self.candidatos = set()
+
+    def _indices(self, h):
+        h1 = (h & _MASCARA_32).astype(np.int64)
+        h2 = (h >> np.uint64(32)).astype(np.int64)
+        return [(h1 + i * h2) % self.largura for i in range(self.profundidade)]
+
+    def update(self, serie):
+        contagens = serie.dropna().value_counts()
+        if contagens.empty:
+            return
+        h = hash_serie(pd.Series(contagens.index, dtype=object))
+        for linha, idx in enumerate(self._indices(h)):
+            np.add.at(self.tabela[linha], idx, contagens.to_numpy(dtype=np.int64))
+        self.candidatos.update(contagens.index[: self.top_k * 2])
+        self._podar()
+
+    def estimar(self, valores):
+        if not len(valores):
+            return np.empty(0, dtype=np.int64)
+        h = hash_serie(pd.Series(list(valores), dtype=object))
+        estimativas = [self.tabela[linha, idx] for linha, idx in enumerate(self._indices(h))]
+        return np.min(estimativas, axis=0)
+
+    def _podar(self):
+        if len(self.candidatos) <= self.top_k * 2:
+            return
+        valores = list(self.candidatos)
+        ordem = np.argsort(-self.estimar(valores), kind="mergesort")
+        self.candidatos = {valores[i] for i in ordem[: self.top_k * 2]}
+
+    def merge(self, outro):
+        self.tabela += outro.tabela
+        self.candidatos |= outro.candidatos
+        self._podar()
+        return self
+
+    def frequentes(self):
+        valores = list(self.candidatos)
+        estimativas = self.estimar(valores)
+        ordem = np.argsort(-estimativas, kind="mergesort")[: self.top_k]
+        return [[valores[i], int(estimativas[i])] for i in ordem]
+
+
+# ---------------- Momentos ----------------
+class Momentos:
+    """Contagem, média, variância, mínimo e máximo mescláveis (Chan et al.)."""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def _combinar(self, n, media, m2, minimo, maximo):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = media - self.media
+        self.media += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.minimo = min(self.minimo, minimo)
+        self.maximo = max(self.maximo, maximo)
+
+    def update(self, valores):
+        v = np.asarray(valores, dtype=np.float64)
+        v = v[~np.isnan(v)]
+        if v.size == 0:
+            return
+        media = float(v.mean())
+        self._combinar(int(v.size), media, float(((v - media) ** 2).sum()), float(v.min()), float(v.max()))
+
+    def merge(self, outro):
+        self._combinar(outro.n, outro.media, outro.m2, outro.minimo, outro.maximo)
+        return self
+
+    @property
+    def desvio(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else None
+
+
+# ---------------- Colunas e documento ----------------
+class ColunaSketch:
+    """Agrupa os sketches de uma coluna; numéricos e texto são tratados à parte."""
+
+    def __init__(self, nome, hll_p=12):
+        self.nome = nome
+        self.dtype = None
+        self.total = 0
+        self.nulos = 0
+        self.hll = HyperLogLog(hll_p)
+        self.momentos = Momentos()
+        self.kll = KLL()
+        self.cms = CountMin()
+
+    def update(self, serie, dtype=None):
+        """`serie` já normalizada (ver `normalizar_serie`); `dtype` é o tipo original."""
+        self.total += len(serie)
+        nao_nulos = serie.notna().to_numpy()
+        self.nulos += int(len(serie) - nao_nulos.sum())
+        dtype = dtype or str(serie.dtype)
+        self.dtype = dtype if self.dtype in (None, dtype) else "object"
+
+        hashes = hash_serie(serie)
+        self.hll.update_hashes(hashes[nao_nulos])
+        if pd.api.types.is_numeric_dtype(serie):
+            valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+            self.momentos.update(valores)
+            self.kll.update(valores)
+        else:
+            self.cms.update(serie)
+        return hashes
+
+    def merge(self, outro):
+        self.total += outro.total
+        self.nulos += outro.nulos
+        if outro.dtype is not None:
+            self.dtype = outro.dtype if self.dtype in (None, outro.dtype) else "object"
+        self.hll.merge(outro.hll)
+        self.momentos.merge(outro.momentos)
+        self.kll.merge(outro.kll)
+        self.cms.merge(outro.cms)
+        return self
+
+    def resumo(self):
+        r = {
+            "dtype": self.dtype,
+            "total": self.total,
+            "nulos": self.nulos,
+            "distintos": self.hll.estimativa(),
+        }
+        if self.momentos.n:
+            r.update({
+                "media": self.momentos.media,
+                "desvio": self.momentos.desvio,
+                "min": self.momentos.minimo,
+                "max": self.momentos.maximo,
+                "quantis": {f"p{int(q * 100):02d}": v for q, v in zip(QUANTIS_PADRAO, self.kll.quantis())},
+            })
+        frequentes = self.cms.frequentes()
+        if frequentes:
+            r["frequentes"] = frequentes
+        return r
+
+
+class PerfilSketch:
+    """Perfil aproximado de um documento, atualizado chunk a chunk."""
+
+    def __init__(self, hll_p_linhas=16):
+        self.linhas = 0
+        self.colunas = {}
+        self.hll_linhas = HyperLogLog(hll_p_linhas)
+        # hashes distintos das linhas; None depois de passar do limite (só HLL)
+        self.hashes_linhas = np.empty(0, dtype=np.uint64)
+
+    def _acumular_hashes(self, h):
+        atual = getattr(self, "hashes_linhas", None)
+        if atual is None:
+            return
+        unicos = np.union1d(atual, h)
+        self.hashes_linhas = unicos if len(unicos) <= LIMITE_DUPLICADAS_EXATAS else None
+
+    def update(self, df):
+        if df is None or df.empty:
+            return self
+        hashes = []
+        for col in df.columns:
+            sk = self.colunas.setdefault(col, ColunaSketch(col))
+            hashes.append(sk.update(normalizar_serie(df[col]), str(df[col].dtype)))
+        h = hash_linhas(hashes, len(df))
+        self.hll_linhas.update_hashes(h)
+        self._acumular_hashes(h)
+        self.linhas += len(df)
+        return self
+
+    def merge(self, outro):
+        self.linhas += outro.linhas
+        for col, sk in outro.colunas.items():
+            if col in self.colunas:
+                self.colunas[col].merge(sk)
+            else:
+                self.colunas[col] = sk
+        self.hll_linhas.merge(outro.hll_linhas)
+        outros = getattr(outro, "hashes_linhas", None)
+        if outros is None:
+            self.hashes_linhas = None
+        else:
+            self._acumular_hashes(outros)
+        return self
+
+    def resumo(self):
+        """Resumo serializável em JSON (usado no dashboard, PDF e Documentos.estatisticas)."""
+        por_coluna = {col: sk.resumo() for col, sk in self.colunas.items()}
+        hashes = getattr(self, "hashes_linhas", None)
+        if hashes is not None:
+            distintas, margem = len(hashes), 0
+        else:
+            # linhas - distintas herda o erro do HLL: margem de ~2 desvios (95%)
+            distintas = min(self.hll_linhas.estimativa(), self.linhas)
+            margem = int(math.ceil(2 * self.hll_linhas.erro_relativo * distintas))
+        return {
+            "aproximado": True,
+            "linhas": self.linhas,
+            "colunas": len(self.colunas),
+            "ausentes": sum(c["nulos"] for c in por_coluna.values()),
+            "duplicadas": max(0, self.linhas - distintas),
+            "duplicadas_exatas": hashes is not None,
+            "margem_duplicadas": margem,
+            "erro_relativo_distintos": self.hll_linhas.erro_relativo,
+            "por_coluna": por_coluna,
+        }
+
+    def to_bytes(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, dados):
+        return pickle.loads(dados)
+
+
+def salvar_perfil(perfil, caminho):
+    """Persiste o estado completo do perfil (necessário para mesclar depois)."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "wb") as f:
+        f.write(perfil.to_bytes())
+
+
+def carregar_perfil(caminho):
+    """Carrega um perfil salvo por `salvar_perfil`; None se não existir."""
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "rb") as f:
+        return PerfilSketch.from_bytes(f.read())
+
+
+def perfilar_chunks(chunks, perfil=None):
+    """Percorre os chunks uma única vez acumulando em `perfil` (ou em um novo)."""
+    perfil = perfil or PerfilSketch()
+    for chunk in chunks:
+        perfil.update(chunk)
+    return perfil
+
+
+def margem_duplicadas(resumo):
+    """Margem (±) da contagem de duplicadas de um resumo; 0 quando ela é exata."""
+    if not resumo or resumo.get("duplicadas_exatas", not resumo.get("aproximado")):
+        return 0
+    if "margem_duplicadas" in resumo:
+        return int(resumo["margem_duplicadas"])
+    # resumos gravados antes da contagem exata: só havia a estimativa do HLL
+    erro = resumo.get("erro_relativo_distintos", 0)
+    distintas = resumo.get("linhas", 0) - resumo.get("duplicadas", 0)
+    return int(math.ceil(2 * erro * distintas))
+
+
+def estatisticas_tabela(resumo):
+    """Converte o resumo no formato de linhas de `describe(include='all')`."""
+    linhas = []
+    for col, r in resumo.get("por_coluna", {}).items():
+        quantis = r.get("quantis") or {}
+        top = (r.get("frequentes") or [[None, None]])[0]
+        linhas.append({
+            "index": col,
+            "count": r["total"] - r["nulos"],
+            "unique": r["distintos"],
+            "top": top[0] if top[0] is not None else "",
+            "freq": top[1] if top[1] is not None else "",
+            "mean": r.get("media", ""),
+            "std": r.get("desvio") if r.get("desvio") is not None else "",
+            "min": r.get("min", ""),
+            "25%": quantis.get("p25", ""),
+            "50%": quantis.get("p50", ""),
+            "75%": quantis.get("p75", ""),
+            "max": r.get("max", ""),
+        })
+    return linhas
@@ -0,0 +1,358 @@
+# app/utils/validacao.py
+"""
+Validação declarativa dos dados limpos. Cada regra vira uma máscara
+booleana vetorizada (True = linha com falha) avaliada chunk a chunk; o
+resultado traz a contagem de falhas por regra e um índice compacto das
+linhas com falha (posição na versão + um bit por regra), gravado ao lado
+da execução para paginar as linhas depois.
+
+Regras (lista de objetos; "nome" é opcional):
+    {"tipo": "nao_nulo",  "coluna": "id"}
+    {"tipo": "intervalo", "coluna": "idade", "min": 0, "max": 120}
+    {"tipo": "regex",     "coluna": "email", "padrao": "[^@]+@[^@]+"}
+    {"tipo": "valores",   "coluna": "uf", "permitidos": ["SP", "RJ"]}
+    {"tipo": "unico",     "colunas": ["cpf"]}
+    {"tipo": "expressao", "expressao": "fim >= inicio"}
+    {"tipo": "dtype",     "coluna": "total", "dtype": "numero"}
+
+Nulos só falham em "nao_nulo" (e em "unico", nunca); cada regra cuida de
+um aspecto. Sem regras, valem as padrão (numéricas sem nulos e >= 0).
+"""
+import os
+import re
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .sketches import HashesVistos, hash_linhas, hash_serie, normalizar_serie
+
+TIPOS_REGRA = ("nao_nulo", "intervalo", "regex", "valores", "unico", "expressao", "dtype")
+DTYPES = ("numero", "inteiro", "texto", "data", "booleano")
+_BOOLEANOS = {"true", "false", "1", "0", "sim", "nao", "não", "s", "n", "t", "f", "yes", "no"}
+
+
+# ---------------- Compilação ----------------
+def _exigir(regra, chave, nome):
+    if regra.get(chave) in (None, "", []):
+        raise ValueError(f"Regra '{nome}' sem '{chave}'.")
+    return regra[chave]
+
+
+def compilar_regras(regras) -> list:
+    """
+    Valida a lista de regras e devolve cópias normalizadas (com "nome" e
+    "colunas"); levanta ValueError com a primeira inconsistência.
+    """
+    if regras is None:
+        return []
+    if not isinstance(regras, list):
+        raise ValueError("'validacao' deve ser uma lista de regras.")
+
+    compiladas, nomes = [], set()
+    for i, regra in enumerate(regras):
+        if not isinstance(regra, dict):
+            raise ValueError(f"Regra de validação {i + 1} deve ser um objeto.")
+        tipo = regra.get("tipo")
+        if tipo not in TIPOS_REGRA:
+            raise ValueError(f"Tipo de regra inválido na regra {i + 1} (use {', '.join(TIPOS_REGRA)}).")
+
+        colunas = regra.get("colunas") or ([regra["coluna"]] if regra.get("coluna") else [])
+        if isinstance(colunas, str):
+            colunas = [colunas]
+        if tipo != "expressao" and not colunas:
+            raise ValueError(f"Regra {i + 1} ({tipo}) sem 'coluna'.")
+        if not all(isinstance(c, str) for c in colunas):
+            raise ValueError(f"Colunas da regra {i + 1} devem ser nomes (texto).")
+        nome = str(regra.get("nome") or f"{tipo}:{'+'.join(colunas) or regra.get('expressao', '')}")[:200]
+        if nome in nomes:
+            raise ValueError(f"Nome de regra repetido: '{nome}'.")
+        nomes.add(nome)
+        compilada = {"nome": nome, "tipo": tipo, "colunas": colunas}
+
+        if tipo == "intervalo":
+            limites = {k: regra.get(k) for k in ("min", "max")}
+            if all(v is None for v in limites.values()):
+                raise ValueError(f"Regra '{nome}' precisa de 'min' e/ou 'max'.")
+            for k, v in limites.items():
+                if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float))):
+                    raise ValueError(f"'{k}' da regra '{nome}' deve ser numérico.")
+            compilada.update(limites)
+        elif tipo == "regex":
+            padrao = _exigir(regra, "padrao", nome)
+            try:
+                re.compile(padrao)
+            except (re.error, TypeError) as e:
+                raise ValueError(f"Padrão inválido na regra '{nome}': {e}") from None
+            compilada["padrao"] = padrao
+        elif tipo == "valores":
+            permitidos = _exigir(regra, "permitidos", nome)
+            if not isinstance(permitidos, list):
+                raise ValueError(f"'permitidos' da regra '{nome}' deve ser uma lista.")
+            compilada["permitidos"] = permitidos
+        elif tipo == "expressao":
+            expressao = str(_exigir(regra, "expressao", nome))
+            # df.eval não aceita atribuição nem variáveis locais (@) aqui
+            if "@" in expressao or "__" in expressao or re.search(r"(?<![<>=!])=(?!=)", expressao):
+                raise ValueError(f"Expressão não permitida na regra '{nome}'.")
+            compilada["expressao"] = expressao
+        elif tipo == "dtype":
+            dtype = regra.get("dtype")
+            if dtype not in DTYPES:
+                raise ValueError(f"'dtype' inválido na regra '{nome}' (use {', '.join(DTYPES)}).")
+            compilada["dtype"] = dtype
+        compiladas.append(compilada)
+    return compiladas
+
+
+def regras_padrao(df: pd.DataFrame) -> list:
+    """Critérios históricos: colunas numéricas sem nulos e sem valores negativos."""
+    regras = []
+    for c in df.select_dtypes(include=[np.number]).columns:
+        regras.append({"nome": f"nao_nulo:{c}", "tipo": "nao_nulo", "colunas": [str(c)]})
+        regras.append({"nome": f"intervalo:{c}", "tipo": "intervalo", "colunas": [str(c)], "min": 0, "max": None})
+    return regras
+
+
+def colunas_das_regras(regras) -> list:
+    """Colunas citadas explicitamente (expressões são checadas na avaliação)."""
+    vistas = []
+    for regra in regras or []:
+        vistas += [c for c in regra["colunas"] if c not in vistas]
+    return vistas
+
+
+# ---------------- Máscaras ----------------
+def _por_distintos(serie, funcao):
+    """
+    Aplica `funcao` (Series → Series booleana) só aos valores distintos de
+    texto e espalha o resultado pelas linhas: colunas categóricas (UF,
+    status, e-mails repetidos) avaliam poucos valores em vez de milhões.
+    """
+    codigos, distintos = pd.factorize(serie, use_na_sentinel=True)
+    resultado = funcao(pd.Series(distintos, dtype=serie.dtype)).to_numpy(dtype=bool, na_value=False)
+    return np.where(codigos >= 0, resultado[codigos], False) if len(resultado) else np.zeros(len(serie), dtype=bool)
+
+
+def _numerico(serie):
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie
+    return pd.to_numeric(serie, errors="coerce")
+
+
+def _falha_nao_nulo(regra, df, estado):
+    return df[regra["colunas"][0]].isna().to_numpy()
+
+
+def _falha_intervalo(regra, df, estado):
+    valores = _numerico(df[regra["colunas"][0]])
+    fora = np.zeros(len(df), dtype=bool)
+    if regra.get("min") is not None:
+        fora |= (valores < regra["min"]).to_numpy(dtype=bool, na_value=False)
+    if regra.get("max") is not None:
+        fora |= (valores > regra["max"]).to_numpy(dtype=bool, na_value=False)
+    return fora
+
+
+def _falha_regex(regra, df, estado):
+    serie = df[regra["colunas"][0]]
+    casou = _por_distintos(serie, lambda s: s.astype("str").str.fullmatch(regra["padrao"]))
+    return serie.notna().to_numpy() & ~casou
+
+
+def _falha_valores(regra, df, estado):
+    serie = df[regra["colunas"][0]]
+    return serie.notna().to_numpy() & ~_por_distintos(serie, lambda s: s.isin(regra["permitidos"]))
+
+
+def _falha_unico(regra, df, estado):
+    """Repetições da chave (a primeira ocorrência passa), entre chunks pelos hashes já vistos."""
+    chave = df[regra["colunas"]]
+    completas = chave.notna().all(axis=1).to_numpy()
+    hashes = hash_linhas([hash_serie(normalizar_serie(chave[c])) for c in chave.columns], len(chave))
+    vistos = estado.setdefault("vistos", HashesVistos())
+    repetidas = pd.Series(hashes).duplicated().to_numpy() | vistos.contem(hashes)
+    vistos.adicionar(hashes[completas & ~repetidas])
+    return completas & repetidas
+
+
+def _falha_expressao(regra, df, estado):
+    try:
+        resultado = df.eval(regra["expressao"])
+    except Exception as e:
+        raise ValueError(f"Expressão inválida na regra '{regra['nome']}': {e}") from None
+    if not isinstance(resultado, pd.Series) or not pd.api.types.is_bool_dtype(resultado):
+        raise ValueError(f"A expressão da regra '{regra['nome']}' deve comparar colunas linha a linha.")
+    # linhas com nulo nas colunas citadas passam (nulos são papel do nao_nulo)
+    citadas = [c for c in re.findall(r"`([^`]+)`|([A-Za-z_]\w*)", regra["expressao"])]
+    citadas = {a or b for a, b in citadas} & set(map(str, df.columns))
+    nulos = df[list(citadas)].isna().any(axis=1).to_numpy() if citadas else False
+    return ~resultado.to_numpy(dtype=bool, na_value=True) & ~nulos
+
+
+def _falha_dtype(regra, df, estado):
+    serie = df[regra["colunas"][0]]
+    presentes = serie.notna()
+    dtype = regra["dtype"]
+    if dtype in ("numero", "inteiro"):
+        def conforme(s):
+            valores = _numerico(s)
+            return valores.notna() & ((valores % 1 == 0) if dtype == "inteiro" else True)
+        nativo = pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+        if nativo and dtype == "numero":
+            return np.zeros(len(serie), dtype=bool)
+    elif dtype == "data":
+        nativo = pd.api.types.is_datetime64_any_dtype(serie)
+        def conforme(s):
+            return pd.to_datetime(s.astype("str"), errors="coerce", format="mixed").notna()
+    elif dtype == "booleano":
+        nativo = pd.api.types.is_bool_dtype(serie)
+        def conforme(s):
+            return s.astype("str").str.strip().str.lower().isin(_BOOLEANOS)
+    else:
+        nativo = pd.api.types.is_string_dtype(serie) and serie.dtype != object
+        def conforme(s):
+            return s.map(lambda v: isinstance(v, str))
+    if nativo and dtype != "inteiro":
+        return np.zeros(len(serie), dtype=bool)
+    return presentes.to_numpy() & ~_por_distintos(serie, conforme)
+
+
+_MASCARAS = {
+    "nao_nulo": _falha_nao_nulo,
+    "intervalo": _falha_intervalo,
+    "regex": _falha_regex,
+    "valores": _falha_valores,
+    "unico": _falha_unico,
+    "expressao": _falha_expressao,
+    "dtype": _falha_dtype,
+}
+
+
+# ---------------- Avaliação ----------------
+class Validador:
+    """
+    Avalia as regras chunk a chunk. As posições das linhas com falha são
+    contadas a partir do primeiro chunk (mesma ordem da versão gravada).
+    Sem `regras`, usa `regras_padrao` do primeiro chunk não vazio.
+    """
+
+    def __init__(self, regras=None):
+        self.padrao = not regras
+        self.regras = None if self.padrao else compilar_regras(regras)
+        self.linhas = 0
+        self._estados = []
+        self._contagens = None
+        self._posicoes, self._bits = [], []
+
+    def _preparar(self, df):
+        if self.regras is None:
+            self.regras = regras_padrao(df)
+        faltando = [c for c in colunas_das_regras(self.regras) if c not in df.columns]
+        if faltando:
+            raise ValueError(f"Colunas inexistentes nas regras de validação: {', '.join(faltando)}.")
+        self._estados = [{} for _ in self.regras]
+        self._contagens = np.zeros(len(self.regras), dtype=np.int64)
+
+    def adicionar(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        if self._contagens is None:
+            self._preparar(df)
+
+        matriz = np.zeros((len(df), len(self.regras)), dtype=bool)
+        for j, (regra, estado) in enumerate(zip(self.regras, self._estados)):
+            matriz[:, j] = _MASCARAS[regra["tipo"]](regra, df, estado)
+        self._contagens += matriz.sum(axis=0)
+
+        com_falha = np.flatnonzero(matriz.any(axis=1))
+        if len(com_falha):
+            self._posicoes.append(com_falha + self.linhas)
+            self._bits.append(np.packbits(matriz[com_falha], axis=1))
+        self.linhas += len(df)
+
+    def indice(self):
+        """(posições das linhas com falha, bits por regra empacotados, nomes das regras)."""
+        nomes = [r["nome"] for r in self.regras or []]
+        largura = (len(nomes) + 7) // 8
+        posicoes = np.concatenate(self._posicoes) if self._posicoes else np.empty(0, dtype=np.int64)
+        bits = np.concatenate(self._bits) if self._bits else np.empty((0, largura), dtype=np.uint8)
+        # uint32 basta até 4 bilhões de linhas: metade do espaço
+        tipo = np.uint32 if self.linhas < 2 ** 32 else np.uint64
+        return posicoes.astype(tipo), bits, nomes
+
+    def resultado(self) -> dict:
+        if not self.linhas:
+            return {"valid": False, "reason": "DataFrame vazio ou nulo", "row_count": 0}
+
+        contagens = self._contagens.tolist()
+        regras = [
+            {"nome": r["nome"], "tipo": r["tipo"], "colunas": r["colunas"], "falhas": int(n)}
+            for r, n in zip(self.regras, contagens)
+        ]
+        linhas_com_falha = int(sum(len(p) for p in self._posicoes))
+        resultado = {
+            "row_count": self.linhas,
+            "valid": linhas_com_falha == 0,
+            "linhas_com_falha": linhas_com_falha,
+            "regras": regras,
+            "messages": [
+                f"{r['nome']}: {r['falhas']} linha(s) com falha" for r in regras if r["falhas"]
+            ],
+        }
+        if self.padrao:
+            # chaves históricas (tela e relatório); "positivos" exigia também não nulos
+            nulos = sum(r["falhas"] for r in regras if r["tipo"] == "nao_nulo")
+            negativos = sum(r["falhas"] for r in regras if r["tipo"] == "intervalo")
+            resultado["no_nulls_numeric"] = nulos == 0
+            resultado["numeric_positive"] = nulos == 0 and negativos == 0
+        return resultado
+
+
+def validar_chunks(chunks, regras=None) -> Validador:
+    validador = Validador(regras)
+    for df in chunks:
+        validador.adicionar(df)
+    return validador
+
+
+# ---------------- Índice de falhas ----------------
+def salvar_indice(validador: Validador, caminho):
+    posicoes, bits, nomes = validador.indice()
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = f"{caminho}.{uuid.uuid4().hex}.npz"
+    np.savez_compressed(temporario, posicoes=posicoes, bits=bits, regras=np.array(nomes, dtype=str))
+    os.replace(temporario, caminho)
+
+
+def carregar_indice(caminho):
+    with np.load(caminho) as dados:
+        return dados["posicoes"], dados["bits"], dados["regras"].tolist()
+
+
+def contar_falhas(indice) -> dict:
+    """Falhas por regra, recontadas a partir dos bits do índice."""
+    _, bits, nomes = indice
+    contagens = np.unpackbits(bits, axis=1, count=len(nomes)).sum(axis=0)
+    return {n: int(c) for n, c in zip(nomes, contagens)}
+
+
+def pagina_falhas(indice, offset=0, limite=100, regra=None):
+    """
+    Fatia do índice: (total, [(posição, [regras que falharam])]). Com
+    `regra`, só as linhas que falharam nela.
+    """
+    posicoes, bits, nomes = indice
+    if regra is not None:
+        if regra not in nomes:
+            raise ValueError(f"Regra de validação desconhecida: '{regra}'.")
+        j = nomes.index(regra)
+        selecao = np.flatnonzero(bits[:, j // 8] & (0x80 >> (j % 8)))
+        posicoes, bits = posicoes[selecao], bits[selecao]
+
+    fatia = slice(offset, offset + limite)
+    matriz = np.unpackbits(bits[fatia], axis=1, count=len(nomes)).astype(bool)
+    return len(posicoes), [
+        (int(p), [n for n, falhou in zip(nomes, linha) if falhou])
+        for p, linha in zip(posicoes[fatia], matriz)
+    ]
@@ -0,0 +1,59 @@
+# app/utils/xlsx_stream.py
+"""
+Exportação XLSX em memória limitada: workbook `write_only` do openpyxl
+(as linhas vão para arquivos temporários, sem objetos Cell), alimentado
+chunk a chunk. Acima do limite de linhas do Excel os dados continuam em
+novas planilhas (Limpos, Limpos_2, ...).
+"""
+import os
+import uuid
+
+from openpyxl import Workbook
+
+# 1.048.576 linhas por planilha no Excel, menos a do cabeçalho
+LINHAS_POR_PLANILHA = 1_048_575
+
+
+def _linhas(df):
+    """Tuplas prontas para o openpyxl: NaN/NaT viram célula vazia, como no to_excel."""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def escrever_xlsx(chunks, destino, nome_planilha="Limpos", linhas_por_planilha=LINHAS_POR_PLANILHA):
+    """
+    Grava os DataFrames de `chunks` em `destino` (escrita atômica via arquivo
+    temporário). Retorna (linhas, planilhas).
+    """
+    wb = Workbook(write_only=True)
+    ws, colunas, planilhas, usadas, total = None, None, 0, 0, 0
+
+    def nova_planilha():
+        nonlocal ws, planilhas, usadas
+        planilhas += 1
+        ws = wb.create_sheet(nome_planilha if planilhas == 1 else f"{nome_planilha}_{planilhas}")
+        ws.append(colunas)
+        usadas = 0
+
+    for df in chunks:
+        if colunas is None:
+            colunas = [str(c) for c in df.columns]
+        inicio = 0
+        while inicio < len(df):
+            if ws is None or usadas >= linhas_por_planilha:
+                nova_planilha()
+            fatia = df.iloc[inicio:inicio + linhas_por_planilha - usadas]
+            for linha in _linhas(fatia):
+                ws.append(linha)
+            usadas += len(fatia)
+            inicio += len(fatia)
+        total += len(df)
+
+    if ws is None:
+        colunas = colunas or []
+        nova_planilha()
+
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+    wb.save(temporario)
+    os.replace(temporario, destino)
+    return total, planilhas
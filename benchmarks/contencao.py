@@ -0,0 +1,127 @@
+# benchmarks/contencao.py
+"""
+Simulação de contenção do agendador de operações pesadas: um usuário
+dispara uma rajada de limpezas enquanto outros fazem uploads (interativos)
+e uma limpeza cada. Compara as esperas com um semáforo FIFO (sem cotas nem
+prioridade). Os limites de vagas, cota, prioridade e memória são
+verificados em tests/test_agendador.py.
+
+Uso:
+    python -m benchmarks.run --modos contencao
+"""
+import threading
+import time
+
+from app.utils.agendador import Agendador
+
+DURACAO_LOTE = 0.05
+DURACAO_INTERATIVA = 0.01
+
+
+def _cenario(rajada=24, outros=3):
+    """Pedidos (usuario, prioridade, chegada em s, duração em s, memória), em ordem de chegada."""
+    pedidos = [("pesado", "lote", 0.0, DURACAO_LOTE, 300) for _ in range(rajada)]
+    for i in range(outros):
+        chegada = 0.02 + 0.01 * i
+        pedidos.append((f"usuario_{i}", "interativa", chegada, DURACAO_INTERATIVA, 50))
+        pedidos.append((f"usuario_{i}", "lote", chegada + 0.005, DURACAO_LOTE, 300))
+    return sorted(pedidos, key=lambda p: p[2])
+
+
+class _Observador:
+    """Acompanha a concorrência real (total, por usuário e memória em uso)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ativos, self.memoria, self.por_usuario = 0, 0, {}
+        self.max_ativos = self.max_memoria = self.max_por_usuario = 0
+
+    def entrar(self, usuario, memoria):
+        with self.lock:
+            self.ativos += 1
+            self.memoria += memoria
+            self.por_usuario[usuario] = self.por_usuario.get(usuario, 0) + 1
+            self.max_ativos = max(self.max_ativos, self.ativos)
+            self.max_memoria = max(self.max_memoria, self.memoria)
+            self.max_por_usuario = max(self.max_por_usuario, self.por_usuario[usuario])
+
+    def sair(self, usuario, memoria):
+        with self.lock:
+            self.ativos -= 1
+            self.memoria -= memoria
+            self.por_usuario[usuario] -= 1
+
+
+def _simular(pedidos, reservar):
+    """Roda os pedidos em threads; `reservar(usuario, prioridade, memoria)` é o context manager de admissão."""
+    observador, esperas = _Observador(), []
+    lock = threading.Lock()
+    inicio = time.perf_counter()
+
+    def rodar(usuario, prioridade, chegada, duracao, memoria):
+        time.sleep(max(0.0, inicio + chegada - time.perf_counter()))
+        pedido_em = time.perf_counter()
+        with reservar(usuario, prioridade, memoria):
+            admitido_em = time.perf_counter()
+            observador.entrar(usuario, memoria)
+            time.sleep(duracao)
+            observador.sair(usuario, memoria)
+        with lock:
+            esperas.append((usuario, prioridade, admitido_em - pedido_em))
+
+    threads = [threading.Thread(target=rodar, args=p) for p in pedidos]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return esperas, observador, time.perf_counter() - inicio
+
+
+def _max_espera(esperas, prioridade, pesado=False):
+    valores = [e for u, p, e in esperas if p == prioridade and (u == "pesado") == pesado]
+    return max(valores) if valores else 0.0
+
+
+def simular_contencao(vagas=4, por_usuario=2, memoria=1000):
+    """Retorna as linhas de resultado (formato do benchmarks.run), com os máximos observados."""
+    pedidos = _cenario()
+
+    semaforo = threading.Semaphore(vagas)
+
+    class _Fifo:
+        def __init__(self, *args):
+            pass
+
+        def __enter__(self):
+            semaforo.acquire()
+
+        def __exit__(self, *exc):
+            semaforo.release()
+
+    esperas_fifo, _, total_fifo = _simular(pedidos, _Fifo)
+
+    agendador = Agendador(vagas=vagas, por_usuario=por_usuario, memoria_bytes=memoria)
+    esperas, observador, total = _simular(
+        pedidos, lambda usuario, prioridade, mem: agendador.vaga(usuario, prioridade, memoria=mem)
+    )
+
+    # as limpezas dos outros usuários passam à frente do resto da rajada (comparação de tempos, não de regras)
+    assert _max_espera(esperas, "lote") < _max_espera(esperas_fifo, "lote") / 2
+
+    resultados = []
+    for nome, dados, duracao in (("contencao_fifo", esperas_fifo, total_fifo), ("contencao_agendador", esperas, total)):
+        resultados.append({
+            "etapa": nome,
+            "modo": "contencao",
+            "linhas": len(pedidos),
+            "segundos": round(duracao, 6),
+            "pico_mb": 0.0,
+            "linhas_por_s": None,
+            "espera_max_interativa_s": round(_max_espera(dados, "interativa"), 4),
+            "espera_max_lote_outros_s": round(_max_espera(dados, "lote"), 4),
+            "espera_max_lote_rajada_s": round(_max_espera(dados, "lote", pesado=True), 4),
+        })
+    resultados[-1].update(
+        max_ativos=observador.max_ativos, max_por_usuario=observador.max_por_usuario, max_memoria=observador.max_memoria,
+    )
+    return resultados
@@ -0,0 +1,85 @@
+# benchmarks/datasets.py
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+_PALAVRAS = ["ana", "bruno", "carla", "diego", "elisa", "fábio", "gisele", "joão", "márcia", "otávio"]
+_CIDADES = ["São Paulo", "Belém", "Florianópolis", "Maceió", "Goiânia", "Ribeirão Preto"]
+
+
+def gerar_dataset(
+    linhas=10_000,
+    colunas_numericas=6,
+    colunas_texto=2,
+    taxa_ausentes=0.05,
+    taxa_duplicadas=0.02,
+    taxa_outliers=0.01,
+    seed=42,
+):
+    """
+    Gera um DataFrame sintético com erros intencionais.
+    As taxas são frações do total de linhas/células (0.0 a 1.0).
+    """
+    rng = np.random.default_rng(seed)
+    n_unicas = max(1, int(round(linhas * (1 - taxa_duplicadas))))
+
+    dados = {}
+    for i in range(colunas_numericas):
+        col = rng.normal(loc=100 * (i + 1), scale=15 * (i + 1), size=n_unicas)
+        n_out = int(n_unicas * taxa_outliers)
+        if n_out:
+            idx = rng.choice(n_unicas, n_out, replace=False)
+            col[idx] *= rng.choice([-20, 20], n_out)
+        dados[f"num_{i}"] = col
+
+    for i in range(colunas_texto):
+        vocab = _CIDADES if i % 2 else _PALAVRAS
+        dados[f"txt_{i}"] = rng.choice(vocab, n_unicas)
+
+    df = pd.DataFrame(dados)
+
+    # Duplicatas: reamostra linhas já existentes
+    n_dup = linhas - n_unicas
+    if n_dup > 0:
+        df = pd.concat([df, df.sample(n_dup, replace=True, random_state=seed)], ignore_index=True)
+        df = df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+    # Ausentes: aplicados célula a célula, inclusive nas duplicatas
+    if taxa_ausentes > 0:
+        mascara = rng.random(df.shape) < taxa_ausentes
+        df = df.mask(mascara)
+
+    return df
+
+
+def serializar(df, formato="csv"):
+    """
+    Serializa o DataFrame no formato aceito pelo `load_dataframe`.
+    Retorna (bytes, nome_arquivo).
+    """
+    if formato in ("csv", "sociocsv"):
+        out = io.StringIO()
+        df.to_csv(out, sep=";", index=False)
+        ext = ".csv" if formato == "csv" else ".sociocsv"
+        return out.getvalue().encode("latin1", errors="replace"), f"dataset{ext}"
+
+    if formato == "json":
+        return df.to_json(orient="records", force_ascii=False).encode("utf-8"), "dataset.json"
+
+    if formato == "xlsx":
+        out = io.BytesIO()
+        with pd.ExcelWriter(out, engine="openpyxl") as writer:
+            df.to_excel(writer, index=False, sheet_name="Dados")
+        return out.getvalue(), "dataset.xlsx"
+
+    raise ValueError(f"Formato desconhecido: {formato}")
+
+
+def compactar(conteudo, nome):
+    """Empacota um arquivo em ZIP (como chegam os arquivos sociocsv)."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(nome, conteudo)
+    return out.getvalue(), f"{nome.rsplit('.', 1)[0]}.zip"
@@ -0,0 +1,101 @@
+# benchmarks/import_time.py
+"""
+Mede o tempo de subida do app (`create_app()`) em um processo novo, com
+`python -X importtime`, e lista os módulos mais caros e quais módulos
+pesados (pandas, sklearn, matplotlib...) foram carregados na subida.
+
+Uso:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --top 30 --saida import_time.json
+    python -m benchmarks.import_time --falhar-se-pesados   # para CI
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Módulos que não devem ser importados só para subir o app
+PESADOS = ("pandas", "numpy", "sklearn", "scipy", "matplotlib", "reportlab", "openpyxl", "pyarrow")
+
+_CODIGO = """
+import json, sys, time
+inicio = time.perf_counter()
+from app.main import create_app
+create_app()
+print(json.dumps({"segundos": time.perf_counter() - inicio, "modulos": sorted(sys.modules)}))
+"""
+
+
+def _parse_importtime(stderr):
+    """Linhas `import time: self | cumulative | nome` → {nome: (self_us, cumulativo_us)}."""
+    tempos = {}
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        try:
+            proprio, cumulativo, nome = linha[len("import time:"):].split("|")
+            tempos[nome.strip()] = (int(proprio), int(cumulativo))
+        except ValueError:
+            continue
+    return tempos
+
+
+def medir_subida(env=None):
+    """Sobe o app em um subprocesso e retorna tempos, módulos carregados e o parse do importtime."""
+    inicio = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CODIGO],
+        capture_output=True, text=True, env={**os.environ, **(env or {})},
+    )
+    parede = time.perf_counter() - inicio
+    if proc.returncode != 0:
+        raise RuntimeError(f"create_app() falhou:\n{proc.stderr[-4000:]}")
+
+    saida = json.loads(proc.stdout.strip().splitlines()[-1])
+    tempos = _parse_importtime(proc.stderr)
+    raizes = {m.split(".")[0] for m in saida["modulos"]}
+    return {
+        "processo_s": round(parede, 3),
+        "create_app_s": round(saida["segundos"], 3),
+        "imports_s": round(sum(p for p, _ in tempos.values()) / 1e6, 3),
+        "modulos": len(saida["modulos"]),
+        "pesados_carregados": [m for m in PESADOS if m in raizes],
+        "tempos": tempos,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de subida do app NeoData.")
+    parser.add_argument("--top", type=int, default=20, help="Quantos módulos listar (por tempo cumulativo).")
+    parser.add_argument("--saida", help="Grava o resultado em JSON.")
+    parser.add_argument("--falhar-se-pesados", action="store_true",
+                        help="Sai com código 1 se algum módulo pesado for importado na subida.")
+    args = parser.parse_args(argv)
+
+    r = medir_subida()
+    print(f"processo: {r['processo_s']:.3f} s | create_app(): {r['create_app_s']:.3f} s | "
+          f"imports: {r['imports_s']:.3f} s | {r['modulos']} módulos")
+    print(f"pesados carregados: {', '.join(r['pesados_carregados']) or 'nenhum'}")
+
+    # Só módulos de topo (ex.: "flask", "sqlalchemy"): o cumulativo já inclui os submódulos
+    topo = sorted(
+        ((nome, c) for nome, (_, c) in r["tempos"].items() if "." not in nome),
+        key=lambda x: -x[1],
+    )[:args.top]
+    print(f"\n{'módulo':<40} {'cumulativo (ms)':>16}")
+    for nome, cumulativo in topo:
+        print(f"{nome:<40} {cumulativo / 1000:>16.1f}")
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({**r, "tempos": dict(topo)}, f, indent=2)
+
+    if args.falhar_se_pesados and r["pesados_carregados"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
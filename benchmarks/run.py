@@ -0,0 +1,435 @@
+# benchmarks/run.py
+"""
+Benchmark do pipeline ingestão → limpeza → exportação.
+
+Uso:
+    python -m benchmarks.run --tamanhos 1000,10000,100000 --saida bench.json
+    python -m benchmarks.run --comparar antes.json depois.json
+    python -m benchmarks.run --modos contencao --tamanhos ""
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from .datasets import compactar, gerar_dataset, serializar
+
+
+def medir(fn, repeticoes=1):
+    """Executa `fn` e retorna (resultado, melhor tempo em s, pico de memória em MB)."""
+    melhor, pico, resultado = float("inf"), 0, None
+    for _ in range(repeticoes):
+        gc.collect()
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = fn()
+        duracao = time.perf_counter() - inicio
+        _, pico_atual = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        melhor = min(melhor, duracao)
+        pico = max(pico, pico_atual)
+    return resultado, melhor, pico / (1024 * 1024)
+
+
+def _registro(etapa, modo, linhas, segundos, pico_mb, **extra):
+    return {
+        "etapa": etapa,
+        "modo": modo,
+        "linhas": linhas,
+        "segundos": round(segundos, 6),
+        "pico_mb": round(pico_mb, 3),
+        "linhas_por_s": round(linhas / segundos, 1) if segundos > 0 else None,
+        **extra,
+    }
+
+
+# ---------------- Standalone ----------------
+def bench_standalone(linhas, formato, repeticoes, tmpdir, n_jobs=4, **dataset_kwargs):
+    from app.cleaning import (
+        analyze_dataframe, calcular_estatisticas_regras_chunks, clean_dataframe, clean_dataframe_regras,
+        detectar_formatos, limpar_chunks_regras, normalizar_dataframe, validate_dataframe,
+    )
+    from app.connectors.sql import exportar_chunks
+    from app.utils.amostragem import AmostraReservatorio
+    from app.utils.cache_colunar import abrir, materializar
+    from app.utils.deriva import assinatura, comparar as comparar_assinaturas
+    from app.utils.agregacao import agregar_chunks, compilar_consulta
+    from app.utils.file_loader import fatiar_dataframe, load_dataframe
+    from app.utils.quase_duplicadas import detectar_chunks, planejar
+    from app.utils.registros import codificar_linhas, decodificar_linhas
+    from app.utils.report_generator import gerar_relatorio_pdf
+    from app.utils.sketches import PerfilSketch
+    from app.utils.run_store import carregar_versao, iter_versao, salvar_versao
+    from app.utils.validacao import validar_chunks
+    from app.utils.xlsx_stream import escrever_xlsx
+
+    df_base = gerar_dataset(linhas=linhas, **dataset_kwargs)
+    conteudo, nome = serializar(df_base, formato)
+    caminho = os.path.join(tmpdir, f"{linhas}_{nome}")
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+
+    resultados = []
+    chunk_rows = max(1, linhas // n_jobs)
+    df, t, m = medir(lambda: load_dataframe(caminho), repeticoes)
+    resultados.append(_registro("load_dataframe", "standalone", linhas, t, m, formato=formato))
+
+    if formato == "xlsx":
+        # Leitor anterior (pd.read_excel, só a primeira planilha) x read_only em chunks
+        _, t, m = medir(lambda: pd.read_excel(caminho), repeticoes)
+        resultados.append(_registro("read_excel_pandas", "standalone", linhas, t, m))
+
+    before, t, m = medir(lambda: analyze_dataframe(df), repeticoes)
+    resultados.append(_registro("analyze_dataframe", "standalone", linhas, t, m))
+
+    limpo, t, m = medir(lambda: clean_dataframe(df.copy()), repeticoes)
+    resultados.append(_registro("clean_dataframe", "standalone", linhas, t, m))
+
+    # knn com os modelos ajustados em uma amostra (MODEL_SAMPLE_ROWS) e aplicados ao frame inteiro
+    treino = 20_000
+    _, t, m = medir(lambda: clean_dataframe(df.copy(), treino=treino), repeticoes)
+    resultados.append(_registro("clean_knn_amostra", "standalone", linhas, t, m, treino=min(treino, linhas)))
+
+    _, t, m = medir(lambda: clean_dataframe_regras(df), repeticoes)
+    resultados.append(_registro("clean_regras_serial", "standalone", linhas, t, m))
+
+    _, t, m = medir(lambda: clean_dataframe_regras(df, n_jobs=n_jobs, chunk_rows=chunk_rows), repeticoes)
+    resultados.append(_registro("clean_regras_paralelo", "standalone", linhas, t, m, n_jobs=n_jobs))
+
+    # Seleção de colunas: só as duas primeiras numéricas são limpas, as demais passam intactas
+    numericas = df.select_dtypes(include="number").columns.tolist()
+    _, t, m = medir(lambda: clean_dataframe_regras(df, colunas=numericas[:2]), repeticoes)
+    resultados.append(_registro("clean_regras_colunas", "standalone", linhas, t, m, colunas=2))
+
+    def regras_streaming():
+        estatisticas = calcular_estatisticas_regras_chunks(fatiar_dataframe(df, chunk_rows))
+        return pd.concat(limpar_chunks_regras(fatiar_dataframe(df, chunk_rows), estatisticas), ignore_index=True)
+
+    _, t, m = medir(regras_streaming, repeticoes)
+    resultados.append(_registro("clean_regras_streaming", "standalone", linhas, t, m, chunk_rows=chunk_rows))
+
+    # Registros no banco: objeto JSON por linha (formato antigo) x array posicional + esquema
+    colunas = list(df.columns)
+
+    def registros_objeto():
+        dados = [json.dumps(r) for r in df.to_dict(orient="records")]
+        return dados, pd.DataFrame([json.loads(d) for d in dados])
+
+    def registros_array():
+        dados = [json.dumps(r) for r in codificar_linhas(df, colunas)]
+        return dados, decodificar_linhas([json.loads(d) for d in dados], colunas)
+
+    (objetos, _), t, m = medir(registros_objeto, repeticoes)
+    resultados.append(_registro("registros_objeto", "standalone", linhas, t, m, bytes=sum(map(len, objetos))))
+    (arrays, _), t, m = medir(registros_array, repeticoes)
+    resultados.append(_registro("registros_array", "standalone", linhas, t, m, bytes=sum(map(len, arrays))))
+
+    destino = f"sqlite:///{os.path.join(tmpdir, f'export_{linhas}.db')}"
+    _, t, m = medir(lambda: exportar_chunks([limpo], destino, "limpos", modo="append"), repeticoes)
+    resultados.append(_registro("exportar_sqlite", "standalone", linhas, t, m))
+
+    # XLSX: caminho antigo (ExcelWriter em memória) x workbook write_only em chunks
+    xlsx_pandas = os.path.join(tmpdir, f"pandas_{linhas}.xlsx")
+    xlsx_stream = os.path.join(tmpdir, f"stream_{linhas}.xlsx")
+
+    def xlsx_em_memoria():
+        with pd.ExcelWriter(xlsx_pandas, engine="openpyxl") as writer:
+            limpo.to_excel(writer, index=False, sheet_name="Limpos")
+
+    _, t, m = medir(xlsx_em_memoria, repeticoes)
+    resultados.append(_registro("xlsx_pandas", "standalone", linhas, t, m, bytes=os.path.getsize(xlsx_pandas)))
+    _, t, m = medir(lambda: escrever_xlsx(fatiar_dataframe(limpo, chunk_rows), xlsx_stream), repeticoes)
+    resultados.append(_registro("xlsx_streaming", "standalone", linhas, t, m, bytes=os.path.getsize(xlsx_stream)))
+
+    # Validação declarativa com as regras de cada tipo
+    val = validate_dataframe(limpo)
+    regras_validacao = [
+        {"tipo": "nao_nulo", "coluna": "num_0"},
+        {"tipo": "intervalo", "coluna": "num_1", "min": 0, "max": 500},
+        {"tipo": "valores", "coluna": "txt_0", "permitidos": ["ana", "bruno", "carla"]},
+        {"tipo": "regex", "coluna": "txt_1", "padrao": r"[A-Z][a-zà-ú]+( [A-Z][a-zà-ú]+)*"},
+        {"tipo": "unico", "colunas": ["num_0", "txt_0"]},
+        {"tipo": "expressao", "expressao": "num_0 < num_1"},
+        {"tipo": "dtype", "coluna": "txt_0", "dtype": "texto"},
+    ]
+    validador, t, m = medir(
+        lambda: validar_chunks(fatiar_dataframe(df, chunk_rows), regras_validacao), repeticoes
+    )
+    posicoes, bits, _ = validador.indice()
+    resultados.append(_registro(
+        "validacao_regras", "standalone", linhas, t, m,
+        regras=len(regras_validacao), linhas_com_falha=len(posicoes), bytes_indice=posicoes.nbytes + bits.nbytes,
+    ))
+
+    # Agregação: parciais por chunk lendo 3 colunas da versão vs. carregar a versão e agrupar
+    pasta_blocos = os.path.join(tmpdir, f"blocos_{linhas}")
+    manifesto, _ = salvar_versao(limpo, pasta_blocos, chunk_linhas=max(chunk_rows // 4, 1))
+    consulta = compilar_consulta({
+        "grupos": ["txt_0"], "filtros": [{"coluna": "num_1", "op": ">", "valor": 0}],
+        "medidas": [{"funcao": "soma", "coluna": "num_0"}, {"funcao": "media", "coluna": "num_0"}, {"funcao": "contagem"}],
+    })
+
+    def agregar_versao_inteira():
+        versao = carregar_versao(manifesto, pasta_blocos)
+        return versao[versao["num_1"] > 0].groupby("txt_0", dropna=False).agg(
+            soma_num_0=("num_0", "sum"), media_num_0=("num_0", "mean"), contagem=("num_0", "size"),
+        ).reset_index()
+
+    _, t, m = medir(agregar_versao_inteira, repeticoes)
+    resultados.append(_registro("agregacao_versao_inteira", "standalone", linhas, t, m))
+    (_, grupos_agg, _), t, m = medir(
+        lambda: agregar_chunks(iter_versao(manifesto, pasta_blocos, ["txt_0", "num_0", "num_1"]), consulta), repeticoes
+    )
+    resultados.append(_registro("agregacao", "standalone", linhas, t, m, grupos=grupos_agg))
+
+    # Normalização: moeda/datas brasileiras em texto vs. conversão valor a valor
+    formatados = pd.DataFrame({
+        "valor": "R$ " + df["num_1"].fillna(0).round(2).map("{:,.2f}".format).str.translate(str.maketrans(",.", ".,")),
+        "data": (pd.Timestamp("2020-01-01") + pd.to_timedelta(df["num_0"].fillna(0).abs().astype(int) % 1500, unit="D"))
+        .dt.strftime("%d/%m/%Y"),
+    })
+
+    def normalizar_por_valor():
+        valores = [float(v.replace("R$", "").replace(".", "").replace(",", ".")) for v in formatados["valor"]]
+        return pd.Series(valores), pd.to_datetime(formatados["data"], dayfirst=True, format="mixed")
+
+    _, t, m = medir(normalizar_por_valor, repeticoes)
+    resultados.append(_registro("normalizacao_por_valor", "standalone", linhas, t, m))
+    (_, contagens), t, m = medir(
+        lambda: normalizar_dataframe(formatados, detectar_formatos(formatados)), repeticoes
+    )
+    resultados.append(_registro("normalizacao", "standalone", linhas, t, m, colunas=len(contagens)))
+
+    # Quase-duplicatas: cada cadastro aparece ~2x, às vezes em maiúsculas/sem acento
+    ids = pd.Series(range(len(df))) % max(len(df) // 2, 1)
+    nomes = df["txt_1"].fillna("") + " " + df["txt_0"].fillna("") + " " + ids.astype(str)
+    cadastros = pd.DataFrame({"nome": nomes.iloc[ids].to_numpy()})
+    variantes = cadastros.index % 3 == 0
+    cadastros.loc[variantes, "nome"] = cadastros.loc[variantes, "nome"].str.upper()
+    resultado_qd, t, m = medir(
+        lambda: detectar_chunks(fatiar_dataframe(cadastros, chunk_rows), {"colunas": ["nome"]}), repeticoes
+    )
+    plano_qd = planejar(resultado_qd, "primeira")
+    resultados.append(_registro(
+        "quase_duplicadas", "standalone", linhas, t, m,
+        pares=len(resultado_qd["pares"]), linhas_em_grupos=len(resultado_qd["posicoes"]),
+        linhas_removidas=len(plano_qd["remover"]),
+    ))
+
+    # Cache colunar: abrir a entrada mapeada (acerto em outro worker) vs. reler e decodificar o arquivo
+    pasta_cache = os.path.join(tmpdir, f"cache_{linhas}")
+    _, t, m = medir(lambda: materializar(df, f"{pasta_cache}_{time.perf_counter_ns()}"), repeticoes)
+    resultados.append(_registro("cache_colunar_gravar", "standalone", linhas, t, m))
+    materializar(df, pasta_cache)
+    _, t, m = medir(lambda: load_dataframe(caminho), repeticoes)
+    resultados.append(_registro("cache_colunar_recarga", "standalone", linhas, t, m, formato=formato))
+    _, t, m = medir(lambda: abrir(pasta_cache), repeticoes)
+    resultados.append(_registro("cache_colunar", "standalone", linhas, t, m))
+
+    # Amostra da ingestão x head(): arquivo ordenado por cidade (como exportações por filial)
+    ordenado = df.sort_values(["txt_1", "num_0"], kind="stable", ignore_index=True)
+
+    def amostrar():
+        amostra = AmostraReservatorio(tamanho=2000, seed=0)
+        for chunk in fatiar_dataframe(ordenado, chunk_rows):
+            amostra.update(chunk)
+        return amostra
+
+    amostra, t, m = medir(amostrar, repeticoes)
+    topo, uniforme = ordenado.head(2000), amostra.amostra(estratificada=False)
+    media = ordenado["num_0"].mean()
+    erro_head, erro_amostra = abs(topo["num_0"].mean() - media), abs(uniforme["num_0"].mean() - media)
+    resultados.append(_registro(
+        "amostra_reservatorio", "standalone", linhas, t, m,
+        categorias=int(ordenado["txt_1"].nunique()), categorias_head=int(topo["txt_1"].nunique()),
+        categorias_amostra=int(amostra.amostra()["txt_1"].nunique()),
+        erro_media_head=round(float(erro_head), 4), erro_media_amostra=round(float(erro_amostra), 4),
+    ))
+
+    # Deriva: um ano de cargas diárias do mesmo feed; compara o último dia (deslocado) e um dia estável
+    diarias = []
+    for i in range(366):
+        carga = df.sample(2000, replace=True, random_state=i, ignore_index=True)
+        if i == 365:
+            carga["num_0"] = carga["num_0"] * 1.5 + carga["num_0"].std()
+        diarias.append(assinatura(PerfilSketch().update(carga)))
+    historico = [({"documento_id": i}, a) for i, a in enumerate(diarias[364::-1])]
+    deriva, t, m = medir(lambda: comparar_assinaturas(diarias[365], historico), repeticoes)
+    estavel = comparar_assinaturas(diarias[364], historico[1:])
+    resultados.append(_registro(
+        "deriva_historico", "standalone", len(historico), t, m,
+        colunas=len(diarias[365]["colunas"]), alertas=len(deriva["alertas"]), alertas_dia_estavel=len(estavel["alertas"]),
+    ))
+
+    after = analyze_dataframe(limpo)
+    _, t, m = medir(lambda: gerar_relatorio_pdf(0, df, limpo, before, after, val), repeticoes)
+    resultados.append(_registro("gerar_relatorio_pdf", "standalone", linhas, t, m))
+    return resultados
+
+
+# ---------------- Flask (SQLite) ----------------
+def _criar_cliente(tmpdir):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ["UPLOAD_FOLDER"] = os.path.join(tmpdir, "uploads")
+    os.environ["OUTPUT_FOLDER"] = os.path.join(tmpdir, "outputs")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from app.main import create_app
+    from app.db import db
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    client.post("/auth/cadastro", data={
+        "nome": "bench", "email": "bench@neodata.local",
+        "senha": "bench", "confirmar_senha": "bench",
+    })
+    return client
+
+
+def bench_flask(client, linhas, formato, repeticoes, **dataset_kwargs):
+    df_base = gerar_dataset(linhas=linhas, **dataset_kwargs)
+    conteudo, nome = serializar(df_base, formato)
+    if formato == "sociocsv":
+        # /api/upload só aceita sociocsv dentro de ZIP
+        conteudo, nome = compactar(conteudo, nome)
+    resultados = []
+
+    def upload():
+        r = client.post(
+            "/api/upload",
+            data={"file": (io.BytesIO(conteudo), nome)},
+            content_type="multipart/form-data",
+        )
+        assert r.status_code == 200 and b"sucesso" in r.data, r.status_code
+        with client.session_transaction() as sess:
+            return sess["last_doc_id"]
+
+    doc_id, t, m = medir(upload, repeticoes)
+    resultados.append(_registro("api_upload", "flask", linhas, t, m, formato=formato))
+
+    resp, t, m = medir(lambda: client.post(f"/api/clean/run?doc_id={doc_id}"), repeticoes)
+    assert resp.status_code == 200, resp.status_code
+    resultados.append(_registro("api_clean_run", "flask", linhas, t, m))
+
+    rotas = {
+        "dashboard": f"/dashboard/{doc_id}",
+        "download_csv": f"/api/download/clean.csv?doc_id={doc_id}",
+        "download_xlsx": f"/api/download/clean.xlsx?doc_id={doc_id}",
+        "download_json": f"/api/download/clean.json?doc_id={doc_id}",
+        "download_report_pdf": f"/api/download/report.pdf?doc_id={doc_id}",
+    }
+    for etapa, url in rotas.items():
+        resp, t, m = medir(lambda: client.get(url), repeticoes)
+        resultados.append(_registro(etapa, "flask", linhas, t, m, bytes=len(resp.data)))
+    return resultados
+
+
+# ---------------- Comparação ----------------
+def comparar(arquivo_a, arquivo_b):
+    """Imprime a razão de tempo/memória entre duas execuções (b / a)."""
+    with open(arquivo_a) as f:
+        a = json.load(f)
+    with open(arquivo_b) as f:
+        b = json.load(f)
+
+    def chave(r):
+        return (r["etapa"], r["modo"], r["linhas"])
+
+    base = {chave(r): r for r in a["resultados"]}
+    print(f"{'etapa':<22}{'modo':<12}{'linhas':>10}{'tempo':>10}{'memória':>10}")
+    for r in b["resultados"]:
+        ref = base.get(chave(r))
+        if not ref:
+            continue
+        rt = r["segundos"] / ref["segundos"] if ref["segundos"] else float("nan")
+        rm = r["pico_mb"] / ref["pico_mb"] if ref["pico_mb"] else float("nan")
+        print(f"{r['etapa']:<22}{r['modo']:<12}{r['linhas']:>10}{rt:>9.2f}x{rm:>9.2f}x")
+
+
+def _commit_atual():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline NeoData.")
+    parser.add_argument("--tamanhos", default="1000,10000", help="Quantidades de linhas separadas por vírgula.")
+    parser.add_argument("--formato", default="csv", choices=["csv", "sociocsv", "json", "xlsx"])
+    parser.add_argument("--colunas-numericas", type=int, default=6)
+    parser.add_argument("--colunas-texto", type=int, default=2)
+    parser.add_argument("--ausentes", type=float, default=0.05)
+    parser.add_argument("--duplicadas", type=float, default=0.02)
+    parser.add_argument("--outliers", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--n-jobs", type=int, default=4, help="Processos da limpeza paralela.")
+    parser.add_argument("--modos", default="standalone,flask", help="standalone, flask e/ou contencao.")
+    parser.add_argument("--saida", default="bench_output.json")
+    parser.add_argument("--comparar", nargs=2, metavar=("A", "B"))
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    tamanhos = [int(t) for t in args.tamanhos.split(",") if t]
+    modos = set(args.modos.split(","))
+    dataset_kwargs = dict(
+        colunas_numericas=args.colunas_numericas,
+        colunas_texto=args.colunas_texto,
+        taxa_ausentes=args.ausentes,
+        taxa_duplicadas=args.duplicadas,
+        taxa_outliers=args.outliers,
+        seed=args.seed,
+    )
+
+    resultados = []
+    if "contencao" in modos:
+        from .contencao import simular_contencao
+        resultados += simular_contencao()
+        print("[bench] simulação de contenção concluída", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        client = _criar_cliente(tmpdir) if "flask" in modos else None
+        for linhas in tamanhos:
+            if "standalone" in modos:
+                resultados += bench_standalone(
+                    linhas, args.formato, args.repeticoes, tmpdir, n_jobs=args.n_jobs, **dataset_kwargs
+                )
+            if client is not None:
+                resultados += bench_flask(client, linhas, args.formato, args.repeticoes, **dataset_kwargs)
+            print(f"[bench] {linhas} linhas concluído", file=sys.stderr)
+
+    saida = {
+        "meta": {
+            "commit": _commit_atual(),
+            "data": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "plataforma": platform.platform(),
+            "parametros": vars(args),
+        },
+        "resultados": resultados,
+    }
+    with open(args.saida, "w") as f:
+        json.dump(saida, f, indent=2, ensure_ascii=False)
+    print(f"[bench] resultados salvos em {args.saida}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
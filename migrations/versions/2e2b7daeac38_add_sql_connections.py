@@ -0,0 +1,44 @@
+"""add sql_connections
+
+Revision ID: 2e2b7daeac38
+Revises: d7e9b12d6445
+Create Date: 2026-10-19 13:47:12.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e2b7daeac38'
+down_revision = 'd7e9b12d6445'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sql_connections',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(length=100), nullable=False),
+    sa.Column('url', sa.String(length=500), nullable=False),
+    sa.Column('consulta', sa.Text(), nullable=False),
+    sa.Column('coluna_watermark', sa.String(length=100), nullable=True),
+    sa.Column('watermark', sa.JSON(), nullable=True),
+    sa.Column('ultima_execucao', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('documento_id')
+    )
+    with op.batch_alter_table('sql_connections', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sql_connections_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sql_connections', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sql_connections_user_id'))
+
+    op.drop_table('sql_connections')
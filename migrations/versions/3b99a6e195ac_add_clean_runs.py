@@ -0,0 +1,41 @@
+"""add clean_runs
+
+Revision ID: 3b99a6e195ac
+Revises: 6eb12a1656c8
+Create Date: 2026-10-19 12:21:09.334871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b99a6e195ac'
+down_revision = '6eb12a1656c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('clean_runs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.Column('config', sa.JSON(), nullable=False),
+    sa.Column('tempos', sa.JSON(), nullable=True),
+    sa.Column('estatisticas', sa.JSON(), nullable=True),
+    sa.Column('artefatos', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('documento_id', 'versao', name='uq_clean_runs_documento_versao')
+    )
+    with op.batch_alter_table('clean_runs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_clean_runs_documento_id'), ['documento_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('clean_runs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_clean_runs_documento_id'))
+
+    op.drop_table('clean_runs')
@@ -0,0 +1,46 @@
+"""add feed and assinatura (drift signature) to Documentos
+
+Revision ID: 5f1c2a9d7e43
+Revises: cacb89c81c9e
+Create Date: 2026-10-19 18:41:12.804213
+
+"""
+import os
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1c2a9d7e43'
+down_revision = 'cacb89c81c9e'
+branch_labels = None
+depends_on = None
+
+
+def _chave_feed(nome):
+    # mesma regra de app.utils.deriva.chave_feed (copiada: migrações não importam o app)
+    base = os.path.splitext(os.path.basename(nome or ""))[0].lower().strip()
+    return re.sub(r"\d+", "#", base)[:200]
+
+
+def upgrade():
+    with op.batch_alter_table('documentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('feed', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('assinatura', sa.JSON(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_documentos_feed'), ['feed'], unique=False)
+
+    # feed dos documentos existentes; a assinatura só existe para cargas a partir daqui
+    conexao = op.get_bind()
+    documentos = sa.table('documentos', sa.column('id', sa.Integer), sa.column('nome_documento', sa.String),
+                          sa.column('feed', sa.String))
+    for id_, nome in conexao.execute(sa.select(documentos.c.id, documentos.c.nome_documento)).fetchall():
+        conexao.execute(documentos.update().where(documentos.c.id == id_).values(feed=_chave_feed(nome)))
+
+
+def downgrade():
+    with op.batch_alter_table('documentos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_documentos_feed'))
+        batch_op.drop_column('assinatura')
+        batch_op.drop_column('feed')
@@ -0,0 +1,26 @@
+"""add jobs.progresso
+
+Revision ID: 62e3ef9e7cd7
+Revises: 2e2b7daeac38
+Create Date: 2026-10-19 14:20:55.174330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '62e3ef9e7cd7'
+down_revision = '2e2b7daeac38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('progresso', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_column('progresso')
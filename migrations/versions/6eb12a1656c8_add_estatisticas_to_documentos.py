@@ -0,0 +1,26 @@
+"""add estatisticas to Documentos
+
+Revision ID: 6eb12a1656c8
+Revises: e8b1399b688e
+Create Date: 2026-10-19 11:03:27.540916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6eb12a1656c8'
+down_revision = 'e8b1399b688e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('documentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('estatisticas', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('documentos', schema=None) as batch_op:
+        batch_op.drop_column('estatisticas')
@@ -0,0 +1,26 @@
+"""add jobs.instancia
+
+Revision ID: 9a4d6c1e2b70
+Revises: 5f1c2a9d7e43
+Create Date: 2026-10-19 19:05:31.418276
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d6c1e2b70'
+down_revision = '5f1c2a9d7e43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('instancia', sa.String(length=120), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_column('instancia')
@@ -0,0 +1,59 @@
+"""map NaN to null in raw/clean record arrays
+
+Revision ID: b3e8f0d2a615
+Revises: 9a4d6c1e2b70
+Create Date: 2026-10-19 19:41:07.215934
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f0d2a615'
+down_revision = '9a4d6c1e2b70'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+TABELAS = ('raw_records', 'clean_records')
+
+
+def _carregar(data):
+    return json.loads(data) if isinstance(data, str) else data
+
+
+def _nulo(v):
+    # NaN não é JSON padrão; null permite ler posições pelas funções JSON do banco
+    return None if isinstance(v, float) and v != v else v
+
+
+def upgrade():
+    conn = op.get_bind()
+    for tabela in TABELAS:
+        ultimo = 0
+        while True:
+            lote = conn.execute(
+                sa.text(f"SELECT id, data FROM {tabela} WHERE id > :u ORDER BY id LIMIT :n"),
+                {'u': ultimo, 'n': LOTE},
+            ).fetchall()
+            if not lote:
+                break
+            ultimo = lote[-1][0]
+            alterados = []
+            for i, data in lote:
+                registro = _carregar(data)
+                if not isinstance(registro, list):
+                    continue
+                convertido = [_nulo(v) for v in registro]
+                if convertido != registro:
+                    alterados.append({'id': i, 'data': json.dumps(convertido)})
+            if alterados:
+                conn.execute(sa.text(f"UPDATE {tabela} SET data = :data WHERE id = :id"), alterados)
+
+
+def downgrade():
+    # null já era lido como ausente antes desta revisão: nada a desfazer
+    pass
@@ -0,0 +1,100 @@
+"""add record_schemas and store raw/clean records as positional arrays
+
+Revision ID: cacb89c81c9e
+Revises: 62e3ef9e7cd7
+Create Date: 2026-10-19 16:52:08.310447
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cacb89c81c9e'
+down_revision = '62e3ef9e7cd7'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+TABELAS = {'raw_records': 'raw', 'clean_records': 'clean'}
+
+
+def _carregar(data):
+    return json.loads(data) if isinstance(data, str) else data
+
+
+def _regravar(conn, tabela, documento_id, converter):
+    """Percorre as linhas do documento por id, em lotes, regravando `data`."""
+    ultimo = 0
+    while True:
+        lote = conn.execute(
+            sa.text(f"SELECT id, data FROM {tabela} WHERE documento_id = :d AND id > :u ORDER BY id LIMIT :n"),
+            {'d': documento_id, 'u': ultimo, 'n': LOTE},
+        ).fetchall()
+        if not lote:
+            return
+        ultimo = lote[-1][0]
+        conn.execute(
+            sa.text(f"UPDATE {tabela} SET data = :data WHERE id = :id"),
+            [{'id': i, 'data': json.dumps(converter(_carregar(data)))} for i, data in lote],
+        )
+
+
+def upgrade():
+    op.create_table('record_schemas',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=10), nullable=False),
+    sa.Column('colunas', sa.JSON(), nullable=False),
+    sa.Column('dtypes', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('documento_id', 'tipo', name='uq_record_schemas_documento_tipo')
+    )
+    with op.batch_alter_table('record_schemas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_record_schemas_documento_id'), ['documento_id'], unique=False)
+
+    # Converte os objetos JSON existentes em arrays na ordem do esquema
+    conn = op.get_bind()
+    esquemas = sa.table(
+        'record_schemas',
+        sa.column('documento_id', sa.Integer), sa.column('tipo', sa.String),
+        sa.column('colunas', sa.JSON), sa.column('dtypes', sa.JSON),
+    )
+    for tabela, tipo in TABELAS.items():
+        documentos = [d for (d,) in conn.execute(sa.text(f"SELECT DISTINCT documento_id FROM {tabela}"))]
+        for documento_id in documentos:
+            colunas = {}
+
+            def para_array(registro):
+                if isinstance(registro, list):
+                    return registro
+                for c in registro:
+                    colunas.setdefault(c, len(colunas))
+                linha = [None] * len(colunas)
+                for c, v in registro.items():
+                    linha[colunas[c]] = v
+                return linha
+
+            _regravar(conn, tabela, documento_id, para_array)
+            conn.execute(esquemas.insert().values(
+                documento_id=documento_id, tipo=tipo, colunas=list(colunas), dtypes={c: 'object' for c in colunas},
+            ))
+
+
+def downgrade():
+    conn = op.get_bind()
+    for tabela, tipo in TABELAS.items():
+        linhas = conn.execute(
+            sa.text("SELECT documento_id, colunas FROM record_schemas WHERE tipo = :t"), {'t': tipo}
+        ).fetchall()
+        for documento_id, colunas in linhas:
+            colunas = _carregar(colunas)
+            _regravar(conn, tabela, documento_id, lambda registro: dict(zip(colunas, registro)))
+
+    with op.batch_alter_table('record_schemas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_record_schemas_documento_id'))
+
+    op.drop_table('record_schemas')
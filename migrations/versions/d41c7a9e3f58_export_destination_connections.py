@@ -0,0 +1,55 @@
+"""export destination connections; drop urls from job parameters
+
+Revision ID: d41c7a9e3f58
+Revises: b3e8f0d2a615
+Create Date: 2026-10-19 20:12:44.603118
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7a9e3f58'
+down_revision = 'b3e8f0d2a615'
+branch_labels = None
+depends_on = None
+
+MENSAGEM = 'Exportação criada antes das conexões de destino; envie de novo com conexao_id.'
+
+
+def _carregar(data):
+    return json.loads(data) if isinstance(data, str) else data
+
+
+def upgrade():
+    with op.batch_alter_table('sql_connections', schema=None) as batch_op:
+        batch_op.alter_column('documento_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('consulta', existing_type=sa.Text(), nullable=True)
+
+    # A URL (com senha) ficava em jobs.parametros: remove e falha os pendentes
+    conn = op.get_bind()
+    linhas = conn.execute(sa.text("SELECT id, status, parametros FROM jobs WHERE tipo = 'export'")).fetchall()
+    for job_id, status, parametros in linhas:
+        parametros = _carregar(parametros) or {}
+        if 'url' not in parametros:
+            continue
+        parametros.pop('url')
+        valores = {'id': job_id, 'p': json.dumps(parametros)}
+        if status in ('pendente', 'executando'):
+            conn.execute(
+                sa.text("UPDATE jobs SET parametros = :p, status = 'erro', erro = :e WHERE id = :id"),
+                dict(valores, e=MENSAGEM),
+            )
+        else:
+            conn.execute(sa.text("UPDATE jobs SET parametros = :p WHERE id = :id"), valores)
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text("DELETE FROM sql_connections WHERE documento_id IS NULL OR consulta IS NULL"))
+    with op.batch_alter_table('sql_connections', schema=None) as batch_op:
+        batch_op.alter_column('consulta', existing_type=sa.Text(), nullable=False)
+        batch_op.alter_column('documento_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,104 @@
+"""add api_tokens, upload_sessions, upload_chunks and jobs
+
+Revision ID: d7e9b12d6445
+Revises: 3b99a6e195ac
+Create Date: 2026-10-19 13:02:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e9b12d6445'
+down_revision = '3b99a6e195ac'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('api_tokens',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(length=100), nullable=False),
+    sa.Column('prefixo', sa.String(length=8), nullable=False),
+    sa.Column('token_hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token_hash')
+    )
+    with op.batch_alter_table('api_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_api_tokens_user_id'), ['user_id'], unique=False)
+
+    op.create_table('upload_sessions',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('nome_arquivo', sa.String(length=200), nullable=False),
+    sa.Column('tamanho_total', sa.BigInteger(), nullable=False),
+    sa.Column('caminho_parcial', sa.String(length=500), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upload_sessions_user_id'), ['user_id'], unique=False)
+
+    op.create_table('upload_chunks',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('sessao_id', sa.String(length=32), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('tamanho', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['sessao_id'], ['upload_sessions.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sessao_id', 'offset', name='uq_upload_chunks_sessao_offset')
+    )
+    with op.batch_alter_table('upload_chunks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upload_chunks_sessao_id'), ['sessao_id'], unique=False)
+
+    op.create_table('jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('tipo', sa.String(length=30), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('parametros', sa.JSON(), nullable=True),
+    sa.Column('resultado', sa.JSON(), nullable=True),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('tempos', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_jobs_documento_id'), ['documento_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_jobs_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_jobs_user_id'))
+        batch_op.drop_index(batch_op.f('ix_jobs_documento_id'))
+
+    op.drop_table('jobs')
+    with op.batch_alter_table('upload_chunks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_chunks_sessao_id'))
+
+    op.drop_table('upload_chunks')
+    with op.batch_alter_table('upload_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_sessions_user_id'))
+
+    op.drop_table('upload_sessions')
+    with op.batch_alter_table('api_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_tokens_user_id'))
+
+    op.drop_table('api_tokens')
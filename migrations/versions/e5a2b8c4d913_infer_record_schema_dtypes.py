@@ -0,0 +1,89 @@
+"""infer record_schemas dtypes left as object by the array conversion
+
+Revision ID: e5a2b8c4d913
+Revises: d41c7a9e3f58
+Create Date: 2026-10-19 20:48:19.772051
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a2b8c4d913'
+down_revision = 'd41c7a9e3f58'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+TABELAS = {'raw': 'raw_records', 'clean': 'clean_records'}
+
+
+def _carregar(data):
+    return json.loads(data) if isinstance(data, str) else data
+
+
+def _tipo(v):
+    if isinstance(v, bool):
+        return 'bool'
+    if isinstance(v, int):
+        return 'int64'
+    if isinstance(v, float):
+        return 'float64'
+    if isinstance(v, str):
+        return 'str'
+    return 'object'
+
+
+def _dtype(tipos, nulos):
+    """dtype que o pandas daria à coluna com esses valores JSON."""
+    if not tipos or 'object' in tipos:
+        return 'object'
+    if tipos == {'bool'}:
+        return 'object' if nulos else 'bool'
+    if tipos <= {'int64', 'float64'}:
+        return 'int64' if tipos == {'int64'} and not nulos else 'float64'
+    if tipos == {'str'}:
+        return 'str'
+    return 'object'
+
+
+def upgrade():
+    # cacb89c81c9e gravou 'object' para todas as colunas dos documentos convertidos
+    conn = op.get_bind()
+    esquemas = conn.execute(sa.text("SELECT id, documento_id, tipo, colunas, dtypes FROM record_schemas")).fetchall()
+    for esquema_id, documento_id, tipo, colunas, dtypes in esquemas:
+        colunas, dtypes = _carregar(colunas) or [], _carregar(dtypes) or {}
+        if not colunas or any(d != 'object' for d in dtypes.values()):
+            continue
+        tipos = [set() for _ in colunas]
+        nulos = [False] * len(colunas)
+        ultimo = 0
+        while True:
+            lote = conn.execute(
+                sa.text(f"SELECT id, data FROM {TABELAS[tipo]} WHERE documento_id = :d AND id > :u ORDER BY id LIMIT :n"),
+                {'d': documento_id, 'u': ultimo, 'n': LOTE},
+            ).fetchall()
+            if not lote:
+                break
+            ultimo = lote[-1][0]
+            for _, data in lote:
+                linha = _carregar(data)
+                for i in range(len(colunas)):
+                    v = linha[i] if i < len(linha) else None
+                    if v is None:
+                        nulos[i] = True
+                    else:
+                        tipos[i].add(_tipo(v))
+        novos = {c: _dtype(tipos[i], nulos[i]) for i, c in enumerate(colunas)}
+        conn.execute(
+            sa.text("UPDATE record_schemas SET dtypes = :d WHERE id = :id"),
+            {'id': esquema_id, 'd': json.dumps(novos)},
+        )
+
+
+def downgrade():
+    # os dtypes inferidos continuam válidos para o código anterior (que os ignorava)
+    pass
@@ -0,0 +1,54 @@
+"""add is_admin to user and profile_runs
+
+Revision ID: e8b1399b688e
+Revises: b9e9601862f7
+Create Date: 2026-10-19 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b1399b688e'
+down_revision = 'b9e9601862f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    op.create_table('profile_runs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('job_id', sa.String(length=36), nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('endpoint', sa.String(length=100), nullable=False),
+    sa.Column('duracao_s', sa.Float(), nullable=False),
+    sa.Column('pico_memoria_kb', sa.Float(), nullable=True),
+    sa.Column('caminho_perfil', sa.String(length=500), nullable=False),
+    sa.Column('caminho_alocacoes', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['documento_id'], ['documentos.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('job_id')
+    )
+    with op.batch_alter_table('profile_runs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_profile_runs_documento_id'), ['documento_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_profile_runs_duracao_s'), ['duracao_s'], unique=False)
+        batch_op.create_index(batch_op.f('ix_profile_runs_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('profile_runs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_profile_runs_user_id'))
+        batch_op.drop_index(batch_op.f('ix_profile_runs_duracao_s'))
+        batch_op.drop_index(batch_op.f('ix_profile_runs_documento_id'))
+
+    op.drop_table('profile_runs')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_admin')
@@ -0,0 +1,79 @@
+# tests/conftest.py
+import io
+import os
+import sys
+
+import pytest
+
+# permite `pytest` da raiz do repositório sem instalar o pacote
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ---------------- Dados ----------------
+@pytest.fixture(scope="session")
+def dataset():
+    """Dataset sintético do benchmark (ausentes, duplicadas e outliers), 3000 linhas."""
+    from benchmarks.datasets import gerar_dataset
+
+    return gerar_dataset(linhas=3000)
+
+
+# ---------------- App ----------------
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App com SQLite e pastas temporárias; jobs rodam na própria requisição."""
+    pytest.importorskip("app.db")
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'neodata.db'}")
+    monkeypatch.setenv("UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setenv("OUTPUT_FOLDER", str(tmp_path / "outputs"))
+    monkeypatch.setenv("SECRET_KEY", "testes")
+    from app.db import db
+    from app.main import create_app
+
+    app = create_app()
+    app.config.update(TESTING=True, JOBS_SINCRONOS=True)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Cliente com o usuário 1 cadastrado e logado."""
+    c = app.test_client()
+    c.post("/auth/cadastro", data=dict(nome="Ana", email="ana@exemplo.com", senha="segredo", confirmar_senha="segredo"))
+    return c
+
+
+@pytest.fixture
+def api(client):
+    """Cabeçalhos da API v1 com um token do usuário 1."""
+    token = client.post("/api/v1/tokens", json={"nome": "testes"}).json["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin(app):
+    """Torna o usuário 1 administrador."""
+    from app.db import db
+    from app.models import User
+
+    with app.app_context():
+        db.session.get(User, 1).is_admin = True
+        db.session.commit()
+
+
+@pytest.fixture
+def enviar(client):
+    """Envia um DataFrame pela página de upload e devolve o id do documento."""
+    def _enviar(df, nome="dados.csv"):
+        dados = df.to_csv(sep=";", index=False).encode("utf-8")
+        r = client.post("/api/upload", data={"file": (io.BytesIO(dados), nome)}, content_type="multipart/form-data")
+        assert r.status_code == 200, r.data[:500]
+        from app.models import Documentos
+        with client.application.app_context():
+            return Documentos.query.order_by(Documentos.id.desc()).first().id
+    return _enviar
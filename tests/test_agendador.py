@@ -0,0 +1,145 @@
+# tests/test_agendador.py
+"""Agendador de operações pesadas: vagas, cota por usuário, prioridade, memória e fila."""
+import threading
+import time
+
+import pytest
+
+from app.utils.agendador import Agendador, FilaCheia
+
+
+class _Registro:
+    """`iniciar` dos pedidos de `agendar`: guarda a ordem de admissão."""
+
+    def __init__(self):
+        self.iniciados = []
+
+    def __call__(self, pedido):
+        self.iniciados.append(pedido.id)
+
+
+def _agendar(agendador, registro, id, usuario, prioridade="lote", memoria=0):
+    return agendador.agendar(usuario, registro, prioridade=prioridade, memoria=memoria, id=id)
+
+
+def test_vagas_e_cota_por_usuario():
+    agendador, registro = Agendador(vagas=3, por_usuario=2), _Registro()
+    for i in range(4):
+        _agendar(agendador, registro, f"a{i}", "a")
+    assert registro.iniciados == ["a0", "a1"]  # cota de 2, mesmo com vaga sobrando
+    _agendar(agendador, registro, "b0", "b")
+    assert registro.iniciados == ["a0", "a1", "b0"]
+    _agendar(agendador, registro, "c0", "c")
+    assert agendador.estado()["vagas_em_uso"] == 3 and agendador.posicao("c0") == 1
+    agendador.liberar("a0")
+    assert registro.iniciados[-1] == "c0"  # c não tem nada rodando: passa à frente de a2
+    agendador.liberar("b0")
+    assert registro.iniciados[-1] == "a2"
+
+
+def test_interativa_passa_a_frente_do_lote():
+    agendador, registro = Agendador(vagas=1, por_usuario=5), _Registro()
+    _agendar(agendador, registro, "rodando", "a")
+    _agendar(agendador, registro, "lote_a", "a")
+    _agendar(agendador, registro, "lote_b", "b")
+    _agendar(agendador, registro, "interativa_c", "c", prioridade="interativa")
+    for id in ("rodando", "interativa_c", "lote_a"):
+        agendador.liberar(id)
+    # no empate de operações em andamento, a ordem de chegada decide
+    assert registro.iniciados == ["rodando", "interativa_c", "lote_a", "lote_b"]
+
+
+def test_rajada_de_um_usuario_nao_atrasa_os_outros():
+    agendador, registro = Agendador(vagas=2, por_usuario=3), _Registro()
+    for i in range(10):
+        _agendar(agendador, registro, f"a{i}", "a")
+    _agendar(agendador, registro, "b0", "b")
+    agendador.liberar("a0")
+    assert registro.iniciados == ["a0", "a1", "b0"]  # b tem 0 em andamento, a tem 1
+
+
+def test_limite_de_memoria_e_sem_ultrapassagem():
+    agendador, registro = Agendador(vagas=4, por_usuario=4, memoria_bytes=1000), _Registro()
+    _agendar(agendador, registro, "grande_1", "a", memoria=600)
+    _agendar(agendador, registro, "grande_2", "b", memoria=600)
+    _agendar(agendador, registro, "pequeno", "c", memoria=300)
+    # grande_2 não cabe e segura o pequeno, para não ser ultrapassado para sempre
+    assert registro.iniciados == ["grande_1"]
+    assert agendador.estado()["memoria_em_uso"] == 600
+    agendador.liberar("grande_1")
+    assert registro.iniciados == ["grande_1", "grande_2", "pequeno"]
+    assert agendador.estado()["memoria_em_uso"] == 900
+
+
+def test_pedido_maior_que_a_memoria_roda_sozinho():
+    agendador, registro = Agendador(vagas=2, por_usuario=2, memoria_bytes=100), _Registro()
+    _agendar(agendador, registro, "enorme", "a", memoria=500)
+    _agendar(agendador, registro, "outro", "b", memoria=10)
+    assert registro.iniciados == ["enorme"]
+    agendador.liberar("enorme")
+    assert registro.iniciados == ["enorme", "outro"]
+
+
+def test_fila_maxima():
+    agendador, registro = Agendador(vagas=1, por_usuario=1, fila_maxima=1), _Registro()
+    _agendar(agendador, registro, "rodando", "a")
+    _agendar(agendador, registro, "esperando", "b")
+    with pytest.raises(FilaCheia):
+        agendador.verificar_fila()
+    with pytest.raises(FilaCheia) as erro:
+        _agendar(agendador, registro, "recusado", "c")
+    assert erro.value.retry_after >= 1
+    assert agendador.estado()["fila"] == 1
+
+
+def test_vaga_com_espera_maxima_sai_da_fila():
+    agendador = Agendador(vagas=1, por_usuario=1)
+    with agendador.vaga("a"):
+        with pytest.raises(FilaCheia) as erro:
+            with agendador.vaga("b", espera_s=0.05):
+                pass
+        assert erro.value.posicao == 1
+    estado = agendador.estado()
+    assert estado["executando"] == estado["fila"] == 0
+
+
+def test_prioridade_invalida():
+    with pytest.raises(ValueError):
+        Agendador(vagas=1, por_usuario=1).agendar("a", lambda p: None, prioridade="urgente")
+
+
+def test_contencao_com_threads_respeita_os_limites():
+    vagas, por_usuario, memoria = 3, 2, 1000
+    agendador = Agendador(vagas=vagas, por_usuario=por_usuario, memoria_bytes=memoria)
+    lock = threading.Lock()
+    ativos = {"total": 0, "memoria": 0}
+    por_usuario_ativos, maximos = {}, {"total": 0, "memoria": 0, "usuario": 0}
+
+    def rodar(usuario, prioridade, mem):
+        with agendador.vaga(usuario, prioridade, memoria=mem, espera_s=10):
+            with lock:
+                ativos["total"] += 1
+                ativos["memoria"] += mem
+                por_usuario_ativos[usuario] = por_usuario_ativos.get(usuario, 0) + 1
+                maximos["total"] = max(maximos["total"], ativos["total"])
+                maximos["memoria"] = max(maximos["memoria"], ativos["memoria"])
+                maximos["usuario"] = max(maximos["usuario"], por_usuario_ativos[usuario])
+            time.sleep(0.01)
+            with lock:
+                ativos["total"] -= 1
+                ativos["memoria"] -= mem
+                por_usuario_ativos[usuario] -= 1
+
+    pedidos = [("pesado", "lote", 300)] * 12 + [
+        (f"u{i}", p, m) for i in range(4) for p, m in (("interativa", 50), ("lote", 300))
+    ]
+    threads = [threading.Thread(target=rodar, args=p) for p in pedidos]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert maximos["total"] <= vagas
+    assert maximos["usuario"] <= por_usuario
+    assert maximos["memoria"] <= memoria
+    estado = agendador.estado()
+    assert estado["executando"] == estado["fila"] == estado["vagas_em_uso"] == estado["memoria_em_uso"] == 0
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cleaning import clean_dataframe_regras
+from app.utils.agregacao import agregar_chunks, compilar_consulta
+from app.utils.run_store import iter_versao, salvar_versao
+
+
+@pytest.fixture(scope="module")
+def versao(dataset, tmp_path_factory):
+    limpo = clean_dataframe_regras(dataset)
+    pasta = str(tmp_path_factory.mktemp("blocos"))
+    manifesto, _ = salvar_versao(limpo, pasta, chunk_linhas=256)
+    return limpo, manifesto, pasta
+
+
+def test_igual_ao_groupby_da_versao_inteira(versao):
+    limpo, manifesto, pasta = versao
+    consulta = compilar_consulta({
+        "grupos": ["txt_0"], "filtros": [{"coluna": "num_1", "op": ">", "valor": 0}],
+        "medidas": [{"funcao": "soma", "coluna": "num_0"}, {"funcao": "media", "coluna": "num_0"}, {"funcao": "contagem"}],
+    })
+    agregado, grupos, linhas = agregar_chunks(iter_versao(manifesto, pasta, ["txt_0", "num_0", "num_1"]), consulta)
+
+    filtrado = limpo[limpo["num_1"] > 0]
+    referencia = filtrado.groupby("txt_0", dropna=False).agg(
+        soma_num_0=("num_0", "sum"), media_num_0=("num_0", "mean"), contagem=("num_0", "size"),
+    ).reset_index()
+    pd.testing.assert_frame_equal(agregado, referencia, check_dtype=False)
+    assert grupos == len(referencia) and linhas == len(filtrado)
+
+
+def test_ordem_limite_e_minimo_maximo(versao):
+    limpo, manifesto, pasta = versao
+    consulta = compilar_consulta({
+        "grupos": ["txt_1"], "ordem": "-maior", "limite": 3,
+        "medidas": [{"funcao": "maximo", "coluna": "num_2", "nome": "maior"}, {"funcao": "minimo", "coluna": "num_2"}],
+    })
+    agregado, grupos, _ = agregar_chunks(iter_versao(manifesto, pasta), consulta)
+    referencia = limpo.groupby("txt_1", dropna=False)["num_2"].agg(["max", "min"])
+    assert grupos == len(referencia) and len(agregado) == 3
+    assert agregado["maior"].tolist() == referencia["max"].nlargest(3).tolist()
+    assert (agregado["minimo_num_2"].to_numpy() == referencia.loc[agregado["txt_1"], "min"].to_numpy()).all()
+
+
+def test_sem_grupos_e_sem_linhas(versao):
+    _, manifesto, pasta = versao
+    consulta = compilar_consulta({"filtros": [{"coluna": "num_0", "op": "<", "valor": -1e12}]})
+    agregado, grupos, linhas = agregar_chunks(iter_versao(manifesto, pasta, ["num_0"]), consulta)
+    assert agregado.to_dict("records") == [{"contagem": 0}] and grupos == 1 and linhas == 0
+
+
+@pytest.mark.parametrize("consulta, mensagem", [
+    ({"medidas": [{"funcao": "mediana", "coluna": "num_0"}]}, "Função inválida"),
+    ({"medidas": [{"funcao": "soma"}]}, "exige 'coluna'"),
+    ({"filtros": [{"coluna": "num_0", "op": "in", "valor": 1}]}, "exige uma lista"),
+    ({"grupos": ["txt_0"], "ordem": "zz"}, "'ordem'"),
+    ({"limite": 0}, "'limite'"),
+    ({"having": []}, "desconhecidas"),
+])
+def test_consulta_invalida(consulta, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        compilar_consulta(consulta)
+
+
+def test_colunas_inexistentes_ou_nao_numericas(versao):
+    _, manifesto, pasta = versao
+    with pytest.raises(ValueError, match="inexistentes"):
+        agregar_chunks(iter_versao(manifesto, pasta), compilar_consulta({"grupos": ["zz"]}))
+    with pytest.raises(ValueError, match="numérica"):
+        agregar_chunks(iter_versao(manifesto, pasta), compilar_consulta({"medidas": [{"funcao": "soma", "coluna": "txt_0"}]}))
+
+
+def test_api_cache_por_versao(client, api, enviar):
+    rng = np.random.default_rng(0)
+    doc_id = enviar(pd.DataFrame({"loja": rng.choice(["a", "b", "c"], 60), "valor": rng.uniform(0, 100, 60)}))
+    consulta = {"grupos": ["loja"], "medidas": [{"funcao": "soma", "coluna": "valor"}], "ordem": "loja"}
+
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras"})
+    run_1 = r.json["job"]["resultado"]["run_id"]
+    primeira = client.post(f"/api/v1/documents/{doc_id}/aggregate", headers=api, json=consulta).json
+    repetida = client.post(f"/api/v1/documents/{doc_id}/aggregate", headers=api, json=consulta).json
+    assert primeira["run_id"] == run_1 and not primeira["cache"] and repetida["cache"]
+    assert repetida["linhas"] == primeira["linhas"] and [g["loja"] for g in primeira["linhas"]] == ["a", "b", "c"]
+
+    # uma nova versão não reaproveita o cache da anterior, que continua consultável por run_id
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras"})
+    nova = client.post(f"/api/v1/documents/{doc_id}/aggregate", headers=api, json=consulta).json
+    assert nova["run_id"] == r.json["job"]["resultado"]["run_id"] != run_1 and not nova["cache"]
+    antiga = client.post(f"/api/v1/documents/{doc_id}/aggregate?run_id={run_1}", headers=api, json=consulta).json
+    assert antiga["run_id"] == run_1 and antiga["cache"]
+
+    r = client.post(f"/api/v1/documents/{doc_id}/aggregate", headers=api, json={"grupos": ["zz"]})
+    assert r.status_code == 400
+    r = client.post(f"/api/v1/documents/{doc_id}/aggregate?run_id=999", headers=api, json=consulta)
+    assert r.status_code == 404
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from app.cleaning import clean_dataframe
+from app.utils.amostragem import AmostraReservatorio, carregar_amostra, posicoes_espalhadas, salvar_amostra
+from app.utils.file_loader import fatiar_dataframe
+
+
+def _amostrar(df, chunk=500, **kwargs):
+    amostra = AmostraReservatorio(**{"tamanho": 300, "seed": 0, **kwargs})
+    for parte in fatiar_dataframe(df, chunk):
+        amostra.update(parte)
+    return amostra
+
+
+def test_arquivo_ordenado_tem_todas_as_categorias(dataset):
+    # como exportações por filial: a última cidade só aparece no fim do arquivo
+    ordenado = dataset.sort_values(["txt_1", "num_0"], kind="stable", ignore_index=True)
+    amostra = _amostrar(ordenado)
+    assert amostra.amostra()["txt_1"].nunique() == ordenado["txt_1"].nunique()
+    assert ordenado.head(300)["txt_1"].nunique() < ordenado["txt_1"].nunique()
+
+    uniforme = amostra.amostra(estratificada=False)
+    media = ordenado["num_0"].mean()
+    assert abs(uniforme["num_0"].mean() - media) < abs(ordenado.head(300)["num_0"].mean() - media)
+
+
+def test_uniforme_sem_reposicao_e_na_ordem_original(dataset):
+    uniforme = _amostrar(dataset.reset_index(names="pos")).amostra(estratificada=False)
+    assert len(uniforme) == 300 and uniforme["pos"].is_unique and uniforme["pos"].is_monotonic_increasing
+
+
+def test_contagens_exatas_e_previa_com_todos_os_estratos(dataset):
+    amostra = _amostrar(dataset)
+    resumo = amostra.resumo()
+    assert resumo["linhas"] == len(dataset) and resumo["estrato"] in ("txt_0", "txt_1")
+    esperado = dataset[resumo["estrato"]].astype(object).fillna("(vazio)").value_counts().to_dict()
+    assert resumo["estratos"] == esperado
+    previa = amostra.previa(len(esperado))
+    assert len(previa) == len(esperado)
+    assert set(previa[resumo["estrato"]].astype(object).fillna("(vazio)")) == set(esperado)
+
+
+def test_categoria_rara_entra_na_amostra():
+    df = pd.DataFrame({"filial": ["a"] * 5000 + ["b"] * 3, "valor": np.arange(5003.0)})
+    amostra = _amostrar(df, tamanho=100, por_estrato=5)
+    assert (amostra.amostra()["filial"] == "b").sum() == 3
+    assert (amostra.amostra(estratificada=False)["filial"] == "a").all()
+
+
+def test_alta_cardinalidade_deixa_de_estratificar():
+    df = pd.DataFrame({"id": [f"c{i}" for i in range(2000)], "valor": np.arange(2000.0)})
+    amostra = _amostrar(df, tamanho=100, max_estratos=50)
+    assert amostra.coluna is None and len(amostra.amostra()) == 100
+
+
+def test_persistencia(dataset, tmp_path):
+    amostra = _amostrar(dataset)
+    salvar_amostra(amostra, str(tmp_path / "amostra.pkl"))
+    pd.testing.assert_frame_equal(carregar_amostra(str(tmp_path / "amostra.pkl")).amostra(), amostra.amostra())
+    assert carregar_amostra(str(tmp_path / "outra.pkl")) is None
+
+
+def test_posicoes_espalhadas():
+    assert posicoes_espalhadas(5, 10).tolist() == [0, 1, 2, 3, 4]
+    posicoes = posicoes_espalhadas(1000, 10)
+    assert posicoes[0] == 0 and posicoes[-1] == 999 and len(posicoes) == 10
+
+
+def test_knn_ajustado_em_amostra(dataset):
+    limpo = clean_dataframe(dataset.copy(), treino=500)
+    numericas = [c for c in limpo if c.startswith("num_")]
+    assert limpo[numericas].notna().all().all()
+    assert limpo.columns.tolist() == clean_dataframe(dataset.copy()).columns.tolist()
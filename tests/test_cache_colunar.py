@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.utils.cache_colunar import abrir, despejar, invalidar, materializar, obter
+
+
+def test_ida_e_volta(dataset, tmp_path):
+    materializar(dataset, str(tmp_path / "e"))
+    mapeado = abrir(str(tmp_path / "e"))
+    pd.testing.assert_frame_equal(mapeado, dataset)
+    # numéricas vêm do mapa, sem cópia: somente leitura
+    assert not mapeado["num_0"].to_numpy().flags.writeable
+
+
+def test_none_e_nan_e_outros_dtypes(tmp_path):
+    df = pd.DataFrame({
+        "objeto": pd.Series(["a", None, np.nan, "b", None], dtype=object),
+        "texto": pd.Series(["x", None, "y", "x", "z"], dtype="str"),
+        "misto": pd.Series([1, "1", None, 2.5, np.nan], dtype=object),
+        "data": pd.to_datetime(["2024-01-01", None, "2024-01-03", "2024-01-04", "2024-01-05"]),
+        "logico": [True, False, True, True, False],
+        "inteiro": np.arange(5, dtype=np.int64),
+        "categoria": pd.Categorical(["p", "q", None, "p", "q"]),
+    })
+    materializar(df, str(tmp_path / "e"))
+    mapeado = abrir(str(tmp_path / "e"))
+    pd.testing.assert_frame_equal(mapeado, df)
+    assert mapeado["objeto"][1] is None and isinstance(mapeado["objeto"][2], float)
+    assert mapeado["misto"][2] is None and mapeado["misto"][0] == 1 and mapeado["misto"][1] == "1"
+
+
+def test_obter_por_versao(tmp_path):
+    raiz, chamadas = str(tmp_path), []
+
+    def carregar(n):
+        def _carregar():
+            chamadas.append(n)
+            return pd.DataFrame({"v": np.arange(n, dtype=float)})
+        return _carregar
+
+    assert len(obter(raiz, "doc_1", 1, carregar(3), 10 ** 9)) == 3
+    assert len(obter(raiz, "doc_1", 1, carregar(99), 10 ** 9)) == 3
+    assert chamadas == [3]
+    # versão nova: recarrega e descarta a anterior
+    assert len(obter(raiz, "doc_1", 2, carregar(4), 10 ** 9)) == 4
+    assert os.listdir(os.path.join(raiz, "doc_1")) == ["2"]
+    # frames vazios não ficam no cache
+    assert obter(raiz, "doc_2", 1, lambda: pd.DataFrame(), 10 ** 9).empty
+    assert not os.path.exists(os.path.join(raiz, "doc_2", "1"))
+
+    invalidar(raiz, "doc_1")
+    obter(raiz, "doc_1", 2, carregar(5), 10 ** 9)
+    assert chamadas == [3, 4, 5]
+
+
+def test_despejo_lru(tmp_path):
+    raiz = str(tmp_path)
+    df = pd.DataFrame({"v": np.arange(1000, dtype=float)})
+    for i, chave in enumerate(("a", "b", "c")):
+        pasta = os.path.join(raiz, chave, "1")
+        os.makedirs(os.path.dirname(pasta))
+        materializar(df, pasta)
+        os.utime(pasta, (1000 + i, 1000 + i))
+    os.utime(os.path.join(raiz, "a", "1"), (2000, 2000))  # "a" foi usada por último
+
+    tamanho = sum(e.stat().st_size for e in os.scandir(os.path.join(raiz, "a", "1")))
+    assert despejar(raiz, 2 * tamanho, manter=os.path.join(raiz, "b", "1")) == 1
+    assert sorted(os.listdir(raiz)) == ["a", "b"]
+    assert despejar(raiz, 0) == 2 and os.listdir(raiz) == []
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.deriva import assinatura, chave_feed, comparar, parametros_consulta
+from app.utils.sketches import PerfilSketch
+
+# O KLL não tem semente: as cargas têm 2000 linhas, o que deixa o ruído de
+# amostragem (PSI ~0,01) e o erro do sketch bem abaixo de PSI_MODERADO (0,1).
+
+
+def _assinar(df):
+    return assinatura(PerfilSketch().update(df))
+
+
+@pytest.fixture(scope="module")
+def cargas(dataset):
+    diarias = [assinatura(PerfilSketch().update(dataset.sample(2000, replace=True, random_state=i, ignore_index=True)))
+               for i in range(30)]
+    return [({"documento_id": i}, a) for i, a in enumerate(diarias[::-1])]  # mais recente primeiro
+
+
+def test_coluna_deslocada_e_dia_estavel(dataset, cargas):
+    carga = dataset.sample(2000, replace=True, random_state=99, ignore_index=True)
+    carga["num_0"] = carga["num_0"] * 1.5 + carga["num_0"].std()
+    deriva = comparar(_assinar(carga), cargas)
+    assert deriva["colunas"]["num_0"]["severidade"] == "alta"
+    assert {a["coluna"] for a in deriva["alertas"]} == {"num_0"}
+    assert all(h["coluna_psi_max"] == "num_0" for h in deriva["historico"])
+
+    estavel = comparar(cargas[0][1], cargas[1:])
+    assert estavel["esquema"]["igual"] and not estavel["alertas"] and not estavel["deriva"]
+    assert estavel["comparados"] == len(cargas) - 1
+
+
+def test_mudanca_de_esquema(dataset, cargas):
+    carga = dataset.sample(2000, replace=True, random_state=98, ignore_index=True)
+    carga = carga.drop(columns=["txt_1"]).assign(extra=1.0)
+    carga["num_1"] = carga["num_1"].round(1).astype(str)
+    deriva = comparar(_assinar(carga), cargas)
+    esquema = deriva["esquema"]
+    assert not esquema["igual"] and esquema["novas"] == ["extra"] and esquema["removidas"] == ["txt_1"]
+    assert [t["coluna"] for t in esquema["tipos"]] == ["num_1"]
+    tipos = {(a["tipo"], a["coluna"]): a["severidade"] for a in deriva["alertas"]}
+    assert tipos[("coluna_removida", "txt_1")] == "alta" and tipos[("coluna_nova", "extra")] == "moderada"
+    assert tipos[("tipo_alterado", "num_1")] == "alta"
+    assert deriva["colunas"]["num_1"]["psi_anterior"] is None
+
+
+def test_nulos_e_volume(dataset, cargas):
+    carga = dataset.sample(500, replace=True, random_state=97, ignore_index=True)
+    carga.loc[: len(carga) // 5, "num_2"] = np.nan
+    tipos = {(a["tipo"], a["coluna"]) for a in comparar(_assinar(carga), cargas)["alertas"]}
+    assert ("nulos", "num_2") in tipos and ("linhas", None) in tipos
+
+
+def test_sem_historico(cargas):
+    assert comparar(cargas[0][1], []) == {
+        "comparados": 0, "deriva": False, "esquema": None, "colunas": {}, "historico": [], "alertas": [],
+    }
+
+
+def test_chave_feed_e_parametros():
+    assert chave_feed("uploads/Vendas_2024-05-01.csv") == chave_feed("vendas_2024-05-02.csv") == "vendas_#-#-#"
+    assert parametros_consulta("3, 5", "10") == ([3, 5], 10)
+    assert parametros_consulta() == (None, 30)
+    for contra, limite in (("a,b", None), (None, 0), (None, "x"), (None, 1001)):
+        with pytest.raises(ValueError):
+            parametros_consulta(contra, limite)
+
+
+def test_api_deriva_do_feed(client, api, enviar):
+    rng = np.random.default_rng(0)
+    primeiro = enviar(pd.DataFrame({"valor": rng.normal(100, 10, 300)}), "vendas_2024-05-01.csv")
+    segundo = enviar(pd.DataFrame({"valor": rng.normal(200, 10, 300)}), "vendas_2024-05-02.csv")
+    outro = enviar(pd.DataFrame({"valor": rng.normal(100, 10, 300)}), "clientes.csv")
+
+    r = client.get(f"/api/v1/documents/{segundo}/drift", headers=api)
+    assert r.status_code == 200 and r.json["comparados"] == 1
+    assert r.json["historico"][0]["documento_id"] == primeiro
+    assert r.json["colunas"]["valor"]["severidade"] == "alta"
+    assert client.get(f"/api/v1/documents/{outro}/drift", headers=api).json["comparados"] == 0
+    r = client.get(f"/api/v1/documents/{outro}/drift?contra={primeiro}", headers=api)
+    assert r.json["comparados"] == 1 and r.json["colunas"]["valor"]["severidade"] != "alta"
+    assert client.get(f"/api/v1/documents/{segundo}/drift?limite=0", headers=api).status_code == 400
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from app.utils.file_loader import iter_excel_chunks, load_dataframe
+
+
+def _gravar(caminho, planilhas):
+    with pd.ExcelWriter(caminho, engine="openpyxl") as writer:
+        for nome, df in planilhas.items():
+            df.to_excel(writer, index=False, sheet_name=nome)
+    return str(caminho)
+
+
+def test_read_only_igual_ao_pandas(dataset, tmp_path):
+    caminho = _gravar(tmp_path / "dados.xlsx", {"Dados": dataset.head(500)})
+    pd.testing.assert_frame_equal(pd.read_excel(caminho), load_dataframe(caminho))
+
+
+def test_todas_as_planilhas_em_chunks(tmp_path):
+    a = pd.DataFrame({"id": range(5), "nome": list("abcde")})
+    b = pd.DataFrame({"id": range(5, 8), "nome": list("fgh")})
+    caminho = _gravar(tmp_path / "dados.xlsx", {"Jan": a, "Fev": b})
+
+    chunks = list(iter_excel_chunks(caminho, chunksize=2))
+    assert [(c.attrs["planilha"], len(c)) for c in chunks] == [("Jan", 2), ("Jan", 2), ("Jan", 1), ("Fev", 2), ("Fev", 1)]
+    assert chunks[0]["id"].dtype == "int64"
+    pd.testing.assert_frame_equal(load_dataframe(caminho), pd.concat([a, b], ignore_index=True))
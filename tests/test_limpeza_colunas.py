@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cleaning import (
+    calcular_estatisticas_regras_chunks, clean_dataframe, clean_dataframe_regras, limpar_chunks_regras, validar_regras,
+)
+from app.utils.file_loader import fatiar_dataframe
+
+
+@pytest.fixture
+def numericas(dataset):
+    return dataset.select_dtypes(include="number").columns.tolist()
+
+
+@pytest.mark.parametrize("estrategia", ["regras", "knn"])
+def test_selecionar_todas_as_numericas_igual_ao_padrao(dataset, numericas, estrategia):
+    pd.testing.assert_frame_equal(
+        clean_dataframe(dataset, estrategia), clean_dataframe(dataset, estrategia, colunas=numericas)
+    )
+
+
+def test_colunas_fora_da_selecao_passam_intactas(dataset):
+    limpo = clean_dataframe_regras(dataset, colunas=["num_0", "num_1"])
+    assert limpo[["num_0", "num_1"]].notna().all().all()
+    # as demais numéricas não são imputadas nem filtradas por outliers
+    assert limpo["num_2"].isna().any()
+    assert limpo["num_2"].max() == dataset["num_2"].max()
+
+
+def test_regra_por_coluna(dataset):
+    regras = {"num_0": {"imputar": "valor", "valor": -1, "outliers": "nenhum"}, "num_1": {"fator_iqr": 3}}
+    limpo = clean_dataframe_regras(dataset, regras=regras)
+    faltavam = dataset["num_0"].isna().sum()
+    assert (limpo["num_0"] == -1).sum() >= faltavam - dataset.duplicated().sum()
+    # sem tratamento de outliers, os extremos de num_0 continuam lá
+    assert limpo["num_0"].max() == dataset["num_0"].max()
+    padrao = clean_dataframe_regras(dataset)
+    assert len(limpo) > len(padrao)
+
+
+def test_streaming_com_selecao_igual_ao_serial(dataset):
+    colunas = ["num_0", "txt_0"]
+    serial = clean_dataframe_regras(dataset, colunas=colunas)
+    chunks = list(fatiar_dataframe(dataset.head(300), 100))
+    estatisticas = calcular_estatisticas_regras_chunks(chunks, colunas=colunas)
+    streaming = pd.concat(limpar_chunks_regras(chunks, estatisticas), ignore_index=True)
+    # a mediana do streaming vem do sketch KLL: aproximada, daí a tolerância
+    pd.testing.assert_frame_equal(
+        clean_dataframe_regras(dataset.head(300), colunas=colunas), streaming, check_exact=False, rtol=1e-3,
+    )
+    assert len(serial) > 0
+
+
+@pytest.mark.parametrize("regras, estrategia, mensagem", [
+    ({"num_0": {"imputar": "knn"}}, "regras", "exigem a estratégia knn"),
+    ({"num_0": {"outliers": "isolation_forest"}}, "regras", "exigem a estratégia knn"),
+    ({"num_0": {"imputar": "valor"}}, "knn", "Informe 'valor'"),
+    ({"num_0": {"fator_iqr": 0}}, "knn", "fator_iqr"),
+    ({"num_0": {"fator_iqr": True}}, "knn", "fator_iqr"),
+    ({"num_0": {"janela": 3}}, "knn", "desconhecidas"),
+    ({"num_0": "mediana"}, "knn", "objeto"),
+    (["num_0"], "knn", "objeto"),
+])
+def test_validar_regras(regras, estrategia, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        validar_regras(regras, estrategia)
+
+
+def test_api_recusa_coluna_inexistente(client, api, enviar):
+    rng = np.random.default_rng(0)
+    doc_id = enviar(pd.DataFrame({"a": rng.normal(size=30), "b": rng.normal(size=30)}))
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras", "colunas": ["zz"]})
+    assert r.status_code == 400 and "zz" in r.json["error"]
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras", "colunas": "a"})
+    assert r.status_code == 400
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras", "colunas": ["a"]})
+    assert r.status_code == 202 and r.json["job"]["status"] == "concluido", r.json
@@ -0,0 +1,83 @@
+# tests/test_limpeza_paralela.py
+"""Limpeza por regras: o modo em pool de processos produz o mesmo resultado que o serial."""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cleaning import clean_dataframe_regras
+
+
+def _frame(seed, linhas=3000):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "valor": rng.normal(100, 20, linhas),
+        "qtd": rng.integers(0, 50, linhas).astype(float),
+        "cidade": rng.choice(["Recife", "Natal", "Salvador", None], linhas),
+        "quando": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, linhas), unit="D"),
+        "ativo": rng.random(linhas) > 0.5,
+    })
+    df.loc[rng.random(linhas) < 0.1, "valor"] = np.nan
+    df.loc[rng.random(linhas) < 0.05, "qtd"] = np.nan
+    df.loc[rng.random(linhas) < 0.01, "valor"] = 10_000.0  # outliers
+    return pd.concat([df, df.sample(200, random_state=seed)], ignore_index=True)  # duplicatas
+
+
+def _misto(seed, linhas=2000):
+    """Colunas objeto com tipos misturados e números como texto (coerção)."""
+    rng = np.random.default_rng(seed)
+    texto_numerico = [f"{v:.2f}" for v in rng.normal(50, 5, linhas)]
+    df = pd.DataFrame({
+        "numero_texto": pd.Series(texto_numerico, dtype=object),
+        "misturada": pd.Series([1, "a", 2.5, None] * (linhas // 4), dtype=object),
+        "inteiro": rng.integers(0, 10, linhas),
+    })
+    df.loc[::13, "numero_texto"] = None
+    return pd.concat([df, df.head(100)], ignore_index=True)
+
+
+def _comparar(df, chunk_rows):
+    serial = clean_dataframe_regras(df, n_jobs=1, chunk_rows=chunk_rows)
+    paralelo = clean_dataframe_regras(df, n_jobs=3, chunk_rows=chunk_rows)
+    pd.testing.assert_frame_equal(paralelo, serial)
+    return serial
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_paralelo_igual_ao_serial(seed):
+    df = _frame(seed)
+    limpo = _comparar(df, chunk_rows=500)
+    assert not limpo.duplicated().any()
+    assert limpo["valor"].notna().all()
+
+
+@pytest.mark.parametrize("seed", [0, 7])
+def test_paralelo_igual_ao_serial_tipos_mistos(seed):
+    _comparar(_misto(seed), chunk_rows=300)
+
+
+def test_indice_nao_sequencial():
+    df = _frame(3).sample(frac=1, random_state=3)  # índice embaralhado
+    _comparar(df, chunk_rows=700)
+
+
+def test_limpezas_paralelas_simultaneas_nao_se_misturam():
+    frames = [_frame(10, 2000), _misto(11, 2400)]
+    esperados = [clean_dataframe_regras(df, n_jobs=1, chunk_rows=400) for df in frames]
+    resultados, erros = [None, None], []
+
+    def rodar(i):
+        try:
+            resultados[i] = clean_dataframe_regras(frames[i], n_jobs=2, chunk_rows=400)
+        except Exception as e:  # falhas da thread voltam para o teste
+            erros.append(e)
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not erros
+    for resultado, esperado in zip(resultados, esperados):
+        pd.testing.assert_frame_equal(resultado, esperado)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cleaning import calcular_estatisticas_regras_chunks, limpar_chunks_regras
+from app.utils.file_loader import fatiar_dataframe
+
+
+@pytest.fixture
+def streaming(app, monkeypatch):
+    """Orçamento de memória mínimo: a limpeza por regras roda em chunks de 40 linhas."""
+    import app.utils.memoria as memoria
+
+    monkeypatch.setattr(memoria, "CHUNK_MINIMO", 10)
+    app.config.update(MEMORY_BUDGET_MB=0.15, CHUNK_ROWS=40)
+
+
+def test_duplicatas_entre_chunks_sao_removidas(dataset):
+    base = dataset.drop_duplicates().head(400)
+    # a segunda metade repete a primeira embaralhada: cada repetição cai em outro chunk
+    df = pd.concat([base, base.sample(frac=1, random_state=0)], ignore_index=True)
+    estatisticas = calcular_estatisticas_regras_chunks(fatiar_dataframe(df, 50))
+    limpo = pd.concat(limpar_chunks_regras(fatiar_dataframe(df, 50), estatisticas), ignore_index=True)
+    esperado = pd.concat(limpar_chunks_regras(fatiar_dataframe(base, 50), estatisticas), ignore_index=True)
+    assert not limpo.duplicated().any()
+    pd.testing.assert_frame_equal(limpo, esperado)
+
+
+def _limpar(client, api, doc_id):
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras"})
+    assert r.status_code == 202, r.json
+    return r.json["job"]
+
+
+def test_falha_no_meio_mantem_a_versao_anterior(app, client, api, enviar, streaming, monkeypatch):
+    import app.pipeline as pipeline
+    from app.models import CleanRecord, CleanRun
+    from app.utils.registros import carregar_registros
+
+    rng = np.random.default_rng(0)
+    doc_id = enviar(pd.DataFrame({"a": rng.normal(size=300), "b": rng.choice(["x", "y"], 300)}))
+    job = _limpar(client, api, doc_id)
+    assert job["status"] == "concluido" and job["resultado"]["modo"] == "streaming", job
+    with app.app_context():
+        antes = carregar_registros(CleanRecord, doc_id)
+    assert len(antes) == job["resultado"]["resumo"]["linhas_depois"] > 120
+
+    gravar, chamadas = pipeline.gravar_registros, []
+
+    def gravar_e_falhar(modelo, doc_id, df):
+        chamadas.append(len(df))
+        if len(chamadas) == 3:
+            raise RuntimeError("disco cheio")
+        gravar(modelo, doc_id, df)
+
+    monkeypatch.setattr(pipeline, "gravar_registros", gravar_e_falhar)
+    job = _limpar(client, api, doc_id)
+    assert job["status"] == "erro" and len(chamadas) == 3
+    with app.app_context():
+        pd.testing.assert_frame_equal(carregar_registros(CleanRecord, doc_id), antes)
+        assert CleanRun.query.filter_by(documento_id=doc_id).count() == 1
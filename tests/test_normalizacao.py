@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cleaning import detectar_formatos, normalizar_chunks, normalizar_dataframe
+from app.utils.file_loader import fatiar_dataframe
+
+
+def _moeda_br(valores):
+    return "R$ " + valores.round(2).map("{:,.2f}".format).str.translate(str.maketrans(",.", ".,"))
+
+
+@pytest.fixture(scope="module")
+def formatados(dataset):
+    return pd.DataFrame({
+        "valor": _moeda_br(dataset["num_1"].fillna(0)),
+        "data": (pd.Timestamp("2020-01-01") + pd.to_timedelta(dataset["num_0"].fillna(0).abs().astype(int) % 1500, unit="D"))
+        .dt.strftime("%d/%m/%Y"),
+        "nome": dataset["txt_0"],
+    })
+
+
+def test_igual_a_conversao_valor_a_valor(formatados):
+    formatos = detectar_formatos(formatados)
+    assert formatos == {
+        "valor": {"tipo": "numero", "separadores": "br", "moeda": True},
+        "data": {"tipo": "data", "formatos": ["%d/%m/%Y"]},
+    }
+    normalizado, contagens = normalizar_dataframe(formatados, formatos)
+    assert contagens["valor"]["falhas"] == contagens["data"]["falhas"] == 0
+    assert contagens["valor"]["convertidos"] == len(formatados)
+
+    valores = [float(v.replace("R$", "").replace(".", "").replace(",", ".")) for v in formatados["valor"]]
+    assert (normalizado["valor"] == pd.Series(valores)).all()
+    assert (normalizado["data"] == pd.to_datetime(formatados["data"], dayfirst=True, format="mixed")).all()
+    pd.testing.assert_series_equal(normalizado["nome"], formatados["nome"])
+
+
+def test_streaming_igual_ao_frame_inteiro(formatados):
+    formatos = detectar_formatos(formatados)
+    inteiro, contagens = normalizar_dataframe(formatados, formatos)
+    contagens_chunks = {}
+    fatiado = pd.concat(normalizar_chunks(fatiar_dataframe(formatados, 700), formatos, contagens_chunks))
+    pd.testing.assert_frame_equal(inteiro, fatiado)
+    assert contagens_chunks == contagens
+
+
+def test_formatos_misturados_e_falhas():
+    df = pd.DataFrame({
+        "data": ["05/03/2024", "2024-03-06", "07/03/2024", "", "31/02/2024", None] * 10,
+        "preco": ["1,234.50", "12.00", "3", "", "n/d", None] * 10,
+    })
+    formatos = detectar_formatos(df, limiar=0.7)
+    assert formatos["data"]["formatos"] == ["%d/%m/%Y", "%Y-%m-%d"]
+    assert formatos["preco"] == {"tipo": "numero", "separadores": "us", "moeda": False}
+
+    normalizado, contagens = normalizar_dataframe(df, formatos)
+    assert normalizado["data"].iloc[:3].tolist() == [pd.Timestamp(f"2024-03-0{d}") for d in (5, 6, 7)]
+    assert normalizado["preco"].iloc[:3].tolist() == [1234.5, 12.0, 3.0]
+    # vazios e nulos viram ausentes sem contar como falha; "31/02" e "n/d" são falhas
+    assert contagens["data"]["convertidos"] == contagens["preco"]["convertidos"] == 30
+    assert contagens["data"]["falhas"] == contagens["preco"]["falhas"] == 10
+    assert normalizado.iloc[3:6].isna().all().all()
+
+
+def test_texto_livre_nao_e_convertido(dataset):
+    assert detectar_formatos(dataset[["txt_0", "txt_1"]]) == {}
+    assert detectar_formatos(pd.DataFrame({"x": ["1.234,56", "abc", "def"]})) == {}
+
+
+def test_api_normalizacao_no_resumo(client, api, enviar):
+    rng = np.random.default_rng(0)
+    doc_id = enviar(pd.DataFrame({"valor": _moeda_br(pd.Series(rng.uniform(0, 5000, 50))), "qtd": rng.integers(1, 9, 50)}))
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras"})
+    assert r.status_code == 202 and r.json["job"]["status"] == "concluido", r.json
+    assert r.json["job"]["resultado"]["resumo"]["normalizacao"]["valor"]["falhas"] == 0
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras", "normalizar": False})
+    assert r.status_code == 202 and "normalizacao" not in r.json["job"]["resultado"]["resumo"]
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras", "normalizar": "x"})
+    assert r.status_code == 400
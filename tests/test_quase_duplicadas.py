@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.file_loader import fatiar_dataframe
+from app.utils.quase_duplicadas import (
+    aplicar_plano, detectar_chunks, mesclar_grupos, normalizar_texto, planejar, validar_config,
+)
+
+
+@pytest.fixture(scope="module")
+def cadastros(dataset):
+    # cada cadastro aparece ~2x, às vezes em maiúsculas
+    ids = pd.Series(range(len(dataset))) % (len(dataset) // 2)
+    nomes = dataset["txt_1"].fillna("") + " " + dataset["txt_0"].fillna("") + " " + ids.astype(str)
+    df = pd.DataFrame({"nome": nomes.iloc[ids].to_numpy()})
+    variantes = df.index % 3 == 0
+    df.loc[variantes, "nome"] = df.loc[variantes, "nome"].str.upper()
+    return df
+
+
+def test_duplicatas_exatas_apos_normalizacao_sao_agrupadas(cadastros):
+    resultado = detectar_chunks(fatiar_dataframe(cadastros, 700), {"colunas": ["nome"]})
+    exatas = normalizar_texto(cadastros["nome"]).duplicated(keep=False).to_numpy().nonzero()[0]
+    assert len(exatas) and pd.Index(exatas).isin(resultado["posicoes"]).all()
+
+
+def test_resultado_independe_do_tamanho_do_chunk(cadastros):
+    inteiro = detectar_chunks([cadastros], {"colunas": ["nome"]})
+    fatiado = detectar_chunks(fatiar_dataframe(cadastros, 333), {"colunas": ["nome"]})
+    for chave in ("pares", "posicoes", "rotulos"):
+        np.testing.assert_array_equal(inteiro[chave], fatiado[chave])
+
+
+def test_bloqueio_separa_grupos():
+    df = pd.DataFrame({"nome": ["Ana Souza", "ana souza", "ANA SOUZA"], "uf": ["SP", "SP", "RJ"]})
+    assert detectar_chunks([df], {"colunas": ["nome"]})["posicoes"].tolist() == [0, 1, 2]
+    assert detectar_chunks([df], {"colunas": ["nome"], "bloqueio": ["uf"]})["posicoes"].tolist() == [0, 1]
+
+
+@pytest.fixture
+def grupos():
+    df = pd.DataFrame({
+        "nome": ["Ana Souza", "Bruno Lima", "ana souza", "Carla Dias", "ANA SOUZA", "bruno lima"],
+        "email": [None, "b@x.com", "ana@x.com", "c@x.com", None, None],
+        "cidade": [None, None, "Recife", None, "Recife", "Natal"],
+    })
+    return df, detectar_chunks([df], {"colunas": ["nome"]})
+
+
+def test_politicas(grupos):
+    df, resultado = grupos
+    assert resultado["posicoes"].tolist() == [0, 1, 2, 4, 5]
+    assert resultado["rotulos"].tolist() == [0, 1, 0, 0, 1]
+
+    primeira = planejar(resultado, "primeira")
+    assert primeira["manter"].tolist() == [0, 1] and primeira["remover"].tolist() == [2, 4, 5]
+    completa = planejar(resultado, "mais_completa")
+    assert completa["manter"].tolist() == [2, 1] and completa["remover"].tolist() == [0, 4, 5]
+    assert not len(planejar(resultado, "marcar")["remover"])
+
+    limpo = pd.concat(aplicar_plano(fatiar_dataframe(df, 4), primeira))
+    assert limpo.index.tolist() == [0, 1, 3]
+
+
+def test_mesclar_preenche_os_nulos(grupos):
+    df, resultado = grupos
+    plano = planejar(resultado, "mesclar")
+    mescladas = mesclar_grupos(fatiar_dataframe(df, 4), resultado, plano)
+    limpo = pd.concat(aplicar_plano(fatiar_dataframe(df, 4), plano, mescladas))
+    assert limpo.index.tolist() == [0, 1, 3]
+    assert limpo.loc[0, "email"] == "ana@x.com" and limpo.loc[0, "cidade"] == "Recife"
+    assert limpo.loc[1, "cidade"] == "Natal"
+
+
+@pytest.mark.parametrize("config, mensagem", [
+    ({"limiar": 0}, "limiar"),
+    ({"limiar": True}, "limiar"),
+    ({"politica": "ultima"}, "politica"),
+    ({"permutacoes": 64, "bandas": 5}, "múltiplo"),
+    ({"colunas": "nome"}, "lista"),
+    ({"janela": 3}, "desconhecidas"),
+])
+def test_validar_config(config, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        validar_config(config)
+
+
+def test_api_grupos_do_documento(client, api, enviar):
+    doc_id = enviar(pd.DataFrame({
+        "nome": ["Ana Souza", "ana souza", "Bruno Lima", "Carla Dias"], "valor": [1.0, 2.0, 3.0, 4.0],
+    }))
+    r = client.get(f"/api/v1/documents/{doc_id}/near-duplicates", headers=api)
+    assert r.status_code == 404
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={
+        "estrategia": "regras", "quase_duplicadas": {"colunas": ["nome"], "politica": "marcar"},
+    })
+    assert r.status_code == 202 and r.json["job"]["status"] == "concluido", r.json
+
+    r = client.get(f"/api/v1/documents/{doc_id}/near-duplicates", headers=api)
+    assert r.status_code == 200 and r.json["total"] == 1
+    assert [linha["linha"] for linha in r.json["grupos"][0]["linhas"]] == [0, 1]
+    assert r.json["grupos"][0]["linhas"][1]["dados"]["nome"] == "ana souza"
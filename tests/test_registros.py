@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# app.utils.registros importa app.db
+pytest.importorskip("app.db")
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def doc_id(ctx, client):
+    from app.db import db
+    from app.models import Documentos
+
+    doc = Documentos(nome_documento="registros", user_id=1)
+    db.session.add(doc)
+    db.session.commit()
+    return doc.id
+
+
+def _frame():
+    return pd.DataFrame({
+        "data": pd.to_datetime(["2024-01-05 10:30:00", None, "2024-02-29 00:00:00"]),
+        "inteiro": np.array([1, 2, 3], dtype="int64"),
+        "real": [1.5, np.nan, -2.0],
+        "texto": ["a", None, "c"],
+        "flag": [True, False, True],
+    })
+
+
+def test_ida_e_volta_preserva_dtypes(doc_id):
+    from app.models import RawRecord
+    from app.utils.registros import carregar_registros, gravar_registros
+
+    df = _frame()
+    gravar_registros(RawRecord, doc_id, df)
+    lido = carregar_registros(RawRecord, doc_id)
+    assert dict(lido.dtypes.astype(str)) == dict(df.dtypes.astype(str))
+    pd.testing.assert_frame_equal(lido, df)
+
+
+def test_linhas_curtas_e_projecao(doc_id):
+    from app.db import db
+    from app.models import RawRecord
+    from app.utils.registros import carregar_registros, decodificar_linhas, gravar_registros, iter_registros
+
+    gravar_registros(RawRecord, doc_id, _frame()[["inteiro", "texto"]])
+    # coluna nova só no segundo chunk: as linhas antigas ficam mais curtas
+    gravar_registros(RawRecord, doc_id, pd.DataFrame({"inteiro": [4], "texto": ["d"], "extra": [7.0]}))
+    db.session.commit()
+
+    lido = carregar_registros(RawRecord, doc_id)
+    assert list(lido.columns) == ["inteiro", "texto", "extra"]
+    assert lido["extra"].isna().tolist() == [True, True, True, False]
+    assert lido["inteiro"].dtype == "int64"
+
+    # chunk só com linhas antigas: a coluna nova continua lá, como NaN
+    primeiro = next(iter_registros(RawRecord, doc_id, 2))
+    assert list(primeiro.columns) == ["inteiro", "texto", "extra"] and primeiro["extra"].isna().all()
+
+    projetado = carregar_registros(RawRecord, doc_id, colunas=["extra", "inteiro"])
+    assert list(projetado.columns) == ["extra", "inteiro"] and projetado["inteiro"].dtype == "int64"
+
+    vazio = decodificar_linhas([[1], [2]], ["a", "b"], {"a": "int64", "b": "float64"})
+    assert vazio["b"].dtype == "float64" and vazio["b"].isna().all()
+
+
+def test_nulos_nao_viram_falso_nem_quebram_inteiros():
+    from app.utils.registros import decodificar_linhas
+
+    df = decodificar_linhas([[True, 1], [None, None]], ["flag", "n"], {"flag": "bool", "n": "int64"})
+    assert df["flag"].tolist()[0] is True and pd.isna(df["flag"].tolist()[1])
+    assert df["n"].dtype == "float64" and np.isnan(df["n"].iloc[1])
+
+
+def test_formato_posicional_reconstroi_o_formato_objeto(dataset):
+    from app.utils.registros import codificar_linhas, decodificar_linhas
+
+    colunas = list(dataset.columns)
+    objetos = pd.DataFrame([json.loads(json.dumps(r)) for r in dataset.to_dict(orient="records")])
+    arrays = [json.loads(json.dumps(linha)) for linha in codificar_linhas(dataset, colunas)]
+    pd.testing.assert_frame_equal(objetos, decodificar_linhas(arrays, colunas))
+    # com os dtypes do esquema, volta o frame original
+    dtypes = {c: str(dataset[c].dtype) for c in colunas}
+    pd.testing.assert_frame_equal(dataset, decodificar_linhas(arrays, colunas, dtypes))
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def outro(app):
+    """Cliente de um segundo usuário, logado."""
+    c = app.test_client()
+    c.post("/auth/cadastro", data=dict(nome="Bia", email="bia@exemplo.com", senha="segredo", confirmar_senha="segredo"))
+    return c
+
+
+def _documento(enviar):
+    rng = np.random.default_rng(0)
+    return enviar(pd.DataFrame({"a": rng.normal(size=40), "b": rng.choice(["x", "y"], 40)}))
+
+
+def test_pdf_so_do_dono(client, api, enviar, outro):
+    doc_id = _documento(enviar)
+    assert client.get(f"/api/download/report.pdf?doc_id={doc_id}").status_code == 404
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={"estrategia": "regras"})
+    run_id = r.json["job"]["resultado"]["run_id"]
+
+    r = client.get(f"/api/download/report.pdf?doc_id={doc_id}")
+    assert r.status_code == 200 and r.mimetype == "application/pdf" and r.data.startswith(b"%PDF")
+    assert client.get(f"/api/download/report.pdf?doc_id={doc_id}&run_id={run_id}").status_code == 200
+    assert client.get(f"/api/download/report.pdf?doc_id={doc_id}&run_id=999").status_code == 404
+
+    assert outro.get(f"/api/download/report.pdf?doc_id={doc_id}").status_code == 404
+    assert outro.get(f"/api/download/report.pdf?doc_id={doc_id}&run_id={run_id}").status_code == 404
+
+
+def test_relatorio_antigo_so_do_dono(app, client, enviar, outro):
+    doc_id = _documento(enviar)
+    # relatório anterior ao versionamento: sem CleanRun, só o arquivo em OUTPUT_FOLDER
+    os.makedirs(app.config["OUTPUT_FOLDER"], exist_ok=True)
+    with open(os.path.join(app.config["OUTPUT_FOLDER"], f"relatorio_{doc_id}.pdf"), "wb") as f:
+        f.write(b"%PDF-1.4 antigo")
+
+    assert client.get(f"/api/download/report.pdf?doc_id={doc_id}").data == b"%PDF-1.4 antigo"
+    assert outro.get(f"/api/download/report.pdf?doc_id={doc_id}").status_code == 404
+    assert client.get(f"/api/download/report.pdf?doc_id={doc_id}&run_id=1").status_code == 404
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from app.utils import sketches
+from app.utils.sketches import HashesVistos, PerfilSketch, margem_duplicadas
+
+
+def _df(n=5000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"a": rng.integers(0, 3000, n), "b": rng.choice(["x", "y"], n)})
+
+
+def _perfil(df, tamanho=700):
+    perfil = PerfilSketch()
+    for i in range(0, len(df), tamanho):
+        perfil.update(df.iloc[i:i + tamanho])
+    return perfil
+
+
+def test_duplicadas_exatas_em_chunks_e_merge():
+    df = _df()
+    esperado = int(df.duplicated().sum())
+    resumo = _perfil(df).resumo()
+    assert resumo["duplicadas"] == esperado
+    assert resumo["duplicadas_exatas"] and margem_duplicadas(resumo) == 0
+
+    metade = len(df) // 2
+    mesclado = _perfil(df.iloc[:metade]).merge(_perfil(df.iloc[metade:]))
+    assert mesclado.resumo()["duplicadas"] == esperado
+
+
+def test_acima_do_limite_vira_estimativa_com_margem(monkeypatch):
+    monkeypatch.setattr(sketches, "LIMITE_DUPLICADAS_EXATAS", 1000)
+    df = _df()
+    resumo = _perfil(df).resumo()
+    assert not resumo["duplicadas_exatas"]
+    margem = margem_duplicadas(resumo)
+    assert margem > 0
+    assert abs(resumo["duplicadas"] - int(df.duplicated().sum())) <= margem
+
+
+def test_hashes_vistos_igual_a_isin():
+    rng = np.random.default_rng(0)
+    vistos, todos = HashesVistos(), np.empty(0, dtype=np.uint64)
+    for tamanho in (1, 500, 37, 2000, 3, 800, 800):
+        hashes = rng.integers(0, 5000, tamanho).astype(np.uint64)
+        np.testing.assert_array_equal(vistos.contem(hashes), np.isin(hashes, todos))
+        vistos.adicionar(hashes)
+        todos = np.union1d(todos, hashes)
+    # níveis ordenados, sem repetição e de tamanhos decrescentes
+    assert all((np.diff(n.astype(np.float64)) > 0).all() for n in vistos.niveis)
+    assert [len(n) for n in vistos.niveis] == sorted((len(n) for n in vistos.niveis), reverse=True)
+    assert sum(len(n) for n in vistos.niveis) >= len(todos)
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+
+import pytest
+
+CSV = b"a;b\n" + b"".join(f"{i};{'xyz'[i % 3]}\n".encode() for i in range(200))
+
+
+@pytest.fixture
+def sessao(client, api):
+    """Cria uma sessão de upload para CSV e devolve uma função que a abre."""
+    def _criar(conteudo=CSV, nome="dados.csv"):
+        r = client.post("/api/v1/uploads", headers=api, json={"nome_arquivo": nome, "tamanho_total": len(conteudo)})
+        assert r.status_code == 201, r.json
+        return r.json["id"]
+    return _criar
+
+
+def _enviar_trecho(client, api, sessao_id, conteudo, offset, tamanho):
+    trecho = conteudo[offset:offset + tamanho]
+    cabecalhos = {**api, "X-Content-SHA256": hashlib.sha256(trecho).hexdigest()}
+    return client.put(f"/api/v1/uploads/{sessao_id}?offset={offset}", headers=cabecalhos, data=trecho)
+
+
+def test_trechos_fora_de_ordem_e_repetidos(app, client, api, sessao):
+    from app.models import UploadChunk
+
+    sessao_id = sessao()
+    meio = len(CSV) // 2
+    assert _enviar_trecho(client, api, sessao_id, CSV, meio, len(CSV) - meio).json["faltantes"] == [[0, meio]]
+    for _ in range(2):  # o reenvio do mesmo offset atualiza o trecho em vez de violar a unique constraint
+        r = _enviar_trecho(client, api, sessao_id, CSV, 0, meio)
+        assert r.status_code == 200 and r.json["faltantes"] == [] and r.json["recebido"] == len(CSV)
+    with app.app_context():
+        assert UploadChunk.query.filter_by(sessao_id=sessao_id).count() == 2
+
+    r = client.post(f"/api/v1/uploads/{sessao_id}/finalize", headers=api)
+    assert r.status_code == 202 and r.json["job"]["status"] == "concluido", r.json
+    assert r.json["job"]["resultado"]["linhas"] == 200
+    assert client.post(f"/api/v1/uploads/{sessao_id}/finalize", headers=api).status_code == 409
+    assert _enviar_trecho(client, api, sessao_id, CSV, 0, 10).status_code == 409
+
+
+def test_finalize_simultaneo(app, client, api, sessao):
+    from app.models import Documentos
+
+    sessao_id = sessao()
+    assert _enviar_trecho(client, api, sessao_id, CSV, 0, len(CSV)).status_code == 200
+
+    barreira, status = threading.Barrier(2), []
+
+    def finalizar():
+        c = app.test_client()
+        barreira.wait()
+        status.append(c.post(f"/api/v1/uploads/{sessao_id}/finalize", headers=api).status_code)
+
+    threads = [threading.Thread(target=finalizar) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(status) == [202, 409]
+    with app.app_context():
+        assert Documentos.query.count() == 1
+
+
+def test_ingestao_com_falha_remove_o_documento(app, client, api, sessao):
+    from app.db import db
+    from app.models import Documentos, Job
+
+    conteudo = b"isto nao e uma planilha"
+    sessao_id = sessao(conteudo, "dados.xlsx")
+    assert _enviar_trecho(client, api, sessao_id, conteudo, 0, len(conteudo)).status_code == 200
+    r = client.post(f"/api/v1/uploads/{sessao_id}/finalize", headers=api)
+    assert r.status_code == 202
+    job = r.json["job"]
+    assert job["status"] == "erro" and job["documento_id"] is None, job
+
+    with app.app_context():
+        assert Documentos.query.count() == 0 and db.session.get(Job, job["id"]).status == "erro"
+    pasta = os.path.join(app.config["UPLOAD_FOLDER"], "user_1")
+    assert not os.listdir(pasta)
+    assert client.get(f"/api/v1/documents/{r.json['documento_id']}", headers=api).status_code == 404
@@ -0,0 +1,58 @@
+import pytest
+
+from app.connectors.validacao import validar_url
+
+
+@pytest.mark.parametrize("url", [
+    "mysql+pymysql://u:p@db.exemplo/app?local_infile=1",
+    "mysql+pymysql://u:p@db.exemplo/app?LOCAL_INFILE=1",
+    "mssql+pyodbc://?odbc_connect=DRIVER=/tmp/lib.so;SERVER=x",
+    "mysql+pymysql://u:p@db.exemplo/app?unix_socket=/var/run/mysqld/mysqld.sock",
+    "postgresql://u:p@db.exemplo/app?host=/var/run/postgresql",
+    "postgresql://u:p@db.exemplo/app?hostaddr=127.0.0.1",
+])
+def test_parametros_proibidos(url):
+    with pytest.raises(ValueError, match="proibido"):
+        validar_url(url)
+
+
+@pytest.mark.parametrize("url", [
+    "postgresql://u:p@db.exemplo/app?options=-csearch_path%3Dx",
+    "postgresql://u:p@db.exemplo/app?sslkey=/etc/ssl/private/server.key",
+    "mysql+pymysql://u:p@db.exemplo/app?ssl_ca=/etc/passwd",
+    "oracle://u:p@db.exemplo/?sslmode=require",
+])
+def test_parametros_fora_da_lista(url):
+    with pytest.raises(ValueError, match="não permitido"):
+        validar_url(url)
+
+
+def test_driver_odbc_por_caminho():
+    with pytest.raises(ValueError, match="Driver ODBC"):
+        validar_url("mssql+pyodbc://u:p@db.exemplo/app?driver=/opt/evil/libodbc.so")
+
+
+def test_parametro_repetido():
+    with pytest.raises(ValueError, match="repetido"):
+        validar_url("mysql+pymysql://u:p@db.exemplo/app?charset=utf8mb4&charset=latin1")
+
+
+@pytest.mark.parametrize("url", [
+    "postgresql://u:p@db.exemplo/app?sslmode=require&connect_timeout=5",
+    "mysql+pymysql://u:p@db.exemplo/app?charset=utf8mb4",
+    "mssql+pyodbc://u:p@db.exemplo/app?driver=ODBC+Driver+18+for+SQL+Server&TrustServerCertificate=yes",
+])
+def test_parametros_permitidos(url):
+    assert validar_url(url).host == "db.exemplo"
+
+
+def test_sqlite_so_para_arquivos_liberados(tmp_path):
+    url = f"sqlite:///{tmp_path}/x.db"
+    with pytest.raises(ValueError, match="administradores"):
+        validar_url(url, backends=("sqlite",))
+    assert validar_url(url, backends=("sqlite",), arquivos=True).database.endswith("x.db")
+
+
+def test_banco_da_aplicacao_por_destino():
+    with pytest.raises(ValueError, match="própria aplicação"):
+        validar_url("postgresql://u:p@127.0.0.1/app", proibidas=["postgresql://localhost:5432/app"])
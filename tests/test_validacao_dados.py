@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.cleaning import clean_dataframe, validate_dataframe
+from app.utils.file_loader import fatiar_dataframe
+from app.utils.validacao import carregar_indice, contar_falhas, pagina_falhas, salvar_indice, validar_chunks
+
+REGRAS = [
+    {"tipo": "nao_nulo", "coluna": "num_0"},
+    {"tipo": "intervalo", "coluna": "num_1", "min": 0, "max": 500},
+    {"tipo": "valores", "coluna": "txt_0", "permitidos": ["ana", "bruno", "carla"]},
+    {"tipo": "regex", "coluna": "txt_1", "padrao": r"[A-Z][a-zà-ú]+( [A-Z][a-zà-ú]+)*"},
+    {"tipo": "unico", "colunas": ["num_0", "txt_0"]},
+    {"tipo": "expressao", "expressao": "num_0 < num_1"},
+    {"tipo": "dtype", "coluna": "txt_0", "dtype": "texto"},
+]
+
+
+@pytest.mark.parametrize("limpar", [False, True])
+def test_regras_padrao_reproduzem_criterios_antigos(dataset, limpar):
+    df = clean_dataframe(dataset.copy()) if limpar else dataset
+    numericas = df.select_dtypes(include="number")
+    val = validate_dataframe(df)
+    assert val["no_nulls_numeric"] == bool(numericas.notna().all().all())
+    assert val["numeric_positive"] == bool((numericas >= 0).all().all())
+
+
+def test_falhas_por_regra(dataset):
+    falhas = {r["nome"]: r["falhas"] for r in validar_chunks(fatiar_dataframe(dataset, 700), REGRAS).resultado()["regras"]}
+    assert falhas["nao_nulo:num_0"] == int(dataset["num_0"].isna().sum())
+    # repetições da chave espalhadas entre chunks também contam
+    repetidas = dataset[["num_0", "txt_0"]].notna().all(axis=1) & dataset.duplicated(["num_0", "txt_0"])
+    assert falhas["unico:num_0+txt_0"] == int(repetidas.sum())
+
+
+def test_resultado_independe_do_tamanho_do_chunk(dataset):
+    inteiro = validar_chunks([dataset], REGRAS)
+    fatiado = validar_chunks(fatiar_dataframe(dataset, 250), REGRAS)
+    assert inteiro.resultado() == fatiado.resultado()
+    for a, b in zip(inteiro.indice(), fatiado.indice()):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_indice_bate_com_as_contagens(dataset, tmp_path):
+    validador = validar_chunks(fatiar_dataframe(dataset, 500), REGRAS)
+    resultado = validador.resultado()
+    posicoes, bits, nomes = validador.indice()
+    assert len(posicoes) == resultado["linhas_com_falha"] and bits.shape == (len(posicoes), 1)
+    assert posicoes.dtype == np.uint32 and (np.diff(posicoes.astype(np.int64)) > 0).all()
+
+    caminho = tmp_path / "validacao.npz"
+    salvar_indice(validador, str(caminho))
+    indice = carregar_indice(str(caminho))
+    assert contar_falhas(indice) == {r["nome"]: r["falhas"] for r in resultado["regras"]}
+
+    total, pagina = pagina_falhas(indice, 0, 1000, "nao_nulo:num_0")
+    assert total == int(dataset["num_0"].isna().sum())
+    assert [p for p, _ in pagina] == np.flatnonzero(dataset["num_0"].isna()).tolist()[:1000]
+    assert all("nao_nulo:num_0" in regras for _, regras in pagina)
+    with pytest.raises(ValueError, match="desconhecida"):
+        pagina_falhas(indice, regra="zz")
+
+
+def test_regra_com_coluna_inexistente(dataset):
+    with pytest.raises(ValueError, match="inexistentes"):
+        validar_chunks([dataset], [{"tipo": "nao_nulo", "coluna": "zz"}])
+
+
+def test_api_pagina_falhas_da_execucao(client, api, enviar):
+    a = np.arange(1.0, 41.0)
+    df = pd.DataFrame({"a": np.where(a % 2, a, -a), "b": list("xyzw") * 10})
+    doc_id = enviar(df)
+    r = client.post(f"/api/v1/documents/{doc_id}/clean", headers=api, json={
+        "estrategia": "regras", "colunas": ["b"], "validacao": [{"tipo": "intervalo", "coluna": "a", "min": 0}],
+    })
+    assert r.status_code == 202 and r.json["job"]["status"] == "concluido", r.json
+    run_id = r.json["job"]["resultado"]["run_id"]
+
+    r = client.get(f"/api/v1/documents/{doc_id}/runs/{run_id}/failures?limite=5", headers=api)
+    assert r.status_code == 200
+    assert r.json["total"] == r.json["regras"]["intervalo:a"] == 20
+    assert len(r.json["linhas"]) == 5 and all(linha["dados"]["a"] < 0 for linha in r.json["linhas"])
+    r = client.get(f"/api/v1/documents/{doc_id}/runs/{run_id}/failures?regra=zz", headers=api)
+    assert r.status_code == 400
@@ -0,0 +1,69 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from app.utils.file_loader import fatiar_dataframe
+from app.utils.xlsx_stream import escrever_xlsx
+
+
+@pytest.fixture
+def limpo(dataset):
+    return dataset.head(600).reset_index(drop=True)
+
+
+def test_write_only_igual_ao_excelwriter(limpo, tmp_path):
+    referencia = tmp_path / "pandas.xlsx"
+    with pd.ExcelWriter(referencia, engine="openpyxl") as writer:
+        limpo.to_excel(writer, index=False, sheet_name="Limpos")
+    destino = tmp_path / "stream.xlsx"
+    assert escrever_xlsx(fatiar_dataframe(limpo, 128), destino) == (len(limpo), 1)
+    pd.testing.assert_frame_equal(pd.read_excel(referencia), pd.read_excel(destino))
+
+
+def test_divide_em_planilhas(limpo, tmp_path):
+    destino = tmp_path / "stream.xlsx"
+    total, planilhas = escrever_xlsx(fatiar_dataframe(limpo, 128), destino, linhas_por_planilha=250)
+    assert (total, planilhas) == (600, 3)
+    lidas = pd.read_excel(destino, sheet_name=None)
+    assert list(lidas) == ["Limpos", "Limpos_2", "Limpos_3"]
+    assert [len(df) for df in lidas.values()] == [250, 250, 100]
+    esperado = pd.read_excel(_excel(limpo, tmp_path / "ref.xlsx"))
+    pd.testing.assert_frame_equal(esperado, pd.concat(lidas.values(), ignore_index=True))
+
+
+def test_sem_linhas_grava_planilha_vazia(tmp_path):
+    destino = tmp_path / "vazio.xlsx"
+    assert escrever_xlsx([], destino) == (0, 1)
+    assert os.path.exists(destino) and not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def _excel(df, caminho):
+    with pd.ExcelWriter(caminho, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Dados")
+    return caminho
+
+
+def test_download_xlsx_por_versao(app, client, enviar, dataset):
+    doc_id = enviar(dataset.head(300))
+    assert client.post(f"/api/clean/run?doc_id={doc_id}").status_code == 200
+    csv = client.get(f"/api/download/clean.csv?doc_id={doc_id}")
+    primeiro = client.get(f"/api/download/clean.xlsx?doc_id={doc_id}")
+    assert primeiro.status_code == 200
+    with app.app_context():
+        from app.pipeline import pasta_runs
+        gerados = os.listdir(pasta_runs("xlsx"))
+    assert len(gerados) == 1
+
+    # segundo download reaproveita o arquivo da versão
+    assert client.get(f"/api/download/clean.xlsx?doc_id={doc_id}").data == primeiro.data
+    esperado = pd.read_csv(io.BytesIO(csv.data))
+    lido = pd.read_excel(io.BytesIO(primeiro.data))
+    pd.testing.assert_frame_equal(esperado, lido, check_dtype=False)
+
+    # nova limpeza = nova versão = novo arquivo
+    assert client.post(f"/api/clean/run?doc_id={doc_id}").status_code == 200
+    client.get(f"/api/download/clean.xlsx?doc_id={doc_id}")
+    with app.app_context():
+        assert len(os.listdir(pasta_runs("xlsx"))) == 2